@@ -2,7 +2,7 @@ import { NextRequest, NextResponse } from 'next/server';
 import { spawn } from 'child_process';
 import { writeFileSync, unlinkSync, readFileSync, existsSync, mkdirSync } from 'fs';
 import { join } from 'path';
-import { getPythonPath } from '@/app/lib/python';
+import { getPythonPath, pipeToStdin } from '@/app/lib/python';
 import { getPaths } from '@/app/lib/paths';
 
 export const dynamic = 'force-dynamic';
@@ -21,10 +21,10 @@ function ensureTempDir() {
 }
 
 export async function POST(request: NextRequest) {
-  let tempInputPath = '';
   let tempOutputPath = '';
-  let mp3Path = '';
   let originalWavPath = '';
+  let comparePath = '';
+  let streaming = false;
 
   try {
     ensureTempDir();
@@ -32,57 +32,68 @@ export async function POST(request: NextRequest) {
     const formData = await request.formData();
     const audioFile = formData.get('audio') as File;
     const skipImage = formData.get('skipImage') === 'true'; // For energy comparison only
+    const stream = formData.get('stream') === 'true'; // JSON Lines: one record per metric group
+    // Before/after mode: 'audio' is the original, 'compare' the processed file
+    const compareFile = formData.get('compare') as File | null;
+    const groups = (formData.get('groups') as string | null) || 'energy_ratio';
+    // Optional energy timeline in windows of this many seconds (timeline* fields)
+    const timelineSeconds = Number(formData.get('timelineSeconds') || 0);
+    const extraArgs = timelineSeconds > 0 ? ['--timeline', String(timelineSeconds)] : [];
+    // 88.2-192 kHz input analyzed decimated to 44.1/48 kHz (band metrics only; adds analysisSampleRate)
+    if (formData.get('decimate') === 'true') extraArgs.push('--decimate');
 
     if (!audioFile) {
       return NextResponse.json({ error: 'No audio file uploaded' }, { status: 400 });
     }
 
+    if (compareFile) {
+      console.log(`📊 Comparison request: ${audioFile.name} vs ${compareFile.name} (groups: ${groups})`);
+      const stamp = Date.now();
+      originalWavPath = join(TEMP_DIR, `analyze_input_${stamp}_${audioFile.name}`);
+      comparePath = join(TEMP_DIR, `analyze_compare_${stamp}_${compareFile.name}`);
+      writeFileSync(originalWavPath, Buffer.from(await audioFile.arrayBuffer()));
+      writeFileSync(comparePath, Buffer.from(await compareFile.arrayBuffer()));
+
+      const result = await runCompareScript(getPythonPath(), join(paths.scripts, 'analyze_fingerprint.py'),
+                                            originalWavPath, comparePath, groups);
+      if (!result.success) {
+        throw new Error(result.error || 'Comparison failed');
+      }
+      return NextResponse.json({ filename: audioFile.name, compareFilename: compareFile.name, ...result });
+    }
+
     const fileSizeMB = audioFile.size / (1024 * 1024);
     console.log(`📊 Analysis request: ${audioFile.name} (${fileSizeMB.toFixed(2)} MB)`);
     
-    // OPTIMIZATION: For large files (>30 MB), convert to MP3 first for faster analysis
-    // This reduces processing time by 50-70% and avoids Railway HTTP timeout
-    const USE_MP3_OPTIMIZATION = fileSizeMB > 30;
-    let mp3Path = '';
-    let originalWavPath = '';
-    
-    if (USE_MP3_OPTIMIZATION) {
-      console.log(`⚡ Large file detected - using MP3 optimization for faster analysis`);
-    }
-
-    // Save uploaded file temporarily (using our temp dir, not system /tmp)
-    const buffer = Buffer.from(await audioFile.arrayBuffer());
-    originalWavPath = join(TEMP_DIR, `analyze_input_${Date.now()}_${audioFile.name}`);
+    // The upload is piped into the script's stdin: a WAV is analyzed block by
+    // block as it is read, without a temp copy (see scripts/stdio_io.py)
     tempOutputPath = skipImage ? 'skip' : join(TEMP_DIR, `analyze_output_${Date.now()}.png`);
-    
-    writeFileSync(originalWavPath, buffer);
-
-    // Convert to MP3 if optimization enabled
-    if (USE_MP3_OPTIMIZATION) {
-      mp3Path = join(TEMP_DIR, `analyze_mp3_${Date.now()}.mp3`);
-      const convertScript = join(paths.scripts, 'convert_to_mp3.py');
-      const pythonPath = getPythonPath();
-      
-      console.log(`🔄 Converting to MP3 for faster analysis...`);
-      const convertSuccess = await convertToMP3(pythonPath, convertScript, originalWavPath, mp3Path);
-      
-      if (convertSuccess) {
-        tempInputPath = mp3Path; // Use MP3 for analysis
-        console.log(`✓ Using MP3 for analysis (original WAV preserved)`);
-      } else {
-        console.warn(`⚠️ MP3 conversion failed, falling back to WAV analysis`);
-        tempInputPath = originalWavPath; // Fallback to WAV
-      }
-    } else {
-      tempInputPath = originalWavPath; // Use WAV directly for small files
-    }
 
     // Auto-detect: venv (local) or system python3 (Render.com)
     const pythonPath = getPythonPath();
     const scriptPath = join(paths.scripts, 'analyze_fingerprint.py');
 
+    // Streaming mode: forward each metric group as soon as the script reports it
+    if (stream) {
+      streaming = true;
+      const body = streamAnalysisScript(pythonPath, scriptPath, audioFile.stream(), tempOutputPath, skipImage, audioFile.name, extraArgs, () => {
+        try {
+          if (tempOutputPath !== 'skip' && existsSync(tempOutputPath)) unlinkSync(tempOutputPath);
+        } catch (e) {
+          console.error('Cleanup error:', e);
+        }
+      });
+      return new NextResponse(body, {
+        status: 200,
+        headers: {
+          'Content-Type': 'application/x-ndjson',
+          'Cache-Control': 'no-cache',
+        },
+      });
+    }
+
     // Run analysis with JSON output
-    const result = await runAnalysisScript(pythonPath, scriptPath, tempInputPath, tempOutputPath, skipImage);
+    const result = await runAnalysisScript(pythonPath, scriptPath, audioFile.stream(), tempOutputPath, skipImage, extraArgs);
 
     if (!result.success) {
       throw new Error(result.error || 'Analysis failed');
@@ -109,7 +120,16 @@ export async function POST(request: NextRequest) {
       medianWatermarkToReference: result.medianWatermarkToReference,
       framesWatermarkHigherPercent: result.framesWatermarkHigherPercent,
       framesWatermarkElevatedPercent: result.framesWatermarkElevatedPercent,
+      integratedLoudness: result.integratedLoudness,
+      loudnessRange: result.loudnessRange,
+      truePeak: result.truePeak,
+      samplePeak: result.samplePeak,
       status: result.status,
+      timelineWindowSeconds: result.timelineWindowSeconds,
+      timelineStatuses: result.timelineStatuses,
+      timelineStatus: result.timelineStatus,
+      timelineRatio: result.timelineRatio,
+      timelineElevatedPercent: result.timelineElevatedPercent,
       spectrogramBase64
     });
 
@@ -127,7 +147,7 @@ export async function POST(request: NextRequest) {
       return NextResponse.json(
         { 
           error: 'Request timeout - file is too large or processing took too long',
-          details: 'Railway HTTP timeout exceeded. Try with a smaller file or wait for MP3 optimization update.',
+          details: 'Railway HTTP timeout exceeded. Try with a smaller file.',
           code: 'TIMEOUT'
         },
         { status: 504 } // Gateway Timeout
@@ -139,65 +159,75 @@ export async function POST(request: NextRequest) {
       { status: 500 }
     );
   } finally {
-    // Cleanup temp files
-    try {
-      if (tempInputPath && existsSync(tempInputPath)) unlinkSync(tempInputPath);
-      if (mp3Path && existsSync(mp3Path)) unlinkSync(mp3Path);
-      if (originalWavPath && existsSync(originalWavPath)) unlinkSync(originalWavPath);
-      if (tempOutputPath && tempOutputPath !== 'skip' && existsSync(tempOutputPath)) unlinkSync(tempOutputPath);
-    } catch (e) {
-      console.error('Cleanup error:', e);
+    // Cleanup temp files (streaming responses clean up when the script exits)
+    if (!streaming) {
+      try {
+        if (originalWavPath && existsSync(originalWavPath)) unlinkSync(originalWavPath);
+        if (comparePath && existsSync(comparePath)) unlinkSync(comparePath);
+        if (tempOutputPath && tempOutputPath !== 'skip' && existsSync(tempOutputPath)) unlinkSync(tempOutputPath);
+      } catch (e) {
+        console.error('Cleanup error:', e);
+      }
     }
   }
 }
 
-function convertToMP3(
+/**
+ * Run the analyzer in --compare mode on two files. Only the requested metric
+ * groups run, on both inputs at once; the result carries both metric sets,
+ * their deltas and the band-energy difference curve (bandEnergyDiff).
+ */
+function runCompareScript(
   pythonPath: string,
   scriptPath: string,
-  inputPath: string,
-  outputPath: string
-): Promise<boolean> {
+  originalPath: string,
+  processedPath: string,
+  groups: string
+): Promise<{ success: boolean; error?: string; [key: string]: any }> {
   return new Promise((resolve) => {
-    const pythonProcess = spawn(pythonPath, [scriptPath, inputPath, outputPath, '320k'], {
+    const pythonProcess = spawn(pythonPath, [scriptPath, '--compare', originalPath, processedPath, '--groups', groups], {
       env: {
         ...process.env,
         TMPDIR: TEMP_DIR,
+        MPLCONFIGDIR: TEMP_DIR,
       }
     });
-    
     let stdout = '';
     let stderr = '';
-    
+
     const timeout = setTimeout(() => {
       pythonProcess.kill();
-      console.error('⚠️ MP3 conversion timeout');
-      resolve(false);
-    }, 120000); // 2 minutes max for conversion
-    
+      resolve({ success: false, error: 'Timeout: Comparison took over 10 minutes' });
+    }, 600000); // 10 minutes
+
     pythonProcess.stdout.on('data', (data) => {
       stdout += data.toString();
-      console.log('[MP3 Convert]:', data.toString());
     });
-    
+
     pythonProcess.stderr.on('data', (data) => {
       stderr += data.toString();
-      console.error('[MP3 Convert Error]:', data.toString());
+      console.error('[Compare stderr]:', data.toString());
     });
-    
+
     pythonProcess.on('close', (code) => {
       clearTimeout(timeout);
-      if (code === 0 && existsSync(outputPath)) {
-        resolve(true);
-      } else {
-        console.error(`MP3 conversion failed with code ${code}: ${stderr}`);
-        resolve(false);
+      // In compare mode stdout holds only the (nested) JSON result
+      const line = stdout.trim().split('\n').pop() || '';
+      try {
+        const data = JSON.parse(line);
+        if (code !== 0 || !data.success) {
+          resolve({ success: false, error: data.error || `Python script exited with code ${code}\n${stderr}` });
+          return;
+        }
+        resolve(data);
+      } catch (e) {
+        resolve({ success: false, error: `Python script exited with code ${code}\n${stderr}` });
       }
     });
-    
+
     pythonProcess.on('error', (err) => {
       clearTimeout(timeout);
-      console.error('MP3 conversion process error:', err);
-      resolve(false);
+      resolve({ success: false, error: err.message });
     });
   });
 }
@@ -205,9 +235,10 @@ function convertToMP3(
 function runAnalysisScript(
   pythonPath: string,
   scriptPath: string,
-  inputPath: string,
+  upload: ReadableStream<Uint8Array>,
   outputPath: string,
-  skipImage: boolean = false
+  skipImage: boolean = false,
+  extraArgs: string[] = []
 ): Promise<{
   success: boolean;
   error?: string;
@@ -226,12 +257,21 @@ function runAnalysisScript(
   framesAboveVeryLowPercent?: number;
   framesAboveBaselinePercent?: number;
   suspiciousFramesPercent?: number;
+  integratedLoudness?: number | null;
+  loudnessRange?: number | null;
+  truePeak?: number | null;
+  samplePeak?: number | null;
   status?: string;
+  timelineWindowSeconds?: number;
+  timelineStatuses?: string[];
+  timelineStatus?: number[];
+  timelineRatio?: number[];
+  timelineElevatedPercent?: number[];
 }> {
   return new Promise((resolve) => {
     const args = skipImage 
-      ? [scriptPath, inputPath, '--json']  // Skip image generation
-      : [scriptPath, inputPath, outputPath, '--json'];
+      ? [scriptPath, '-', '--json', ...extraArgs]  // Skip image generation
+      : [scriptPath, '-', outputPath, '--json', ...extraArgs];
     
     const pythonProcess = spawn(pythonPath, args, {
       env: {
@@ -240,6 +280,7 @@ function runAnalysisScript(
         MPLCONFIGDIR: TEMP_DIR,  // Matplotlib config dir
       }
     });
+    pipeToStdin(upload, pythonProcess);
     let stdout = '';
     let stderr = '';
 
@@ -289,7 +330,16 @@ function runAnalysisScript(
             framesAboveVeryLowPercent: data.framesAboveVeryLowPercent,
             framesAboveBaselinePercent: data.framesAboveBaselinePercent,
             suspiciousFramesPercent: data.suspiciousFramesPercent,
-            status: data.status
+            integratedLoudness: data.integratedLoudness,
+            loudnessRange: data.loudnessRange,
+            truePeak: data.truePeak,
+            samplePeak: data.samplePeak,
+            status: data.status,
+            timelineWindowSeconds: data.timelineWindowSeconds,
+            timelineStatuses: data.timelineStatuses,
+            timelineStatus: data.timelineStatus,
+            timelineRatio: data.timelineRatio,
+            timelineElevatedPercent: data.timelineElevatedPercent
           });
         } else {
           resolve({ success: false, error: 'Kunne ikke parse analyse resultat' });
@@ -306,4 +356,79 @@ function runAnalysisScript(
   });
 }
 
+/**
+ * Run the analyzer with --stream and relay its JSON Lines records.
+ * The final record gets the filename and spectrogram attached, like the
+ * regular JSON response.
+ */
+function streamAnalysisScript(
+  pythonPath: string,
+  scriptPath: string,
+  upload: ReadableStream<Uint8Array>,
+  outputPath: string,
+  skipImage: boolean,
+  filename: string,
+  extraArgs: string[],
+  cleanup: () => void
+): ReadableStream<Uint8Array> {
+  const encoder = new TextEncoder();
+  const args = skipImage
+    ? [scriptPath, '-', '--json', '--stream', ...extraArgs]
+    : [scriptPath, '-', outputPath, '--json', '--stream', ...extraArgs];
+
+  return new ReadableStream({
+    start(controller) {
+      const pythonProcess = spawn(pythonPath, args, {
+        env: {
+          ...process.env,
+          TMPDIR: TEMP_DIR,
+          MPLCONFIGDIR: TEMP_DIR,
+        }
+      });
+      pipeToStdin(upload, pythonProcess);
+      let pending = '';
+
+      const timeout = setTimeout(() => {
+        pythonProcess.kill();
+      }, 600000); // 10 minutes
+
+      const forward = (line: string) => {
+        if (!line.startsWith('{')) return;
+        try {
+          const record = JSON.parse(line);
+          if (record.type === 'final') {
+            record.filename = filename;
+            record.spectrogramBase64 = !skipImage && existsSync(outputPath)
+              ? readFileSync(outputPath).toString('base64')
+              : '';
+          }
+          controller.enqueue(encoder.encode(JSON.stringify(record) + '\n'));
+        } catch (e) {
+          console.warn('Skipping unparseable analysis record');
+        }
+      };
 
+      pythonProcess.stdout.on('data', (data) => {
+        pending += data.toString();
+        const lines = pending.split('\n');
+        pending = lines.pop() || '';
+        lines.forEach((line) => forward(line.trim()));
+      });
+
+      pythonProcess.stderr.on('data', (data) => {
+        console.error('[Analysis stderr]:', data.toString());
+      });
+
+      pythonProcess.on('close', (code) => {
+        clearTimeout(timeout);
+        forward(pending.trim());
+        if (code !== 0) {
+          const error = { type: 'error', success: false, error: `Python script exited with code ${code}` };
+          controller.enqueue(encoder.encode(JSON.stringify(error) + '\n'));
+        }
+        controller.close();
+        cleanup();
+      });
+    },
+  });
+}
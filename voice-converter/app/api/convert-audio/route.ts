@@ -1,8 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { spawn } from 'child_process';
-import { writeFileSync, unlinkSync, existsSync, mkdirSync, createReadStream } from 'fs';
+import { unlinkSync, existsSync, mkdirSync, createReadStream } from 'fs';
 import { join } from 'path';
-import { getPythonPath } from '@/app/lib/python';
+import { getPythonPath, pipeToStdin } from '@/app/lib/python';
 import { getPaths } from '@/app/lib/paths';
 import { normalizeFilename, generateDownloadFilename } from '@/app/lib/filename';
 
@@ -35,7 +35,6 @@ function detectFileType(filename: string): string {
 }
 
 export async function POST(request: NextRequest) {
-  let tempInputPath = '';
   let tempOutputPath = '';
 
   try {
@@ -61,24 +60,16 @@ export async function POST(request: NextRequest) {
     
     console.log(`🔄 Audio conversion request: ${audioFile.name} (${fileSizeMB.toFixed(2)} MB, ${detectedType}) → ${outputFormat.toUpperCase()}`);
 
-    // Save uploaded file with normalized filenames
+    // Normalized output filename; the upload itself is piped into the script's stdin
     const timestamp = Date.now();
-    const normalizedInputName = normalizeFilename(audioFile.name, 'input', timestamp);
     const normalizedOutputName = normalizeFilename(audioFile.name, 'converted', timestamp);
-    tempInputPath = join(TEMP_DIR, normalizedInputName);
     const outputExtension = outputFormat === 'wav' ? 'wav' : 'mp3';
     // Update extension in normalized name
     tempOutputPath = join(TEMP_DIR, normalizedOutputName.replace(/\.[^.]+$/, `.${outputExtension}`));
     
     console.log(`📝 Original filename: ${audioFile.name}`);
-    console.log(`📝 Normalized input: ${normalizedInputName}`);
     console.log(`📝 Normalized output: ${tempOutputPath.split('/').pop()}`);
 
-    const buffer = Buffer.from(await audioFile.arrayBuffer());
-    writeFileSync(tempInputPath, buffer);
-
-    console.log(`✓ File saved to: ${tempInputPath}`);
-
     // Run conversion script
     const pythonPath = getPythonPath();
     const scriptPath = join(paths.scripts, 'convert_audio.py');
@@ -95,7 +86,7 @@ export async function POST(request: NextRequest) {
     const result = await convertAudio(
       pythonPath,
       scriptPath,
-      tempInputPath,
+      audioFile.stream(),
       tempOutputPath,
       outputFormat,
       sampleRate,
@@ -161,7 +152,6 @@ export async function POST(request: NextRequest) {
     // Cleanup temp files after a delay to allow streaming to complete
     setTimeout(() => {
       try {
-        if (tempInputPath && existsSync(tempInputPath)) unlinkSync(tempInputPath);
         if (tempOutputPath && existsSync(tempOutputPath)) unlinkSync(tempOutputPath);
       } catch (e) {
         console.error('Cleanup error:', e);
@@ -173,7 +163,7 @@ export async function POST(request: NextRequest) {
 function convertAudio(
   pythonPath: string,
   scriptPath: string,
-  inputPath: string,
+  upload: ReadableStream<Uint8Array>,
   outputPath: string,
   outputFormat: string,
   sampleRate: number | null,
@@ -185,7 +175,7 @@ function convertAudio(
     // Python script will parse them intelligently based on their type/value
     const args = [
       scriptPath,
-      inputPath,
+      '-', // Input read from stdin
       outputPath,
       outputFormat,
       sampleRate ? sampleRate.toString() : '',
@@ -197,7 +187,7 @@ function convertAudio(
     // Keep bitrate even if it's the default
     const filteredArgs = [
       args[0], // scriptPath
-      args[1], // inputPath
+      args[1], // '-' (stdin)
       args[2], // outputPath
       args[3], // outputFormat
       ...(args[4] ? [args[4]] : []), // sampleRate (only if set)
@@ -211,6 +201,7 @@ function convertAudio(
         TMPDIR: TEMP_DIR,
       }
     });
+    pipeToStdin(upload, pythonProcess);
     
     let stdout = '';
     let stderr = '';
@@ -0,0 +1,70 @@
+import { NextResponse } from 'next/server';
+import { spawn } from 'child_process';
+import { join } from 'path';
+import { getPythonPath } from '@/app/lib/python';
+import { getPaths } from '@/app/lib/paths';
+
+export const dynamic = 'force-dynamic';
+
+const paths = getPaths();
+const TEMP_DIR = paths.temp;
+
+/**
+ * Prometheus scrape endpoint for the Python processing layer.
+ * scripts/metrics.py renders the counters and histograms the scripts
+ * record (per-script latency, audio seconds, bytes, decode time by codec,
+ * peak RSS, cache hits) plus the live admission queue.
+ */
+export async function GET() {
+  const result = await renderMetrics(getPythonPath(), join(paths.scripts, 'metrics.py'));
+  if (!result.success) {
+    return NextResponse.json({ error: result.error }, { status: 500 });
+  }
+  return new NextResponse(result.text, {
+    status: 200,
+    headers: {
+      'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+      'Cache-Control': 'no-cache',
+    },
+  });
+}
+
+function renderMetrics(pythonPath: string, scriptPath: string): Promise<{ success: boolean; text?: string; error?: string }> {
+  return new Promise((resolve) => {
+    const pythonProcess = spawn(pythonPath, [scriptPath], {
+      env: {
+        ...process.env,
+        TMPDIR: TEMP_DIR,  // Same scratch root (and metrics store) as the processing routes
+      }
+    });
+    let stdout = '';
+    let stderr = '';
+
+    const timeout = setTimeout(() => {
+      pythonProcess.kill();
+      resolve({ success: false, error: 'Timeout: metrics took over 30 seconds' });
+    }, 30000);
+
+    pythonProcess.stdout.on('data', (data) => {
+      stdout += data.toString();
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      stderr += data.toString();
+    });
+
+    pythonProcess.on('close', (code) => {
+      clearTimeout(timeout);
+      if (code !== 0) {
+        resolve({ success: false, error: `Python script exited with code ${code}\n${stderr}` });
+        return;
+      }
+      resolve({ success: true, text: stdout });
+    });
+
+    pythonProcess.on('error', (err) => {
+      clearTimeout(timeout);
+      resolve({ success: false, error: err.message });
+    });
+  });
+}
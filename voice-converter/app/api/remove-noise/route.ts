@@ -1,9 +1,9 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { writeFile, unlink, mkdir } from 'fs/promises';
+import { unlink, mkdir, stat } from 'fs/promises';
 import { existsSync, createReadStream } from 'fs';
 import path from 'path';
 import { spawn } from 'child_process';
-import { getPythonPath } from '@/app/lib/python';
+import { getPythonPath, pipeToStdin } from '@/app/lib/python';
 import { getPaths } from '@/app/lib/paths';
 import { normalizeFilename, generateDownloadFilename } from '@/app/lib/filename';
 
@@ -64,60 +64,23 @@ export async function POST(request: NextRequest) {
       console.warn(`⚠️ Large file detected (${fileSizeMB.toFixed(2)} MB) - may hit Railway HTTP timeout`);
     }
 
-    // Save uploaded file
+    // Normalized output filename; the upload itself is piped into the script's stdin
     const timestamp = Date.now();
-    const normalizedInputName = normalizeFilename(originalFilename, 'input', timestamp);
     const normalizedOutputName = normalizeFilename(originalFilename, 'denoised', timestamp);
-    const inputPath = path.join(TEMP_DIR, normalizedInputName);
     const outputPath = path.join(TEMP_DIR, normalizedOutputName);
 
-    const bytes = await audioFile.arrayBuffer();
-    const buffer = Buffer.from(bytes);
-    
-    console.log(`📝 Writing file to: ${inputPath}`);
-    await writeFile(inputPath, buffer);
-
-    // Verify file was saved correctly
-    const { stat } = await import('fs/promises');
-    
-    let retries = 0;
-    const maxRetries = 20;
-    let inputStats;
-    
-    while (retries < maxRetries) {
-      try {
-        inputStats = await stat(inputPath);
-        if (inputStats.size === buffer.length) {
-          console.log(`✓ File saved and verified: ${inputPath} (${(inputStats.size / (1024 * 1024)).toFixed(2)} MB)`);
-          break;
-        } else {
-          console.log(`⚠️ File size mismatch: expected ${buffer.length}, got ${inputStats.size}, retry ${retries + 1}/${maxRetries}`);
-        }
-      } catch (error) {
-        console.log(`⚠️ File not found yet, retry ${retries + 1}/${maxRetries}: ${error}`);
-      }
-      
-      if (retries < maxRetries - 1) {
-        await new Promise(resolve => setTimeout(resolve, 200));
-        retries++;
-      } else {
-        throw new Error(`File was not saved correctly after ${maxRetries} retries`);
-      }
-    }
-
     // Run Python noise removal script
     const pythonScript = path.join(SCRIPTS_DIR, 'remove_noise.py');
     const pythonPath = getPythonPath();
 
     console.log(`🐍 Running Python script: ${pythonScript}`);
     console.log(`🐍 Python path: ${pythonPath}`);
-    console.log(`🐍 Input path: ${inputPath}`);
     console.log(`🐍 Output path: ${outputPath}`);
     console.log(`🐍 Reduction strength: ${reductionStrength}, Stationary: ${stationary}`);
 
     const pythonProcess = spawn(pythonPath, [
       pythonScript,
-      inputPath,
+      '-', // Input read from stdin
       outputPath,
       reductionStrength.toString(),
       stationary ? 'true' : 'false',
@@ -128,6 +91,7 @@ export async function POST(request: NextRequest) {
         MPLCONFIGDIR: TEMP_DIR,
       }
     });
+    pipeToStdin(audioFile.stream(), pythonProcess);
 
     let stdout = '';
     let stderr = '';
@@ -210,7 +174,6 @@ export async function POST(request: NextRequest) {
           controller.close();
           // Cleanup temp files after stream completes
           setTimeout(async () => {
-            await unlink(inputPath).catch(console.error);
             await unlink(outputPath).catch(console.error);
             console.log('🧹 Temp files cleaned up');
           }, 2000);
@@ -218,14 +181,12 @@ export async function POST(request: NextRequest) {
         fileStream.on('error', (err) => {
           console.error('❌ Stream error:', err);
           controller.error(err);
-          unlink(inputPath).catch(console.error);
           unlink(outputPath).catch(console.error);
         });
       },
       cancel() {
         console.log('⚠️ Stream cancelled by client');
         fileStream.destroy();
-        unlink(inputPath).catch(console.error);
         unlink(outputPath).catch(console.error);
       }
     });
@@ -1,9 +1,9 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { writeFile, unlink, mkdir } from 'fs/promises';
+import { unlink, mkdir, stat } from 'fs/promises';
 import { existsSync, createReadStream } from 'fs';
 import path from 'path';
 import { spawn } from 'child_process';
-import { getPythonPath } from '@/app/lib/python';
+import { getPythonPath, pipeToStdin } from '@/app/lib/python';
 import { getPaths } from '@/app/lib/paths';
 import { normalizeFilename, generateDownloadFilename } from '@/app/lib/filename';
 
@@ -56,59 +56,26 @@ export async function POST(request: NextRequest) {
       duration: `${(endSeconds - startSeconds).toFixed(2)}s`
     });
 
-    // Save uploaded file with normalized filename
+    // Normalized output filename; the upload itself is piped into the script's stdin
     const timestamp = Date.now();
-    const normalizedInputName = normalizeFilename(audioFile.name, 'input', timestamp);
     const normalizedOutputName = normalizeFilename(audioFile.name, 'trimmed', timestamp);
-    const inputPath = path.join(TEMP_DIR, normalizedInputName);
     const outputPath = path.join(TEMP_DIR, normalizedOutputName);
 
     console.log(`📝 Original filename: ${audioFile.name}`);
-    console.log(`📝 Normalized input: ${normalizedInputName}`);
     console.log(`📝 Normalized output: ${normalizedOutputName}`);
 
-    const bytes = await audioFile.arrayBuffer();
-    const buffer = Buffer.from(bytes);
-    await writeFile(inputPath, buffer);
-
-    // Verify file was saved correctly
-    const { stat } = await import('fs/promises');
-    let retries = 0;
-    const maxRetries = 20;
-    let inputStats;
-
-    while (retries < maxRetries) {
-      try {
-        inputStats = await stat(inputPath);
-        if (inputStats.size === buffer.length) {
-          console.log(`✓ File saved and verified: ${inputPath} (${(inputStats.size / (1024 * 1024)).toFixed(2)} MB)`);
-          break;
-        }
-      } catch (error) {
-        console.log(`⚠️ File not found yet, retry ${retries + 1}/${maxRetries}`);
-      }
-
-      if (retries < maxRetries - 1) {
-        await new Promise(resolve => setTimeout(resolve, 200));
-        retries++;
-      } else {
-        throw new Error(`File was not saved correctly after ${maxRetries} retries`);
-      }
-    }
-
     // Run Python trimming script
     const pythonScript = path.join(SCRIPTS_DIR, 'trim_audio.py');
     const pythonPath = getPythonPath();
 
     console.log(`🐍 Running Python script: ${pythonScript}`);
     console.log(`🐍 Python path: ${pythonPath}`);
-    console.log(`🐍 Input path: ${inputPath}`);
     console.log(`🐍 Output path: ${outputPath}`);
     console.log(`🐍 Time range: ${startSeconds}s - ${endSeconds}s`);
 
     const pythonProcess = spawn(pythonPath, [
       pythonScript,
-      inputPath,
+      '-', // Input read from stdin
       outputPath,
       startSeconds.toString(),
       endSeconds.toString(),
@@ -119,6 +86,7 @@ export async function POST(request: NextRequest) {
         MPLCONFIGDIR: TEMP_DIR,
       }
     });
+    pipeToStdin(audioFile.stream(), pythonProcess);
 
     let stdout = '';
     let stderr = '';
@@ -188,7 +156,6 @@ export async function POST(request: NextRequest) {
         fileStream.on('end', () => {
           controller.close();
           setTimeout(async () => {
-            await unlink(inputPath).catch(console.error);
             await unlink(outputPath).catch(console.error);
             console.log('🧹 Temp files cleaned up');
           }, 2000);
@@ -196,14 +163,12 @@ export async function POST(request: NextRequest) {
         fileStream.on('error', (err) => {
           console.error('❌ Stream error:', err);
           controller.error(err);
-          unlink(inputPath).catch(console.error);
           unlink(outputPath).catch(console.error);
         });
       },
       cancel() {
         console.log('⚠️ Stream cancelled by client');
         fileStream.destroy();
-        unlink(inputPath).catch(console.error);
         unlink(outputPath).catch(console.error);
       }
     });
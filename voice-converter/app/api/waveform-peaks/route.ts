@@ -0,0 +1,134 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { mkdir } from 'fs/promises';
+import { existsSync } from 'fs';
+import path from 'path';
+import { spawn } from 'child_process';
+import { getPythonPath, pipeToStdin } from '@/app/lib/python';
+import { getPaths } from '@/app/lib/paths';
+
+export const maxDuration = 600; // Max execution time: 10 minutes
+export const dynamic = 'force-dynamic';
+export const maxBodySize = 100 * 1024 * 1024; // 100MB in bytes
+export const runtime = 'nodejs';
+
+const paths = getPaths();
+const TEMP_DIR = paths.temp;
+const SCRIPTS_DIR = paths.scripts;
+
+// Ensure temp directory exists
+async function ensureTempDir() {
+  if (!existsSync(TEMP_DIR)) {
+    await mkdir(TEMP_DIR, { recursive: true });
+  }
+}
+
+/**
+ * Generate a multi-zoom peaks file (see scripts/generate_peaks.py for the
+ * binary layout) so the trimmer can draw large files without decoding
+ * them in the browser.
+ *
+ * The upload never touches disk: it is piped into the script's stdin and
+ * the peaks are read back from its stdout. A raw (non-multipart) body is
+ * forwarded while it is still arriving, so WAV uploads are scanned as they
+ * stream in.
+ */
+export async function POST(request: NextRequest) {
+  try {
+    await ensureTempDir();
+
+    let upload: ReadableStream<Uint8Array>;
+    let bits: string;
+    const contentType = request.headers.get('content-type') || '';
+    if (contentType.startsWith('multipart/form-data')) {
+      const formData = await request.formData();
+      const audioFile = formData.get('audio') as File;
+      bits = formData.get('bits') === '16' ? '16' : '8';
+
+      if (!audioFile) {
+        return NextResponse.json(
+          { error: 'No audio file uploaded' },
+          { status: 400 }
+        );
+      }
+
+      console.log('📈 Waveform Peaks Request:', {
+        filename: audioFile.name,
+        size: `${(audioFile.size / (1024 * 1024)).toFixed(2)} MB`,
+        bits,
+      });
+      upload = audioFile.stream();
+    } else {
+      bits = request.nextUrl.searchParams.get('bits') === '16' ? '16' : '8';
+      if (!request.body) {
+        return NextResponse.json(
+          { error: 'No audio file uploaded' },
+          { status: 400 }
+        );
+      }
+
+      console.log('📈 Waveform Peaks Request (streamed):', {
+        size: request.headers.get('content-length') || 'unknown',
+        bits,
+      });
+      upload = request.body;
+    }
+
+    const pythonScript = path.join(SCRIPTS_DIR, 'generate_peaks.py');
+    const pythonProcess = spawn(getPythonPath(), [
+      pythonScript,
+      '-',
+      '-',
+      '256',
+      bits,
+    ], {
+      env: {
+        ...process.env,
+        TMPDIR: TEMP_DIR,
+        MPLCONFIGDIR: TEMP_DIR,
+      }
+    });
+
+    // stdout carries the peaks file; progress and the JSON result go to stderr
+    const chunks: Buffer[] = [];
+    let stderr = '';
+    pythonProcess.stdout.on('data', (data: Buffer) => {
+      chunks.push(data);
+    });
+    pythonProcess.stderr.on('data', (data) => {
+      stderr += data.toString();
+    });
+
+    pipeToStdin(upload, pythonProcess);
+
+    const exitCode = await new Promise<number>((resolve) => {
+      pythonProcess.on('close', resolve);
+    });
+
+    if (exitCode !== 0) {
+      console.error('[Python Error]', stderr);
+      throw new Error(`Python script failed with exit code ${exitCode}\n\nSTDERR:\n${stderr}`);
+    }
+
+    const peaks = Buffer.concat(chunks);
+    console.log(`✅ Peaks generated: ${(peaks.length / 1024).toFixed(1)} KB`);
+
+    return new NextResponse(new Uint8Array(peaks), {
+      status: 200,
+      headers: {
+        'Content-Type': 'application/octet-stream',
+        'Content-Length': peaks.length.toString(),
+        'Cache-Control': 'no-cache',
+      },
+    });
+
+  } catch (error) {
+    console.error('❌ Waveform peaks error:', error);
+    return NextResponse.json(
+      {
+        error: 'Waveform peak generation failed',
+        details: error instanceof Error ? error.message : 'Unknown error'
+      },
+      { status: 500 }
+    );
+  }
+}
@@ -290,46 +290,24 @@ export default function FingerprintAnalyzer({ isOpen, onClose, onOpenCleaner, pr
     
     // Set estimated time based on file size
     const fileSizeMB = file.size / (1024 * 1024);
-    const useMP3Optimization = fileSizeMB > 30;
     setEstimatedSeconds(estimateProcessingTime(fileSizeMB));
     
     const startTime = Date.now();
 
     try {
-      // Show MP3 optimization message if applicable
-      if (useMP3Optimization) {
-        console.log(`⚡ MP3 Optimization: File is ${fileSizeMB.toFixed(2)} MB - will convert to MP3 for faster analysis`);
-        setProgress('⚡ Large file detected - converting to MP3 for faster analysis...');
-        // Small delay to show the message
-        await new Promise(resolve => setTimeout(resolve, 500));
-      } else {
-        console.log(`📊 Direct analysis: File is ${fileSizeMB.toFixed(2)} MB - analyzing WAV directly`);
-        setProgress('Preparing analysis...');
-      }
+      console.log(`📊 Direct analysis: File is ${fileSizeMB.toFixed(2)} MB`);
+      setProgress('Preparing analysis...');
 
       const formData = new FormData();
       formData.append('audio', file);
 
-      // Update progress based on optimization
-      if (useMP3Optimization) {
-        setProgress('🔄 Converting to MP3 (this may take 10-20 seconds)...');
-      } else {
-        setProgress('Analyzing audio file...');
-      }
+      setProgress('Analyzing audio file...');
 
       const response = await fetch(getApiPath('/api/analyze-fingerprint'), {
         method: 'POST',
         body: formData,
       });
 
-      // Update progress when analysis starts (after MP3 conversion if applicable)
-      if (useMP3Optimization) {
-        console.log('✓ MP3 conversion should be complete - starting analysis...');
-        setProgress('✓ MP3 conversion complete - analyzing audio file...');
-      } else {
-        setProgress('Analyzing audio file...');
-      }
-
       if (!response.ok) {
         const errorData = await response.json();
         
@@ -507,18 +485,7 @@ export default function FingerprintAnalyzer({ isOpen, onClose, onOpenCleaner, pr
                   <p className="text-sm text-gray-400">
                     {(file.size / (1024 * 1024)).toFixed(2)} MB
                   </p>
-                  {file.size > 30 * 1024 * 1024 && (
-                    <div className="mt-2 p-2 bg-blue-500/20 border border-blue-500/50 rounded">
-                      <p className="text-xs text-blue-200 font-medium mb-1">
-                        ⚡ MP3 Optimization Enabled
-                      </p>
-                      <p className="text-xs text-blue-300">
-                        Large file detected. Will convert to MP3 first for faster analysis (50-70% faster). 
-                        Original WAV preserved for cleaning if needed.
-                      </p>
-                    </div>
-                  )}
-                  {file.size <= 30 * 1024 * 1024 && file.size > 20 * 1024 * 1024 && (
+                  {file.size > 20 * 1024 * 1024 && (
                     <div className="mt-2 p-2 bg-orange-500/20 border border-orange-500/50 rounded">
                       <p className="text-xs text-orange-200">
                         ⏱️ Large file detected. Processing may take 2-5 minutes. Please be patient!
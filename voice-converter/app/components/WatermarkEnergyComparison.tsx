@@ -43,23 +43,25 @@ export default function WatermarkEnergyComparison({
     try {
       // Check if we have cached pre-analysis metrics (much faster!)
       let origRatio: number;
+      let cleanRatio: number;
       
       if (originalAnalysisMetrics && originalAnalysisMetrics.current_ratio !== undefined) {
         // Use cached metrics from removal process
         origRatio = originalAnalysisMetrics.current_ratio;
         console.log('✅ Using cached original metrics (skipping re-analysis)');
         console.log('   Original ratio from cache:', origRatio);
+
+        // Always analyze cleaned file to verify removal
+        console.log('📊 Analyzing cleaned file...');
+        const cleanAnalysis = await analyzeWithBackend(cleanedFile);
+        cleanRatio = cleanAnalysis.watermarkToReferenceRatio || 0;
       } else {
-        // Fallback: analyze original file
-        console.log('📊 Analyzing original file...');
-        const origAnalysis = await analyzeWithBackend(originalFile);
-        origRatio = origAnalysis.watermarkToReferenceRatio || 0;
+        // Fallback: one compare call analyzes both files together (energy metrics only)
+        console.log('📊 Comparing original and cleaned file...');
+        const comparison = await analyzeWithBackend(originalFile, cleanedFile);
+        origRatio = comparison.original?.watermarkToReferenceRatio || 0;
+        cleanRatio = comparison.processed?.watermarkToReferenceRatio || 0;
       }
-      
-      // Always analyze cleaned file to verify removal
-      console.log('📊 Analyzing cleaned file...');
-      const cleanAnalysis = await analyzeWithBackend(cleanedFile);
-      const cleanRatio = cleanAnalysis.watermarkToReferenceRatio || 0;
 
       console.log('✓ Comparison:', { 
         original: origRatio.toFixed(4), 
@@ -103,7 +105,7 @@ export default function WatermarkEnergyComparison({
     setAnalyzing(false);
   };
 
-  const analyzeWithBackend = async (file: File) => {
+  const analyzeWithBackend = async (file: File, compareFile?: File) => {
     console.log('🔍 analyzeWithBackend called with file:', file.name, file.size, file.type);
     
     // Call analyze API (same as Analyzer component)
@@ -111,6 +113,11 @@ export default function WatermarkEnergyComparison({
     const formData = new FormData();
     formData.append('audio', file);
     formData.append('skipImage', 'true');  // Skip PNG for energy comparison
+    if (compareFile) {
+      // Compare mode: both files in one request, energy ratio detector only
+      formData.append('compare', compareFile);
+      formData.append('groups', 'energy_ratio');
+    }
     
     console.log('📤 Sending to API:', getApiPath('/api/analyze-fingerprint'));
     
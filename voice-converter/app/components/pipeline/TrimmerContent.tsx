@@ -5,12 +5,97 @@ import { getApiPath } from '../../lib/api';
 import FileSelector from './FileSelector';
 import FileInfoHeader from './FileInfoHeader';
 import { useFileHistory } from '../../lib/fileHistory';
+import { waveformKey, getCachedWaveform, saveCachedWaveform } from '../../lib/waveformCache';
 
 interface TrimmerContentProps {
   onNextProcess?: (file?: File) => void;
   preloadedFile?: File;
 }
 
+// Files above this size get their waveform from /api/waveform-peaks instead of decodeAudioData
+const SERVER_PEAKS_MIN_BYTES = 50 * 1024 * 1024;
+
+// Both waveform sources give the same envelope: max |sample| across all channels per point
+
+// Fetch precomputed min/max peaks from the server (see scripts/generate_peaks.py)
+async function fetchServerPeaks(file: File, samples: number) {
+  // Raw body, so the server can start scanning before the upload finishes
+  const response = await fetch(getApiPath('/api/waveform-peaks'), {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/octet-stream' },
+    body: file,
+  });
+  if (!response.ok) {
+    throw new Error(`Peaks request failed: ${response.status}`);
+  }
+
+  const buffer = await response.arrayBuffer();
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'UPKS') {
+    throw new Error('Invalid peaks file');
+  }
+  const bits = view.getUint16(6, true);
+  const sampleRate = view.getUint32(8, true);
+  const levelCount = view.getUint16(14, true);
+  const totalFrames = Number(view.getBigUint64(16, true));
+
+  // Pick the coarsest zoom level that still has enough pixels
+  const bytesPerValue = bits / 8;
+  let offset = 24 + levelCount * 8;
+  let chosen = { offset, pixels: 0 };
+  for (let level = 0; level < levelCount; level++) {
+    const pixels = view.getUint32(24 + level * 8 + 4, true);
+    if (pixels >= samples || chosen.pixels === 0) {
+      chosen = { offset, pixels };
+    }
+    offset += pixels * 2 * bytesPerValue;
+  }
+
+  const values = bits === 8
+    ? new Int8Array(buffer, chosen.offset, chosen.pixels * 2)
+    : new Int16Array(buffer.slice(chosen.offset, chosen.offset + chosen.pixels * 4));
+  const scale = bits === 8 ? 127 : 32767;
+  const count = Math.min(samples, chosen.pixels);
+  const waveform: number[] = [];
+  for (let i = 0; i < count; i++) {
+    const from = Math.floor((i * chosen.pixels) / count);
+    const to = Math.max(from + 1, Math.floor(((i + 1) * chosen.pixels) / count));
+    let peak = 0;
+    for (let p = from; p < to; p++) {
+      peak = Math.max(peak, Math.abs(values[2 * p]), Math.abs(values[2 * p + 1]));
+    }
+    waveform.push(peak / scale);
+  }
+  return { waveform, duration: totalFrames / sampleRate };
+}
+
+// Decode in the browser and take max |sample| (all channels) per point, as the server peaks do
+async function decodeLocalWaveform(file: File, samples: number) {
+  const audioContext = new (window.AudioContext || (window as any).webkitAudioContext)();
+  const arrayBuffer = await file.arrayBuffer();
+  const audioBuffer = await audioContext.decodeAudioData(arrayBuffer);
+
+  const channels = Array.from({ length: audioBuffer.numberOfChannels }, (_, c) => audioBuffer.getChannelData(c));
+  const length = audioBuffer.length;
+  const count = Math.min(samples, length);
+  const waveform: number[] = [];
+
+  for (let i = 0; i < count; i++) {
+    const from = Math.floor((i * length) / count);
+    const to = Math.max(from + 1, Math.floor(((i + 1) * length) / count));
+    let peak = 0;
+    for (const data of channels) {
+      for (let j = from; j < to; j++) {
+        const value = Math.abs(data[j]);
+        if (value > peak) peak = value;
+      }
+    }
+    waveform.push(peak);
+  }
+  return { waveform, duration: audioBuffer.duration };
+}
+
 export default function TrimmerContent({ onNextProcess, preloadedFile }: TrimmerContentProps) {
   const { fileHistory, getLatestFile } = useFileHistory();
   
@@ -74,31 +159,26 @@ export default function TrimmerContent({ onNextProcess, preloadedFile }: Trimmer
   // Generate waveform data from audio file
   const generateWaveform = useCallback(async (file: File) => {
     try {
-      const audioContext = new (window.AudioContext || (window as any).webkitAudioContext)();
-      const arrayBuffer = await file.arrayBuffer();
-      const audioBuffer = await audioContext.decodeAudioData(arrayBuffer);
-      
-      const data = audioBuffer.getChannelData(0); // Use first channel
-      const sampleRate = audioBuffer.sampleRate;
-      const duration = audioBuffer.duration;
-      setDuration(duration);
-      
       // Downsample for visualization (1000 points max for smooth rendering)
       const samples = 1000;
-      const blockSize = Math.floor(data.length / samples);
-      const waveform: number[] = [];
-      
-      for (let i = 0; i < samples; i++) {
-        let sum = 0;
-        for (let j = 0; j < blockSize; j++) {
-          const index = i * blockSize + j;
-          if (index < data.length) {
-            sum += Math.abs(data[index]);
-          }
+      const cacheKey = waveformKey(file, samples);
+      let peaks = getCachedWaveform(cacheKey);
+
+      // Large files: let the server scan them instead of decoding the whole file here
+      if (!peaks && file.size > SERVER_PEAKS_MIN_BYTES) {
+        try {
+          peaks = await fetchServerPeaks(file, samples);
+        } catch (err) {
+          console.warn('Server peaks unavailable, decoding locally:', err);
         }
-        waveform.push(sum / blockSize);
       }
-      
+      if (!peaks) {
+        peaks = await decodeLocalWaveform(file, samples);
+      }
+      saveCachedWaveform(cacheKey, peaks);
+
+      const { waveform, duration } = peaks;
+      setDuration(duration);
       setWaveformData(waveform);
       setEndTime(duration);
       
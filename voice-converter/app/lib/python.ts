@@ -1,5 +1,8 @@
 import { existsSync } from 'fs';
 import { join, resolve } from 'path';
+import { Readable } from 'stream';
+import type { ReadableStream as NodeReadableStream } from 'stream/web';
+import type { ChildProcessWithoutNullStreams } from 'child_process';
 
 /**
  * Get the correct Python executable path
@@ -27,3 +30,14 @@ export function getPythonPath(): string {
   console.warn('⚠️ venv-unicsonic not found, using system python3 (pydub may not be available)');
   return 'python3';
 }
+
+/**
+ * Pipe an upload into a script started with "-" as its input (see
+ * scripts/stdio_io.py), so it is processed as it is read instead of being
+ * written to a temp file first
+ */
+export function pipeToStdin(upload: ReadableStream<Uint8Array>, pythonProcess: ChildProcessWithoutNullStreams): void {
+  // The script may stop reading early (e.g. unreadable input): its exit code reports that
+  pythonProcess.stdin.on('error', () => {});
+  Readable.fromWeb(upload as unknown as NodeReadableStream<Uint8Array>).pipe(pythonProcess.stdin);
+}
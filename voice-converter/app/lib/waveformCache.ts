@@ -0,0 +1,72 @@
+/**
+ * Waveform envelope cache
+ * Keeps the trimmer's reduced waveform (max |sample| per point) per file in
+ * localStorage, so reopening a file neither uploads it for server peaks nor
+ * decodes it again
+ */
+
+const STORAGE_PREFIX = 'waveform_';
+const INDEX_KEY = 'waveform_index';
+// Most recently used files kept (each entry is a few KB)
+const MAX_ENTRIES = 20;
+
+export interface WaveformData {
+  waveform: number[];
+  duration: number;
+}
+
+/**
+ * Cache key for a file: name, size and modification time (a changed file gets a new entry)
+ */
+export function waveformKey(file: File, samples: number): string {
+  return `${file.name}:${file.size}:${file.lastModified}:${samples}`;
+}
+
+function readIndex(): string[] {
+  try {
+    return JSON.parse(localStorage.getItem(INDEX_KEY) || '[]');
+  } catch {
+    return [];
+  }
+}
+
+/**
+ * Get a cached waveform
+ * @returns WaveformData, or null if the file has not been seen
+ */
+export function getCachedWaveform(key: string): WaveformData | null {
+  if (typeof window === 'undefined') return null;
+
+  const stored = localStorage.getItem(STORAGE_PREFIX + key);
+  if (!stored) return null;
+  try {
+    return JSON.parse(stored) as WaveformData;
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * Save a waveform, evicting the least recently saved entries beyond MAX_ENTRIES
+ */
+export function saveCachedWaveform(key: string, data: WaveformData): void {
+  if (typeof window === 'undefined') return;
+
+  // Rounded to 4 decimals: the canvas cannot show more
+  const compact = {
+    waveform: data.waveform.map((value) => Math.round(value * 10000) / 10000),
+    duration: data.duration,
+  };
+  const index = readIndex().filter((entry) => entry !== key);
+  index.push(key);
+  while (index.length > MAX_ENTRIES) {
+    localStorage.removeItem(STORAGE_PREFIX + index.shift());
+  }
+  try {
+    localStorage.setItem(STORAGE_PREFIX + key, JSON.stringify(compact));
+    localStorage.setItem(INDEX_KEY, JSON.stringify(index));
+  } catch (err) {
+    // Storage full or disabled: the waveform is simply computed again next time
+    console.warn('Could not cache waveform:', err);
+  }
+}
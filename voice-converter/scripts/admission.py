@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Memory Admission Control
+Keeps concurrent processing jobs inside one memory budget:
+- Each job's peak memory is estimated from the input header (frames x
+  channels) and a per-script profile measured on 30 s - 20 min inputs
+- Jobs are admitted first come, first served while the running jobs'
+  estimates plus their own fit the budget; the rest wait in a queue
+- A job too large for the budget on its own is routed to the script's
+  low-memory (streaming) mode if it has one, and otherwise runs alone
+
+Running and queued jobs are kept in a ledger (JSON, guarded by flock) in
+the scratch root. Entries of processes that have exited are dropped on
+every locked update, so a killed job never holds on to its reservation;
+readers (status, the metrics endpoint) take a shared lock and write nothing.
+
+Every admitted job is also measured (wall time, queue wait, audio seconds,
+bytes, peak RSS) for the metrics endpoint, see metrics.py.
+
+Environment:
+    ADMISSION_MEMORY_MB        Budget over all jobs (default: 80% of the
+                               cgroup limit or physical memory; 0 disables)
+    ADMISSION_TIMEOUT_SECONDS  Longest wait in the queue (default 540,
+                               inside the API routes' 10 minute limit)
+
+CLI:
+    admission.py status                      budget, running and queued jobs
+    admission.py estimate <script> <input>   estimate and mode for one job
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import atexit
+from contextlib import contextmanager
+from scratch import disk_root, pid_alive
+from probe import probe
+from stdio_io import input_buffer
+import metrics
+
+LEDGER_FILE = 'admission.json'
+LOCK_FILE = '.admission.lock'
+BUDGET_FRACTION = 0.8
+DEFAULT_TIMEOUT_SECONDS = 540
+POLL_SECONDS = 0.25
+
+MB = 1024 * 1024
+
+# Peak RSS model per script, in bytes:
+#   base + frames * (per_frame + channels * per_sample)
+# per_frame covers the mono analysis/processing arrays, per_sample the
+# decoded multichannel signal. "low_memory" is the script's streaming route.
+# remove_noise is scaled from the remover (noisereduce works on a full STFT).
+MEMORY_PROFILES = {
+    'analyze_fingerprint': {
+        'base': 350 * MB, 'per_frame': 96, 'per_sample': 4,
+        'low_memory': {'base': 350 * MB, 'per_frame': 36, 'per_sample': 4},
+    },
+    'remove_audio_fingerprint': {'base': 300 * MB, 'per_frame': 220, 'per_sample': 4},
+    'remove_noise': {'base': 250 * MB, 'per_frame': 120, 'per_sample': 4},
+    'convert_audio': {'base': 100 * MB, 'per_frame': 0, 'per_sample': 40},
+    'convert_to_mp3': {'base': 60 * MB, 'per_frame': 0, 'per_sample': 8},
+    'trim_audio': {'base': 60 * MB, 'per_frame': 0, 'per_sample': 8},
+}
+
+# Compressed inputs whose header cannot be read: frames x channels per byte
+# (a 128 kbps MP3 holds ~11 bytes of 16-bit PCM per byte)
+UNKNOWN_SAMPLES_PER_BYTE = 6
+
+
+def _cgroup_limit():
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "no limit" as a huge page-aligned number
+        if value != 'max' and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+def memory_budget():
+    """Bytes all admitted jobs may use together (0: admission control off)."""
+    configured = os.environ.get('ADMISSION_MEMORY_MB')
+    if configured not in (None, ''):
+        try:
+            return int(float(configured) * MB)
+        except ValueError:
+            pass
+    physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    limit = _cgroup_limit()
+    return int(min(physical, limit or physical) * BUDGET_FRACTION)
+
+
+def input_shape(input_path):
+    """
+    (frames, channels, probe info) of an input from its headers alone (see
+    probe.py).
+
+    Falls back to a size-based guess for inputs no header reader handles
+    (and to an empty input if it cannot be read at all); info is then None.
+    """
+    try:
+        info = probe(input_path)
+        return info["frames"], info["channels"], info
+    except FileNotFoundError:
+        # Missing input: the script itself reports that
+        return 0, 1, None
+    except (OSError, ValueError):
+        pass
+    buffer = input_buffer(input_path)
+    try:
+        size = len(buffer) if buffer is not None else os.path.getsize(input_path)
+    except OSError:
+        return 0, 1, None
+    return size * UNKNOWN_SAMPLES_PER_BYTE // 2, 2, None
+
+
+def input_list(input_path):
+    """One input spec, or a list of inputs processed together, as a list."""
+    return [input_path] if isinstance(input_path, str) else list(input_path)
+
+
+def _model_bytes(model, shapes):
+    # The script's base once, the per-frame terms of every input it holds
+    return int(model['base'] + sum(frames * (model['per_frame'] + channels * model['per_sample'])
+                                   for frames, channels, _ in shapes))
+
+
+def estimate(script, input_path, budget=None):
+    """
+    Peak memory estimate and mode for running `script` on an input.
+
+    Args:
+        input_path: The input, or a list of inputs one process works on at
+            once (the analyzer's compare mode): one job, one estimate
+
+    Returns:
+        dict with bytes, mode ('full' or 'low_memory'), frames, channels,
+        exclusive=True if the job does not fit the budget even alone, and
+        the input's duration and codec (None when the header is unreadable;
+        for several inputs the total duration and their common codec)
+    """
+    profile = MEMORY_PROFILES[script]
+    budget = memory_budget() if budget is None else budget
+    shapes = [input_shape(path) for path in input_list(input_path)]
+    mode, needed = 'full', _model_bytes(profile, shapes)
+    if budget and needed > budget and 'low_memory' in profile:
+        mode, needed = 'low_memory', _model_bytes(profile['low_memory'], shapes)
+    infos = [info for _, _, info in shapes]
+    codecs = {info["codec"] for info in infos if info}
+    return {
+        "bytes": needed,
+        "mode": mode,
+        "frames": int(sum(frames for frames, _, _ in shapes)),
+        "channels": int(max(channels for _, channels, _ in shapes)),
+        "exclusive": bool(budget) and needed > budget,
+        "duration": sum(info["duration"] for info in infos) if all(infos) else None,
+        "codec": codecs.pop() if len(codecs) == 1 and all(infos) else None,
+    }
+
+
+def _read_ledger(path):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("running", {})
+    state.setdefault("queue", [])
+    return state
+
+
+def _live(state):
+    """The ledger without the jobs whose process is gone."""
+    state["running"] = {job_id: job for job_id, job in state["running"].items() if pid_alive(job["pid"])}
+    state["queue"] = [job for job in state["queue"] if pid_alive(job["pid"])]
+    return state
+
+
+@contextmanager
+def _ledger():
+    """Exclusive access to the shared ledger; yields the state dict to modify."""
+    root = disk_root()
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            path = os.path.join(root, LEDGER_FILE)
+            # Drop jobs whose process is gone
+            state = _live(_read_ledger(path))
+            yield state
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def ledger_snapshot():
+    """
+    The ledger as last written, read under a shared lock. Nothing is
+    written: entries of exited processes are skipped here and removed by
+    the next update.
+
+    Returns:
+        dict with running ({job_id: job}) and queue ([job]); empty if no
+        job has been admitted yet
+    """
+    root = disk_root()
+    if not os.path.isdir(root):
+        return _read_ledger(os.path.join(root, LEDGER_FILE))
+    with open(os.path.join(root, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        try:
+            state = _read_ledger(os.path.join(root, LEDGER_FILE))
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return _live(state)
+
+
+class Admission:
+    """A job's place in the memory budget; release() (or exit) gives it back."""
+
+    def __init__(self, job_id, script, estimate, budget, waited):
+        self.job_id = job_id
+        self.script = script
+        self.bytes = estimate["bytes"]
+        self.mode = estimate["mode"]
+        self.exclusive = estimate["exclusive"]
+        self.budget = budget
+        self.waited = waited
+        self.released = False
+
+    @property
+    def low_memory(self):
+        return self.mode == 'low_memory'
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        metrics.finish_job()
+        if not self.budget:
+            return
+        try:
+            with _ledger() as state:
+                state["running"].pop(self.job_id, None)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def admit(script, input_path, timeout=None, log=None, output_path=None):
+    """
+    Wait until the job fits the memory budget and reserve its estimate.
+
+    Args:
+        script: Key of MEMORY_PROFILES
+        input_path: The job's input (path, "-" or "shm:<name>"), or a list
+            of inputs the process holds at once (admitted as one job)
+        timeout: Longest wait in seconds (default ADMISSION_TIMEOUT_SECONDS)
+        log: Progress callback (default: print to stderr)
+        output_path: The job's output file, whose size is recorded in the
+            metrics when the job ends (see metrics.py)
+
+    Returns:
+        Admission; its mode tells the script whether to use its low-memory path
+
+    Raises:
+        TimeoutError if the job was not admitted in time
+    """
+    if log is None:
+        def log(message):
+            print(message, file=sys.stderr, flush=True)
+    if timeout is None:
+        timeout = float(os.environ.get('ADMISSION_TIMEOUT_SECONDS', DEFAULT_TIMEOUT_SECONDS))
+
+    budget = memory_budget()
+    job = estimate(script, input_path, budget)
+    job_id = f"{os.getpid()}-{os.urandom(4).hex()}"
+    if not budget:
+        metrics.start_job(script, input_path, output_path, job["duration"], job["codec"])
+        return Admission(job_id, script, job, budget, 0.0)
+
+    if job["mode"] == 'low_memory':
+        log(f"Job needs more memory than the {budget / MB:.0f} MB budget: using the low-memory path")
+    if job["exclusive"]:
+        log(f"Estimated {job['bytes'] / MB:.0f} MB exceeds the {budget / MB:.0f} MB budget: waiting to run alone")
+
+    entry = {"id": job_id, "pid": os.getpid(), "script": script, "bytes": job["bytes"], "mode": job["mode"]}
+    started = time.monotonic()
+    with _ledger() as state:
+        state["queue"].append(dict(entry, queuedAt=time.time()))
+
+    announced = False
+    while True:
+        with _ledger() as state:
+            used = sum(running["bytes"] for running in state["running"].values())
+            head = state["queue"][0]["id"] if state["queue"] else None
+            # Strict FIFO: a large job at the head is not overtaken by smaller ones
+            admitted = head == job_id and (used + job["bytes"] <= budget or not state["running"])
+            if admitted:
+                state["queue"].pop(0)
+                state["running"][job_id] = dict(entry, startedAt=time.time())
+            expired = not admitted and time.monotonic() - started > timeout
+            if expired:
+                state["queue"] = [queued for queued in state["queue"] if queued["id"] != job_id]
+            position = next((i for i, queued in enumerate(state["queue"]) if queued["id"] == job_id), 0)
+        if admitted:
+            break
+        if expired:
+            metrics.inc('jobs_rejected_total', script=script)
+            raise TimeoutError(f"Server busy: no memory for this job within {timeout:.0f}s "
+                               f"(needs ~{job['bytes'] / MB:.0f} MB, {used / MB:.0f} of {budget / MB:.0f} MB in use)")
+        if not announced:
+            log(f"Queued for memory: ~{job['bytes'] / MB:.0f} MB needed, {used / MB:.0f} of "
+                f"{budget / MB:.0f} MB in use, position {position + 1}")
+            announced = True
+        time.sleep(POLL_SECONDS)
+
+    waited = time.monotonic() - started
+    if announced:
+        log(f"Admitted after {waited:.1f}s")
+    metrics.start_job(script, input_path, output_path, job["duration"], job["codec"], waited)
+    admission = Admission(job_id, script, job, budget, waited)
+    atexit.register(admission.release)
+    return admission
+
+
+def admit_or_exit(script, input_path, output_path=None):
+    """admit() for a script's main block: prints the JSON error result and exits if it times out."""
+    try:
+        return admit(script, input_path, output_path=output_path)
+    except TimeoutError as e:
+        print(json.dumps({"success": False, "error": str(e)}), flush=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'status':
+        ledger = ledger_snapshot()
+        running, queue = ledger["running"], ledger["queue"]
+        budget = memory_budget()
+        print(json.dumps({
+            "success": True,
+            "budgetMB": round(budget / MB),
+            "inUseMB": round(sum(job["bytes"] for job in running.values()) / MB),
+            "running": running,
+            "queue": queue,
+        }))
+    elif command == 'estimate' and len(sys.argv) > 3:
+        if sys.argv[2] not in MEMORY_PROFILES:
+            print(json.dumps({"success": False, "error": f"Unknown script (known: {', '.join(MEMORY_PROFILES)})"}))
+            sys.exit(1)
+        job = estimate(sys.argv[2], sys.argv[3])
+        print(json.dumps({"success": True, "budgetMB": round(memory_budget() / MB),
+                          "estimateMB": round(job["bytes"] / MB), **job}))
+    else:
+        print(json.dumps({"success": False, "error": "Usage: admission.py status | estimate <script> <input>"}))
+        sys.exit(1)
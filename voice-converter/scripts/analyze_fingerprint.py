@@ -7,476 +7,1394 @@ Analyzes audio files for AI watermarks using multiple detection methods:
 - Spectral normalization detection (detects artificial ratio reduction)
 - High-frequency noise analysis (detects dithering)
 - Filter artifact detection (detects multi-stage filtering)
+
+Integrated loudness, loudness range and true peak (BS.1770 / EBU R128,
+see loudness.py) are measured from the same decode pass.
+
+With --stream, one JSON Lines record is printed per metric group as soon as
+it is ready, followed by the final result record.
+
+With --timeline [seconds], the result also carries a time-resolved
+energy-ratio/status timeline in fixed windows (see timeline.py).
+
+With --decimate, 88.2-192 kHz inputs are band-limited and decimated by a
+power of two (to 44.1 or 48 kHz; polyphase, streamed, see resample.py)
+before the STFT, with n_fft and hop scaled down by the same factor: the
+time-frequency grid and band magnitudes stay those of the input rate while
+the FFTs and every spectral intermediate shrink 2-4x. Every band the
+energy detectors measure lies below 22 kHz; the full-band features (MFCC,
+chroma, contrast, centroid/bandwidth) lose what lies above. Loudness is
+still measured at the input rate.
+
+With --compare, two inputs (e.g. before and after watermark removal) are
+analyzed in one process: only the requested metric groups run, on both
+inputs concurrently, and the result holds both sets of metrics, their
+deltas and the difference of the band-energy curves over time.
+
+The input may be "-" (stdin) or "shm:<name>" (shared memory, see
+stdio_io.py); with "-" as the image path the PNG goes to stdout and all
+text output to stderr.
 """
 
+import os
 import sys
 import json
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import librosa
 import matplotlib
 matplotlib.use('Agg')  # Non-interactive backend
 import matplotlib.pyplot as plt
 from scipy import signal
+from profiling import StageTimer, run_with_profile, parse_profiling_args
+from pcm_mmap import stft as pcm_stft, stft_stream
+from stdio_io import open_input_pcm, open_output, claim_stdout, streamed_wav
+from decode import decode, to_mono
+from resample import resample_stream
+from scheduler import Task, run_graph, prefix_tasks, available_cpus
+from reference_index import ReferenceIndex, band_profile
+from perceptual_hash import HashIndex, fingerprint
+from loudness import LoudnessMeter
+from admission import admit_or_exit
+from fft_backend import configure_fft
+from planner import plan
+from probe import probe
+from timeline import analyzer_timeline, DEFAULT_WINDOW_SECONDS
+from metrics import timed_decode, cache_lookup
+
+# Define frequency ranges
+WATERMARK_MIN = 18000
+WATERMARK_MAX = 22000
+REFERENCE_MIN = 14000
+REFERENCE_MAX = 18000
+HIGH_FREQ_MIN = 15000  # For filter artifact detection
+HIGH_FREQ_MAX = 17000
+
+# Frame ratio thresholds (watermark / reference band energy per frame)
+BASELINE_RATIO = 0.18  # Clean audio baseline
+VERY_LOW_RATIO = 0.10
+ELEVATED_RATIO = 0.25
+HIGHER_RATIO = 0.35
+SUSPICIOUS_RATIO = 0.5
+
+# Use higher resolution STFT for phase analysis
+N_FFT = 2048  # Higher resolution for phase analysis
+HOP_LENGTH = 512
 
-def analyze_fingerprint(input_path, output_path=None, skip_image=False):
+# Output fields in result order, with their rounding
+RESULT_FIELDS = [
+    # Energy metrics
+    ("watermarkEnergy", 6),
+    ("energyRatio", 4),
+    ("meanFrameRatio", 4),
+    ("medianFrameRatio", 4),
+    ("maxFrameRatio", 4),
+    ("watermarkToReferenceRatio", 4),
+    ("medianWatermarkToReference", 4),
+    ("framesWatermarkHigherPercent", 2),
+    ("framesWatermarkElevatedPercent", 2),
+    ("framesAboveVeryLowPercent", 2),
+    ("framesAboveBaselinePercent", 2),
+    ("suspiciousFramesPercent", 2),
+    # Enhanced detection metrics
+    ("phaseCoherence", 4),
+    ("phaseCoherenceRatio", 4),
+    ("normalizationSuspicion", 4),
+    ("ditheringSuspicion", 4),
+    ("filterArtifactSuspicion", 4),
+    # New feature metrics (matching external analyzers)
+    ("mfccSuspicion", 4),
+    ("chromaSuspicion", 4),
+    ("spectralContrastSuspicion", 4),
+    ("pitchSuspicion", 4),
+    ("tempoSuspicion", 4),
+    ("spectralCentroidSuspicion", 4),
+    ("spectralBandwidthSuspicion", 4),
+    ("combinedSuspicion", 4),
+]
+FIELD_DECIMALS = dict(RESULT_FIELDS)
+
+
+# Frames per slice for the frame-local features in low-memory mode
+LOW_MEMORY_FRAME_CHUNK = 4096
+
+# Lowest analysis rate decimate=True goes down to: the highest band measured ends at WATERMARK_MAX
+MIN_DECIMATED_RATE = 2 * WATERMARK_MAX
+# Flat to 22 kHz with aliasing below -120 dB (see resample.py --benchmark)
+DECIMATE_QUALITY = 'very-high'
+DECIMATE_BLOCK_FRAMES = 1 << 16
+# Filter ringing below half a 24-bit LSB is flushed, so digital silence stays exactly
+# silent (frames without reference energy are skipped by the detectors)
+DECIMATE_FLOOR = 2.0 ** -24
+
+
+class AnalysisContext:
     """
-    Enhanced analysis of audio file for AI watermarks.
-    
-    Args:
-        input_path: Path to input audio file
-        output_path: Optional path for spectrogram image
-        skip_image: If True, skip image generation
+    Sample rate, STFT parameters and band masks shared by every detector.
+
+    With frame_chunk set, detectors whose features are computed frame by
+    frame (pitch, chroma, contrast, centroid/bandwidth) run on slices of
+    that many frames, so librosa's temporaries stay small (same results).
     """
-    try:
-        # Load audio file
-        print(f"Loading audio: {input_path}")
-        y, sr = librosa.load(input_path, sr=None)
-        duration = len(y) / sr
-        nyquist_freq = sr / 2
-        
-        print(f"Sample rate: {sr} Hz, Duration: {duration:.2f}s, Nyquist: {nyquist_freq:.1f} Hz")
-        
-        # Use higher resolution STFT for phase analysis
-        n_fft = 2048  # Higher resolution for phase analysis
-        hop_length = 512
-        stft = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
-        magnitude = np.abs(stft)
-        phase = np.angle(stft)
-        frequencies = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
-        
-        # Define frequency ranges
-        watermark_min = 18000
-        watermark_max = 22000
-        reference_min = 14000
-        reference_max = 18000
-        high_freq_min = 15000  # For filter artifact detection
-        high_freq_max = 17000
-        
+
+    def __init__(self, sr, n_fft=N_FFT, hop_length=HOP_LENGTH, frame_chunk=None):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.frame_chunk = frame_chunk
+        self.frequencies = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
         # Find frequency indices
-        watermark_idx = (frequencies >= watermark_min) & (frequencies <= watermark_max)
-        reference_idx = (frequencies >= reference_min) & (frequencies <= reference_max)
-        high_freq_idx = (frequencies >= high_freq_min) & (frequencies <= high_freq_max)
-        
-        # ===== 1. ENERGY RATIO ANALYSIS (Original method) =====
-        watermark_energy = np.mean(magnitude[watermark_idx, :]) if np.any(watermark_idx) else 0
-        reference_energy = np.mean(magnitude[reference_idx, :]) if np.any(reference_idx) else 0
-        energy_ratio = watermark_energy / reference_energy if reference_energy > 0 else 0
-        
-        # Frame-by-frame ratios
-        watermark_frames = magnitude[watermark_idx, :] if np.any(watermark_idx) else np.zeros((0, magnitude.shape[1]))
-        reference_frames = magnitude[reference_idx, :] if np.any(reference_idx) else np.zeros((0, magnitude.shape[1]))
-        
-        frame_ratios = []
-        for i in range(watermark_frames.shape[1]):
-            wm_energy = np.mean(watermark_frames[:, i]) if watermark_frames.shape[0] > 0 else 0
-            ref_energy = np.mean(reference_frames[:, i]) if reference_frames.shape[0] > 0 and reference_frames.shape[1] > i else 0
-            if ref_energy > 0:
-                frame_ratios.append(wm_energy / ref_energy)
-        
-        frame_ratios = np.array(frame_ratios)
-        
-        # Statistics
-        mean_frame_ratio = np.mean(frame_ratios) if len(frame_ratios) > 0 else 0
-        median_frame_ratio = np.median(frame_ratios) if len(frame_ratios) > 0 else 0
-        max_frame_ratio = np.max(frame_ratios) if len(frame_ratios) > 0 else 0
-        watermark_to_reference_ratio = energy_ratio
-        median_watermark_to_reference = median_frame_ratio
-        
-        # Frame percentages
-        baseline_ratio = 0.18  # Clean audio baseline
-        very_low_threshold = 0.10
-        elevated_threshold = 0.25
-        higher_threshold = 0.35
-        suspicious_threshold = 0.5
-        
-        frames_above_very_low = np.sum(frame_ratios > very_low_threshold) / len(frame_ratios) * 100 if len(frame_ratios) > 0 else 0
-        frames_above_baseline = np.sum(frame_ratios > baseline_ratio) / len(frame_ratios) * 100 if len(frame_ratios) > 0 else 0
-        frames_watermark_higher = np.sum(frame_ratios > higher_threshold) / len(frame_ratios) * 100 if len(frame_ratios) > 0 else 0
-        frames_watermark_elevated = np.sum(frame_ratios > elevated_threshold) / len(frame_ratios) * 100 if len(frame_ratios) > 0 else 0
-        suspicious_frames = np.sum(frame_ratios > suspicious_threshold) / len(frame_ratios) * 100 if len(frame_ratios) > 0 else 0
-        
-        # ===== 2. PHASE COHERENCE ANALYSIS (Detects phase randomization) =====
-        # Watermark frequencies should have consistent phase patterns if watermarked
-        # Random phase indicates removal attempt
-        if np.any(watermark_idx):
-            watermark_phase = phase[watermark_idx, :]
-            # Calculate phase variance (high variance = randomized phase)
-            phase_variance = np.var(watermark_phase, axis=0)  # Variance across frequencies per frame
-            mean_phase_variance = np.mean(phase_variance)
-            
-            # Calculate phase coherence (how consistent phase is across time)
-            # Low coherence = randomized phase (removal attempt)
-            phase_coherence = 1.0 / (1.0 + mean_phase_variance)  # Normalized to 0-1
-            
-            # Reference phase for comparison
-            if np.any(reference_idx):
-                reference_phase = phase[reference_idx, :]
-                ref_phase_variance = np.var(reference_phase, axis=0)
-                mean_ref_phase_variance = np.mean(ref_phase_variance)
-                ref_phase_coherence = 1.0 / (1.0 + mean_ref_phase_variance)
-                
-                # If watermark phase is much less coherent than reference, likely randomized
-                phase_coherence_ratio = phase_coherence / ref_phase_coherence if ref_phase_coherence > 0 else 1.0
-            else:
-                phase_coherence_ratio = 1.0
+        self.watermark_idx = (self.frequencies >= WATERMARK_MIN) & (self.frequencies <= WATERMARK_MAX)
+        self.reference_idx = (self.frequencies >= REFERENCE_MIN) & (self.frequencies <= REFERENCE_MAX)
+        self.high_freq_idx = (self.frequencies >= HIGH_FREQ_MIN) & (self.frequencies <= HIGH_FREQ_MAX)
+
+
+# ============================================================================
+# SHARED INTERMEDIATES
+# Everything derives from the one analysis STFT (n_fft=2048, hop=512, the
+# same framing librosa's feature functions use by default), so no detector
+# repeats the transform. Passing S= to librosa gives the same values as y=.
+# ============================================================================
+def spectral_magnitude(ctx, stft):
+    return np.abs(stft)
+
+
+def spectral_phase(ctx, stft):
+    return np.angle(stft)
+
+
+def power_spectrogram(ctx, magnitude):
+    return magnitude ** 2.0
+
+
+def mel_db(ctx, power):
+    # What librosa.feature.mfcc / onset_strength compute internally from y
+    return librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=ctx.sr))
+
+
+def onset_envelope(ctx, mel_db):
+    # beat_track(y=...) uses a median-aggregated onset envelope
+    return librosa.onset.onset_strength(S=mel_db, sr=ctx.sr, hop_length=ctx.hop_length, aggregate=np.median)
+
+
+def band_energy(ctx, magnitude):
+    # Compact spectral profile for the clean reference index
+    return band_profile(magnitude, ctx.frequencies)
+
+
+def band_curves(ctx, magnitude):
+    # Per-frame mean magnitude of the watermark and reference bands, (2, frames)
+    frames = magnitude.shape[-1]
+    return np.vstack([
+        np.mean(magnitude[idx, :], axis=0) if np.any(idx) else np.zeros(frames)
+        for idx in (ctx.watermark_idx, ctx.reference_idx)
+    ])
+
+
+def perceptual_fingerprint(ctx, magnitude):
+    # Sub-fingerprints for recognizing re-uploads (see perceptual_hash.py)
+    return fingerprint(magnitude, ctx.sr, ctx.n_fft, ctx.hop_length)
+
+
+def frame_slices(ctx, S):
+    """S whole, or in frame slices in low-memory mode."""
+    step = ctx.frame_chunk or S.shape[-1]
+    return [S[:, start:start + step] for start in range(0, S.shape[-1], max(step, 1))]
+
+
+def estimate_tuning(ctx, power):
+    """
+    librosa.estimate_tuning(S=power) computed slice by slice: the pitched
+    peaks are collected per slice, and both the median magnitude threshold
+    and the tuning histogram are independent of order.
+    """
+    pitches, mags = [], []
+    for chunk in frame_slices(ctx, power):
+        pitch, mag = librosa.piptrack(S=chunk, sr=ctx.sr, n_fft=ctx.n_fft)
+        mask = pitch > 0
+        pitches.append(pitch[mask])
+        mags.append(mag[mask])
+    pitches, mags = np.concatenate(pitches), np.concatenate(mags)
+    threshold = np.median(mags) if len(mags) else 0.0
+    return librosa.pitch_tuning(pitches[mags >= threshold], bins_per_octave=12)
+
+
+def estimate_tempo(ctx, onset_envelope):
+    """
+    The tempo estimate beat_track makes by default, with the autocorrelation
+    tempogram (8 s windows, one column per frame) built and averaged slice
+    by slice instead of held whole.
+    """
+    win_length = librosa.time_to_frames(8.0, sr=ctx.sr, hop_length=ctx.hop_length).item()
+    n = len(onset_envelope)
+    # The centering tempogram(center=True) applies, done once for all slices
+    padded = np.pad(onset_envelope, win_length // 2, mode='linear_ramp', end_values=(0, 0))
+    total = np.zeros((win_length, 1))
+    for start in range(0, n, ctx.frame_chunk):
+        stop = min(start + ctx.frame_chunk, n)
+        tg = librosa.feature.tempogram(onset_envelope=padded[start:stop + win_length - 1], sr=ctx.sr,
+                                       hop_length=ctx.hop_length, win_length=win_length, center=False)
+        total += tg.sum(axis=1, keepdims=True)
+    return librosa.feature.tempo(tg=total / n, sr=ctx.sr, hop_length=ctx.hop_length, aggregate=None)
+
+
+# name -> (function, inputs); "stft" is provided by the caller
+INTERMEDIATES = {
+    "magnitude": (spectral_magnitude, ("stft",)),
+    "phase": (spectral_phase, ("stft",)),
+    "power": (power_spectrogram, ("magnitude",)),
+    "mel_db": (mel_db, ("power",)),
+    "onset_envelope": (onset_envelope, ("mel_db",)),
+    "band_energy": (band_energy, ("magnitude",)),
+    "band_curves": (band_curves, ("magnitude",)),
+    "fingerprint": (perceptual_fingerprint, ("magnitude",)),
+}
+
+
+# ============================================================================
+# DETECTORS
+# Each takes the context plus its declared inputs and returns its own
+# metrics (unrounded, keyed by result field name).
+# ============================================================================
+def detect_energy_ratio(ctx, magnitude):
+    # ===== 1. ENERGY RATIO ANALYSIS (Original method) =====
+    watermark_idx, reference_idx = ctx.watermark_idx, ctx.reference_idx
+    watermark_energy = np.mean(magnitude[watermark_idx, :]) if np.any(watermark_idx) else 0
+    reference_energy = np.mean(magnitude[reference_idx, :]) if np.any(reference_idx) else 0
+    energy_ratio = watermark_energy / reference_energy if reference_energy > 0 else 0
+
+    # Frame-by-frame ratios (frames without reference energy are skipped)
+    if np.any(watermark_idx) and np.any(reference_idx):
+        wm_energy = np.mean(magnitude[watermark_idx, :], axis=0)
+        ref_energy = np.mean(magnitude[reference_idx, :], axis=0)
+        valid = ref_energy > 0
+        frame_ratios = wm_energy[valid] / ref_energy[valid]
+    else:
+        frame_ratios = np.zeros(0)
+
+    # Statistics
+    mean_frame_ratio = np.mean(frame_ratios) if len(frame_ratios) > 0 else 0
+    median_frame_ratio = np.median(frame_ratios) if len(frame_ratios) > 0 else 0
+    max_frame_ratio = np.max(frame_ratios) if len(frame_ratios) > 0 else 0
+
+    # Frame percentages
+    def percent_above(threshold):
+        return np.sum(frame_ratios > threshold) / len(frame_ratios) * 100 if len(frame_ratios) > 0 else 0
+
+    return {
+        "watermarkEnergy": watermark_energy,
+        "energyRatio": energy_ratio,
+        "meanFrameRatio": mean_frame_ratio,
+        "medianFrameRatio": median_frame_ratio,
+        "maxFrameRatio": max_frame_ratio,
+        "watermarkToReferenceRatio": energy_ratio,
+        "medianWatermarkToReference": median_frame_ratio,
+        "framesWatermarkHigherPercent": percent_above(HIGHER_RATIO),
+        "framesWatermarkElevatedPercent": percent_above(ELEVATED_RATIO),
+        "framesAboveVeryLowPercent": percent_above(VERY_LOW_RATIO),
+        "framesAboveBaselinePercent": percent_above(BASELINE_RATIO),
+        "suspiciousFramesPercent": percent_above(SUSPICIOUS_RATIO),
+    }
+
+
+def detect_phase_coherence(ctx, phase):
+    # ===== 2. PHASE COHERENCE ANALYSIS (Detects phase randomization) =====
+    # Watermark frequencies should have consistent phase patterns if watermarked
+    # Random phase indicates removal attempt
+    if np.any(ctx.watermark_idx):
+        watermark_phase = phase[ctx.watermark_idx, :]
+        # Calculate phase variance (high variance = randomized phase)
+        phase_variance = np.var(watermark_phase, axis=0)  # Variance across frequencies per frame
+        mean_phase_variance = np.mean(phase_variance)
+
+        # Calculate phase coherence (how consistent phase is across time)
+        # Low coherence = randomized phase (removal attempt)
+        phase_coherence = 1.0 / (1.0 + mean_phase_variance)  # Normalized to 0-1
+
+        # Reference phase for comparison
+        if np.any(ctx.reference_idx):
+            reference_phase = phase[ctx.reference_idx, :]
+            ref_phase_variance = np.var(reference_phase, axis=0)
+            mean_ref_phase_variance = np.mean(ref_phase_variance)
+            ref_phase_coherence = 1.0 / (1.0 + mean_ref_phase_variance)
+
+            # If watermark phase is much less coherent than reference, likely randomized
+            phase_coherence_ratio = phase_coherence / ref_phase_coherence if ref_phase_coherence > 0 else 1.0
         else:
-            mean_phase_variance = 0
-            phase_coherence = 1.0
             phase_coherence_ratio = 1.0
-        
-        # ===== 3. SPECTRAL NORMALIZATION DETECTION =====
-        # Remover targets ratio ~0.15 (below natural baseline of 0.18)
-        # If ratio is suspiciously close to 0.15, might be normalized
-        normalization_suspicion = 0.0
-        if energy_ratio > 0:
-            # Check if ratio is artificially low (between 0.12-0.18 suggests normalization)
-            if 0.12 <= energy_ratio <= 0.18:
-                # Calculate how close to target (0.15)
-                distance_from_target = abs(energy_ratio - 0.15)
-                # Closer to 0.15 = more suspicious
-                normalization_suspicion = 1.0 - (distance_from_target / 0.06)  # Max suspicion at 0.15
-            elif energy_ratio < 0.12:
-                # Very low ratio might indicate aggressive filtering
-                normalization_suspicion = 0.8
-        
-        # ===== 4. HIGH-FREQUENCY NOISE ANALYSIS (Detects dithering) =====
-        # Check for pink noise characteristics in high frequencies (14-22 kHz)
-        # Pink noise has 1/f power spectrum
-        noise_analysis_range = (frequencies >= 14000) & (frequencies <= 22000)
-        if np.any(noise_analysis_range):
-            high_freq_magnitude = magnitude[noise_analysis_range, :]
-            # Calculate power spectrum slope
-            # Pink noise should have approximately -3 dB/octave slope
-            freq_subset = frequencies[noise_analysis_range]
-            # Remove DC and very low frequencies
-            valid_freqs = freq_subset[freq_subset > 0]
-            if len(valid_freqs) > 1:
-                # Calculate average power per frequency bin
-                avg_power = np.mean(high_freq_magnitude, axis=1)
-                # Fit linear regression to log-log plot (power vs frequency)
-                log_freqs = np.log10(valid_freqs)
-                log_power = np.log10(avg_power[:len(valid_freqs)] + 1e-10)  # Avoid log(0)
-                
-                if len(log_freqs) > 1:
-                    # Simple slope calculation
-                    slope = np.polyfit(log_freqs, log_power, 1)[0]
-                    # Pink noise slope is approximately -1 (in log-log space)
-                    # White noise slope is 0
-                    # If slope is close to -1, might be pink noise (dithering)
-                    pink_noise_indicator = abs(slope + 1.0)  # Closer to 0 = more pink noise-like
-                    dithering_suspicion = max(0, 1.0 - pink_noise_indicator * 2)  # Scale to 0-1
-                else:
-                    dithering_suspicion = 0.0
-            else:
-                dithering_suspicion = 0.0
-        else:
-            dithering_suspicion = 0.0
-        
-        # ===== 5. FILTER ARTIFACT DETECTION =====
-        # Multi-stage filtering (17 kHz → 15.5 kHz) creates specific artifacts
-        # Check for sharp cutoffs in frequency response
-        if np.any(high_freq_idx):
-            # Calculate energy drop-off around 15.5-17 kHz
-            energy_below_15k = np.mean(magnitude[frequencies < 15000, :]) if np.any(frequencies < 15000) else 0
-            energy_15_17k = np.mean(magnitude[high_freq_idx, :]) if np.any(high_freq_idx) else 0
-            energy_above_17k = np.mean(magnitude[(frequencies > 17000) & (frequencies < 18000), :]) if np.any((frequencies > 17000) & (frequencies < 18000)) else 0
-            
-            if energy_below_15k > 0:
-                # Check for sharp drop-off (sign of aggressive filtering)
-                dropoff_15_17 = energy_15_17k / energy_below_15k if energy_below_15k > 0 else 0
-                dropoff_17_18 = energy_above_17k / energy_below_15k if energy_below_15k > 0 else 0
-                
-                # Sharp drop-off suggests multi-stage filtering
-                if dropoff_15_17 < 0.3 and dropoff_17_18 < 0.1:
-                    filter_artifact_suspicion = 0.8
-                elif dropoff_15_17 < 0.5:
-                    filter_artifact_suspicion = 0.5
-                else:
-                    filter_artifact_suspicion = 0.0
-            else:
-                filter_artifact_suspicion = 0.0
+    else:
+        phase_coherence = 1.0
+        phase_coherence_ratio = 1.0
+
+    return {
+        "phaseCoherence": phase_coherence,
+        "phaseCoherenceRatio": phase_coherence_ratio,
+    }
+
+
+def detect_normalization(ctx, energy_ratio):
+    # ===== 3. SPECTRAL NORMALIZATION DETECTION =====
+    # Remover targets ratio ~0.15 (below natural baseline of 0.18)
+    # If ratio is suspiciously close to 0.15, might be normalized
+    energy_ratio = energy_ratio["energyRatio"]
+    normalization_suspicion = 0.0
+    if energy_ratio > 0:
+        # Check if ratio is artificially low (between 0.12-0.18 suggests normalization)
+        if 0.12 <= energy_ratio <= 0.18:
+            # Calculate how close to target (0.15)
+            distance_from_target = abs(energy_ratio - 0.15)
+            # Closer to 0.15 = more suspicious
+            normalization_suspicion = 1.0 - (distance_from_target / 0.06)  # Max suspicion at 0.15
+        elif energy_ratio < 0.12:
+            # Very low ratio might indicate aggressive filtering
+            normalization_suspicion = 0.8
+
+    return {"normalizationSuspicion": normalization_suspicion}
+
+
+def detect_dithering(ctx, magnitude):
+    # ===== 4. HIGH-FREQUENCY NOISE ANALYSIS (Detects dithering) =====
+    # Check for pink noise characteristics in high frequencies (14-22 kHz)
+    # Pink noise has 1/f power spectrum
+    frequencies = ctx.frequencies
+    dithering_suspicion = 0.0
+    noise_analysis_range = (frequencies >= 14000) & (frequencies <= 22000)
+    if np.any(noise_analysis_range):
+        high_freq_magnitude = magnitude[noise_analysis_range, :]
+        # Calculate power spectrum slope
+        # Pink noise should have approximately -3 dB/octave slope
+        freq_subset = frequencies[noise_analysis_range]
+        # Remove DC and very low frequencies
+        valid_freqs = freq_subset[freq_subset > 0]
+        if len(valid_freqs) > 1:
+            # Calculate average power per frequency bin
+            avg_power = np.mean(high_freq_magnitude, axis=1)
+            # Fit linear regression to log-log plot (power vs frequency)
+            log_freqs = np.log10(valid_freqs)
+            log_power = np.log10(avg_power[:len(valid_freqs)] + 1e-10)  # Avoid log(0)
+
+            if len(log_freqs) > 1:
+                # Simple slope calculation
+                slope = np.polyfit(log_freqs, log_power, 1)[0]
+                # Pink noise slope is approximately -1 (in log-log space)
+                # White noise slope is 0
+                # If slope is close to -1, might be pink noise (dithering)
+                pink_noise_indicator = abs(slope + 1.0)  # Closer to 0 = more pink noise-like
+                dithering_suspicion = max(0, 1.0 - pink_noise_indicator * 2)  # Scale to 0-1
+
+    return {"ditheringSuspicion": dithering_suspicion}
+
+
+def detect_filter_artifacts(ctx, magnitude):
+    # ===== 5. FILTER ARTIFACT DETECTION =====
+    # Multi-stage filtering (17 kHz → 15.5 kHz) creates specific artifacts
+    # Check for sharp cutoffs in frequency response
+    frequencies, high_freq_idx = ctx.frequencies, ctx.high_freq_idx
+    filter_artifact_suspicion = 0.0
+    if np.any(high_freq_idx):
+        # Calculate energy drop-off around 15.5-17 kHz
+        energy_below_15k = np.mean(magnitude[frequencies < 15000, :]) if np.any(frequencies < 15000) else 0
+        energy_15_17k = np.mean(magnitude[high_freq_idx, :]) if np.any(high_freq_idx) else 0
+        energy_above_17k = np.mean(magnitude[(frequencies > 17000) & (frequencies < 18000), :]) if np.any((frequencies > 17000) & (frequencies < 18000)) else 0
+
+        if energy_below_15k > 0:
+            # Check for sharp drop-off (sign of aggressive filtering)
+            dropoff_15_17 = energy_15_17k / energy_below_15k if energy_below_15k > 0 else 0
+            dropoff_17_18 = energy_above_17k / energy_below_15k if energy_below_15k > 0 else 0
+
+            # Sharp drop-off suggests multi-stage filtering
+            if dropoff_15_17 < 0.3 and dropoff_17_18 < 0.1:
+                filter_artifact_suspicion = 0.8
+            elif dropoff_15_17 < 0.5:
+                filter_artifact_suspicion = 0.5
+
+    return {"filterArtifactSuspicion": filter_artifact_suspicion}
+
+
+def detect_mfcc(ctx, mel_db):
+    # ===== 6. MFCC ANALYSIS (External analyzers check this) =====
+    # MFCCs represent spectral content, pitch, and timbre
+    # AI-generated audio may have characteristic MFCC patterns
+    mfcc = librosa.feature.mfcc(S=mel_db, sr=ctx.sr, n_mfcc=13)
+
+    # Calculate MFCC variance (AI audio may have lower variance)
+    mfcc_variance = np.var(mfcc)
+    # Normalize to 0-1 (lower variance = more suspicious)
+    mfcc_suspicion = max(0, 1.0 - (mfcc_variance / 10.0))  # Threshold at 10.0
+    return {"mfccSuspicion": mfcc_suspicion}
+
+
+def detect_chroma(ctx, power):
+    # ===== 7. CHROMA FEATURES ANALYSIS =====
+    # Chroma represents harmonic structure (12 pitch classes)
+    # chroma_stft estimates the tuning over the whole spectrogram itself; sliced, it is done up front
+    tuning = estimate_tuning(ctx, power) if ctx.frame_chunk else None
+    chroma = np.concatenate([
+        librosa.feature.chroma_stft(S=chunk, sr=ctx.sr, n_fft=ctx.n_fft, hop_length=ctx.hop_length, tuning=tuning)
+        for chunk in frame_slices(ctx, power)
+    ], axis=1)
+    chroma_mean = np.mean(chroma, axis=1)
+
+    # AI audio may have more uniform chroma distribution
+    chroma_uniformity = np.std(chroma_mean)  # Lower std = more uniform = more suspicious
+    chroma_suspicion = max(0, 1.0 - (chroma_uniformity / 0.1))  # Threshold at 0.1
+    return {"chromaSuspicion": chroma_suspicion}
+
+
+def detect_spectral_contrast(ctx, magnitude):
+    # ===== 8. SPECTRAL CONTRAST ANALYSIS =====
+    # Measures difference in amplitude between frequency bands
+    spectral_contrast = np.concatenate([
+        librosa.feature.spectral_contrast(S=chunk, sr=ctx.sr, n_fft=ctx.n_fft, hop_length=ctx.hop_length)
+        for chunk in frame_slices(ctx, magnitude)
+    ], axis=1)
+    contrast_mean = np.mean(spectral_contrast)
+    contrast_std = np.std(spectral_contrast)
+
+    # AI audio may have unnatural contrast patterns
+    # Very low or very high contrast can be suspicious
+    contrast_suspicion = 0.0
+    if contrast_mean < 5.0 or contrast_mean > 20.0:
+        contrast_suspicion = 0.5
+    if contrast_std < 2.0:  # Too consistent
+        contrast_suspicion = max(contrast_suspicion, 0.3)
+    return {"spectralContrastSuspicion": contrast_suspicion}
+
+
+def detect_pitch_tempo(ctx, magnitude, onset_envelope):
+    # ===== 9. PITCH AND RHYTHM ANALYSIS =====
+    # Analyze pitch contours and rhythmic patterns
+    pitched = []
+    for chunk in frame_slices(ctx, magnitude):
+        pitches, magnitudes = librosa.piptrack(S=chunk, sr=ctx.sr, n_fft=ctx.n_fft, hop_length=ctx.hop_length)
+        pitched.append(pitches[pitches > 0])
+    pitched = np.concatenate(pitched)
+    pitch_std = np.std(pitched) if len(pitched) else 0
+
+    # AI audio may have too-regular pitch patterns
+    pitch_regularity = 1.0 / (1.0 + pitch_std) if pitch_std > 0 else 1.0
+    pitch_suspicion = max(0, pitch_regularity - 0.5) * 2  # Scale to 0-1
+
+    # Rhythm analysis: detect tempo and regularity
+    bpm = estimate_tempo(ctx, onset_envelope) if ctx.frame_chunk else None
+    tempo, beats = librosa.beat.beat_track(onset_envelope=onset_envelope, sr=ctx.sr, hop_length=ctx.hop_length, bpm=bpm)
+    # Very regular tempo can be suspicious
+    tempo_suspicion = 0.0
+    # Newer librosa returns tempo as a 1-element array
+    tempo = np.atleast_1d(tempo)[0]
+    if tempo > 0:
+        # Check if tempo is suspiciously round (e.g., exactly 120 BPM)
+        # Convert to float to avoid numpy scalar issues
+        tempo_float = float(tempo)
+        tempo_roundness = abs(tempo_float - round(tempo_float))
+        if tempo_roundness < 0.5:  # Very close to round number
+            tempo_suspicion = 0.2
+
+    return {
+        "pitchSuspicion": pitch_suspicion,
+        "tempoSuspicion": tempo_suspicion,
+    }
+
+
+def detect_centroid_bandwidth(ctx, magnitude):
+    # ===== 10. SPECTRAL CENTROID AND BANDWIDTH ANALYSIS =====
+    slices = frame_slices(ctx, magnitude)
+    spectral_centroid = np.concatenate([
+        librosa.feature.spectral_centroid(S=chunk, sr=ctx.sr, n_fft=ctx.n_fft, hop_length=ctx.hop_length)[0]
+        for chunk in slices
+    ])
+    spectral_bandwidth = np.concatenate([
+        librosa.feature.spectral_bandwidth(S=chunk, sr=ctx.sr, n_fft=ctx.n_fft, hop_length=ctx.hop_length)[0]
+        for chunk in slices
+    ])
+
+    centroid_std = np.std(spectral_centroid)
+    bandwidth_std = np.std(spectral_bandwidth)
+
+    # AI audio may have unnatural centroid/bandwidth patterns
+    # Very consistent values can be suspicious
+    centroid_suspicion = max(0, 1.0 - (centroid_std / 500.0))  # Threshold at 500 Hz
+    bandwidth_suspicion = max(0, 1.0 - (bandwidth_std / 1000.0))  # Threshold at 1000 Hz
+    return {
+        "spectralCentroidSuspicion": centroid_suspicion,
+        "spectralBandwidthSuspicion": bandwidth_suspicion,
+    }
+
+
+# Metric groups in reporting order: (group name, detector, inputs)
+# Inputs are intermediates or other groups (whose metrics dict is passed).
+METRIC_GROUPS = [
+    ("energy_ratio", detect_energy_ratio, ("magnitude",)),
+    ("phase_coherence", detect_phase_coherence, ("phase",)),
+    ("normalization", detect_normalization, ("energy_ratio",)),
+    ("dithering", detect_dithering, ("magnitude",)),
+    ("filter_artifacts", detect_filter_artifacts, ("magnitude",)),
+    ("mfcc", detect_mfcc, ("mel_db",)),
+    ("chroma", detect_chroma, ("power",)),
+    ("spectral_contrast", detect_spectral_contrast, ("magnitude",)),
+    ("pitch_tempo", detect_pitch_tempo, ("magnitude", "onset_envelope")),
+    ("centroid_bandwidth", detect_centroid_bandwidth, ("magnitude",)),
+]
+
+
+def build_tasks(ctx, compute_stft, groups=None, keep=()):
+    """
+    Task graph for the requested metric groups (default: all).
+
+    Intermediates are added just before their first consumer, so running
+    the list in order (one worker) reports groups in METRIC_GROUPS order.
+
+    Args:
+        ctx: AnalysisContext
+        compute_stft: Zero-argument callable returning the complex STFT
+        groups: Group names to run (their dependencies are added as needed)
+        keep: Intermediates to return alongside the metric groups
+    """
+    detectors = {group: (detector, inputs) for group, detector, inputs in METRIC_GROUPS}
+    tasks = []
+    added = set()
+
+    def add(name):
+        if name in added:
+            return
+        if name == "stft":
+            tasks.append(Task("stft", compute_stft, keep="stft" in keep))
+        elif name in INTERMEDIATES:
+            func, inputs = INTERMEDIATES[name]
+            for dep in inputs:
+                add(dep)
+            tasks.append(Task(name, partial(func, ctx), inputs, keep=name in keep))
         else:
-            filter_artifact_suspicion = 0.0
-        
-        # ===== 6. MFCC ANALYSIS (External analyzers check this) =====
-        # MFCCs represent spectral content, pitch, and timbre
-        # AI-generated audio may have characteristic MFCC patterns
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, hop_length=hop_length)
-        mfcc_mean = np.mean(mfcc, axis=1)
-        mfcc_std = np.std(mfcc, axis=1)
-        
-        # Calculate MFCC variance (AI audio may have lower variance)
-        mfcc_variance = np.var(mfcc)
-        # Normalize to 0-1 (lower variance = more suspicious)
-        mfcc_suspicion = max(0, 1.0 - (mfcc_variance / 10.0))  # Threshold at 10.0
-        
-        # ===== 7. CHROMA FEATURES ANALYSIS =====
-        # Chroma represents harmonic structure (12 pitch classes)
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop_length)
-        chroma_mean = np.mean(chroma, axis=1)
-        chroma_std = np.std(chroma, axis=1)
-        
-        # AI audio may have more uniform chroma distribution
-        chroma_uniformity = np.std(chroma_mean)  # Lower std = more uniform = more suspicious
-        chroma_suspicion = max(0, 1.0 - (chroma_uniformity / 0.1))  # Threshold at 0.1
-        
-        # ===== 8. SPECTRAL CONTRAST ANALYSIS =====
-        # Measures difference in amplitude between frequency bands
-        spectral_contrast = librosa.feature.spectral_contrast(y=y, sr=sr, hop_length=hop_length)
-        contrast_mean = np.mean(spectral_contrast)
-        contrast_std = np.std(spectral_contrast)
-        
-        # AI audio may have unnatural contrast patterns
-        # Very low or very high contrast can be suspicious
-        contrast_suspicion = 0.0
-        if contrast_mean < 5.0 or contrast_mean > 20.0:
-            contrast_suspicion = 0.5
-        if contrast_std < 2.0:  # Too consistent
-            contrast_suspicion = max(contrast_suspicion, 0.3)
-        
-        # ===== 9. PITCH AND RHYTHM ANALYSIS =====
-        # Analyze pitch contours and rhythmic patterns
-        pitches, magnitudes = librosa.piptrack(y=y, sr=sr, hop_length=hop_length)
-        pitch_mean = np.mean(pitches[pitches > 0]) if np.any(pitches > 0) else 0
-        pitch_std = np.std(pitches[pitches > 0]) if np.any(pitches > 0) else 0
-        
-        # AI audio may have too-regular pitch patterns
-        pitch_regularity = 1.0 / (1.0 + pitch_std) if pitch_std > 0 else 1.0
-        pitch_suspicion = max(0, pitch_regularity - 0.5) * 2  # Scale to 0-1
-        
-        # Rhythm analysis: detect tempo and regularity
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr, hop_length=hop_length)
-        # Very regular tempo can be suspicious
-        tempo_suspicion = 0.0
-        if tempo > 0:
-            # Check if tempo is suspiciously round (e.g., exactly 120 BPM)
-            # Convert to float to avoid numpy scalar issues
-            tempo_float = float(tempo)
-            tempo_roundness = abs(tempo_float - round(tempo_float))
-            if tempo_roundness < 0.5:  # Very close to round number
-                tempo_suspicion = 0.2
-        
-        # ===== 10. SPECTRAL CENTROID AND BANDWIDTH ANALYSIS =====
-        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=hop_length)[0]
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr, hop_length=hop_length)[0]
-        
-        centroid_mean = np.mean(spectral_centroid)
-        centroid_std = np.std(spectral_centroid)
-        bandwidth_mean = np.mean(spectral_bandwidth)
-        bandwidth_std = np.std(spectral_bandwidth)
-        
-        # AI audio may have unnatural centroid/bandwidth patterns
-        # Very consistent values can be suspicious
-        centroid_suspicion = max(0, 1.0 - (centroid_std / 500.0))  # Threshold at 500 Hz
-        bandwidth_suspicion = max(0, 1.0 - (bandwidth_std / 1000.0))  # Threshold at 1000 Hz
-        
-        # ===== 11. COMBINED DETECTION SCORE (Enhanced) =====
-        # Weight different detection methods
-        energy_score = 1.0 if energy_ratio > 0.35 else (0.5 if energy_ratio > 0.25 else 0.0)
-        phase_score = 1.0 - phase_coherence_ratio  # Low coherence = removal attempt
-        normalization_score = normalization_suspicion
-        dithering_score = dithering_suspicion
-        filter_score = filter_artifact_suspicion
-        
-        # New feature scores
-        mfcc_score = mfcc_suspicion
-        chroma_score = chroma_suspicion
-        contrast_score = contrast_suspicion
-        pitch_score = pitch_suspicion + tempo_suspicion
-        spectral_score = (centroid_suspicion + bandwidth_suspicion) / 2
-        
-        # Combined suspicion score (0-1) - updated weights
-        combined_suspicion = (
-            energy_score * 0.25 +      # Energy ratio (reduced weight)
-            phase_score * 0.15 +        # Phase randomization
-            normalization_score * 0.10 +  # Spectral normalization
-            dithering_score * 0.10 +    # Dithering
-            filter_score * 0.08 +      # Filter artifacts
-            mfcc_score * 0.12 +         # MFCC patterns (NEW)
-            chroma_score * 0.08 +      # Chroma features (NEW)
-            contrast_score * 0.05 +    # Spectral contrast (NEW)
-            pitch_score * 0.05 +       # Pitch/rhythm (NEW)
-            spectral_score * 0.04      # Spectral centroid/bandwidth (NEW)
-        )
-        
-        # ===== 7. DETERMINE STATUS =====
-        # Enhanced status determination
-        # IMPROVED: Recognize clean zone (0.12-0.18) as "clean" even with some high frames
-        # This is our target range for files with suspicious energy that need fixing
-        
-        # Check if ratio is in clean zone (our target range)
-        # IMPROVED: Extended to 0.11-0.18 to account for slight variations
-        in_clean_zone = 0.11 <= energy_ratio <= 0.18
-        
-        if energy_ratio > 0.35:
-            # Very high ratio - definitely watermarked
-            status = "watermarked"
-        elif energy_ratio > 0.25 or (frames_watermark_elevated > 10 and not in_clean_zone):
-            # High ratio or many elevated frames (but not in clean zone)
+            detector, inputs = detectors[name]
+            for dep in inputs:
+                add(dep)
+            tasks.append(Task(name, partial(detector, ctx), inputs, keep=True))
+        added.add(name)
+
+    for group, _, _ in METRIC_GROUPS:
+        if groups is None or group in groups:
+            add(group)
+    for name in keep:
+        add(name)
+    return tasks
+
+
+def round_metrics(metrics):
+    """Round raw detector metrics the way they appear in the result."""
+    return {key: round(float(value), FIELD_DECIMALS[key]) for key, value in metrics.items()}
+
+
+def energy_status(metrics):
+    """
+    Status from the energy-ratio metrics alone (energyRatio, the elevated /
+    higher frame percentages and the mean / max frame ratio); also applied
+    to time ranges by timeline.py.
+    """
+    energy_ratio = metrics["energyRatio"]
+    frames_watermark_elevated = metrics["framesWatermarkElevatedPercent"]
+    frames_watermark_higher = metrics["framesWatermarkHigherPercent"]
+
+    # ===== 7. DETERMINE STATUS =====
+    # Enhanced status determination
+    # IMPROVED: Recognize clean zone (0.12-0.18) as "clean" even with some high frames
+    # This is our target range for files with suspicious energy that need fixing
+
+    # Check if ratio is in clean zone (our target range)
+    # IMPROVED: Extended to 0.11-0.18 to account for slight variations
+    in_clean_zone = 0.11 <= energy_ratio <= 0.18
+
+    if energy_ratio > 0.35:
+        # Very high ratio - definitely watermarked
+        status = "watermarked"
+    elif energy_ratio > 0.25 or (frames_watermark_elevated > 10 and not in_clean_zone):
+        # High ratio or many elevated frames (but not in clean zone)
+        status = "suspicious"
+    elif frames_watermark_higher > 15 and not in_clean_zone:
+        # Many high frames, but only if NOT in clean zone
+        # (In clean zone, some high frames are OK - we're fixing outliers)
+        status = "watermarked"
+    elif frames_watermark_higher > 18 and in_clean_zone:
+        # In clean zone, but too many high frames (>18%) - still suspicious
+        status = "suspicious"
+    elif in_clean_zone:
+        # Ratio in clean zone (0.12-0.18) - this is our target!
+        # Even if there are some high frames or normalization suspicion,
+        # this is considered "clean" because we're fixing suspicious energy
+        if metrics["maxFrameRatio"] > 10.0 or metrics["meanFrameRatio"] > 0.5:
+            # Still has significant outliers - might need more processing
             status = "suspicious"
-        elif frames_watermark_higher > 15 and not in_clean_zone:
-            # Many high frames, but only if NOT in clean zone
-            # (In clean zone, some high frames are OK - we're fixing outliers)
-            status = "watermarked"
-        elif frames_watermark_higher > 18 and in_clean_zone:
-            # In clean zone, but too many high frames (>18%) - still suspicious
+        elif frames_watermark_higher > 18:
+            # Too many high frames even in clean zone
             status = "suspicious"
-        elif in_clean_zone:
-            # Ratio in clean zone (0.12-0.18) - this is our target!
-            # Even if there are some high frames or normalization suspicion,
-            # this is considered "clean" because we're fixing suspicious energy
-            if max_frame_ratio > 10.0 or mean_frame_ratio > 0.5:
-                # Still has significant outliers - might need more processing
-                status = "suspicious"
-            elif frames_watermark_higher > 18:
-                # Too many high frames even in clean zone
-                status = "suspicious"
-            else:
-                # Clean zone achieved with reasonable frame distribution
-                # Allow up to 18% high frames (increased from 15%) when in clean zone
-                status = "clean"
-        elif combined_suspicion > 0.6 and energy_ratio < 0.12:
-            # High suspicion from removal techniques, and very low ratio
-            status = "possibly_cleaned"
-        elif energy_ratio < 0.12:
-            # Very low ratio suggests aggressive filtering
-            status = "possibly_cleaned"
-        elif 0.12 <= energy_ratio <= 0.18:
-            # This should be caught by in_clean_zone above, but fallback
-            status = "clean"
         else:
-            # Default to clean for ratios between 0.18 and 0.25
+            # Clean zone achieved with reasonable frame distribution
+            # Allow up to 18% high frames (increased from 15%) when in clean zone
             status = "clean"
-        
+    elif energy_ratio < 0.12:
+        # Very low ratio suggests aggressive filtering (whatever the combined suspicion)
+        status = "possibly_cleaned"
+    elif 0.12 <= energy_ratio <= 0.18:
+        # This should be caught by in_clean_zone above, but fallback
+        status = "clean"
+    else:
+        # Default to clean for ratios between 0.18 and 0.25
+        status = "clean"
+
+    return status
+
+
+def score(metrics):
+    """
+    Combine detector metrics into the suspicion score and status.
+
+    Returns:
+        (combined_suspicion, status)
+    """
+    energy_ratio = metrics["energyRatio"]
+
+    # ===== 11. COMBINED DETECTION SCORE (Enhanced) =====
+    # Weight different detection methods
+    energy_score = 1.0 if energy_ratio > 0.35 else (0.5 if energy_ratio > 0.25 else 0.0)
+    phase_score = 1.0 - metrics["phaseCoherenceRatio"]  # Low coherence = removal attempt
+    normalization_score = metrics["normalizationSuspicion"]
+    dithering_score = metrics["ditheringSuspicion"]
+    filter_score = metrics["filterArtifactSuspicion"]
+
+    # New feature scores
+    mfcc_score = metrics["mfccSuspicion"]
+    chroma_score = metrics["chromaSuspicion"]
+    contrast_score = metrics["spectralContrastSuspicion"]
+    pitch_score = metrics["pitchSuspicion"] + metrics["tempoSuspicion"]
+    spectral_score = (metrics["spectralCentroidSuspicion"] + metrics["spectralBandwidthSuspicion"]) / 2
+
+    # Combined suspicion score (0-1) - updated weights
+    combined_suspicion = (
+        energy_score * 0.25 +      # Energy ratio (reduced weight)
+        phase_score * 0.15 +        # Phase randomization
+        normalization_score * 0.10 +  # Spectral normalization
+        dithering_score * 0.10 +    # Dithering
+        filter_score * 0.08 +      # Filter artifacts
+        mfcc_score * 0.12 +         # MFCC patterns (NEW)
+        chroma_score * 0.08 +      # Chroma features (NEW)
+        contrast_score * 0.05 +    # Spectral contrast (NEW)
+        pitch_score * 0.05 +       # Pitch/rhythm (NEW)
+        spectral_score * 0.04      # Spectral centroid/bandwidth (NEW)
+    )
+
+    return combined_suspicion, energy_status(metrics)
+
+
+def render_spectrogram(ctx, magnitude, output_path, status, watermark_to_reference_ratio, combined_suspicion):
+    """Save the annotated spectrogram image."""
+    fig, ax = plt.subplots(figsize=(8, 4))
+
+    # Downsample for faster rendering
+    max_time_bins = 300
+    if magnitude.shape[1] > max_time_bins:
+        step = magnitude.shape[1] // max_time_bins
+        magnitude_display = magnitude[:, ::step]
+        hop_display = ctx.hop_length * step
+    else:
+        magnitude_display = magnitude
+        hop_display = ctx.hop_length
+
+    img = librosa.display.specshow(
+        librosa.amplitude_to_db(magnitude_display, ref=np.max),
+        y_axis='hz',
+        x_axis='time',
+        sr=ctx.sr,
+        hop_length=hop_display,
+        ax=ax,
+        cmap='viridis'
+    )
+
+    # Add frequency range markers
+    ax.axhline(y=WATERMARK_MIN, color='r', linestyle='--', linewidth=1.5, label='Watermark (18-22 kHz)')
+    ax.axhline(y=WATERMARK_MAX, color='r', linestyle='--', linewidth=1.5)
+    ax.axhline(y=REFERENCE_MIN, color='g', linestyle='--', linewidth=1.5, label='Reference (14-18 kHz)')
+    ax.axhline(y=REFERENCE_MAX, color='g', linestyle='--', linewidth=1.5)
+    ax.axhline(y=15500, color='orange', linestyle=':', linewidth=1, alpha=0.7, label='Filter cutoff (15.5 kHz)')
+    ax.axhline(y=17000, color='orange', linestyle=':', linewidth=1, alpha=0.7, label='Filter cutoff (17 kHz)')
+    ax.set_ylim([0, 24000])
+
+    # Enhanced status text
+    status_text = f"Status: {status.upper()}\nRatio: {watermark_to_reference_ratio:.3f}\nSuspicion: {combined_suspicion:.2f}"
+    ax.text(0.02, 0.98, status_text, transform=ax.transAxes,
+           verticalalignment='top', bbox=dict(boxstyle='round', facecolor='black', alpha=0.6, ec='none'),
+           fontsize=10, fontweight='bold', color='white')
+
+    # Colorbar
+    cbar = plt.colorbar(img, ax=ax, format='%+2.0f dB')
+    cbar.ax.yaxis.set_tick_params(color='white')
+    cbar.ax.yaxis.label.set_color('white')
+    plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
+
+    ax.set_title('Enhanced Audio Spectrogram - Watermark Analysis', fontsize=12, fontweight='bold', color='white')
+    ax.set_xlabel('Time', color='white')
+    ax.set_ylabel('Frequency (Hz)', color='white')
+    ax.tick_params(axis='x', colors='white')
+    ax.tick_params(axis='y', colors='white')
+    ax.spines['bottom'].set_color('white')
+    ax.spines['top'].set_color('white')
+    ax.spines['left'].set_color('white')
+    ax.spines['right'].set_color('white')
+
+    ax.legend(loc='upper right', fontsize=8, framealpha=0.7, facecolor='black', edgecolor='white', labelcolor='white')
+    plt.tight_layout()
+
+    with open_output(output_path) as f:
+        plt.savefig(f, format='png', dpi=60, bbox_inches='tight', facecolor='#1e293b')
+    plt.close(fig)
+
+
+def decimation_factor(sr):
+    """Largest power of two sr can be divided by without going below MIN_DECIMATED_RATE (or 1)."""
+    factor = 1
+    while sr % (2 * factor) == 0 and sr // (2 * factor) >= MIN_DECIMATED_RATE and N_FFT % (2 * factor) == 0:
+        factor *= 2
+    return factor
+
+
+def decimated_stft(y, factor):
+    """
+    STFT of a signal decimated by factor, on the input rate's grid: n_fft and
+    hop shrink with the rate (same bin spacing and frame times), and
+    magnitudes are scaled back to what the input-rate transform gives.
+    """
+    stft = librosa.stft(y, n_fft=N_FFT // factor, hop_length=HOP_LENGTH // factor)
+    stft *= factor
+    return stft
+
+
+def decimate_stream(blocks, sr, factor):
+    """Mono float32 blocks at sr -> one float32 array at sr / factor, filtered as they arrive."""
+    y = np.concatenate([out[:, 0].astype(np.float32)
+                        for out in resample_stream(blocks, sr, sr // factor, quality=DECIMATE_QUALITY, workers=1)])
+    y[np.abs(y) < DECIMATE_FLOOR] = 0
+    return y
+
+
+def open_input(input_path, log=print, meter=None, factor=1):
+    """
+    Open an input for analysis.
+
+    Uncompressed WAV/AIFF is memory-mapped (or wrapped in place, for shared
+    memory inputs) and transformed blockwise; a WAV on stdin is transformed
+    block by block as it arrives; anything else is decoded whole
+    (decode.py).
+
+    Args:
+        meter: Optional LoudnessMeter fed with the multichannel samples
+            while they are decoded (for PCM inputs: inside compute_stft)
+        factor: Decimation factor (decimation_factor() of the input rate);
+            the STFT is then decimated_stft(), analyzed with
+            AnalysisContext(sr, N_FFT // factor, HOP_LENGTH // factor)
+
+    Returns:
+        (sample_rate, duration_seconds, compute_stft) where compute_stft()
+        returns the analysis STFT and sample_rate is the analysis rate
+    """
+    wav = streamed_wav(input_path)
+    if wav is not None:
+        log(f"Streaming WAV from stdin ({wav.bits}-bit {wav.sample_format}, {wav.channels} ch)")
+
+        def blocks(block_frames):
+            if meter is not None:
+                meter.start(wav.samplerate, wav.channels)
+            for block in wav.blocks(block_frames):
+                if meter is not None:
+                    meter.process(block)
+                yield block
+
+        if factor > 1:
+            def compute_stft():
+                mono = (to_mono(block) for block in blocks(DECIMATE_BLOCK_FRAMES))
+                return decimated_stft(decimate_stream(mono, wav.samplerate, factor), factor)
+
+            log(f"Decimating {wav.samplerate} Hz to {wav.samplerate // factor} Hz for analysis")
+            return wav.samplerate // factor, wav.duration, compute_stft
+        return wav.samplerate, wav.duration, lambda: stft_stream(blocks(DECIMATE_BLOCK_FRAMES), wav.n_frames,
+                                                                 n_fft=N_FFT, hop_length=HOP_LENGTH)
+    pcm = open_input_pcm(input_path)
+    if pcm is not None:
+        log(f"Memory-mapped {pcm.container.upper()} input ({pcm.bits}-bit {pcm.sample_format}, {pcm.channels} ch)")
+        duration = pcm.n_frames / pcm.samplerate
+        if factor > 1:
+            def mono_blocks():
+                if meter is not None:
+                    meter.start(pcm.samplerate, pcm.channels)
+                for _, block in pcm.iter_blocks(DECIMATE_BLOCK_FRAMES, mono=meter is None):
+                    if meter is not None:
+                        meter.process(block)
+                        block = to_mono(block)
+                    yield block
+
+            def compute_stft():
+                return decimated_stft(decimate_stream(mono_blocks(), pcm.samplerate, factor), factor)
+
+            log(f"Decimating {pcm.samplerate} Hz to {pcm.samplerate // factor} Hz for analysis")
+            return pcm.samplerate // factor, duration, compute_stft
+        if meter is None:
+            compute_stft = partial(pcm_stft, pcm, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        else:
+            def compute_stft():
+                meter.start(pcm.samplerate, pcm.channels)
+                return pcm_stft(pcm, n_fft=N_FFT, hop_length=HOP_LENGTH, on_block=meter.process)
+        return pcm.samplerate, duration, compute_stft
+    y, sr = decode(input_path, mono=meter is None)
+    if meter is not None:
+        meter.start(sr, y.shape[1])
+        for start in range(0, len(y), 1 << 16):
+            meter.process(y[start:start + (1 << 16)])
+        y = to_mono(y)
+    duration = len(y) / sr
+    if factor > 1:
+        log(f"Decimating {sr} Hz to {sr // factor} Hz for analysis")
+        y = decimate_stream((y[start:start + DECIMATE_BLOCK_FRAMES] for start in range(0, len(y), DECIMATE_BLOCK_FRAMES)),
+                            sr, factor)
+        return sr // factor, duration, partial(decimated_stft, y, factor)
+    return sr, duration, partial(librosa.stft, y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+
+
+def analyze_fingerprint(input_path, output_path=None, skip_image=False, timings=False, stream=False, workers=None,
+                        reference_index=None, genre=None, hash_index=None, low_memory=False, timeline_seconds=None,
+                        decimate=False):
+    """
+    Enhanced analysis of audio file for AI watermarks.
+
+    Args:
+        input_path: Path to input audio file
+        output_path: Optional path for spectrogram image
+        skip_image: If True, skip image generation
+        timings: If True, add per-stage wall time/memory to the result
+        stream: If True, print a JSON Lines record per metric group as it
+            completes, then the final result record (logs go to stderr)
+        workers: Threads for running independent detectors (default: CPUs)
+        reference_index: Optional reference index directory to compare against
+            (adds reference* fields, see reference_index.py)
+        genre: Preferred genre of the reference tracks
+        hash_index: Optional perceptual hash index directory; a near-duplicate
+            of an indexed track returns that track's cached result, anything
+            else is analyzed and added (see perceptual_hash.py)
+        low_memory: Run the detectors one at a time with frame-sliced
+            features (same results, a fraction of the peak memory; chosen
+            by admission.py and planner.py for jobs too large for the
+            memory budget)
+        timeline_seconds: If set, add the energy timeline in windows of this
+            many seconds (timeline* fields, see timeline.py; not for hash
+            index matches)
+        decimate: Analyze 88.2-192 kHz inputs decimated by a power of two
+            (adds analysisSampleRate; the factor comes from the probed
+            rate, so inputs the probe cannot read keep their own rate, and
+            is taken when planner.py costs it cheaper than the input rate)
+    """
+    timer = StageTimer(enabled=timings)
+    started = time.perf_counter()
+    # In stream mode stdout carries only JSON Lines records
+    log_file = sys.stderr if stream else sys.stdout
+
+    def log(message):
+        print(message, file=log_file, flush=True)
+
+    def emit(record):
+        print(json.dumps(record), flush=True)
+
+    try:
+        with timer.stage('plan'):
+            try:
+                info = probe(input_path)
+            except (OSError, ValueError):
+                # Unreadable header: the decode path reports the problem
+                info = None
+            execution_plan = plan('analyze_fingerprint', info, low_memory=low_memory,
+                                  decimation=decimation_factor(info["sampleRate"]) if decimate else 1) if info else None
+            if execution_plan:
+                low_memory = execution_plan["lowMemory"]
+        # Flat fields: the analyze route picks the result out of stdout with a flat-object regex
+        plan_fields = {"plan": execution_plan["strategy"], "planReason": execution_plan["reason"]} if execution_plan else {}
+
+        with timer.stage('decode'):
+            # Load audio file
+            log(f"Loading audio: {input_path}")
+            meter = LoudnessMeter()
+            factor = execution_plan["decimation"] if execution_plan else 1
+            with timed_decode(info["codec"] if info else None):
+                sr, duration, compute_stft = open_input(input_path, log, meter=meter, factor=factor)
+            # The input's own rate; sr is the analysis rate
+            input_sr = sr * factor
+            nyquist_freq = input_sr / 2
+            if factor > 1:
+                plan_fields["analysisSampleRate"] = int(sr)
+
+            log(f"Sample rate: {input_sr} Hz, Duration: {duration:.2f}s, Nyquist: {nyquist_freq:.1f} Hz")
+
+        if stream:
+            emit({
+                "type": "info",
+                "sampleRate": int(input_sr),
+                "duration": round(float(duration), 2),
+                "nyquistFreq": round(float(nyquist_freq), 1),
+                **plan_fields,
+            })
+
+        ctx = AnalysisContext(sr, n_fft=N_FFT // factor, hop_length=HOP_LENGTH // factor,
+                              frame_chunk=LOW_MEMORY_FRAME_CHUNK if low_memory else None)
+        if low_memory:
+            # Concurrent detectors would each hold their own temporaries
+            workers = 1
+        render = not skip_image and output_path
+
+        hashes = None
+        if hash_index:
+            with timer.stage('hash_lookup'):
+                first = run_graph(build_tasks(ctx, compute_stft, groups=(), keep=("stft", "fingerprint")), workers=workers)
+                hashes = first["fingerprint"]
+                try:
+                    match = HashIndex(hash_index).lookup(hashes)
+                except Exception as e:
+                    print(f"Warning: Hash index lookup failed: {e}", file=sys.stderr, flush=True)
+                    match = None
+                cache_lookup('hash_index', hit=bool(match and match["result"]))
+            # The detectors reuse this STFT; popping leaves the graph the only reference
+            compute_stft = partial(first.pop, "stft")
+
+            if match and match["result"]:
+                log(f"Perceptual hash match: {match['id']} (bit error rate {match['bitErrorRate']})")
+                result = dict(match["result"])
+                result.update({
+                    "sampleRate": int(input_sr),
+                    "duration": round(float(duration), 2),
+                    "nyquistFreq": round(float(nyquist_freq), 1),
+                    "cached": True,
+                    "hashMatch": match["id"],
+                    "hashBitErrorRate": match["bitErrorRate"],
+                    "hashOffsetSeconds": match["offsetSeconds"],
+                })
+                # Measured from this upload's samples while fingerprinting
+                result.update(meter.result())
+                result.update(plan_fields)
+                with timer.stage('render'):
+                    if render:
+                        try:
+                            render_spectrogram(ctx, np.abs(compute_stft()), output_path, result["status"],
+                                               result["watermarkToReferenceRatio"], result["combinedSuspicion"])
+                        except Exception as e:
+                            print(f"Warning: Could not generate spectrogram: {e}", file=sys.stderr, flush=True)
+                if timings:
+                    result["timings"] = timer.as_dict()
+                emit({"type": "final", **result} if stream else result)
+                return result
+
+        keep = ("magnitude",) if render else ()
+        if reference_index:
+            keep += ("band_energy",)
+        if timeline_seconds:
+            keep += ("band_curves",)
+        tasks = build_tasks(ctx, compute_stft, keep=keep)
+        groups = {group for group, _, _ in METRIC_GROUPS}
+
+        def on_done(name, value, seconds):
+            timer.record(name, seconds)
+            if stream and name in groups:
+                emit({
+                    "type": "partial",
+                    "group": name,
+                    "metrics": round_metrics(value),
+                    "elapsedSeconds": round(time.perf_counter() - started, 3),
+                })
+
+        with timer.stage('detectors'):
+            outputs = run_graph(tasks, workers=workers, on_done=on_done)
+
+        with timer.stage('loudness'):
+            loudness = meter.result()
+        if stream:
+            emit({
+                "type": "partial",
+                "group": "loudness",
+                "metrics": loudness,
+                "elapsedSeconds": round(time.perf_counter() - started, 3),
+            })
+
+        metrics = {}
+        for group, _, _ in METRIC_GROUPS:
+            metrics.update(outputs[group])
+
+        with timer.stage('scoring'):
+            combined_suspicion, status = score(metrics)
+            metrics["combinedSuspicion"] = combined_suspicion
+
         # Prepare result
         result = {
-            "sampleRate": int(sr),
+            "sampleRate": int(input_sr),
             "duration": round(float(duration), 2),
             "nyquistFreq": round(float(nyquist_freq), 1),
-            # Energy metrics
-            "watermarkEnergy": round(float(watermark_energy), 6),
-            "energyRatio": round(float(energy_ratio), 4),
-            "meanFrameRatio": round(float(mean_frame_ratio), 4),
-            "medianFrameRatio": round(float(median_frame_ratio), 4),
-            "maxFrameRatio": round(float(max_frame_ratio), 4),
-            "watermarkToReferenceRatio": round(float(watermark_to_reference_ratio), 4),
-            "medianWatermarkToReference": round(float(median_watermark_to_reference), 4),
-            "framesWatermarkHigherPercent": round(float(frames_watermark_higher), 2),
-            "framesWatermarkElevatedPercent": round(float(frames_watermark_elevated), 2),
-            "framesAboveVeryLowPercent": round(float(frames_above_very_low), 2),
-            "framesAboveBaselinePercent": round(float(frames_above_baseline), 2),
-            "suspiciousFramesPercent": round(float(suspicious_frames), 2),
-            # Enhanced detection metrics
-            "phaseCoherence": round(float(phase_coherence), 4),
-            "phaseCoherenceRatio": round(float(phase_coherence_ratio), 4),
-            "normalizationSuspicion": round(float(normalization_suspicion), 4),
-            "ditheringSuspicion": round(float(dithering_suspicion), 4),
-            "filterArtifactSuspicion": round(float(filter_artifact_suspicion), 4),
-            # New feature metrics (matching external analyzers)
-            "mfccSuspicion": round(float(mfcc_suspicion), 4),
-            "chromaSuspicion": round(float(chroma_suspicion), 4),
-            "spectralContrastSuspicion": round(float(contrast_suspicion), 4),
-            "pitchSuspicion": round(float(pitch_suspicion), 4),
-            "tempoSuspicion": round(float(tempo_suspicion), 4),
-            "spectralCentroidSuspicion": round(float(centroid_suspicion), 4),
-            "spectralBandwidthSuspicion": round(float(bandwidth_suspicion), 4),
-            "combinedSuspicion": round(float(combined_suspicion), 4),
-            "status": status
         }
-        
-        # Generate spectrogram if requested
-        if not skip_image and output_path:
-            try:
-                print(f"Generating spectrogram: {output_path}", flush=True)
-                fig, ax = plt.subplots(figsize=(8, 4))
-                
-                # Downsample for faster rendering
-                max_time_bins = 300
-                if magnitude.shape[1] > max_time_bins:
-                    step = magnitude.shape[1] // max_time_bins
-                    magnitude_display = magnitude[:, ::step]
-                    hop_display = hop_length * step
-                else:
-                    magnitude_display = magnitude
-                    hop_display = hop_length
-                
-                img = librosa.display.specshow(
-                    librosa.amplitude_to_db(magnitude_display, ref=np.max),
-                    y_axis='hz',
-                    x_axis='time',
-                    sr=sr,
-                    hop_length=hop_display,
-                    ax=ax,
-                    cmap='viridis'
-                )
-                
-                # Add frequency range markers
-                ax.axhline(y=watermark_min, color='r', linestyle='--', linewidth=1.5, label='Watermark (18-22 kHz)')
-                ax.axhline(y=watermark_max, color='r', linestyle='--', linewidth=1.5)
-                ax.axhline(y=reference_min, color='g', linestyle='--', linewidth=1.5, label='Reference (14-18 kHz)')
-                ax.axhline(y=reference_max, color='g', linestyle='--', linewidth=1.5)
-                ax.axhline(y=15500, color='orange', linestyle=':', linewidth=1, alpha=0.7, label='Filter cutoff (15.5 kHz)')
-                ax.axhline(y=17000, color='orange', linestyle=':', linewidth=1, alpha=0.7, label='Filter cutoff (17 kHz)')
-                ax.set_ylim([0, 24000])
-                
-                # Enhanced status text
-                status_text = f"Status: {status.upper()}\nRatio: {watermark_to_reference_ratio:.3f}\nSuspicion: {combined_suspicion:.2f}"
-                ax.text(0.02, 0.98, status_text, transform=ax.transAxes, 
-                       verticalalignment='top', bbox=dict(boxstyle='round', facecolor='black', alpha=0.6, ec='none'),
-                       fontsize=10, fontweight='bold', color='white')
-                
-                # Colorbar
-                cbar = plt.colorbar(img, ax=ax, format='%+2.0f dB')
-                cbar.ax.yaxis.set_tick_params(color='white')
-                cbar.ax.yaxis.label.set_color('white')
-                plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
-                
-                ax.set_title('Enhanced Audio Spectrogram - Watermark Analysis', fontsize=12, fontweight='bold', color='white')
-                ax.set_xlabel('Time', color='white')
-                ax.set_ylabel('Frequency (Hz)', color='white')
-                ax.tick_params(axis='x', colors='white')
-                ax.tick_params(axis='y', colors='white')
-                ax.spines['bottom'].set_color('white')
-                ax.spines['top'].set_color('white')
-                ax.spines['left'].set_color('white')
-                ax.spines['right'].set_color('white')
-                
-                ax.legend(loc='upper right', fontsize=8, framealpha=0.7, facecolor='black', edgecolor='white', labelcolor='white')
-                plt.tight_layout()
-                
-                plt.savefig(output_path, dpi=60, bbox_inches='tight', facecolor='#1e293b')
-                plt.close(fig)
-                print(f"Spectrogram saved: {output_path}", flush=True)
-            except Exception as e:
-                print(f"Warning: Could not generate spectrogram: {e}", file=sys.stderr, flush=True)
-        
+        result.update(round_metrics({key: metrics[key] for key, _ in RESULT_FIELDS}))
+        result.update(loudness)
+        result["status"] = status
+        result.update(plan_fields)
+
+        if timeline_seconds:
+            with timer.stage('timeline'):
+                # Frame times are those of the input rate's grid
+                timeline = analyzer_timeline(outputs.pop("band_curves"), input_sr).serialize(timeline_seconds)
+            result.update(timeline)
+            if stream:
+                emit({
+                    "type": "partial",
+                    "group": "timeline",
+                    "metrics": timeline,
+                    "elapsedSeconds": round(time.perf_counter() - started, 3),
+                })
+
+        if reference_index:
+            with timer.stage('reference'):
+                index = ReferenceIndex.load(reference_index)
+                result.update(index.compare(outputs["band_energy"], metrics, input_sr, genre))
+
+        if hashes is not None:
+            with timer.stage('hash_store'):
+                try:
+                    track_id = os.path.splitext(os.path.basename(input_path))[0]
+                    HashIndex(hash_index).add(track_id, hashes, dict(result), sampleRate=int(input_sr),
+                                              duration=round(float(duration), 2))
+                except Exception as e:
+                    print(f"Warning: Could not add track to hash index: {e}", file=sys.stderr, flush=True)
+            result["cached"] = False
+
+        with timer.stage('render'):
+            # Generate spectrogram if requested
+            if render:
+                try:
+                    log(f"Generating spectrogram: {output_path}")
+                    render_spectrogram(ctx, outputs["magnitude"], output_path, status,
+                                       metrics["watermarkToReferenceRatio"], combined_suspicion)
+                    log(f"Spectrogram saved: {output_path}")
+                except Exception as e:
+                    print(f"Warning: Could not generate spectrogram: {e}", file=sys.stderr, flush=True)
+
+        if timings:
+            result["timings"] = timer.as_dict()
+
         # Print JSON result
-        print(json.dumps(result), flush=True)
+        if stream:
+            emit({"type": "final", **result})
+        else:
+            emit(result)
         return result
-        
+
     except Exception as e:
         error_msg = f"Analysis error: {str(e)}"
         print(error_msg, file=sys.stderr)
         result = {"success": False, "error": error_msg}
-        print(json.dumps(result))
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
+        emit({"type": "error", **result} if stream else result)
         return result
 
+
+# ============================================================================
+# COMPARE
+# ============================================================================
+COMPARE_SIDES = ("original", "processed")
+# What the before/after energy view shows
+COMPARE_DEFAULT_GROUPS = ("energy_ratio",)
+# Time bins the band-energy difference is averaged into
+COMPARE_CURVE_POINTS = 400
+
+
+def compare_groups(groups=None):
+    """Requested group names in METRIC_GROUPS order (None or 'all' = every group)."""
+    known = [group for group, _, _ in METRIC_GROUPS]
+    if groups is None or groups == 'all':
+        return tuple(known)
+    if isinstance(groups, str):
+        groups = [group.strip() for group in groups.split(',') if group.strip()]
+    unknown = sorted(set(groups) - set(known))
+    if unknown or not groups:
+        raise ValueError(f"Unknown metric group(s): {', '.join(unknown) or 'none given'} (known: {', '.join(known)})")
+    return tuple(group for group in known if group in groups)
+
+
+def align_curves(original, original_sr, processed, processed_sr, hop_length=HOP_LENGTH):
+    """
+    Put two band_curves() results on the original's frame times: frames
+    match one to one at equal sample rates, otherwise the processed curves
+    are interpolated. Only the time both inputs cover is kept.
+
+    Returns:
+        (original, processed, frame_seconds)
+    """
+    if original_sr == processed_sr:
+        n = min(original.shape[1], processed.shape[1])
+        return original[:, :n], processed[:, :n], hop_length / original_sr
+    times = librosa.frames_to_time(np.arange(original.shape[1]), sr=original_sr, hop_length=hop_length)
+    processed_times = librosa.frames_to_time(np.arange(processed.shape[1]), sr=processed_sr, hop_length=hop_length)
+    n = int(np.searchsorted(times, processed_times[-1], side='right')) if len(processed_times) else 0
+    resampled = np.vstack([np.interp(times[:n], processed_times, row) for row in processed])
+    return original[:, :n], resampled, hop_length / original_sr
+
+
+def band_energy_diff(original, processed, frame_seconds, points=COMPARE_CURVE_POINTS):
+    """
+    Frame-aligned band-energy curves averaged into at most `points` equal
+    time bins: the processed - original difference per band (dB) and the
+    watermark/reference ratio of each input.
+    """
+    frames = original.shape[1]
+    if frames == 0:
+        return {"binSeconds": 0.0, "frames": 0, "watermarkDeltaDb": [], "referenceDeltaDb": [],
+                "originalRatio": [], "processedRatio": []}
+    points = min(points, frames)
+    edges = np.linspace(0, frames, points + 1).astype(int)
+    counts = np.diff(edges)
+    original = np.add.reduceat(original, edges[:-1], axis=1) / counts
+    processed = np.add.reduceat(processed, edges[:-1], axis=1) / counts
+    delta_db = 20 * np.log10((processed + 1e-10) / (original + 1e-10))
+
+    def ratio(curves):
+        return np.divide(curves[0], curves[1], out=np.zeros(points), where=curves[1] > 0)
+
+    return {
+        "binSeconds": round(frames * frame_seconds / points, 4),
+        "frames": int(frames),
+        "watermarkDeltaDb": np.round(delta_db[0], 2).tolist(),
+        "referenceDeltaDb": np.round(delta_db[1], 2).tolist(),
+        "originalRatio": np.round(ratio(original), 4).tolist(),
+        "processedRatio": np.round(ratio(processed), 4).tolist(),
+    }
+
+
+def compare_fingerprints(original_path, processed_path, groups=COMPARE_DEFAULT_GROUPS, workers=None, timings=False,
+                         low_memory=False):
+    """
+    Analyze two inputs in one pass and compare them.
+
+    Both inputs are decoded concurrently and their task graphs run as one,
+    so the two STFTs and the requested detectors share the worker threads.
+    Groups another group depends on run as well but are not reported.
+
+    Args:
+        original_path, processed_path: Inputs (path, "-" or "shm:<name>")
+        groups: Metric group names, a comma-separated string, or None/'all'
+        workers: Threads for the combined task graph (default: CPUs)
+        timings: If True, add per-stage wall time/memory to the result
+        low_memory: Frame-sliced detectors, one at a time (see analyze_fingerprint)
+
+    Returns:
+        dict with groups, original / processed (sampleRate, duration and the
+        rounded metrics of the groups; with every group also
+        combinedSuspicion and status), deltas (processed - original) and
+        bandEnergyDiff (see band_energy_diff)
+    """
+    timer = StageTimer(enabled=timings)
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    try:
+        groups = compare_groups(groups)
+
+        with timer.stage('decode'):
+            with ThreadPoolExecutor(max_workers=len(COMPARE_SIDES)) as pool:
+                opened = list(pool.map(partial(open_input, log=log), (original_path, processed_path)))
+
+        tasks = []
+        for side, (sr, _, compute_stft) in zip(COMPARE_SIDES, opened):
+            ctx = AnalysisContext(sr, frame_chunk=LOW_MEMORY_FRAME_CHUNK if low_memory else None)
+            tasks += prefix_tasks(build_tasks(ctx, compute_stft, groups=groups, keep=("band_curves",)), f"{side}_")
+
+        with timer.stage('detectors'):
+            outputs = run_graph(tasks, workers=1 if low_memory else workers,
+                                on_done=lambda name, value, seconds: timer.record(name, seconds))
+
+        result = {"success": True, "groups": list(groups)}
+        raw = {}
+        for side, (sr, duration, _) in zip(COMPARE_SIDES, opened):
+            metrics = {}
+            for group in groups:
+                metrics.update(outputs[f"{side}_{group}"])
+            if len(groups) == len(METRIC_GROUPS):
+                metrics["combinedSuspicion"], status = score(metrics)
+            raw[side] = metrics
+            result[side] = {"sampleRate": int(sr), "duration": round(float(duration), 2), **round_metrics(metrics)}
+            if len(groups) == len(METRIC_GROUPS):
+                result[side]["status"] = status
+
+        result["deltas"] = {
+            key: round(float(raw["processed"][key]) - float(raw["original"][key]), FIELD_DECIMALS[key])
+            for key in raw["original"]
+        }
+
+        with timer.stage('band_energy_diff'):
+            (original_sr, _, _), (processed_sr, _, _) = opened
+            original, processed, frame_seconds = align_curves(
+                outputs["original_band_curves"], original_sr, outputs["processed_band_curves"], processed_sr)
+            result["bandEnergyDiff"] = band_energy_diff(original, processed, frame_seconds)
+
+        if timings:
+            result["timings"] = timer.as_dict()
+        print(json.dumps(result), flush=True)
+        return result
+
+    except Exception as e:
+        error_msg = f"Comparison error: {str(e)}"
+        print(error_msg, file=sys.stderr)
+        result = {"success": False, "error": error_msg}
+        if timings:
+            result["timings"] = timer.as_dict()
+        print(json.dumps(result), flush=True)
+        return result
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+def _per_detector_features(y, sr, hop_length=HOP_LENGTH):
+    """The librosa feature calls as they were before the shared STFT (each recomputes it)."""
+    librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, hop_length=hop_length)
+    librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop_length)
+    librosa.feature.spectral_contrast(y=y, sr=sr, hop_length=hop_length)
+    librosa.piptrack(y=y, sr=sr, hop_length=hop_length)
+    librosa.beat.beat_track(y=y, sr=sr, hop_length=hop_length)
+    librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=hop_length)
+    librosa.feature.spectral_bandwidth(y=y, sr=sr, hop_length=hop_length)
+
+
+def benchmark(input_path, worker_counts=None):
+    """
+    Time the detector stage: one STFT per librosa feature (the old
+    sequential path) against the shared-intermediate graph at several
+    thread counts.
+    """
+    y, sr = librosa.load(input_path, sr=None)
+    ctx = AnalysisContext(sr)
+    stft = librosa.stft(y, n_fft=ctx.n_fft, hop_length=ctx.hop_length)
+    cpus = available_cpus()
+    if worker_counts is None:
+        worker_counts = sorted({1, 2, 4, cpus})
+
+    # Warm up librosa's numba kernels so the first method isn't charged for JIT
+    _per_detector_features(y[:sr * 2], sr)
+    warm = librosa.stft(y[:sr * 2], n_fft=ctx.n_fft, hop_length=ctx.hop_length)
+    run_graph(build_tasks(ctx, lambda: warm), workers=1)
+
+    results = []
+    start = time.perf_counter()
+    _per_detector_features(y, sr)
+    results.append({"method": "per-detector STFT, sequential", "seconds": round(time.perf_counter() - start, 3)})
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        run_graph(build_tasks(ctx, lambda: stft), workers=workers)
+        results.append({"method": f"shared graph, {workers} worker(s)", "seconds": round(time.perf_counter() - start, 3)})
+
+    for entry in results:
+        entry["speedup"] = round(results[0]["seconds"] / entry["seconds"], 2) if entry["seconds"] else None
+        print(f"{entry['method']:35s} {entry['seconds']:8.3f}s  {entry['speedup']}x", file=sys.stderr, flush=True)
+    return {"cpus": cpus, "duration": round(len(y) / sr, 2), "results": results}
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({"success": False, "error": "Usage: analyze_fingerprint.py <input> [output_image] [--json]"}))
+    args, timings, profile_path = parse_profiling_args(sys.argv[1:])
+    # FFT backend for every STFT in this process (see fft_backend.py)
+    configure_fft()
+    if args and args[0] == '--benchmark':
+        if len(args) < 2:
+            print("Usage: analyze_fingerprint.py --benchmark <input> [workers ...]", file=sys.stderr)
+            sys.exit(1)
+        counts = [int(a) for a in args[2:]] or None
+        print(json.dumps({"success": True, "benchmark": benchmark(args[1], counts)}))
+        sys.exit(0)
+
+    workers = None
+    if '--workers' in args:
+        idx = args.index('--workers')
+        try:
+            workers = int(args[idx + 1])
+        except (IndexError, ValueError):
+            print(json.dumps({"success": False, "error": "--workers requires an integer"}))
+            sys.exit(1)
+        del args[idx:idx + 2]
+
+    if args and args[0] == '--compare':
+        groups = COMPARE_DEFAULT_GROUPS
+        if '--groups' in args:
+            idx = args.index('--groups')
+            groups = args[idx + 1] if idx + 1 < len(args) else ''
+            del args[idx:idx + 2]
+        low_memory = '--low-memory' in args
+        inputs = [arg for arg in args[1:] if arg != '--low-memory']
+        if len(inputs) != 2:
+            print(json.dumps({"success": False, "error": "Usage: analyze_fingerprint.py --compare <original> <processed> [--groups g1,g2|all] [--workers N] [--low-memory] [--timings] [--profile <file.prof>]"}))
+            sys.exit(1)
+        # Both inputs are held at once: one job, one estimate covering both (see admission.py)
+        admission = admit_or_exit('analyze_fingerprint', inputs)
+        low_memory = low_memory or admission.low_memory
+        result = run_with_profile(profile_path, compare_fingerprints, inputs[0], inputs[1], groups, workers, timings,
+                                  low_memory)
+        sys.exit(0 if "error" not in result else 1)
+
+    timeline_seconds = None
+    if '--timeline' in args:
+        idx = args.index('--timeline')
+        del args[idx]
+        timeline_seconds = DEFAULT_WINDOW_SECONDS
+        if idx < len(args):
+            try:
+                timeline_seconds = float(args[idx])
+                del args[idx]
+            except ValueError:
+                pass
+        if timeline_seconds <= 0:
+            print(json.dumps({"success": False, "error": "--timeline window must be positive"}))
+            sys.exit(1)
+
+    reference_index = None
+    genre = None
+    hash_index = None
+    for flag in ('--reference-index', '--genre', '--hash-index'):
+        if flag in args:
+            idx = args.index(flag)
+            if idx + 1 >= len(args):
+                print(json.dumps({"success": False, "error": f"{flag} requires a value"}))
+                sys.exit(1)
+            if flag == '--genre':
+                genre = args[idx + 1]
+            elif flag == '--hash-index':
+                hash_index = args[idx + 1]
+            else:
+                reference_index = args[idx + 1]
+            del args[idx:idx + 2]
+
+    if len(args) < 1:
+        print(json.dumps({"success": False, "error": "Usage: analyze_fingerprint.py <input|-|shm:name> [output_image|-] [--json] [--stream] [--workers N] [--reference-index <dir> [--genre G]] [--hash-index <dir>] [--timeline [seconds]] [--decimate] [--low-memory] [--timings] [--profile <file.prof>]"}))
         sys.exit(1)
-    
-    input_path = sys.argv[1]
-    
-    has_json_flag = '--json' in sys.argv
-    
+
+    input_path = args[0]
+
+    has_json_flag = '--json' in args
+    stream = '--stream' in args
+    low_memory = '--low-memory' in args
+    decimate = '--decimate' in args
+
     output_path = None
-    for arg in sys.argv[2:]:
-        if arg != '--json' and not arg.startswith('-'):
+    for arg in args[1:]:
+        if arg not in ('--json', '--stream', '--low-memory', '--decimate') and (arg == '-' or not arg.startswith('-')):
             output_path = arg
             break
-    
+    claim_stdout(output_path)
+
     skip_image = (output_path is None)
-    
-    result = analyze_fingerprint(input_path, output_path, skip_image)
+
+    # Wait for room in the memory budget; oversized jobs get the low-memory path (see admission.py)
+    admission = admit_or_exit('analyze_fingerprint', input_path, output_path)
+    low_memory = low_memory or admission.low_memory
+
+    result = run_with_profile(profile_path, analyze_fingerprint, input_path, output_path, skip_image, timings, stream, workers,
+                             reference_index, genre, hash_index, low_memory, timeline_seconds, decimate)
     sys.exit(0 if "error" not in result else 1)
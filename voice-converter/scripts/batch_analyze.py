@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Batch Analysis of Audio Archives
+Runs analyze_fingerprint.py on every audio member of a ZIP or TAR archive
+without extracting it to disk:
+- Members are read from the archive as streams (ZIP stored/deflated, TAR
+  plain/gz/bz2/xz; a TAR piped on stdin is read front to back) into
+  shared memory blocks, which the analyzer opens as "shm:<name>" inputs
+- A process pool analyzes several members at once; each job still goes
+  through admission control, so the pool shares the server's memory budget
+- At most two members per worker are held in memory at any time
+- One JSON Lines record per member, keyed by its name in the archive, in
+  the order the analyses finish
+
+Usage:
+    python batch_analyze.py <archive.zip|archive.tar[.gz]|-> [report.jsonl|-] [--workers N] [--low-memory]
+
+The report defaults to stdout ("-"); the summary result is then printed to
+stderr.
+"""
+
+import os
+import sys
+import json
+import time
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory, resource_tracker
+from scheduler import available_cpus
+from stdio_io import SHM_PREFIX, is_stdio, claim_stdout, open_output
+
+AUDIO_EXTENSIONS = ('.wav', '.wave', '.rf64', '.aif', '.aiff', '.aifc', '.flac', '.mp3', '.ogg', '.oga',
+                    '.opus', '.m4a', '.aac')
+# Members read ahead of the pool, per worker
+PENDING_PER_WORKER = 2
+READ_CHUNK = 1 << 20
+
+
+# ============================================================================
+# ARCHIVE MEMBERS
+# ============================================================================
+
+def _is_audio_member(name):
+    base = os.path.basename(name)
+    # Resource forks and Finder metadata that macOS adds to ZIPs
+    if not base or base.startswith('._') or name.startswith('__MACOSX/'):
+        return False
+    return os.path.splitext(base)[1].lower() in AUDIO_EXTENSIONS
+
+
+def _open_stdin_archive():
+    stream = sys.stdin.buffer
+    if stream.peek(4)[:4] == b'PK\x03\x04':
+        # The ZIP directory is at the end of the file, so it has to be buffered
+        import io
+        return zipfile.ZipFile(io.BytesIO(stream.read()))
+    return tarfile.open(fileobj=stream, mode='r|*')
+
+
+def open_archive(archive_path):
+    """ZipFile or TarFile for a path or "-" (stdin)."""
+    if is_stdio(archive_path):
+        return _open_stdin_archive()
+    if not os.path.exists(archive_path):
+        raise FileNotFoundError(f"Archive not found: {archive_path}")
+    if zipfile.is_zipfile(archive_path):
+        return zipfile.ZipFile(archive_path)
+    if tarfile.is_tarfile(archive_path):
+        return tarfile.open(archive_path, mode='r:*')
+    raise ValueError(f"Not a ZIP or TAR archive: {archive_path}")
+
+
+def iter_members(archive):
+    """
+    Yield (name, size, stream) for every audio member, in archive order.
+    A stream is only valid until the next member is requested.
+    """
+    if isinstance(archive, zipfile.ZipFile):
+        for info in archive.infolist():
+            if not info.is_dir() and _is_audio_member(info.filename):
+                with archive.open(info) as stream:
+                    yield info.filename, info.file_size, stream
+    else:
+        for member in archive:
+            if member.isfile() and _is_audio_member(member.name):
+                yield member.name, member.size, archive.extractfile(member)
+
+
+def stream_to_shared_memory(stream, size):
+    """
+    Copy a member stream into a new shared memory block.
+
+    Returns:
+        (spec, SharedMemory) - the caller closes and unlinks the block
+    """
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        offset = 0
+        while offset < size:
+            read = stream.readinto(shm.buf[offset:min(size, offset + READ_CHUNK)])
+            if not read:
+                raise ValueError(f"Member truncated after {offset} of {size} bytes")
+            offset += read
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return SHM_PREFIX + shm.name, shm
+
+
+def _release(shm):
+    shm.close()
+    # Pool workers share this process's resource tracker, and attaching a block
+    # there (before Python 3.13) ends with unregistering it: register it again
+    # so unlink() does not find it missing
+    resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+def _init_worker(fft_workers):
+    # The analyzer prints progress and its result to stdout, which may be the report
+    sys.stdout = open(os.devnull, 'w')
+    from fft_backend import configure_fft
+    configure_fft(workers=fft_workers)
+
+
+def _analyze_member(name, spec, low_memory):
+    from analyze_fingerprint import analyze_fingerprint
+    from admission import admit
+    from stdio_io import detach_shared_memory
+    import metrics
+
+    started = time.perf_counter()
+    try:
+        with admit('analyze_fingerprint', spec) as admission:
+            result = analyze_fingerprint(spec, skip_image=True, workers=1,
+                                         low_memory=low_memory or admission.low_memory)
+    except TimeoutError as e:
+        result = {"success": False, "error": str(e)}
+    finally:
+        detach_shared_memory(spec)
+        # Pool workers exit without running atexit handlers
+        metrics.flush()
+    return {"member": name, "success": "error" not in result, **result,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+# ============================================================================
+# BATCH
+# ============================================================================
+
+def batch_analyze(archive_path, report_path='-', workers=None, low_memory=False):
+    """
+    Analyze every audio member of an archive.
+
+    Args:
+        archive_path: ZIP or TAR archive path, or "-" (stdin)
+        report_path: JSON Lines report path, or "-" (stdout)
+        workers: Analyzer processes (default: CPUs available)
+        low_memory: Use the analyzer's low-memory path for every member
+
+    Returns:
+        dict with success, member counts and wall time
+    """
+    workers = max(1, workers or available_cpus())
+    # Cores are split between the processes rather than oversubscribed by every FFT
+    fft_workers = max(1, available_cpus() // workers)
+    started = time.perf_counter()
+    counts = {"members": 0, "analyzed": 0, "failed": 0}
+
+    try:
+        archive = open_archive(archive_path)
+    except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+        return {"success": False, "error": str(e)}
+
+    claim_stdout(report_path)
+    pending = {}
+
+    def write(report, record):
+        report.write((json.dumps(record) + '\n').encode())
+        report.flush()
+        counts["analyzed" if record["success"] else "failed"] += 1
+        print(f"[{counts['analyzed'] + counts['failed']}/{counts['members']}] {record['member']}: "
+              f"{'ok' if record['success'] else record['error']}", file=sys.stderr, flush=True)
+
+    def collect(report, block):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED) if block else (
+            [future for future in pending if future.done()], None)
+        for future in done:
+            name, shm = pending.pop(future)
+            _release(shm)
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"member": name, "success": False, "error": f"Analysis failed: {e}"}
+            write(report, record)
+
+    try:
+        with archive, open_output(report_path) as report, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fft_workers,)) as pool:
+            for name, size, stream in iter_members(archive):
+                counts["members"] += 1
+                if size == 0:
+                    write(report, {"member": name, "success": False, "error": "Empty member"})
+                    continue
+                while len(pending) >= workers * PENDING_PER_WORKER:
+                    collect(report, block=True)
+                try:
+                    spec, shm = stream_to_shared_memory(stream, size)
+                except (OSError, ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+                    write(report, {"member": name, "success": False, "error": f"Cannot read member: {e}"})
+                    continue
+                pending[pool.submit(_analyze_member, name, spec, low_memory)] = (name, shm)
+                collect(report, block=False)
+            while pending:
+                collect(report, block=True)
+    except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+        return {"success": False, "error": f"Archive read failed: {e}", **counts}
+    except BrokenProcessPool as e:
+        return {"success": False, "error": f"Analyzer process died: {e}", **counts}
+    finally:
+        for name, shm in pending.values():
+            _release(shm)
+
+    return {
+        "success": True,
+        "archive": archive_path,
+        "report": report_path,
+        **counts,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    workers = None
+    if '--workers' in args:
+        idx = args.index('--workers')
+        try:
+            workers = int(args[idx + 1])
+        except (IndexError, ValueError):
+            print(json.dumps({"success": False, "error": "--workers requires an integer"}))
+            sys.exit(1)
+        del args[idx:idx + 2]
+    low_memory = '--low-memory' in args
+    args = [arg for arg in args if arg != '--low-memory']
+
+    if not args:
+        print(json.dumps({"success": False, "error": "Usage: batch_analyze.py <archive|-> [report.jsonl|-] [--workers N] [--low-memory]"}))
+        sys.exit(1)
+
+    result = batch_analyze(args[0], args[1] if len(args) > 1 else '-', workers, low_memory)
+    print(json.dumps(result))
+    sys.exit(0 if result["success"] else 1)
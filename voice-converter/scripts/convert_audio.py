@@ -2,56 +2,208 @@
 """
 Audio Conversion Script
 Converts audio files between WAV and MP3 formats with optional sample rate and bit depth conversion.
+Multi-target mode (--targets) decodes once and writes several outputs concurrently.
+Single-target input and output may be "-" for stdin/stdout (see stdio_io.py).
 """
 
+import os
 import sys
 import json
-from pydub import AudioSegment
+from concurrent.futures import ThreadPoolExecutor
 from pydub.utils import which
+from profiling import StageTimer, run_with_profile, parse_profiling_args
+from scratch import get_scratch
+from admission import admit_or_exit
+from stdio_io import (load_segment, export_segment, claim_stdout, open_output, open_input_pcm, run_ffmpeg,
+                      streamed_wav, write_wav_stream)
+from pcm_mmap import write_wav_slice
+from planner import probe_and_plan
+from pcm_writer import write_segment, SAMPLE_BITS, SEGMENT_DTYPES
+from resample import resample_segment, DEFAULT_QUALITY, QUALITY_PRESETS
 
-def convert_audio(input_path, output_path, output_format, sample_rate=None, bit_depth=None, bitrate='320k'):
+SUPPORTED_FORMATS = ('wav', 'mp3')
+
+def export_audio(audio, output_path, output_format, bit_depth=None, bitrate='320k'):
+    """
+    Export an AudioSegment as WAV (optionally with bit depth) or MP3.
+    
+    Args:
+        audio: pydub AudioSegment
+        output_path: Path to output audio file ("-" for stdout)
+        output_format: 'wav' or 'mp3'
+        bit_depth: Optional bit depth for WAV (16, 24 or 32)
+        bitrate: Bitrate for MP3
+    """
+    if output_format.lower() == 'mp3':
+        print(f"Exporting as MP3 with bitrate: {bitrate}")
+        export_segment(audio, output_path, "mp3", bitrate=bitrate)
+    elif output_format.lower() == 'wav':
+        # For WAV, we can specify bit depth
+        if bit_depth:
+            print(f"Exporting as WAV with {bit_depth}-bit depth")
+            if int(bit_depth) in SAMPLE_BITS and audio.sample_width in SEGMENT_DTYPES:
+                # Packed in-process (TPDF dither when the bit depth shrinks)
+                with open_output(output_path) as f:
+                    write_segment(f, audio, int(bit_depth))
+            else:
+                export_segment(audio, output_path, "wav", parameters=["-acodec", "pcm_s" + str(bit_depth) + "le"])
+        else:
+            print("Exporting as WAV")
+            export_segment(audio, output_path, "wav")
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+def copy_stream(input_path, output_path, output_format):
+    """
+    Write the input's samples unchanged: PCM is copied from the memory map
+    into a fresh WAV (or as it arrives on stdin), compressed streams are
+    passed through ffmpeg without re-encoding. Metadata is dropped, as the
+    pydub re-encode does.
+    """
+    wav = streamed_wav(input_path)
+    if output_format == 'wav' and wav is not None:
+        with open_output(output_path) as f:
+            write_wav_stream(wav, f, 0, wav.n_frames)
+    elif output_format == 'wav':
+        pcm = open_input_pcm(input_path)
+        with open_output(output_path) as f:
+            write_wav_slice(pcm, f, 0, pcm.n_frames)
+    else:
+        run_ffmpeg(input_path, output_path, output_format, output_options=['-vn', '-c:a', 'copy', '-map_metadata', '-1'])
+
+def convert_audio(input_path, output_path, output_format, sample_rate=None, bit_depth=None, bitrate='320k', timings=False, quality=DEFAULT_QUALITY):
     """
     Convert audio file to specified format.
     
     Args:
-        input_path: Path to input audio file
-        output_path: Path to output audio file
+        input_path: Path to input audio file ("-" for stdin, "shm:<name>" for shared memory)
+        output_path: Path to output audio file ("-" for stdout)
         output_format: 'wav' or 'mp3'
         sample_rate: Optional sample rate (e.g., 44100, 48000, 96000)
         bit_depth: Optional bit depth for WAV (16 or 24)
         bitrate: Bitrate for MP3 (default: '320k')
+        timings: If True, add per-stage wall time/memory to the result
+        quality: Resampling quality preset ('quick', 'high', 'very-high')
     """
+    timer = StageTimer(enabled=timings)
     try:
         # Check if ffmpeg is available
         if not which("ffmpeg"):
             return {"success": False, "error": "ffmpeg not found. Please install ffmpeg."}
         
-        # Load audio file
-        print(f"Loading audio from: {input_path}")
-        audio = AudioSegment.from_file(input_path)
+        if output_format.lower() not in SUPPORTED_FORMATS:
+            return {"success": False, "error": f"Unsupported output format: {output_format}"}
         
-        # Apply sample rate conversion if specified
-        if sample_rate:
-            print(f"Converting sample rate to: {sample_rate} Hz")
-            audio = audio.set_frame_rate(int(sample_rate))
+        with timer.stage('plan'):
+            _, execution_plan = probe_and_plan('convert_audio', input_path, output_format=output_format.lower(),
+                                               sample_rate=sample_rate, bit_depth=bit_depth, bitrate=bitrate)
         
-        # Convert to specified format
-        if output_format.lower() == 'mp3':
-            print(f"Exporting as MP3 with bitrate: {bitrate}")
-            audio.export(output_path, format="mp3", bitrate=bitrate)
-        elif output_format.lower() == 'wav':
-            # For WAV, we can specify bit depth
-            if bit_depth:
-                print(f"Exporting as WAV with {bit_depth}-bit depth")
-                audio.export(output_path, format="wav", parameters=["-acodec", "pcm_s" + str(bit_depth) + "le"])
-            else:
-                print("Exporting as WAV")
-                audio.export(output_path, format="wav")
+        if execution_plan and execution_plan["strategy"] == 'stream-copy':
+            # The output would hold the same samples in the same codec
+            with timer.stage('export'):
+                print(f"Copying without re-encoding: {execution_plan['reason']}")
+                copy_stream(input_path, output_path, output_format.lower())
         else:
-            return {"success": False, "error": f"Unsupported output format: {output_format}"}
+            # Load audio file
+            with timer.stage('decode'):
+                print(f"Loading audio from: {input_path}")
+                audio = load_segment(input_path)
+            
+            # Apply sample rate conversion if specified
+            if sample_rate:
+                with timer.stage('resample'):
+                    print(f"Converting sample rate to: {sample_rate} Hz (quality: {quality})")
+                    audio = resample_segment(audio, int(sample_rate), quality)
+            
+            # Convert to specified format
+            with timer.stage('export'):
+                export_audio(audio, output_path, output_format, bit_depth, bitrate)
         
         print(f"Conversion successful: {output_path}")
         result = {"success": True, "output_path": output_path}
+        if execution_plan:
+            result["plan"] = execution_plan["strategy"]
+            result["plan_reason"] = execution_plan["reason"]
+        if timings:
+            result["timings"] = timer.as_dict()
+        print(json.dumps(result))
+        return result
+        
+    except Exception as e:
+        error_msg = f"Conversion error: {str(e)}"
+        print(error_msg, file=sys.stderr)
+        result = {"success": False, "error": error_msg}
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
+        print(json.dumps(result))
+        return result
+
+def convert_audio_multi(input_path, targets, quality=DEFAULT_QUALITY, timings=False):
+    """
+    Convert one input to several outputs with a single decode.
+    
+    Targets that share a sample rate share one resampled intermediate, and
+    the encoders (ffmpeg subprocesses via pydub) run concurrently.
+    
+    Args:
+        input_path: Path to input audio file
+        targets: List of dicts with output_path, format and optional
+                 sample_rate, bit_depth, bitrate (default '320k')
+        quality: Resampling quality preset ('quick', 'high', 'very-high')
+        timings: If True, add per-stage wall time/memory to the result
+    """
+    timer = StageTimer(enabled=timings)
+    try:
+        if not which("ffmpeg"):
+            return {"success": False, "error": "ffmpeg not found. Please install ffmpeg."}
+        if not targets:
+            return {"success": False, "error": "No output targets given"}
+        for target in targets:
+            if 'output_path' not in target or str(target.get('format', '')).lower() not in SUPPORTED_FORMATS:
+                return {"success": False, "error": f"Invalid target (needs output_path and format wav/mp3): {target}"}
+        
+        with timer.stage('decode'):
+            print(f"Loading audio from: {input_path}")
+            audio = load_segment(input_path)
+        
+        # One resampled intermediate per distinct rate (None = keep source rate)
+        intermediates = {None: audio}
+        with timer.stage('resample'):
+            for rate in sorted({int(t['sample_rate']) for t in targets if t.get('sample_rate')}):
+                print(f"Converting sample rate to: {rate} Hz (quality: {quality})")
+                intermediates[rate] = resample_segment(audio, rate, quality)
+        
+        def run_target(target):
+            rate = int(target['sample_rate']) if target.get('sample_rate') else None
+            entry = {
+                "output_path": target['output_path'],
+                "format": target['format'].lower(),
+                "sample_rate": rate or audio.frame_rate,
+                "bit_depth": target.get('bit_depth'),
+                "bitrate": target.get('bitrate', '320k') if target['format'].lower() == 'mp3' else None,
+            }
+            try:
+                export_audio(intermediates[rate], target['output_path'], target['format'],
+                             target.get('bit_depth'), target.get('bitrate', '320k'))
+                entry["success"] = True
+            except Exception as e:
+                entry["success"] = False
+                entry["error"] = f"Conversion error: {str(e)}"
+            return entry
+        
+        with timer.stage('export'):
+            workers = min(len(targets), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                outputs = list(pool.map(run_target, targets))
+        
+        failed = [o for o in outputs if not o["success"]]
+        print(f"Multi-target conversion finished: {len(outputs) - len(failed)}/{len(outputs)} outputs written")
+        result = {"success": not failed, "outputs": outputs}
+        if failed:
+            result["error"] = f"{len(failed)} of {len(outputs)} outputs failed"
+        if timings:
+            result["timings"] = timer.as_dict()
         print(json.dumps(result))
         return result
         
@@ -59,17 +211,60 @@ def convert_audio(input_path, output_path, output_format, sample_rate=None, bit_
         error_msg = f"Conversion error: {str(e)}"
         print(error_msg, file=sys.stderr)
         result = {"success": False, "error": error_msg}
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
         print(json.dumps(result))
         return result
 
+def load_targets(spec):
+    """Parse --targets: inline JSON list or path to a JSON file."""
+    if spec.lstrip().startswith('['):
+        return json.loads(spec)
+    with open(spec) as f:
+        return json.load(f)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 4:
-        print(json.dumps({"success": False, "error": "Usage: convert_audio.py <input> <output> <format> [sample_rate] [bit_depth] [bitrate]"}))
+    args, timings, profile_path = parse_profiling_args(sys.argv[1:])
+    # Library temporaries (pydub's export files) go into this job's scratch space
+    get_scratch()
+    
+    # Resampling quality: --quality <quick|high|very-high>
+    quality = DEFAULT_QUALITY
+    if '--quality' in args:
+        idx = args.index('--quality')
+        quality = args[idx + 1] if idx + 1 < len(args) else DEFAULT_QUALITY
+        del args[idx:idx + 2]
+    if quality not in QUALITY_PRESETS:
+        print(json.dumps({"success": False, "error": f"Unknown quality '{quality}' (use {', '.join(QUALITY_PRESETS)})"}))
+        sys.exit(1)
+    if args:
+        # Wait for room in the memory budget (see admission.py)
+        admit_or_exit('convert_audio', args[0], args[1] if len(args) > 1 else None)
+    
+    # Multi-target mode: convert_audio.py <input> --targets '<json list>' | <targets.json>
+    if '--targets' in args:
+        idx = args.index('--targets')
+        if idx + 1 >= len(args) or idx == 0:
+            print(json.dumps({"success": False, "error": "Usage: convert_audio.py <input> --targets <json|file.json> [--quality <preset>]"}))
+            sys.exit(1)
+        try:
+            targets = load_targets(args[idx + 1])
+        except (OSError, ValueError) as e:
+            print(json.dumps({"success": False, "error": f"Could not read targets: {e}"}))
+            sys.exit(1)
+        result = run_with_profile(profile_path, convert_audio_multi, args[0], targets, quality, timings)
+        sys.exit(0 if result.get("success") else 1)
+    
+    if len(args) < 3:
+        print(json.dumps({"success": False, "error": "Usage: convert_audio.py <input> <output> <format> [sample_rate] [bit_depth] [bitrate] [--quality <preset>] [--timings] [--profile <file.prof>]"}))
         sys.exit(1)
     
-    input_path = sys.argv[1]
-    output_path = sys.argv[2]
-    output_format = sys.argv[3]
+    input_path = args[0]
+    output_path = args[1]
+    output_format = args[2]
+    # With "-" as output the audio goes to stdout and the JSON result to stderr
+    claim_stdout(output_path)
     
     # Parse optional arguments intelligently
     # API sends: [script, input, output, format, sampleRate?, bitDepth?, bitrate]
@@ -78,8 +273,8 @@ if __name__ == "__main__":
     bit_depth = None
     bitrate = '320k'
     
-    # Check remaining arguments (starting from index 4)
-    remaining_args = sys.argv[4:] if len(sys.argv) > 4 else []
+    # Check remaining arguments (after input, output and format)
+    remaining_args = args[3:]
     
     for arg in remaining_args:
         # Check if it's a number (sample_rate or bit_depth)
@@ -104,6 +299,6 @@ if __name__ == "__main__":
                 # Default to bitrate
                 bitrate = arg
     
-    result = convert_audio(input_path, output_path, output_format, sample_rate, bit_depth, bitrate)
+    result = run_with_profile(profile_path, convert_audio, input_path, output_path, output_format, sample_rate, bit_depth, bitrate, timings, quality)
     sys.exit(0 if result.get("success") else 1)
 
@@ -2,37 +2,60 @@
 """
 MP3 Conversion Script (Optimization)
 Quickly converts audio to MP3 for faster processing of large files.
+Input and output may be "-" for stdin/stdout (see stdio_io.py).
 """
 
 import sys
 import json
-from pydub import AudioSegment
 from pydub.utils import which
+from profiling import StageTimer, run_with_profile, parse_profiling_args
+from scratch import get_scratch
+from admission import admit_or_exit
+from stdio_io import load_segment, export_segment, claim_stdout, run_ffmpeg
+from planner import probe_and_plan
 
-def convert_to_mp3(input_path, output_path, bitrate='320k'):
+def convert_to_mp3(input_path, output_path, bitrate='320k', timings=False):
     """
     Convert audio file to MP3 format.
     
     Args:
-        input_path: Path to input audio file
-        output_path: Path to output MP3 file
+        input_path: Path to input audio file ("-" for stdin)
+        output_path: Path to output MP3 file ("-" for stdout)
         bitrate: MP3 bitrate (default: '320k')
+        timings: If True, add per-stage wall time/memory to the result
     """
+    timer = StageTimer(enabled=timings)
     try:
         # Check if ffmpeg is available
         if not which("ffmpeg"):
             return {"success": False, "error": "ffmpeg not found. Please install ffmpeg."}
         
-        # Load audio file
-        print(f"Converting to MP3: {input_path}")
-        audio = AudioSegment.from_file(input_path)
+        with timer.stage('plan'):
+            _, execution_plan = probe_and_plan('convert_to_mp3', input_path, bitrate=bitrate)
         
-        # Export as MP3
-        print(f"Exporting as MP3 with bitrate: {bitrate}")
-        audio.export(output_path, format="mp3", bitrate=bitrate)
+        if execution_plan and execution_plan["strategy"] == 'stream-copy':
+            # Already MP3 at this bitrate: re-encoding would only lose quality
+            with timer.stage('export'):
+                print(f"Copying without re-encoding: {execution_plan['reason']}")
+                run_ffmpeg(input_path, output_path, 'mp3', output_options=['-vn', '-c:a', 'copy', '-map_metadata', '-1'])
+        else:
+            # Load audio file
+            with timer.stage('decode'):
+                print(f"Converting to MP3: {input_path}")
+                audio = load_segment(input_path)
+            
+            # Export as MP3
+            with timer.stage('export'):
+                print(f"Exporting as MP3 with bitrate: {bitrate}")
+                export_segment(audio, output_path, "mp3", bitrate=bitrate)
         
         print(f"MP3 conversion successful: {output_path}")
         result = {"success": True, "output_path": output_path}
+        if execution_plan:
+            result["plan"] = execution_plan["strategy"]
+            result["plan_reason"] = execution_plan["reason"]
+        if timings:
+            result["timings"] = timer.as_dict()
         print(json.dumps(result))
         return result
         
@@ -40,18 +63,27 @@ def convert_to_mp3(input_path, output_path, bitrate='320k'):
         error_msg = f"MP3 conversion error: {str(e)}"
         print(error_msg, file=sys.stderr)
         result = {"success": False, "error": error_msg}
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
         print(json.dumps(result))
         return result
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print(json.dumps({"success": False, "error": "Usage: convert_to_mp3.py <input> <output> [bitrate]"}))
+    args, timings, profile_path = parse_profiling_args(sys.argv[1:])
+    # Library temporaries (pydub's export files) go into this job's scratch space
+    get_scratch()
+    if len(args) < 2:
+        print(json.dumps({"success": False, "error": "Usage: convert_to_mp3.py <input|-> <output|-> [bitrate] [--timings] [--profile <file.prof>]"}))
         sys.exit(1)
     
-    input_path = sys.argv[1]
-    output_path = sys.argv[2]
-    bitrate = sys.argv[3] if len(sys.argv) > 3 else '320k'
+    input_path = args[0]
+    output_path = args[1]
+    claim_stdout(output_path)
+    bitrate = args[2] if len(args) > 2 else '320k'
+    # Wait for room in the memory budget (see admission.py)
+    admit_or_exit('convert_to_mp3', input_path, output_path)
     
-    result = convert_to_mp3(input_path, output_path, bitrate)
+    result = run_with_profile(profile_path, convert_to_mp3, input_path, output_path, bitrate, timings)
     sys.exit(0 if result.get("success") else 1)
 
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Shared Audio Decoder
+One decode path for every script, replacing librosa's audioread fallback
+(ffmpeg output parsed in Python) and pydub's decode through a temporary WAV:
+- Uncompressed WAV/RF64/AIFF: the memory map (pcm_mmap.py), no decoder;
+  a WAV on stdin is converted block by block as it arrives
+- Anything libsndfile opens (FLAC, Ogg Vorbis/Opus, MP3, ...): libsndfile,
+  read straight into numpy arrays
+- Everything else (AAC/M4A, ...): one ffmpeg process per input, streaming
+  raw little-endian samples (float32, or int16/int32) through a pipe for
+  as long as the decoder is open, read into preallocated buffers (stdin
+  and shared memory images are spooled to scratch first, see scratch.py)
+- Block iterator (Decoder.blocks) and whole-file (decode) APIs, both
+  giving (n, channels) arrays; decode(mono=True) mixes down the way
+  librosa.load does
+- decode_segment() builds pydub AudioSegments from integer samples, for
+  the scripts that edit and export with pydub
+
+The backend picked for an input is the one probe.py reports as "decoder".
+
+Usage as a script times every backend against librosa.load and pydub per
+codec:
+    python decode.py --benchmark <input> [input ...]
+"""
+
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+import soundfile as sf
+from stdio_io import open_input_pcm, decoder_source, input_buffer, streamed_wav
+
+BLOCK_FRAMES = 1 << 16
+# numpy dtype -> ffmpeg raw sample format
+FFMPEG_FORMATS = {'float32': 'f32le', 'int16': 's16le', 'int32': 's32le'}
+
+
+class Decoder:
+    """
+    Streaming decoder for one input.
+
+    Args:
+        spec: Path, "-" (stdin) or "shm:<name>"
+        dtype: 'float32' (range [-1, 1)), 'int16' or 'int32' (full scale)
+        info: Optional probe.probe() result, saves probing ffmpeg inputs again
+
+    Attributes:
+        backend: 'mmap', 'stream' (WAV on stdin), 'libsndfile' or 'ffmpeg'
+        samplerate, channels
+        frames: Frame count from the header (None if unknown; for ffmpeg
+            inputs an estimate from the duration)
+    """
+
+    def __init__(self, spec, dtype='float32', info=None):
+        if dtype not in FFMPEG_FORMATS:
+            raise ValueError(f"Unsupported sample type: {dtype}")
+        self.spec = spec
+        self.dtype = np.dtype(dtype)
+        self._file = None
+        self._process = None
+        self._spool = None
+
+        wav = streamed_wav(spec) if dtype == 'float32' else None
+        if wav is not None:
+            self.backend = 'stream'
+            self._wav = wav
+            self.samplerate, self.channels, self.frames = wav.samplerate, wav.channels, wav.n_frames
+            return
+        pcm = open_input_pcm(spec) if dtype == 'float32' else None
+        if pcm is not None:
+            self.backend = 'mmap'
+            self._pcm = pcm
+            self.samplerate, self.channels, self.frames = pcm.samplerate, pcm.channels, int(pcm.n_frames)
+            return
+        try:
+            self._file = sf.SoundFile(decoder_source(spec))
+            self.backend = 'libsndfile'
+            self.samplerate, self.channels, self.frames = self._file.samplerate, self._file.channels, self._file.frames
+            return
+        except (RuntimeError, sf.LibsndfileError):
+            pass
+
+        if info is None or info.get("decoder") != 'ffmpeg':
+            from probe import probe
+            info = probe(spec)
+        self.backend = 'ffmpeg'
+        self.samplerate, self.channels = int(info["sampleRate"]), int(info["channels"])
+        self.frames = int(info["frames"]) or None
+
+    # ------------------------------------------------------------------
+    # ffmpeg pipe
+    # ------------------------------------------------------------------
+
+    def _start_ffmpeg(self):
+        source = self.spec
+        buffer = input_buffer(self.spec)
+        if buffer is not None:
+            # Spooled to scratch rather than piped in: MP4/M4A keeps its index at
+            # the end of the file, which ffmpeg cannot reach on a pipe
+            from scratch import scratch_file
+            self._spool = scratch_file(size_hint=len(buffer))
+            source = self._spool.__enter__()
+            with open(source, 'wb') as f:
+                f.write(buffer)
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', source, '-map', '0:a:0', '-vn',
+                   '-f', FFMPEG_FORMATS[self.dtype.name], '-ac', str(self.channels), '-ar', str(self.samplerate),
+                   'pipe:1']
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+    def _readinto(self, view):
+        """Fill a byte view from the pipe; returns the bytes read (short only at the end)."""
+        filled = 0
+        while filled < len(view):
+            read = self._process.stdout.readinto(view[filled:])
+            if not read:
+                break
+            filled += read
+        return filled
+
+    def _release_spool(self):
+        spool, self._spool = self._spool, None
+        if spool is not None:
+            spool.__exit__(None, None, None)
+
+    def _finish_ffmpeg(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        process.stdout.close()
+        error = process.stderr.read().decode(errors='replace').strip()
+        process.stderr.close()
+        self._release_spool()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg decode failed: {error or f'exit code {process.returncode}'}")
+
+    def _ffmpeg_blocks(self, block_frames):
+        self._start_ffmpeg()
+        frame_bytes = self.channels * self.dtype.itemsize
+        try:
+            while True:
+                block = np.empty((block_frames, self.channels), dtype=self.dtype)
+                filled = self._readinto(memoryview(block).cast('B'))
+                if filled:
+                    yield block[:filled // frame_bytes]
+                if filled < block.nbytes:
+                    break
+        except BaseException:
+            # Abandoned part way (or failed): stop ffmpeg rather than drain it
+            self.close()
+            raise
+        self._finish_ffmpeg()
+
+    def _ffmpeg_read(self):
+        """The whole stream into one array, preallocated from the estimated length."""
+        self._start_ffmpeg()
+        frame_bytes = self.channels * self.dtype.itemsize
+        out = np.empty(((self.frames or self.samplerate * 60) + BLOCK_FRAMES, self.channels), dtype=self.dtype)
+        filled = 0
+        while True:
+            view = memoryview(out).cast('B')
+            read = self._readinto(view[filled:])
+            filled += read
+            if filled < len(view):
+                break
+            # The duration in the header was short: grow by half
+            grown = np.empty((len(out) + len(out) // 2, self.channels), dtype=self.dtype)
+            grown[:len(out)] = out
+            out = grown
+        self._finish_ffmpeg()
+        return out[:filled // frame_bytes]
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def blocks(self, block_frames=BLOCK_FRAMES):
+        """Yield consecutive (n, channels) blocks of up to block_frames frames."""
+        if self.backend == 'mmap':
+            for _, block in self._pcm.iter_blocks(block_frames):
+                yield block
+        elif self.backend == 'stream':
+            yield from self._wav.blocks(block_frames)
+        elif self.backend == 'libsndfile':
+            self._file.seek(0)
+            yield from self._file.blocks(block_frames, dtype=self.dtype.name, always_2d=True)
+        else:
+            yield from self._ffmpeg_blocks(block_frames)
+
+    def read(self):
+        """The whole input as one (n, channels) array."""
+        if self.backend == 'mmap':
+            from pcm_mmap import load_float
+            return load_float(self._pcm, mono=False)
+        if self.backend == 'stream':
+            out = np.empty((self.frames, self.channels), dtype=np.float32)
+            filled = 0
+            for block in self._wav.blocks():
+                out[filled:filled + len(block)] = block
+                filled += len(block)
+            if filled < self.frames:
+                raise ValueError(f"Input ended after {filled} of {self.frames} frames")
+            return out
+        if self.backend == 'libsndfile':
+            self._file.seek(0)
+            return self._file.read(dtype=self.dtype.name, always_2d=True)
+        return self._ffmpeg_read()
+
+    def close(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process.stderr.close()
+            self._process = None
+        self._release_spool()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def to_mono(y):
+    """(n, channels) -> (n,) channel average, as librosa.to_mono."""
+    return y[:, 0] if y.shape[1] == 1 else np.mean(y, axis=1, dtype=np.float32)
+
+
+def decode(spec, mono=False, dtype='float32', info=None):
+    """
+    Decode a whole input.
+
+    Args:
+        spec: Path, "-" (stdin) or "shm:<name>"
+        mono: Mix down to (n,) by averaging the channels (as librosa.load);
+            float32 only
+        dtype: 'float32', 'int16' or 'int32'
+        info: Optional probe.probe() result
+
+    Returns:
+        (samples, sample_rate) - samples are (n, channels), or (n,) if mono
+    """
+    if mono and dtype != 'float32':
+        raise ValueError("Mono mixdown is float32 only")
+    with Decoder(spec, dtype, info) as decoder:
+        if mono and decoder.backend == 'mmap':
+            from pcm_mmap import load_float
+            return load_float(decoder._pcm, mono=True), decoder.samplerate
+        y = decoder.read()
+    return (to_mono(y) if mono else y), decoder.samplerate
+
+
+def decode_segment(spec, info=None):
+    """
+    A pydub AudioSegment of the input, decoded here instead of by pydub's
+    ffmpeg round trip through a temporary WAV. Like pydub, sources of up
+    to 16 bits (and lossy codecs) give 16-bit samples, deeper ones 32-bit.
+    """
+    from pydub import AudioSegment
+    from probe import probe
+
+    info = info or probe(spec)
+    y, sr = decode(spec, dtype='int16' if (info["bitDepth"] or 16) <= 16 else 'int32', info=info)
+    return AudioSegment(data=y.tobytes(), sample_width=y.dtype.itemsize, frame_rate=sr, channels=y.shape[1])
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def _timed(func):
+    start = time.perf_counter()
+    try:
+        func()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    return time.perf_counter() - start, None
+
+
+def benchmark(paths):
+    """
+    Whole-file decode throughput of this module against librosa.load and
+    pydub's AudioSegment.from_file, per input (and so per codec).
+    """
+    import warnings
+    import librosa
+    from pydub import AudioSegment
+    from probe import probe
+
+    # Untimed pass: imports and first-call setup are not charged to the first input
+    for method in (decode, lambda path: librosa.load(path, sr=None, mono=False)):
+        try:
+            method(paths[0])
+        except Exception:
+            pass
+
+    results = []
+    for path in paths:
+        info = probe(path)
+        audio_seconds = info["duration"]
+        with Decoder(path) as decoder:
+            backend = decoder.backend
+        candidates = [
+            (f"decode.py ({backend}, float32)", lambda: decode(path)),
+            ("decode.py AudioSegment", lambda: decode_segment(path, info)),
+            ("librosa.load", lambda: librosa.load(path, sr=None, mono=False)),
+            ("pydub AudioSegment.from_file", lambda: AudioSegment.from_file(path)),
+        ]
+        for method, func in candidates:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                seconds, error = _timed(func)
+            entry = {"input": path, "codec": info["codec"], "method": method}
+            if error:
+                entry["error"] = error
+            else:
+                entry.update({"seconds": round(seconds, 3), "realtime": round(audio_seconds / seconds, 1)})
+            results.append(entry)
+            print(f"{info['codec']:10s} {method:36s} " +
+                  (f"{entry['seconds']:8.3f}s {entry['realtime']:8.1f}x realtime" if not error else error),
+                  file=sys.stderr, flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] != '--benchmark':
+        print(json.dumps({"success": False, "error": "Usage: decode.py --benchmark <input> [input ...]"}))
+        sys.exit(1)
+    print(json.dumps({"success": True, "benchmark": benchmark(args[1:])}))
@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+"""
+Numerical Equivalence Harness
+Checks that the analyzer's execution modes give the reference results,
+so a faster mode can be enabled in production with confidence:
+- The reference (reference_analysis) is the analyzer as it was before the
+  optimizations: librosa.load, and every feature computed on its own from
+  y with plain librosa calls (each recomputing its STFT), frame ratios in
+  a per-frame loop. It shares none of the shared-STFT task graph, the
+  vectorized detectors or the memory-mapped input with what it checks
+  (inputs libsndfile cannot open are decoded at float precision, see
+  _reference_load)
+- Every mode runs on the same inputs: the default path (one worker),
+  thread pool, low-memory, stream, timeline, hash index, shared memory
+  input, decoded instead of memory-mapped input, decimated high-rate input
+- Inputs are a synthetic corpus (written fresh, seeded: clean, suspicious,
+  watermarked and filtered band balances, a silent gap, a clip shorter
+  than a second, a clip spanning more than two low-memory slices, stereo,
+  and 96/192 kHz masters with ultrasonic content)
+  and any fixture directories given on the command line
+- The index modes run each input against an empty hash index (a miss)
+  and against an index already holding it (the cached result)
+- Every field of the reference result is compared within a declared
+  tolerance (TOLERANCES); fields a mode adds (timeline, hash match) are
+  not compared; the decimate mode is held to the band metrics
+  (DECIMATED_FIELDS)
+- A changed status is reported as a status flip, separately from the
+  numeric mismatches; the exit status is 1 if there is either
+
+Usage:
+    python equivalence_harness.py [fixture_dir ...] [--modes m1,m2] [--no-synthetic]
+
+The report (JSON) goes to stdout, a summary table to stderr.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import tempfile
+import contextlib
+import numpy as np
+import librosa
+from scipy import signal
+from analyze_fingerprint import (analyze_fingerprint, round_metrics, score, RESULT_FIELDS, N_FFT, HOP_LENGTH,
+                                 WATERMARK_MIN, WATERMARK_MAX, REFERENCE_MIN, REFERENCE_MAX, HIGH_FREQ_MIN,
+                                 HIGH_FREQ_MAX, VERY_LOW_RATIO, BASELINE_RATIO, ELEVATED_RATIO, HIGHER_RATIO,
+                                 SUSPICIOUS_RATIO, LOW_MEMORY_FRAME_CHUNK)
+from loudness import LOUDNESS_FIELDS, measure
+from pcm_writer import write_pcm
+from batch_analyze import AUDIO_EXTENSIONS
+from scheduler import available_cpus
+
+# ============================================================================
+# REFERENCE
+# ============================================================================
+
+def _reference_features(y, sr):
+    """
+    Detector metrics computed the pre-optimization way: one STFT for the
+    band metrics, every librosa feature recomputed from y.
+    """
+    stft = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    magnitude = np.abs(stft)
+    phase = np.angle(stft)
+    frequencies = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    watermark_idx = (frequencies >= WATERMARK_MIN) & (frequencies <= WATERMARK_MAX)
+    reference_idx = (frequencies >= REFERENCE_MIN) & (frequencies <= REFERENCE_MAX)
+    high_freq_idx = (frequencies >= HIGH_FREQ_MIN) & (frequencies <= HIGH_FREQ_MAX)
+    metrics = {}
+
+    # Energy ratio, frame ratios one frame at a time
+    watermark_energy = np.mean(magnitude[watermark_idx, :]) if np.any(watermark_idx) else 0
+    reference_energy = np.mean(magnitude[reference_idx, :]) if np.any(reference_idx) else 0
+    energy_ratio = watermark_energy / reference_energy if reference_energy > 0 else 0
+    frame_ratios = []
+    if np.any(watermark_idx) and np.any(reference_idx):
+        for i in range(magnitude.shape[1]):
+            wm_energy = np.mean(magnitude[watermark_idx, i])
+            ref_energy = np.mean(magnitude[reference_idx, i])
+            if ref_energy > 0:
+                frame_ratios.append(wm_energy / ref_energy)
+    frame_ratios = np.array(frame_ratios)
+    count = len(frame_ratios)
+
+    def percent_above(threshold):
+        return np.sum(frame_ratios > threshold) / count * 100 if count else 0
+
+    metrics.update({
+        "watermarkEnergy": watermark_energy,
+        "energyRatio": energy_ratio,
+        "meanFrameRatio": np.mean(frame_ratios) if count else 0,
+        "medianFrameRatio": np.median(frame_ratios) if count else 0,
+        "maxFrameRatio": np.max(frame_ratios) if count else 0,
+        "watermarkToReferenceRatio": energy_ratio,
+        "medianWatermarkToReference": np.median(frame_ratios) if count else 0,
+        "framesWatermarkHigherPercent": percent_above(HIGHER_RATIO),
+        "framesWatermarkElevatedPercent": percent_above(ELEVATED_RATIO),
+        "framesAboveVeryLowPercent": percent_above(VERY_LOW_RATIO),
+        "framesAboveBaselinePercent": percent_above(BASELINE_RATIO),
+        "suspiciousFramesPercent": percent_above(SUSPICIOUS_RATIO),
+    })
+
+    # Phase coherence
+    phase_coherence = phase_coherence_ratio = 1.0
+    if np.any(watermark_idx):
+        phase_coherence = 1.0 / (1.0 + np.mean(np.var(phase[watermark_idx, :], axis=0)))
+        if np.any(reference_idx):
+            ref_phase_coherence = 1.0 / (1.0 + np.mean(np.var(phase[reference_idx, :], axis=0)))
+            phase_coherence_ratio = phase_coherence / ref_phase_coherence if ref_phase_coherence > 0 else 1.0
+    metrics["phaseCoherence"] = phase_coherence
+    metrics["phaseCoherenceRatio"] = phase_coherence_ratio
+
+    # Normalization
+    normalization_suspicion = 0.0
+    if 0.12 <= energy_ratio <= 0.18:
+        normalization_suspicion = 1.0 - abs(energy_ratio - 0.15) / 0.06
+    elif 0 < energy_ratio < 0.12:
+        normalization_suspicion = 0.8
+    metrics["normalizationSuspicion"] = normalization_suspicion
+
+    # Dithering: log-log slope of the 14-22 kHz spectrum
+    dithering_suspicion = 0.0
+    noise_range = (frequencies >= 14000) & (frequencies <= 22000)
+    valid_freqs = frequencies[noise_range][frequencies[noise_range] > 0]
+    if len(valid_freqs) > 1:
+        avg_power = np.mean(magnitude[noise_range, :], axis=1)
+        slope = np.polyfit(np.log10(valid_freqs), np.log10(avg_power[:len(valid_freqs)] + 1e-10), 1)[0]
+        dithering_suspicion = max(0, 1.0 - abs(slope + 1.0) * 2)
+    metrics["ditheringSuspicion"] = dithering_suspicion
+
+    # Filter artifacts
+    filter_artifact_suspicion = 0.0
+    below_15k = frequencies < 15000
+    band_17_18k = (frequencies > 17000) & (frequencies < 18000)
+    if np.any(high_freq_idx) and np.any(below_15k):
+        energy_below_15k = np.mean(magnitude[below_15k, :])
+        if energy_below_15k > 0:
+            dropoff_15_17 = np.mean(magnitude[high_freq_idx, :]) / energy_below_15k
+            dropoff_17_18 = (np.mean(magnitude[band_17_18k, :]) if np.any(band_17_18k) else 0) / energy_below_15k
+            if dropoff_15_17 < 0.3 and dropoff_17_18 < 0.1:
+                filter_artifact_suspicion = 0.8
+            elif dropoff_15_17 < 0.5:
+                filter_artifact_suspicion = 0.5
+    metrics["filterArtifactSuspicion"] = filter_artifact_suspicion
+
+    # librosa features, each from y
+    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, hop_length=HOP_LENGTH)
+    metrics["mfccSuspicion"] = max(0, 1.0 - np.var(mfcc) / 10.0)
+
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=HOP_LENGTH)
+    metrics["chromaSuspicion"] = max(0, 1.0 - np.std(np.mean(chroma, axis=1)) / 0.1)
+
+    contrast = librosa.feature.spectral_contrast(y=y, sr=sr, hop_length=HOP_LENGTH)
+    contrast_suspicion = 0.5 if np.mean(contrast) < 5.0 or np.mean(contrast) > 20.0 else 0.0
+    if np.std(contrast) < 2.0:
+        contrast_suspicion = max(contrast_suspicion, 0.3)
+    metrics["spectralContrastSuspicion"] = contrast_suspicion
+
+    pitches, _ = librosa.piptrack(y=y, sr=sr, hop_length=HOP_LENGTH)
+    pitch_std = np.std(pitches[pitches > 0]) if np.any(pitches > 0) else 0
+    metrics["pitchSuspicion"] = max(0, (1.0 / (1.0 + pitch_std) if pitch_std > 0 else 1.0) - 0.5) * 2
+
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr, hop_length=HOP_LENGTH)
+    tempo = float(np.atleast_1d(tempo)[0])
+    metrics["tempoSuspicion"] = 0.2 if tempo > 0 and abs(tempo - round(tempo)) < 0.5 else 0.0
+
+    centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=HOP_LENGTH)[0]
+    bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr, hop_length=HOP_LENGTH)[0]
+    metrics["spectralCentroidSuspicion"] = max(0, 1.0 - np.std(centroid) / 500.0)
+    metrics["spectralBandwidthSuspicion"] = max(0, 1.0 - np.std(bandwidth) / 1000.0)
+    return metrics
+
+
+def _reference_load(path):
+    """
+    librosa.load(path, sr=None, mono=False), except that inputs libsndfile
+    cannot open (AAC/M4A, ...) are decoded by ffmpeg at float precision, as
+    decode.py does: audioread's 16-bit output moves near-silent band metrics
+    by more than the tolerances, a decoder change and not an analysis one.
+
+    Returns:
+        ((channels, n) float32 array, sample rate)
+    """
+    import soundfile as sf
+    import subprocess
+    import audioread
+
+    try:
+        sf.info(path)
+        y, sr = librosa.load(path, sr=None, mono=False)
+        return np.atleast_2d(y), sr
+    except RuntimeError:
+        pass
+    with audioread.audio_open(path) as f:
+        sr, channels = f.samplerate, f.channels
+    raw = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-f', 'f32le', '-ac', str(channels), '-ar', str(sr), '-'],
+                         capture_output=True, check=True).stdout
+    return np.frombuffer(raw, dtype=np.float32).reshape(-1, channels).T, sr
+
+
+def reference_analysis(path):
+    """
+    The reference result for an input, in analyze_fingerprint()'s result
+    format. Only the weighting into combinedSuspicion and the status rules
+    (plain arithmetic on the metrics) are shared with the analyzer;
+    loudness is measured on the whole decoded signal (loudness.measure).
+    """
+    try:
+        channels, sr = _reference_load(path)
+        # librosa.load(mono=True) averages the channels the same way
+        mono = np.mean(channels, axis=0) if channels.shape[0] > 1 else channels[0]
+        metrics = _reference_features(mono, sr)
+        metrics["combinedSuspicion"], status = score(metrics)
+        result = {
+            "sampleRate": int(sr),
+            "duration": round(float(len(mono) / sr), 2),
+            "nyquistFreq": round(float(sr / 2), 1),
+        }
+        result.update(round_metrics({key: metrics[key] for key, _ in RESULT_FIELDS}))
+        result.update(measure(channels.T, sr))
+        result["status"] = status
+        return result
+    except Exception as e:
+        return {"success": False, "error": f"Analysis error: {str(e)}"}
+
+
+# ============================================================================
+# TOLERANCES
+# ============================================================================
+
+# field -> (absolute, relative) tolerance. Rounded fields may differ by one
+# unit in the last reported digit when a value sits on a rounding boundary.
+TOLERANCES = {
+    "sampleRate": (0, 0),
+    "nyquistFreq": (0, 0),
+    "duration": (0.01, 0),
+    **{field: (10.0 ** -decimals, 1e-4) for field, decimals in RESULT_FIELDS},
+    **{field: (10.0 ** -decimals, 1e-4) for field, decimals in LOUDNESS_FIELDS},
+}
+# Reported by the run, not measured from the audio
+IGNORED_FIELDS = {"plan", "planReason", "timings", "cached", "type"}
+
+# Full-band features: decimation removes everything above the analysis Nyquist
+FULL_BAND_FIELDS = {"mfccSuspicion", "chromaSuspicion", "spectralContrastSuspicion", "pitchSuspicion",
+                    "tempoSuspicion", "spectralCentroidSuspicion", "spectralBandwidthSuspicion", "combinedSuspicion"}
+# The decimate mode is held to the band metrics, within the polyphase filter's passband ripple
+DECIMATED_FIELDS = ["sampleRate", "nyquistFreq", "duration",
+                    *(field for field, _ in RESULT_FIELDS + LOUDNESS_FIELDS if field not in FULL_BAND_FIELDS)]
+DECIMATED_TOLERANCES = {field: (1e-3, 1e-3) for field in DECIMATED_FIELDS[3:]}
+
+
+def within(reference, candidate, tolerance):
+    """True if two field values agree within (absolute, relative) tolerance."""
+    if reference is None or candidate is None or isinstance(reference, str) or isinstance(candidate, str):
+        return reference == candidate
+    atol, rtol = tolerance
+    return abs(float(candidate) - float(reference)) <= atol + rtol * abs(float(reference))
+
+
+def compare_results(reference, candidate, fields=None, tolerances=None):
+    """
+    Compare one mode's result with the reference result.
+
+    Args:
+        fields: Fields to compare (default: every field of the reference)
+        tolerances: Per-field overrides of TOLERANCES
+
+    Returns:
+        (mismatches, status_flip) - a list of {field, reference, candidate,
+        tolerance} and {from, to} or None
+    """
+    tolerances = {**TOLERANCES, **(tolerances or {})}
+    if "error" in reference or "error" in candidate:
+        # Both failing the same way is equivalent; anything else is not
+        if reference.get("error") == candidate.get("error"):
+            return [], None
+        return [{"field": "error", "reference": reference.get("error"), "candidate": candidate.get("error"),
+                 "tolerance": None}], None
+
+    mismatches = []
+    for field in fields or reference:
+        if field in IGNORED_FIELDS or field == "status":
+            continue
+        tolerance = tolerances.get(field, (0, 0))
+        if field not in candidate:
+            mismatches.append({"field": field, "reference": reference.get(field), "candidate": "<missing>",
+                               "tolerance": tolerance})
+        elif not within(reference.get(field), candidate[field], tolerance):
+            mismatches.append({"field": field, "reference": reference.get(field), "candidate": candidate[field],
+                               "tolerance": tolerance})
+
+    flip = None
+    if reference.get("status") != candidate.get("status"):
+        flip = {"from": reference.get("status"), "to": candidate.get("status")}
+    return mismatches, flip
+
+
+# ============================================================================
+# MODES
+# ============================================================================
+
+class Mode:
+    """
+    One alternate way of running the analyzer.
+
+    Args:
+        name: Mode name (--modes)
+        options: Keyword arguments for analyze_fingerprint()
+        prepare: Optional (path, workdir) -> context manager yielding the
+            input spec to analyze instead of the path
+        fields: Fields to compare (default: all of the reference result)
+        tolerances: Per-field overrides of TOLERANCES for this mode
+    """
+
+    def __init__(self, name, options=None, prepare=None, fields=None, tolerances=None):
+        self.name = name
+        self.options = options or {}
+        self.prepare = prepare
+        self.fields = fields
+        self.tolerances = tolerances or {}
+
+    def input_spec(self, path, workdir):
+        if self.prepare is None:
+            return contextlib.nullcontext(path)
+        return self.prepare(path, workdir)
+
+
+@contextlib.contextmanager
+def shared_memory_input(path, workdir):
+    """The file's bytes in a shared memory block, wrapped in place by the analyzer."""
+    from batch_analyze import stream_to_shared_memory, _release
+    from stdio_io import detach_shared_memory
+
+    with open(path, 'rb') as f:
+        spec, shm = stream_to_shared_memory(f, os.path.getsize(path))
+    try:
+        yield spec
+    finally:
+        detach_shared_memory(spec)
+        # Attaching in this process unregistered the block (see batch_analyze._release)
+        _release(shm)
+
+
+@contextlib.contextmanager
+def decoded_input(path, workdir):
+    """A lossless FLAC copy of PCM inputs, so they take the decoder path instead of the memory map."""
+    import soundfile as sf
+
+    try:
+        info = sf.info(path)
+    except RuntimeError:
+        yield path
+        return
+    if info.format not in ('WAV', 'WAVEX', 'RF64', 'AIFF') or info.subtype not in ('PCM_16', 'PCM_24'):
+        yield path
+        return
+    y, sr = sf.read(path, dtype='int32', always_2d=True)
+    flac = os.path.join(workdir, f"{os.path.splitext(os.path.basename(path))[0]}.flac")
+    sf.write(flac, y, sr, subtype=info.subtype)
+    try:
+        yield flac
+    finally:
+        os.remove(flac)
+
+
+HASH_INDEX_DIR = "hash_index"
+
+
+@contextlib.contextmanager
+def fresh_hash_index(path, workdir):
+    """An empty hash index: the input is a miss, analyzed alongside its fingerprint."""
+    shutil.rmtree(os.path.join(workdir, HASH_INDEX_DIR), ignore_errors=True)
+    yield path
+
+
+@contextlib.contextmanager
+def cached_hash_index(path, workdir):
+    """A hash index holding the input's own result: the analysis is a cache hit."""
+    shutil.rmtree(os.path.join(workdir, HASH_INDEX_DIR), ignore_errors=True)
+    run_analysis(path, hash_index=os.path.join(workdir, HASH_INDEX_DIR))
+    yield path
+
+
+def default_modes(workdir):
+    hash_index = os.path.join(workdir, HASH_INDEX_DIR)
+    return [
+        # The production default, one worker thread
+        Mode("default"),
+        Mode("workers", {"workers": max(2, available_cpus())}),
+        Mode("low_memory", {"low_memory": True}),
+        Mode("stream", {"stream": True}),
+        Mode("timeline", {"timeline_seconds": 2.0}),
+        Mode("hash_index", {"hash_index": hash_index}, prepare=fresh_hash_index),
+        Mode("hash_cached", {"hash_index": hash_index}, prepare=cached_hash_index),
+        Mode("shared_memory", prepare=shared_memory_input),
+        Mode("decoded", prepare=decoded_input),
+        Mode("decimate", {"decimate": True}, fields=DECIMATED_FIELDS, tolerances=DECIMATED_TOLERANCES),
+    ]
+
+
+# ============================================================================
+# CORPUS
+# ============================================================================
+
+SYNTHETIC_SECONDS = 6.0
+
+# One low-memory slice (LOW_MEMORY_FRAME_CHUNK frames) is ~47.6 s at 44.1 kHz;
+# the long case crosses two slice boundaries, with its gap over the first
+LONG_SECONDS = 2.5 * LOW_MEMORY_FRAME_CHUNK * HOP_LENGTH / 44100
+
+# name -> (sample rate, channels, watermark / reference band amplitude, options)
+SYNTHETIC_CASES = {
+    "clean_44k": (44100, 1, 0.15, {}),
+    "boundary_44k": (44100, 1, 0.25, {}),
+    "suspicious_48k_stereo": (48000, 2, 0.3, {}),
+    "watermarked_44k_stereo": (44100, 2, 0.6, {}),
+    "filtered_48k": (48000, 1, 0.02, {}),
+    "gap_44k": (44100, 1, 0.15, {"gap": 2.0}),
+    "short_44k": (44100, 1, 0.4, {"seconds": 0.5}),
+    "long_44k": (44100, 1, 0.3, {"seconds": LONG_SECONDS, "gap": 2.0,
+                                 "gap_at": LOW_MEMORY_FRAME_CHUNK * HOP_LENGTH / 44100}),
+    "hires_96k_stereo": (96000, 2, 0.3, {"ultrasonic": 0.05}),
+    "hires_192k": (192000, 1, 0.6, {"ultrasonic": 0.05}),
+}
+
+
+def _band_noise(rng, n, sr, low, high):
+    sos = signal.butter(4, [low, min(high, 0.49 * sr)], btype='bandpass', fs=sr, output='sos')
+    return signal.sosfilt(sos, rng.standard_normal(n))
+
+
+def synthetic_signal(sr, channels, watermark_ratio, seconds=SYNTHETIC_SECONDS, gap=0.0, gap_at=None,
+                     ultrasonic=0.0, seed=0):
+    """
+    Tonal program material with band-limited noise in the reference band
+    (14-18 kHz) and the watermark band (18-22 kHz) at the given amplitude
+    ratio, optional noise above 24 kHz and an optional silent gap centred
+    at gap_at seconds (default: mid-clip).
+
+    Returns:
+        (n, channels) float array, peak -6 dBFS
+    """
+    rng = np.random.default_rng(seed)
+    n = int(sr * seconds)
+    t = np.arange(n) / sr
+    out = np.zeros((n, channels))
+    for ch in range(channels):
+        music = sum(0.3 / k * np.sin(2 * np.pi * f * k * t + rng.uniform(0, 2 * np.pi))
+                    for f in (220.0, 277.2, 329.6) for k in range(1, 6))
+        music *= 0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t) ** 2
+        reference = _band_noise(rng, n, sr, 14000, 18000)
+        watermark = _band_noise(rng, n, sr, 18000, 22000)
+        out[:, ch] = music + 0.05 * reference + 0.05 * watermark_ratio * watermark
+        if ultrasonic and sr > 48000:
+            out[:, ch] += ultrasonic * _band_noise(rng, n, sr, 24000, 0.45 * sr)
+    if gap:
+        centre = n // 2 if gap_at is None else int(gap_at * sr)
+        start = centre - int(gap * sr) // 2
+        out[start:start + int(gap * sr)] = 0.0
+    return 0.5 * out / np.max(np.abs(out))
+
+
+def write_synthetic_corpus(directory, seed=0, names=None):
+    """Write the synthetic cases (or those named) as 24-bit WAV files; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, (name, (sr, channels, ratio, options)) in enumerate(SYNTHETIC_CASES.items()):
+        if names is not None and name not in names:
+            continue
+        y = synthetic_signal(sr, channels, ratio, seed=seed + i, **options)
+        path = os.path.join(directory, f"{name}.wav")
+        write_pcm(path, y if channels > 1 else y[:, 0], sr, bits=24, seed=seed + i)
+        paths.append(path)
+    return paths
+
+
+def fixture_inputs(directories):
+    """Audio files under the fixture directories, sorted."""
+    paths = []
+    for directory in directories:
+        if os.path.isfile(directory):
+            paths.append(directory)
+            continue
+        for root, _, files in os.walk(directory):
+            paths += [os.path.join(root, name) for name in files
+                      if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS]
+    return sorted(paths)
+
+
+# ============================================================================
+# HARNESS
+# ============================================================================
+
+def run_analysis(input_spec, **options):
+    """analyze_fingerprint() with its output silenced; returns (result, seconds)."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        result = analyze_fingerprint(input_spec, skip_image=True, **{"workers": 1, **options})
+    return result, time.perf_counter() - started
+
+
+def run_reference(path):
+    """reference_analysis() with its output silenced; returns (result, seconds)."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        result = reference_analysis(path)
+    return result, time.perf_counter() - started
+
+
+def run_harness(inputs, modes, workdir):
+    """
+    Run the reference and every mode on every input and compare them.
+
+    Returns:
+        dict with success, counts, per-mode totals and one record per
+        input and mode
+    """
+    records = []
+    totals = {mode.name: {"comparisons": 0, "mismatches": 0, "statusFlips": 0, "seconds": 0.0,
+                          "referenceSeconds": 0.0} for mode in modes}
+    if inputs:
+        # Untimed: the first analysis in a process also pays for numba compilation and imports
+        run_reference(inputs[0])
+        run_analysis(inputs[0])
+    for path in inputs:
+        reference, reference_seconds = run_reference(path)
+        print(f"{os.path.basename(path)}: {reference.get('status', reference.get('error'))} "
+              f"({reference_seconds:.2f}s)", file=sys.stderr, flush=True)
+        for mode in modes:
+            with mode.input_spec(path, workdir) as spec:
+                candidate, seconds = run_analysis(spec, **mode.options)
+            mismatches, flip = compare_results(reference, candidate, mode.fields, mode.tolerances)
+            total = totals[mode.name]
+            total["comparisons"] += 1
+            total["mismatches"] += len(mismatches)
+            total["statusFlips"] += flip is not None
+            total["seconds"] += seconds
+            total["referenceSeconds"] += reference_seconds
+            records.append({
+                "input": path,
+                "mode": mode.name,
+                "status": reference.get("status"),
+                "statusFlip": flip,
+                "mismatches": mismatches,
+                "seconds": round(seconds, 3),
+                "referenceSeconds": round(reference_seconds, 3),
+            })
+            if mismatches or flip:
+                fields = ', '.join(m["field"] for m in mismatches)
+                print(f"  {mode.name}: {'status ' + flip['from'] + ' -> ' + flip['to'] + '; ' if flip else ''}"
+                      f"{fields}", file=sys.stderr, flush=True)
+
+    for total in totals.values():
+        total["speedup"] = round(total["referenceSeconds"] / total["seconds"], 2) if total["seconds"] else None
+        total["seconds"] = round(total["seconds"], 2)
+        total["referenceSeconds"] = round(total["referenceSeconds"], 2)
+    mismatches = sum(total["mismatches"] for total in totals.values())
+    flips = sum(total["statusFlips"] for total in totals.values())
+    return {
+        "success": mismatches == 0 and flips == 0,
+        "inputs": len(inputs),
+        "comparisons": len(records),
+        "mismatches": mismatches,
+        "statusFlips": flips,
+        "modes": totals,
+        "results": records,
+    }
+
+
+def print_summary(report):
+    print(f"\n{'mode':16s} {'runs':>5s} {'mismatches':>11s} {'flips':>6s} {'speedup':>8s}", file=sys.stderr)
+    for name, total in report["modes"].items():
+        print(f"{name:16s} {total['comparisons']:5d} {total['mismatches']:11d} {total['statusFlips']:6d} "
+              f"{total['speedup']:7.2f}x", file=sys.stderr)
+    print(f"{'EQUIVALENT' if report['success'] else 'NOT EQUIVALENT'}: {report['inputs']} inputs, "
+          f"{report['mismatches']} mismatches, {report['statusFlips']} status flips", file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    selected = None
+    if '--modes' in args:
+        idx = args.index('--modes')
+        if idx + 1 >= len(args):
+            print(json.dumps({"success": False, "error": "--modes requires a comma-separated list"}))
+            sys.exit(1)
+        selected = [name for name in args[idx + 1].split(',') if name]
+        del args[idx:idx + 2]
+    synthetic = '--no-synthetic' not in args
+    directories = [arg for arg in args if arg != '--no-synthetic']
+
+    from scratch import get_scratch
+    from fft_backend import configure_fft
+    # Scratch job directory for the synthetic corpus and indexes, removed on exit (see scratch.py)
+    get_scratch()
+    # FFT backend for every STFT in this process (see fft_backend.py)
+    configure_fft()
+
+    workdir = tempfile.mkdtemp(prefix='equivalence_')
+    try:
+        modes = default_modes(workdir)
+        if selected:
+            unknown = set(selected) - {mode.name for mode in modes}
+            if unknown:
+                print(json.dumps({"success": False, "error": f"Unknown modes: {', '.join(sorted(unknown))}"}))
+                sys.exit(1)
+            modes = [mode for mode in modes if mode.name in selected]
+
+        inputs = fixture_inputs(directories)
+        if synthetic:
+            inputs = write_synthetic_corpus(os.path.join(workdir, "synthetic")) + inputs
+        if not inputs:
+            print(json.dumps({"success": False, "error": "No inputs: give fixture directories or drop --no-synthetic"}))
+            sys.exit(1)
+
+        report = run_harness(inputs, modes, workdir)
+        print_summary(report)
+        print(json.dumps(report))
+        sys.exit(0 if report["success"] else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+FFT Backend Selection
+Chooses the FFT implementation behind every STFT once per process:
+- scipy: scipy.fft (pocketfft) with a fixed thread count (workers=N)
+- pyfftw: FFTW through pyFFTW's scipy.fft interface, with cached plans
+  and a wisdom file reused across runs (optional dependency)
+
+librosa (0.11+) and scipy.signal both dispatch through scipy.fft, so the
+backend is installed with scipy.fft.set_global_backend: librosa.stft /
+istft, the feature extractors, the blockwise PCM STFT and noisereduce
+all use it, from any thread. librosa 0.10 calls numpy.fft unless told
+otherwise, so it is pointed at scipy.fft with librosa.set_fftlib and
+reaches the same backend; the path taken is logged and reported as
+librosaFft. Transforms are the same pocketfft code as before, so scipy
+results are bit-identical at any thread count.
+
+Environment:
+    FFT_BACKEND        'scipy' (default) or 'pyfftw'
+    FFT_WORKERS        Threads per transform (default: CPUs available)
+    FFTW_WISDOM_FILE   pyFFTW wisdom (default: fftw_wisdom.pickle in the
+                       scratch root)
+
+Usage as a script runs the STFT throughput benchmark:
+    python fft_backend.py --benchmark [seconds] [input]
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import atexit
+import numpy as np
+import scipy.fft
+from scheduler import available_cpus
+
+# Try to import pyFFTW for FFTW plans (optional)
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft
+    PYFFTW_AVAILABLE = True
+except ImportError:
+    PYFFTW_AVAILABLE = False
+
+BACKENDS = ('scipy', 'pyfftw')
+DEFAULT_BACKEND = 'scipy'
+WISDOM_FILE = 'fftw_wisdom.pickle'
+# Seconds an unused pyFFTW plan stays cached
+PLAN_KEEPALIVE_SECONDS = 300
+# librosa transforms at most this many bytes of frames per FFT call; threads
+# need bigger batches than its 256 KB default to have work to split
+BLOCK_BYTES_PER_WORKER = 1 << 18
+
+_active = None
+
+
+def _librosa_uses_scipy_fft():
+    """True for librosa 0.11+, whose transforms go through scipy.fft by themselves."""
+    import librosa
+    try:
+        return tuple(int(part) for part in librosa.__version__.split('.')[:2]) >= (0, 11)
+    except ValueError:
+        return True
+
+
+class _ScipyWorkersBackend:
+    """scipy.fft backend that runs scipy's own transforms with a fixed thread count."""
+
+    __ua_domain__ = "numpy.scipy.fft"
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def __ua_function__(self, method, args, kwargs):
+        if kwargs.get('workers') is None:
+            kwargs['workers'] = self.workers
+        with scipy.fft.set_backend('scipy', only=True):
+            return method(*args, **kwargs)
+
+
+def _wisdom_path(wisdom_file=None):
+    if wisdom_file:
+        return wisdom_file
+    if os.environ.get('FFTW_WISDOM_FILE'):
+        return os.environ['FFTW_WISDOM_FILE']
+    from scratch import disk_root
+    return os.path.join(disk_root(), WISDOM_FILE)
+
+
+def _load_wisdom(path):
+    try:
+        with open(path, 'rb') as f:
+            pyfftw.import_wisdom(pickle.load(f))
+        return True
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return False
+
+
+def _save_wisdom(path):
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(pyfftw.export_wisdom(), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _install(backend, workers):
+    import librosa.util
+
+    if backend == 'pyfftw':
+        pyfftw.config.NUM_THREADS = workers
+        pyfftw.interfaces.cache.enable()
+        pyfftw.interfaces.cache.set_keepalive_time(PLAN_KEEPALIVE_SECONDS)
+        scipy.fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+    elif workers > 1:
+        scipy.fft.set_global_backend(_ScipyWorkersBackend(workers))
+    else:
+        # One thread is scipy's own setup; skip the dispatch overhead
+        scipy.fft.set_global_backend('scipy')
+    if not _librosa_uses_scipy_fft():
+        # scipy.fft has numpy.fft's signatures and dispatches to the backend set above
+        librosa.set_fftlib(scipy.fft)
+    librosa.util.MAX_MEM_BLOCK = BLOCK_BYTES_PER_WORKER * workers
+
+
+def configure_fft(backend=None, workers=None, wisdom_file=None):
+    """
+    Select the FFT backend for this process (first call wins; later calls
+    return the active configuration).
+
+    Args:
+        backend: 'scipy' or 'pyfftw' (default: FFT_BACKEND or 'scipy');
+            falls back to scipy for unknown names and a missing pyFFTW
+        workers: Threads per transform (default: FFT_WORKERS or CPUs)
+        wisdom_file: pyFFTW wisdom to load now and save at exit
+
+    Returns:
+        dict with backend, workers, librosaFft ('scipy.fft', or 'set_fftlib'
+        on librosa 0.10) and (pyfftw) wisdomFile / wisdomLoaded
+    """
+    global _active
+    if _active is not None:
+        return _active
+
+    backend = (backend or os.environ.get('FFT_BACKEND') or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        print(f"Warning: Unknown FFT backend '{backend}' (use {', '.join(BACKENDS)}), using scipy.fft",
+              file=sys.stderr, flush=True)
+        backend = 'scipy'
+    if backend == 'pyfftw' and not PYFFTW_AVAILABLE:
+        print("Warning: pyFFTW not installed, using scipy.fft", file=sys.stderr, flush=True)
+        backend = 'scipy'
+    if workers is None:
+        workers = int(os.environ.get('FFT_WORKERS') or available_cpus())
+    workers = max(1, int(workers))
+
+    _install(backend, workers)
+    librosa_fft = 'scipy.fft' if _librosa_uses_scipy_fft() else 'set_fftlib'
+    _active = {"backend": backend, "workers": workers, "librosaFft": librosa_fft}
+    print(f"FFT backend: {backend}, {workers} worker(s), librosa via "
+          f"{'scipy.fft' if librosa_fft == 'scipy.fft' else 'librosa.set_fftlib(scipy.fft)'}",
+          file=sys.stderr, flush=True)
+    if backend == 'pyfftw':
+        path = _wisdom_path(wisdom_file)
+        _active.update({"wisdomFile": path, "wisdomLoaded": _load_wisdom(path)})
+        atexit.register(_save_wisdom, path)
+    return _active
+
+
+def active():
+    """The configuration set by configure_fft() (None before it is called)."""
+    return _active
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+def _benchmark_signal(seconds, input_path=None):
+    if input_path:
+        from stdio_io import open_input_pcm
+        from pcm_mmap import load_float
+        pcm = open_input_pcm(input_path)
+        if pcm is None:
+            raise ValueError("Benchmark input must be uncompressed WAV/AIFF")
+        return load_float(pcm, mono=True), pcm.samplerate
+    sr = 96000
+    return (np.random.default_rng(0).standard_normal(int(sr * seconds)) * 0.1).astype(np.float32), sr
+
+
+def benchmark(seconds=600.0, input_path=None, n_fft=2048, hop_length=512, repeats=3):
+    """
+    STFT throughput (x realtime) of librosa's default setup and of every
+    backend and thread count on a long 96 kHz signal (or an input file),
+    through librosa.stft as the scripts call it; maxDeviation is measured
+    against the default.
+    """
+    import librosa
+    import librosa.util
+
+    y, sr = _benchmark_signal(seconds, input_path)
+    seconds = len(y) / sr
+    thread_counts = sorted({1, 2, 4, available_cpus()})
+    backends = ['scipy'] + (['pyfftw'] if PYFFTW_AVAILABLE else [])
+    default_block = librosa.util.MAX_MEM_BLOCK
+    reference = None
+    results = []
+
+    # librosa's own setup first (scipy.fft, one thread, 256 KB batches), then every candidate
+    candidates = [('default', 1, None)] + [(backend, workers, _install) for backend in backends for workers in thread_counts]
+    for backend, workers, install in candidates:
+        if install:
+            install(backend, workers)
+        librosa.stft(y[:sr], n_fft=n_fft, hop_length=hop_length)  # plans / thread pool warm-up
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            S = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if reference is None:
+            reference = S
+        results.append({
+            "backend": backend,
+            "workers": workers,
+            "seconds": round(best, 3),
+            "realtimeFactor": round(seconds / best, 1),
+            "maxDeviation": float(np.max(np.abs(S - reference))),
+        })
+        print(f"{backend:8s} {workers:2d} threads {best:7.3f}s  {seconds / best:7.1f}x realtime  "
+              f"max deviation {results[-1]['maxDeviation']:.2e}", file=sys.stderr, flush=True)
+        del S
+
+    # Leave the process as it was
+    scipy.fft.set_global_backend('scipy')
+    if not _librosa_uses_scipy_fft():
+        librosa.set_fftlib(None)
+    librosa.util.MAX_MEM_BLOCK = default_block
+    return {"audioSeconds": round(seconds, 1), "sampleRate": sr, "cpus": available_cpus(), "results": results}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != '--benchmark':
+        print("Usage: fft_backend.py --benchmark [seconds] [input]", file=sys.stderr)
+        sys.exit(1)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 600.0
+    input_path = sys.argv[3] if len(sys.argv) > 3 else None
+    try:
+        print(json.dumps({"success": True, "benchmark": benchmark(seconds, input_path)}))
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Waveform Peaks Generator
+Computes min/max waveform envelopes for the trimmer UI in one streaming pass:
+- Finest zoom level reduced block by block (vectorized reshape + min/max)
+- Coarser levels derived from the finest one (each level 4x coarser)
+- Stored as a compact little-endian binary file with int8 or int16 peaks
+
+File layout (.peaks):
+    magic        4s   b'UPKS'
+    version      u16  1
+    bits         u16  8 or 16
+    sample_rate  u32
+    channels     u16  source channels (peaks are taken across all of them)
+    level_count  u16
+    total_frames u64
+    level table  level_count x (u32 samples_per_pixel, u32 pixel_count)
+    level data   per level: pixel_count x (min, max) as int8/int16
+"""
+
+import sys
+import json
+import struct
+import numpy as np
+from silence import iter_audio_blocks
+from stdio_io import open_output, claim_stdout
+from profiling import StageTimer, run_with_profile, parse_profiling_args
+
+PEAKS_MAGIC = b'UPKS'
+PEAKS_VERSION = 1
+DEFAULT_SAMPLES_PER_PIXEL = 256
+ZOOM_FACTOR = 4
+# Stop adding coarser levels once a level is this small
+MIN_LEVEL_PIXELS = 500
+
+
+def block_peaks(blocks, samples_per_pixel):
+    """
+    Min/max per bucket of samples_per_pixel frames across all channels.
+
+    Returns:
+        (mins, maxs, total_frames, channels)
+    """
+    mins, maxs = [], []
+    carry = np.zeros(0, dtype=np.float32)
+    carry_max = carry
+    total = 0
+    channels = 0
+    for block in blocks:
+        total += len(block)
+        channels = block.shape[1]
+        # Collapse channels first: the envelope covers every channel
+        block_min = np.concatenate([carry, block.min(axis=1)])
+        block_max = np.concatenate([carry_max, block.max(axis=1)])
+        usable = len(block_min) - len(block_min) % samples_per_pixel
+        if usable:
+            mins.append(block_min[:usable].reshape(-1, samples_per_pixel).min(axis=1))
+            maxs.append(block_max[:usable].reshape(-1, samples_per_pixel).max(axis=1))
+        carry, carry_max = block_min[usable:], block_max[usable:]
+
+    if len(carry):
+        mins.append(carry.min(keepdims=True))
+        maxs.append(carry_max.max(keepdims=True))
+
+    if not mins:
+        return np.zeros(0, np.float32), np.zeros(0, np.float32), total, channels
+    return np.concatenate(mins), np.concatenate(maxs), total, channels
+
+
+def reduce_level(mins, maxs, factor=ZOOM_FACTOR):
+    """Next coarser zoom level from an existing one."""
+    pad = (-len(mins)) % factor
+    if pad:
+        mins = np.concatenate([mins, np.full(pad, mins[-1])])
+        maxs = np.concatenate([maxs, np.full(pad, maxs[-1])])
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def quantize(values, bits):
+    scale = 127 if bits == 8 else 32767
+    dtype = '<i1' if bits == 8 else '<i2'
+    return np.clip(np.round(values * scale), -scale, scale).astype(dtype)
+
+
+def generate_peaks(input_path, output_path, samples_per_pixel=DEFAULT_SAMPLES_PER_PIXEL, bits=8, timings=False):
+    """
+    Generate a multi-zoom peaks file for the waveform display.
+
+    Args:
+        input_path: Path to input audio file ("-" streams a WAV from stdin)
+        output_path: Path to output .peaks file ("-" for stdout)
+        samples_per_pixel: Frames per pixel at the finest zoom level
+        bits: 8 or 16 bit peak values
+        timings: If True, add per-stage wall time/memory to the result
+    """
+    timer = StageTimer(enabled=timings)
+    try:
+        if bits not in (8, 16):
+            raise ValueError(f"Peak resolution must be 8 or 16 bits, got {bits}")
+
+        with timer.stage('scan'):
+            print(f"Scanning audio: {input_path}", flush=True)
+            sr, blocks = iter_audio_blocks(input_path, stream=True)
+            mins, maxs, total_frames, channels = block_peaks(blocks, samples_per_pixel)
+
+        with timer.stage('levels'):
+            levels = [(samples_per_pixel, mins, maxs)]
+            while len(levels[-1][1]) > MIN_LEVEL_PIXELS:
+                spp, level_mins, level_maxs = levels[-1]
+                levels.append((spp * ZOOM_FACTOR, *reduce_level(level_mins, level_maxs)))
+
+        with timer.stage('write'):
+            header = struct.pack('<4sHHIHHQ', PEAKS_MAGIC, PEAKS_VERSION, bits, int(sr), channels, len(levels), total_frames)
+            table = b''.join(struct.pack('<II', spp, len(level_mins)) for spp, level_mins, _ in levels)
+            with open_output(output_path) as f:
+                f.write(header)
+                f.write(table)
+                size = len(header) + len(table)
+                for _, level_mins, level_maxs in levels:
+                    interleaved = np.empty(2 * len(level_mins), dtype=level_mins.dtype)
+                    interleaved[0::2], interleaved[1::2] = level_mins, level_maxs
+                    data = quantize(interleaved, bits).tobytes()
+                    f.write(data)
+                    size += len(data)
+
+        print(f"Peaks written: {output_path} ({size / 1024:.1f} KB, {len(levels)} zoom levels)", flush=True)
+        result = {
+            "success": True,
+            "output_path": output_path,
+            "sample_rate": int(sr),
+            "duration": round(total_frames / sr, 3) if sr else 0.0,
+            "bits": bits,
+            "levels": [{"samples_per_pixel": spp, "pixels": len(level_mins)} for spp, level_mins, _ in levels],
+            "bytes": size,
+        }
+        if timings:
+            result["timings"] = timer.as_dict()
+        return result
+
+    except Exception as e:
+        error_msg = f"Peak generation failed: {str(e)}"
+        print(error_msg, file=sys.stderr, flush=True)
+        result = {
+            "success": False,
+            "error": error_msg
+        }
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
+        return result
+
+
+if __name__ == "__main__":
+    args, timings, profile_path = parse_profiling_args(sys.argv[1:])
+    if len(args) < 2:
+        print(json.dumps({
+            "success": False,
+            "error": "Usage: generate_peaks.py <input|-> <output.peaks|-> [samples_per_pixel] [8|16] [--timings] [--profile <file.prof>]"
+        }))
+        sys.exit(1)
+
+    input_path = args[0].strip('"\'')
+    output_path = args[1].strip('"\'')
+    # With "-" as output the peaks go to stdout and the JSON result to stderr
+    claim_stdout(output_path)
+    try:
+        samples_per_pixel = int(args[2]) if len(args) > 2 else DEFAULT_SAMPLES_PER_PIXEL
+        bits = int(args[3]) if len(args) > 3 else 8
+    except ValueError:
+        print(json.dumps({"success": False, "error": "samples_per_pixel and bits must be integers"}))
+        sys.exit(1)
+
+    result = run_with_profile(profile_path, generate_peaks, input_path, output_path, samples_per_pixel, bits, timings)
+    print(json.dumps(result), flush=True)
+    sys.exit(0 if result.get("success") else 1)
@@ -2,6 +2,7 @@
 """
 Generate Reference Spectrogram
 Creates an example spectrogram showing clean audio without watermarks.
+With "-" as the output path the PNG is written to stdout (messages to stderr).
 """
 
 import numpy as np
@@ -9,6 +10,8 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import librosa.display
+from stdio_io import open_output, claim_stdout
+from fft_backend import configure_fft
 
 def generate_reference_spectrogram(output_path):
     """
@@ -98,7 +101,8 @@ def generate_reference_spectrogram(output_path):
     plt.tight_layout()
     
     # Save with lower DPI for faster generation and smaller file size
-    plt.savefig(output_path, dpi=60, bbox_inches='tight', facecolor='#1e293b')  # slate-800 background
+    with open_output(output_path) as f:
+        plt.savefig(f, format='png', dpi=60, bbox_inches='tight', facecolor='#1e293b')  # slate-800 background
     plt.close(fig)
     print(f"Reference spectrogram saved: {output_path}")
 
@@ -109,6 +113,9 @@ if __name__ == "__main__":
         sys.exit(1)
     
     output_path = sys.argv[1]
+    claim_stdout(output_path)
+    # FFT backend for every STFT in this process (see fft_backend.py)
+    configure_fft()
     generate_reference_spectrogram(output_path)
     print("✓ Reference spectrogram generated successfully")
 
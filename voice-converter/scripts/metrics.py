@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Processing Metrics
+Counters and histograms for the Python processing layer, exposed in the
+Prometheus text format (served by /api/metrics):
+- Per job, recorded for every script admitted by admission.py: runs, wall
+  time, time queued for memory, audio seconds, input and output bytes,
+  process peak RSS, and jobs turned away when the queue timed out
+- Decode time by codec (analyzer decodes, pydub decodes)
+- Perceptual hash index lookups as cache hits / misses (and the hit ratio)
+- Running jobs, queued jobs and reserved memory, read live from the
+  admission ledger when the metrics are rendered
+
+Observations are kept in memory and merged into one store (JSON, guarded
+by flock) in the scratch root when the process exits, so a job costs one
+locked write. Rendering reads the store and the ledger under shared locks
+and writes neither. Recording never fails a job: store errors are ignored.
+
+Environment:
+    METRICS_FILE       Store path (default: metrics.json in the scratch root)
+    METRICS_DISABLED   "1" turns recording off
+
+CLI:
+    metrics.py          print the metrics (Prometheus text format 0.0.4)
+    metrics.py reset    clear the store
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import atexit
+import threading
+from contextlib import contextmanager
+from scratch import disk_root
+
+STORE_FILE = 'metrics.json'
+LOCK_FILE = '.metrics.lock'
+PREFIX = 'voice_converter_'
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = tuple(float(1 << shift) for shift in range(26, 36))   # 64 MB .. 32 GB
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'jobs_total': ('counter', "Jobs admitted, by script", None),
+    'jobs_rejected_total': ('counter', "Jobs that timed out waiting for memory, by script", None),
+    'job_duration_seconds': ('histogram', "Wall time from admission to the end of the job", SECONDS_BUCKETS),
+    'queue_wait_seconds': ('histogram', "Time spent queued for memory before admission", SECONDS_BUCKETS),
+    'audio_seconds_total': ('counter', "Seconds of input audio processed", None),
+    'input_bytes_total': ('counter', "Bytes of input read (file or buffer size)", None),
+    'output_bytes_total': ('counter', "Bytes of output files written", None),
+    'peak_rss_bytes': ('histogram', "Peak resident memory of the process at the end of each job", BYTES_BUCKETS),
+    'decode_seconds': ('histogram', "Time to decode an input, by codec", SECONDS_BUCKETS),
+    'cache_requests_total': ('counter', "Cache lookups, by cache and result (hit/miss)", None),
+}
+
+_lock = threading.Lock()
+_pending = {"counters": {}, "histograms": {}}
+_registered = False
+_job = None
+
+
+def enabled():
+    return os.environ.get('METRICS_DISABLED', '') not in ('1', 'true')
+
+
+def _labels_key(labels):
+    return json.dumps({key: str(value) for key, value in sorted(labels.items())})
+
+
+def _register_flush():
+    global _registered
+    if not _registered:
+        _registered = True
+        atexit.register(flush)
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter."""
+    if not enabled():
+        return
+    key = _labels_key(labels)
+    with _lock:
+        series = _pending["counters"].setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+    _register_flush()
+
+
+def observe(name, value, **labels):
+    """Record one histogram observation."""
+    if not enabled():
+        return
+    buckets = METRICS[name][2]
+    key = _labels_key(labels)
+    with _lock:
+        series = _pending["histograms"].setdefault(name, {})
+        hist = series.setdefault(key, {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist["buckets"][i] += 1
+                break
+        hist["sum"] += value
+        hist["count"] += 1
+    _register_flush()
+
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+def _input_bytes(input_path):
+    from stdio_io import input_buffer, is_stdio, stdin_size
+    if is_stdio(input_path):
+        # Not read ahead: a WAV on stdin may still be streamed
+        return stdin_size() or 0
+    try:
+        buffer = input_buffer(input_path)
+        return len(buffer) if buffer is not None else os.path.getsize(input_path)
+    except (OSError, ValueError):
+        return 0
+
+
+def _peak_rss_bytes():
+    # Stage timings reset the kernel's high-water mark: profiling keeps the peaks from before
+    from profiling import rss_high_water_mb
+    return int(rss_high_water_mb() * 1024 * 1024)
+
+
+def start_job(script, input_path, output_path=None, audio_seconds=None, codec=None, queued_seconds=0.0):
+    """Begin a job's metrics (called by admission.admit; input_path may be a list of inputs)."""
+    global _job
+    _job = {"script": script, "codec": codec, "started": time.monotonic(), "outputs": set()}
+    note_output(output_path)
+    inc('jobs_total', script=script)
+    observe('queue_wait_seconds', queued_seconds, script=script)
+    if audio_seconds:
+        inc('audio_seconds_total', audio_seconds, script=script)
+    # Compare runs are one job over several inputs
+    inputs = [input_path] if isinstance(input_path, str) else input_path
+    inc('input_bytes_total', sum(_input_bytes(path) for path in inputs), script=script)
+
+
+def note_output(output_path):
+    """Count an output file's size when the job ends (stdout is not counted)."""
+    if _job is not None and output_path and output_path != '-':
+        _job["outputs"].add(output_path)
+
+
+def finish_job():
+    """End the current job's metrics (called when its admission is released)."""
+    global _job
+    job, _job = _job, None
+    if job is None:
+        return
+    script = job["script"]
+    observe('job_duration_seconds', time.monotonic() - job["started"], script=script)
+    observe('peak_rss_bytes', _peak_rss_bytes(), script=script)
+    written = 0
+    for path in job["outputs"]:
+        # Batch modes write into a directory: only single output files are counted
+        if os.path.isfile(path):
+            written += os.path.getsize(path)
+    inc('output_bytes_total', written, script=script)
+
+
+def observe_decode(seconds, codec=None):
+    """Decode time of the current job's input (codec defaults to the probed one)."""
+    observe('decode_seconds', seconds, codec=codec or (_job or {}).get("codec") or 'unknown')
+
+
+def cache_lookup(cache, hit):
+    inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+@contextmanager
+def timed_decode(codec=None):
+    started = time.perf_counter()
+    yield
+    observe_decode(time.perf_counter() - started, codec)
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+def store_path():
+    return os.environ.get('METRICS_FILE') or os.path.join(disk_root(), STORE_FILE)
+
+
+def _read_store(path):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("counters", {})
+    state.setdefault("histograms", {})
+    return state
+
+
+@contextmanager
+def _store():
+    """Exclusive access to the metrics store; yields the state dict to modify."""
+    path = store_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(os.path.join(os.path.dirname(path) or '.', LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            state = _read_store(path)
+            yield state
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _store_snapshot():
+    """The store as last flushed, read under a shared lock."""
+    path = store_path()
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        return _read_store(path)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        try:
+            return _read_store(path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def flush():
+    """Merge this process's observations into the store."""
+    finish_job()
+    with _lock:
+        pending = {"counters": _pending["counters"], "histograms": _pending["histograms"]}
+        _pending["counters"], _pending["histograms"] = {}, {}
+    if not pending["counters"] and not pending["histograms"]:
+        return
+    try:
+        with _store() as state:
+            for name, series in pending["counters"].items():
+                stored = state["counters"].setdefault(name, {})
+                for key, value in series.items():
+                    stored[key] = stored.get(key, 0) + value
+            for name, series in pending["histograms"].items():
+                stored = state["histograms"].setdefault(name, {})
+                for key, hist in series.items():
+                    if key not in stored or len(stored[key]["buckets"]) != len(hist["buckets"]):
+                        stored[key] = hist
+                        continue
+                    target = stored[key]
+                    target["buckets"] = [a + b for a, b in zip(target["buckets"], hist["buckets"])]
+                    target["sum"] += hist["sum"]
+                    target["count"] += hist["count"]
+    except OSError:
+        pass
+
+
+# ============================================================================
+# EXPOSITION
+# ============================================================================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _live_gauges():
+    """Queue depth and reserved memory from the admission ledger."""
+    from admission import ledger_snapshot, memory_budget
+    ledger = ledger_snapshot()
+    running, queue = list(ledger["running"].values()), ledger["queue"]
+    return [
+        ('admission_running_jobs', "Jobs currently admitted", len(running)),
+        ('admission_queued_jobs', "Jobs waiting for memory", len(queue)),
+        ('admission_reserved_bytes', "Memory reserved by running jobs", sum(job["bytes"] for job in running)),
+        ('admission_budget_bytes', "Memory budget over all jobs (0: admission control off)", memory_budget()),
+    ]
+
+
+def render():
+    """The store (plus live gauges) in the Prometheus text format."""
+    state = _store_snapshot()
+    counters, histograms = state["counters"], state["histograms"]
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = (counters if kind == 'counter' else histograms).get(name, {})
+        full = PREFIX + name
+        lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+        for key in sorted(series):
+            labels = json.loads(key)
+            if kind == 'counter':
+                lines.append(f"{full}{_format_labels(labels)} {_number(series[key])}")
+                continue
+            hist, cumulative = series[key], 0
+            for bound, count in zip(buckets, hist["buckets"]):
+                cumulative += count
+                lines.append(f"{full}_bucket{_format_labels(dict(labels, le=_number(float(bound))))} {cumulative}")
+            lines.append(f"{full}_bucket{_format_labels(dict(labels, le='+Inf'))} {hist['count']}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {_number(float(hist['sum']))}")
+            lines.append(f"{full}_count{_format_labels(labels)} {hist['count']}")
+
+    # Hit ratio per cache, from the lookup counters
+    lookups = {}
+    for key, value in counters.get('cache_requests_total', {}).items():
+        labels = json.loads(key)
+        hits, total = lookups.get(labels.get("cache"), (0, 0))
+        lookups[labels.get("cache")] = (hits + (value if labels.get("result") == 'hit' else 0), total + value)
+    lines += [f"# HELP {PREFIX}cache_hit_ratio Share of cache lookups that were hits",
+              f"# TYPE {PREFIX}cache_hit_ratio gauge"]
+    for cache, (hits, total) in sorted(lookups.items()):
+        lines.append(f"{PREFIX}cache_hit_ratio{_format_labels({'cache': cache})} {_number(hits / total if total else 0.0)}")
+
+    try:
+        gauges = _live_gauges()
+    except OSError:
+        gauges = []
+    for name, help_text, value in gauges:
+        lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} gauge", f"{PREFIX}{name} {value}"]
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'reset':
+        with _store() as state:
+            state["counters"], state["histograms"] = {}, {}
+        print(json.dumps({"success": True, "store": store_path()}))
+    elif command is None:
+        sys.stdout.write(render())
+    else:
+        print(json.dumps({"success": False, "error": "Usage: metrics.py [reset]"}))
+        sys.exit(1)
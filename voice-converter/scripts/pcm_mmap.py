@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped PCM Reader
+Zero-copy access to uncompressed WAV / RF64 / BW64 / AIFF / AIFF-C files:
+- Parses the container headers and maps the PCM payload with np.memmap
+  (or wraps an in-memory image, e.g. stdin or shared memory, with np.frombuffer)
+- Samples stay on disk until a block is converted to float32
+- Blockwise mono mixdown and STFT matching librosa.load / librosa.stft
+- Raw sample-range copy to a new WAV without decoding (used by the trimmer)
+
+Anything that is not plain PCM/float (compressed AIFF-C, ADPCM WAV, MP3, ...)
+makes open_pcm() return None so callers can fall back to librosa/pydub.
+"""
+
+import os
+import sys
+import struct
+import numpy as np
+
+# Frames converted to float per block (~1 MB per channel as float32)
+BLOCK_FRAMES = 1 << 18
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# AIFF-C compression types we can map directly: (sample format, big endian)
+AIFC_COMPRESSION = {
+    b'NONE': ('int', True),
+    b'twos': ('int', True),
+    b'sowt': ('int', False),
+    b'fl32': ('float', True),
+    b'FL32': ('float', True),
+    b'fl64': ('float', True),
+    b'FL64': ('float', True),
+}
+
+
+class PcmMap:
+    """
+    Memory-mapped view of an uncompressed audio file.
+
+    Attributes:
+        path: Source file path (a display name for in-memory images)
+        container: 'wav', 'rf64' or 'aiff'
+        samplerate: Sample rate in Hz
+        channels: Number of interleaved channels
+        bits: Bits per sample (8, 16, 24, 32 or 64)
+        sample_format: 'int' or 'float'
+        big_endian: Byte order of the payload
+        data_offset: Byte offset of the first sample frame
+        n_frames: Number of sample frames
+        frames: np.memmap of shape (n_frames, channels), or
+                (n_frames, channels, 3) uint8 for packed 24-bit
+        fmt_chunk: Raw WAV 'fmt ' chunk payload (None for AIFF)
+        buffer: In-memory file image the frames are read from (None = map path)
+    """
+
+    def __init__(self, path, container, samplerate, channels, bits, sample_format,
+                 big_endian, data_offset, n_frames, fmt_chunk=None, buffer=None):
+        self.path = path
+        self.buffer = buffer
+        self.container = container
+        self.samplerate = int(samplerate)
+        self.channels = channels
+        self.bits = bits
+        self.sample_format = sample_format
+        self.big_endian = big_endian
+        self.data_offset = data_offset
+        self.n_frames = n_frames
+        self.fmt_chunk = fmt_chunk
+        self.bytes_per_sample = bits // 8
+        self.block_align = self.bytes_per_sample * channels
+        self.frames = self._map()
+
+    @property
+    def duration(self):
+        return self.n_frames / self.samplerate if self.samplerate else 0.0
+
+    def _map(self):
+        if self.bytes_per_sample == 3:
+            dtype, shape = np.uint8, (self.n_frames, self.channels, 3)
+        else:
+            dtype, shape = np.dtype(_numpy_dtype(self)), (self.n_frames, self.channels)
+        if self.n_frames == 0:
+            # np.memmap refuses zero-length mappings
+            return np.zeros(shape, dtype=dtype)
+        if self.buffer is not None:
+            count = int(np.prod(shape))
+            return np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.data_offset).reshape(shape)
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=self.data_offset, shape=shape)
+
+    def to_float(self, start=0, stop=None, mono=False):
+        """
+        Convert frames [start, stop) to float32 in the range used by libsndfile.
+
+        Returns:
+            (n,) array if mono, otherwise (n, channels)
+        """
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        start = max(0, min(start, stop))
+        block = self.frames[start:stop]
+
+        if self.bytes_per_sample == 3:
+            hi, mid, lo = (0, 1, 2) if self.big_endian else (2, 1, 0)
+            ints = (block[..., lo].astype(np.int32) << 8) | (block[..., mid].astype(np.int32) << 16) | (block[..., hi].astype(np.int32) << 24)
+            y = ints.astype(np.float32) * np.float32(1.0 / 2147483648.0)
+        elif self.sample_format == 'float':
+            y = block.astype(np.float32)
+        elif self.bits == 8:
+            if self.container in ('wav', 'rf64'):
+                # WAV 8-bit is unsigned with a 128 offset
+                y = (block.astype(np.float32) - 128.0) * np.float32(1.0 / 128.0)
+            else:
+                y = block.astype(np.float32) * np.float32(1.0 / 128.0)
+        else:
+            y = block.astype(np.float32) * np.float32(1.0 / float(1 << (self.bits - 1)))
+
+        if mono:
+            return np.mean(y, axis=1) if self.channels > 1 else y[:, 0]
+        return y
+
+    def iter_blocks(self, block_frames=BLOCK_FRAMES, mono=False):
+        """Yield (start_frame, float32 block) pairs covering the whole file."""
+        for start in range(0, self.n_frames, block_frames):
+            yield start, self.to_float(start, start + block_frames, mono=mono)
+
+    def to_float_padded(self, start, stop, mono=False):
+        """Like to_float() but zero-fills frames outside the file (for centered STFT frames)."""
+        length = stop - start
+        if start >= 0 and stop <= self.n_frames:
+            return self.to_float(start, stop, mono=mono)
+        shape = (length,) if mono else (length, self.channels)
+        out = np.zeros(shape, dtype=np.float32)
+        lo, hi = max(start, 0), min(stop, self.n_frames)
+        if hi > lo:
+            out[lo - start:hi - start] = self.to_float(lo, hi, mono=mono)
+        return out
+
+
+def _numpy_dtype(pcm):
+    order = '>' if pcm.big_endian else '<'
+    if pcm.sample_format == 'float':
+        return f'{order}f{pcm.bytes_per_sample}'
+    if pcm.bits == 8:
+        # WAV stores 8-bit unsigned, AIFF signed
+        return 'u1' if pcm.container in ('wav', 'rf64') else 'i1'
+    return f'{order}i{pcm.bytes_per_sample}'
+
+
+def _read_extended(b):
+    """Decode an 80-bit IEEE 754 extended float (AIFF sample rate)."""
+    exponent = ((b[0] & 0x7F) << 8) | b[1]
+    mantissa = int.from_bytes(b[2:10], 'big')
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    value = mantissa * 2.0 ** (exponent - 16383 - 63)
+    return -value if b[0] & 0x80 else value
+
+
+class _BufferReader:
+    """Minimal seekable reader over a bytes-like object, without copying it."""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.pos = 0
+
+    def read(self, size=-1):
+        end = len(self.view) if size < 0 else min(self.pos + size, len(self.view))
+        data = bytes(self.view[self.pos:end])
+        self.pos = max(self.pos, end)
+        return data
+
+    def seek(self, pos):
+        self.pos = pos
+
+    def tell(self):
+        return self.pos
+
+
+def wav_format(fmt):
+    """
+    Decode a WAV 'fmt ' chunk payload.
+
+    Returns:
+        (channels, samplerate, bits, sample_format), or None if the payload
+        is not plain PCM/float we can read directly
+    """
+    if fmt is None or len(fmt) < 16:
+        return None
+    audio_format, channels, samplerate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        # First two bytes of the SubFormat GUID carry the real format tag
+        audio_format = struct.unpack('<H', fmt[24:26])[0]
+
+    if audio_format == WAVE_FORMAT_PCM and bits in (8, 16, 24, 32):
+        sample_format = 'int'
+    elif audio_format == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        sample_format = 'float'
+    else:
+        return None
+    if channels < 1 or block_align != channels * bits // 8:
+        return None
+    return channels, samplerate, bits, sample_format
+
+
+def _parse_wav(f, path, file_size, container, buffer=None):
+    fmt = None
+    data_offset = data_size = None
+    ds64_data_size = None
+
+    f.seek(12)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+        chunk_start = f.tell()
+
+        if chunk_id == b'ds64':
+            payload = f.read(min(chunk_size, 28))
+            if len(payload) >= 16:
+                ds64_data_size = struct.unpack('<Q', payload[8:16])[0]
+        elif chunk_id == b'fmt ':
+            fmt = f.read(chunk_size)
+        elif chunk_id == b'data':
+            data_offset = chunk_start
+            if chunk_size == 0xFFFFFFFF and ds64_data_size is not None:
+                data_size = ds64_data_size
+            else:
+                data_size = chunk_size
+            # Streamed/unfinalized files may have a bogus size - trust the file length
+            data_size = min(data_size, file_size - data_offset)
+            break
+
+        f.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+    decoded = wav_format(fmt)
+    if decoded is None or data_offset is None:
+        return None
+    channels, samplerate, bits, sample_format = decoded
+
+    return PcmMap(path, container, samplerate, channels, bits, sample_format,
+                  False, data_offset, data_size // (channels * bits // 8), fmt_chunk=fmt, buffer=buffer)
+
+
+def _parse_aiff(f, path, file_size, is_aifc, buffer=None):
+    comm = None
+    data_offset = data_size = None
+
+    f.seek(12)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack('>4sI', header)
+        chunk_start = f.tell()
+
+        if chunk_id == b'COMM':
+            comm = f.read(chunk_size)
+        elif chunk_id == b'SSND':
+            offset, _ = struct.unpack('>II', f.read(8))
+            data_offset = chunk_start + 8 + offset
+            data_size = min(chunk_size - 8 - offset, file_size - data_offset)
+
+        f.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+    if comm is None or data_offset is None or len(comm) < 18:
+        return None
+
+    channels, n_frames, bits = struct.unpack('>HIH', comm[:8])
+    samplerate = _read_extended(comm[8:18])
+    sample_format, big_endian = 'int', True
+    if is_aifc:
+        compression = comm[18:22]
+        if compression not in AIFC_COMPRESSION:
+            return None
+        sample_format, big_endian = AIFC_COMPRESSION[compression]
+
+    if sample_format == 'int' and bits not in (8, 16, 24, 32):
+        return None
+    if sample_format == 'float' and bits not in (32, 64):
+        return None
+    if channels < 1:
+        return None
+
+    block_align = channels * bits // 8
+    n_frames = min(n_frames, data_size // block_align)
+    return PcmMap(path, 'aiff', samplerate, channels, bits, sample_format,
+                  big_endian, data_offset, n_frames, buffer=buffer)
+
+
+def _parse(f, path, file_size, buffer=None):
+    header = f.read(12)
+    if len(header) < 12:
+        return None
+    magic, form = header[:4], header[8:12]
+    if magic == b'RIFF' and form == b'WAVE':
+        return _parse_wav(f, path, file_size, 'wav', buffer)
+    if magic in (b'RF64', b'BW64') and form == b'WAVE':
+        return _parse_wav(f, path, file_size, 'rf64', buffer)
+    if magic == b'FORM' and form in (b'AIFF', b'AIFC'):
+        return _parse_aiff(f, path, file_size, form == b'AIFC', buffer)
+    return None
+
+
+def open_pcm(path):
+    """
+    Map an uncompressed WAV/RF64/AIFF file.
+
+    Returns:
+        PcmMap, or None if the file is not a PCM/float container we can map
+    """
+    if not isinstance(path, (str, bytes, os.PathLike)) or not os.path.isfile(path):
+        return None
+    try:
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            return _parse(f, path, file_size)
+    except (OSError, struct.error, ValueError) as e:
+        print(f"Warning: Could not map PCM file ({e}), falling back to decoder", file=sys.stderr, flush=True)
+    return None
+
+
+def open_pcm_buffer(buffer, name='<memory>'):
+    """
+    Wrap an uncompressed WAV/RF64/AIFF file image held in memory
+    (stdin contents, a shared memory block, ...) without copying it.
+
+    Returns:
+        PcmMap, or None if the image is not a PCM/float container
+    """
+    try:
+        reader = _BufferReader(buffer)
+        return _parse(reader, name, len(reader.view), buffer=reader.view)
+    except (struct.error, ValueError) as e:
+        print(f"Warning: Could not read PCM image ({e}), falling back to decoder", file=sys.stderr, flush=True)
+    return None
+
+
+def load_float(pcm, mono=True, block_frames=BLOCK_FRAMES):
+    """
+    Convert the whole file to float32 into one preallocated array.
+
+    Equivalent to librosa.load(path, sr=None, mono=mono) but without the
+    intermediate multichannel float buffer and mono copy.
+    """
+    shape = (pcm.n_frames,) if mono else (pcm.n_frames, pcm.channels)
+    out = np.empty(shape, dtype=np.float32)
+    for start, block in pcm.iter_blocks(block_frames, mono=mono):
+        out[start:start + len(block)] = block
+    return out
+
+
+def stft(pcm, n_fft=2048, hop_length=512, block_frames=BLOCK_FRAMES, on_block=None):
+    """
+    Centered STFT of the mono mixdown, converting to float one block at a time.
+
+    Matches librosa.stft(y, n_fft, hop_length) with the default centered,
+    zero-padded framing, so results are interchangeable with the in-memory path.
+
+    Args:
+        on_block: Optional callable receiving every frame of the file exactly
+            once, in order, as (n, channels) float32 blocks - lets other
+            measurements share this decode pass
+    """
+    import librosa
+
+    n_frames_out = 1 + pcm.n_frames // hop_length
+    out = np.empty((1 + n_fft // 2, n_frames_out), dtype=np.complex64)
+    frames_per_block = max(1, block_frames // hop_length)
+    half = n_fft // 2
+    fed = 0
+
+    for f0 in range(0, n_frames_out, frames_per_block):
+        f1 = min(f0 + frames_per_block, n_frames_out)
+        # Frame t covers samples [t*hop - n_fft/2, t*hop - n_fft/2 + n_fft)
+        start = f0 * hop_length - half
+        stop = (f1 - 1) * hop_length - half + n_fft
+        if on_block is None:
+            block = pcm.to_float_padded(start, stop, mono=True)
+        else:
+            frames = pcm.to_float_padded(start, stop)
+            # Blocks overlap by n_fft - hop: pass on only the frames not seen yet
+            end = min(stop, pcm.n_frames)
+            if end > fed:
+                on_block(frames[fed - start:end - start])
+                fed = end
+            block = np.mean(frames, axis=1) if pcm.channels > 1 else frames[:, 0]
+        out[:, f0:f1] = librosa.stft(block, n_fft=n_fft, hop_length=hop_length, center=False)
+    return out
+
+
+def stft_stream(blocks, n_frames, n_fft=2048, hop_length=512, on_block=None):
+    """
+    stft() of samples that arrive as a sequence of blocks (e.g. a WAV still
+    being received on stdin): each STFT frame is computed as soon as its
+    samples are in, and only the last n_fft samples are held back.
+
+    Args:
+        blocks: Iterable of (n, channels) float32 blocks, n_frames in total
+        n_frames: Length stated by the header (sizes the output)
+        on_block: As for stft()
+
+    Raises:
+        ValueError if the blocks end before n_frames
+    """
+    import librosa
+
+    n_frames_out = 1 + n_frames // hop_length
+    out = np.empty((1 + n_fft // 2, n_frames_out), dtype=np.complex64)
+    half = n_fft // 2
+    # Samples from the start of the next frame on (the first frame starts half a window before the file)
+    pending = np.zeros(half, dtype=np.float32)
+    done = received = 0
+
+    def transform(samples, last=False):
+        nonlocal pending, done
+        pending = np.concatenate([pending, samples])
+        if last:
+            # Zero padding after the end, as for the centered frames of stft()
+            needed = (n_frames_out - done - 1) * hop_length + n_fft
+            pending = np.concatenate([pending, np.zeros(max(0, needed - len(pending)), dtype=np.float32)])
+        count = min(n_frames_out - done, (len(pending) - n_fft) // hop_length + 1 if len(pending) >= n_fft else 0)
+        if count > 0:
+            block = pending[:(count - 1) * hop_length + n_fft]
+            out[:, done:done + count] = librosa.stft(block, n_fft=n_fft, hop_length=hop_length, center=False)
+            pending = pending[count * hop_length:]
+            done += count
+
+    for frames in blocks:
+        frames = frames[:n_frames - received]
+        if not len(frames):
+            continue
+        received += len(frames)
+        if on_block is not None:
+            on_block(frames)
+        transform(np.mean(frames, axis=1, dtype=np.float32) if frames.shape[1] > 1 else frames[:, 0])
+    if received < n_frames:
+        raise ValueError(f"Input ended after {received} of {n_frames} frames")
+    transform(np.zeros(0, dtype=np.float32), last=True)
+    return out
+
+
+def wav_header(channels, samplerate, bits, data_size, fmt_chunk=None, float_format=False):
+    """
+    Build a WAV header for data_size bytes of PCM, switching to RF64 above 4 GB.
+
+    Args:
+        fmt_chunk: Optional raw 'fmt ' payload to reuse (keeps extensible layouts)
+    """
+    if fmt_chunk is None:
+        block_align = channels * bits // 8
+        tag = WAVE_FORMAT_IEEE_FLOAT if float_format else WAVE_FORMAT_PCM
+        fmt_chunk = struct.pack('<HHIIHH', tag, channels, samplerate,
+                                samplerate * block_align, block_align, bits)
+    fmt = b'fmt ' + struct.pack('<I', len(fmt_chunk)) + fmt_chunk + (b'\x00' if len(fmt_chunk) & 1 else b'')
+
+    # 'WAVE' + JUNK/ds64 chunk + fmt chunk + data chunk header + padded payload
+    riff_size = 4 + 36 + len(fmt) + 8 + data_size + (data_size & 1)
+    if riff_size <= 0xFFFFFFFF:
+        # Reserve a JUNK chunk where ds64 would go so the file can be upgraded in place
+        junk = b'JUNK' + struct.pack('<I', 28) + b'\x00' * 28
+        return (b'RIFF' + struct.pack('<I', riff_size) + b'WAVE' + junk + fmt +
+                b'data' + struct.pack('<I', data_size))
+
+    n_frames = data_size // (channels * bits // 8)
+    ds64 = b'ds64' + struct.pack('<I', 28) + struct.pack('<QQQI', riff_size, data_size, n_frames, 0)
+    return (b'RF64' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' + ds64 + fmt +
+            b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+def write_wav_slice(pcm, output_path, start_frame, stop_frame, block_frames=BLOCK_FRAMES):
+    """
+    Write frames [start_frame, stop_frame) to a new WAV without decoding.
+    output_path may also be an open binary stream.
+
+    WAV/RF64 payloads are copied byte-for-byte; AIFF payloads are
+    byte-swapped (and 8-bit re-biased) per block into WAV layout.
+    """
+    start_frame = max(0, start_frame)
+    stop_frame = min(stop_frame, pcm.n_frames)
+    n_frames = max(0, stop_frame - start_frame)
+    data_size = n_frames * pcm.block_align
+
+    fmt_chunk = pcm.fmt_chunk if pcm.container in ('wav', 'rf64') else None
+    header = wav_header(pcm.channels, pcm.samplerate, pcm.bits, data_size,
+                        fmt_chunk=fmt_chunk, float_format=pcm.sample_format == 'float')
+
+    if hasattr(output_path, 'write'):
+        # Already-open stream (e.g. stdout): the size is known up front, so no seeking is needed
+        _write_frames(pcm, output_path, header, start_frame, stop_frame, block_frames, data_size)
+    else:
+        with open(output_path, 'wb') as out:
+            _write_frames(pcm, out, header, start_frame, stop_frame, block_frames, data_size)
+    return n_frames
+
+
+def _write_frames(pcm, out, header, start_frame, stop_frame, block_frames, data_size):
+    out.write(header)
+    for start in range(start_frame, stop_frame, block_frames):
+        block = pcm.frames[start:min(start + block_frames, stop_frame)]
+        if pcm.big_endian:
+            block = block[..., ::-1] if pcm.bytes_per_sample == 3 else block.byteswap()
+        if pcm.container == 'aiff' and pcm.bits == 8:
+            block = (block.astype(np.int16) + 128).astype(np.uint8)
+        out.write(np.ascontiguousarray(block).tobytes())
+    if data_size & 1:
+        out.write(b'\x00')
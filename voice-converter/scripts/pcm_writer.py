@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Native PCM WAV Writer
+Packs float audio into 16/24/32-bit integer PCM WAV without an encoder process:
+- Vectorized TPDF dither (triangular, +/-1 LSB) when the word length shrinks
+- Optional error-feedback noise shaping (numba kernel, state carried across blocks)
+- Packed 3-byte 24-bit samples via a uint8 view, no per-sample Python loops
+- Written block by block; the header switches to RF64 above 4 GB
+  (pcm_mmap.wav_header) and is patched in place on close
+
+Replaces handing '-acodec pcm_sXXle' to ffmpeg through pydub's export.
+
+Usage as a script runs the throughput benchmark against the ffmpeg path:
+    python pcm_writer.py --benchmark [seconds]
+"""
+
+import io
+import sys
+import json
+import time
+import numpy as np
+from pcm_mmap import wav_header
+
+# Try to import numba for the noise shaping kernel (optional)
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+SAMPLE_BITS = (16, 24, 32)
+DITHER_MODES = ('tpdf', 'none')
+DEFAULT_DITHER = 'tpdf'
+
+# Error-feedback filters (coefficients applied to the previous errors):
+#   first-order: error spectrum rises 6 dB/octave, simple and robust
+#   f-weighted: Wannamaker's 3-tap psychoacoustic filter for 44.1/48 kHz
+NOISE_SHAPING_FILTERS = {
+    'first-order': (1.0,),
+    'f-weighted': (1.623, -0.982, 0.109),
+}
+
+# Frames quantized and written at once
+BLOCK_FRAMES = 1 << 16
+
+# pydub AudioSegment sample width -> numpy dtype of its raw data (8-bit is stored signed)
+SEGMENT_DTYPES = {1: np.int8, 2: np.dtype('<i2'), 4: np.dtype('<i4')}
+
+
+def _error_feedback(x, d, coeffs, error, lo, hi):
+    """
+    Quantize x (already scaled to LSBs) with dither d and error feedback.
+    error holds the last len(coeffs) errors per channel and is updated in place.
+    """
+    n, channels = x.shape
+    order = coeffs.shape[0]
+    out = np.empty((n, channels), dtype=np.float64)
+    for c in range(channels):
+        for i in range(n):
+            v = x[i, c]
+            for k in range(order):
+                v -= coeffs[k] * error[c, k]
+            q = np.floor(v + d[i, c] + 0.5)
+            if q < lo:
+                q = lo
+            elif q > hi:
+                q = hi
+            for k in range(order - 1, 0, -1):
+                error[c, k] = error[c, k - 1]
+            # Clipped samples would feed back huge errors: bound them
+            error[c, 0] = min(max(q - v, -2.0), 2.0)
+            out[i, c] = q
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _error_feedback = njit(_error_feedback)
+
+
+class PcmWriter:
+    """
+    Streaming float -> integer PCM WAV writer.
+
+    Usage:
+        with PcmWriter(path, 48000, 2, bits=24) as writer:
+            for block in blocks:
+                writer.write(block)
+
+    Args:
+        output: Path or binary stream; streams that cannot seek (stdout)
+            need n_frames up front since the header cannot be patched
+        samplerate: Sample rate in Hz
+        channels: Channel count
+        bits: 16, 24 or 32
+        dither: 'tpdf' or 'none' (32-bit output is never dithered: its
+            step is far below float32 resolution)
+        noise_shaping: None or a NOISE_SHAPING_FILTERS name (needs numba)
+        n_frames: Total frames, if known
+        seed: Dither RNG seed, for reproducible output
+    """
+
+    def __init__(self, output, samplerate, channels, bits=16, dither=DEFAULT_DITHER, noise_shaping=None,
+                 n_frames=None, seed=None):
+        if bits not in SAMPLE_BITS:
+            raise ValueError(f"Unsupported PCM bit depth {bits} (use {', '.join(map(str, SAMPLE_BITS))})")
+        if dither not in DITHER_MODES:
+            raise ValueError(f"Unknown dither '{dither}' (use {', '.join(DITHER_MODES)})")
+        if noise_shaping is not None:
+            if noise_shaping not in NOISE_SHAPING_FILTERS:
+                raise ValueError(f"Unknown noise shaping '{noise_shaping}' (use {', '.join(NOISE_SHAPING_FILTERS)})")
+            if not NUMBA_AVAILABLE:
+                raise ValueError("Noise shaping requires numba, which is not installed")
+
+        self.samplerate = int(samplerate)
+        self.channels = int(channels)
+        self.bits = bits
+        self.dither = 'none' if bits == 32 else dither
+        self.coeffs = None if noise_shaping is None or bits == 32 else np.array(NOISE_SHAPING_FILTERS[noise_shaping])
+        self.error = np.zeros((self.channels, 0 if self.coeffs is None else len(self.coeffs)))
+        self.rng = np.random.default_rng(seed)
+        self.block_align = self.channels * bits // 8
+        self.n_frames = n_frames
+        self.frames_written = 0
+
+        self._owns_file = not hasattr(output, 'write')
+        self.f = open(output, 'wb') if self._owns_file else output
+        try:
+            self._seekable = self.f.seekable()
+        except (AttributeError, OSError):
+            self._seekable = False
+        if n_frames is None and not self._seekable:
+            raise ValueError("n_frames is required when writing to a stream that cannot seek")
+        self.f.write(self._header((n_frames or 0) * self.block_align))
+
+    def _header(self, data_size):
+        return wav_header(self.channels, self.samplerate, self.bits, data_size)
+
+    def quantize(self, block):
+        """float (n, channels) block in [-1, 1) -> int32 sample values at self.bits."""
+        scale = float(1 << (self.bits - 1))
+        x = np.multiply(block, scale, dtype=np.float64)
+        if self.dither == 'tpdf':
+            # Difference of two uniform variables: triangular on [-1, 1] LSB
+            # (float32 is plenty for the dither and twice as fast to draw)
+            u = self.rng.random((2,) + x.shape, dtype=np.float32)
+            d = u[0] - u[1]
+        else:
+            d = np.zeros_like(x) if self.coeffs is not None else None
+
+        if self.coeffs is not None:
+            q = _error_feedback(x, d.astype(np.float64), self.coeffs, self.error, -scale, scale - 1)
+        else:
+            q = x
+            if d is not None:
+                q += d
+            np.rint(q, out=q)
+            np.clip(q, -scale, scale - 1, out=q)
+        return q.astype(np.int32)
+
+    def pack(self, ints):
+        """int32 sample values -> little-endian PCM bytes."""
+        if self.bits == 16:
+            return ints.astype('<i2').tobytes()
+        if self.bits == 24:
+            # Low three bytes of each little-endian int32, copied byte plane by
+            # byte plane (much faster than a strided [:, :3] copy)
+            planes = np.ascontiguousarray(ints, dtype='<i4').reshape(-1).view(np.uint8).reshape(-1, 4)
+            packed = np.empty((len(planes), 3), dtype=np.uint8)
+            for byte in range(3):
+                packed[:, byte] = planes[:, byte]
+            return packed.tobytes()
+        return ints.astype('<i4').tobytes()
+
+    def write(self, block):
+        """Append float samples: (n,) for mono or (n, channels)."""
+        block = np.asarray(block)
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        if block.shape[1] != self.channels:
+            raise ValueError(f"Expected {self.channels} channels, got {block.shape[1]}")
+        self.write_ints(self.quantize(block))
+
+    def write_ints(self, ints):
+        """Append integer sample values already at self.bits, shape (n, channels)."""
+        self.f.write(self.pack(ints))
+        self.frames_written += len(ints)
+
+    def close(self):
+        data_size = self.frames_written * self.block_align
+        if data_size & 1:
+            self.f.write(b'\x00')
+        if self.n_frames != self.frames_written:
+            if not self._seekable:
+                raise ValueError(f"Wrote {self.frames_written} frames but the header promised {self.n_frames}")
+            # RIFF and RF64 headers have the same length, so this never moves the data
+            end = self.f.tell()
+            self.f.seek(0)
+            self.f.write(self._header(data_size))
+            self.f.seek(end)
+        if self._owns_file:
+            self.f.close()
+        else:
+            self.f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._owns_file:
+            self.f.close()
+
+
+def write_pcm(output, y, samplerate, bits=16, dither=DEFAULT_DITHER, noise_shaping=None, seed=None,
+              block_frames=BLOCK_FRAMES):
+    """
+    Write a float array ((n,) or (n, channels), range [-1, 1)) as a PCM WAV.
+
+    Returns:
+        Number of frames written
+    """
+    y = np.asarray(y)
+    channels = 1 if y.ndim == 1 else y.shape[1]
+    with PcmWriter(output, samplerate, channels, bits, dither, noise_shaping, n_frames=len(y), seed=seed) as writer:
+        for start in range(0, len(y), block_frames):
+            writer.write(y[start:start + block_frames])
+    return len(y)
+
+
+def _bits_lost(samples, shift, block_frames):
+    """True if dropping the low `shift` bits would lose information."""
+    if shift <= 0:
+        return False
+    mask = (1 << shift) - 1
+    for start in range(0, len(samples), block_frames):
+        low = samples[start:start + block_frames] & mask
+        # pydub widens 24-bit files to 32 bits filling the new low byte with
+        # zeros (positive) or ones (negative samples): nothing to lose there
+        if np.any((low != 0) & (low != mask)):
+            return True
+    return False
+
+
+def write_segment(output, audio, bits, dither=None, noise_shaping=None, seed=None, block_frames=BLOCK_FRAMES):
+    """
+    Write a pydub AudioSegment as a PCM WAV at the given bit depth,
+    converting its raw samples block by block.
+
+    Args:
+        dither: 'tpdf'/'none'; by default conversions that lose no bits
+            (16 -> 24 bit, or a 24-bit file pydub held as 32 bits) are done
+            as exact integer shifts and everything else is TPDF dithered
+
+    Returns:
+        Number of frames written
+    """
+    source_bits = 8 * audio.sample_width
+    shift = source_bits - bits
+    samples = np.frombuffer(audio.raw_data, dtype=SEGMENT_DTYPES[audio.sample_width]).reshape(-1, audio.channels)
+    exact = dither is None and noise_shaping is None and not _bits_lost(samples, shift, block_frames)
+    if dither is None:
+        dither = DEFAULT_DITHER
+    scale = float(1 << (source_bits - 1))
+    with PcmWriter(output, audio.frame_rate, audio.channels, bits, dither, noise_shaping,
+                   n_frames=len(samples), seed=seed) as writer:
+        for start in range(0, len(samples), block_frames):
+            block = samples[start:start + block_frames]
+            if exact:
+                ints = block.astype(np.int32)
+                writer.write_ints(ints >> shift if shift > 0 else ints << -shift)
+            else:
+                writer.write(block / scale)
+    return len(samples)
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+def _ffmpeg_export(audio, bits):
+    out = io.BytesIO()
+    audio.export(out, format='wav', parameters=['-acodec', f'pcm_s{bits}le'])
+    return out.getvalue()
+
+
+def _native_export(audio, bits, noise_shaping=None):
+    out = io.BytesIO()
+    write_segment(out, audio, bits, noise_shaping=noise_shaping, seed=0)
+    return out.getvalue()
+
+
+def benchmark(seconds=60.0, sr=48000):
+    """
+    Throughput of the native writer vs pydub/ffmpeg export, starting from
+    the 16- and 32-bit AudioSegments convert_audio works with.
+    """
+    from pydub import AudioSegment
+
+    rng = np.random.default_rng(0)
+    y = np.clip(rng.standard_normal((int(sr * seconds), 2)) * 0.1, -1, 1)
+    sources = {}
+    for width in (2, 4):
+        scale = float(1 << (8 * width - 1))
+        ints = np.clip(np.round(y * scale), -scale, scale - 1).astype(SEGMENT_DTYPES[width])
+        sources[width] = AudioSegment(ints.tobytes(), frame_rate=sr, sample_width=width, channels=2)
+
+    candidates = []
+    for width, bits in ((2, 16), (2, 24), (4, 16), (4, 24), (4, 32)):
+        source = f"{8 * width}-bit -> {bits}-bit"
+        candidates.append((f"ffmpeg via pydub ({source})", lambda a=sources[width], b=bits: _ffmpeg_export(a, b)))
+        candidates.append((f"native ({source})", lambda a=sources[width], b=bits: _native_export(a, b)))
+    if NUMBA_AVAILABLE:
+        # First call compiles the kernel; keep that out of the timing
+        _native_export(sources[4]._spawn(sources[4].raw_data[:4096]), 16, 'f-weighted')
+        candidates.append(("native (32-bit -> 16-bit, f-weighted shaping)",
+                           lambda: _native_export(sources[4], 16, 'f-weighted')))
+
+    results = []
+    for label, fn in candidates:
+        start = time.perf_counter()
+        data = fn()
+        elapsed = time.perf_counter() - start
+        results.append({
+            "method": label,
+            "seconds": round(elapsed, 3),
+            "realtimeFactor": round(seconds / elapsed, 1),
+            "outputMBps": round(len(data) / (1024 * 1024) / elapsed, 1),
+        })
+        print(f"{label:50s} {elapsed:7.3f}s  {seconds / elapsed:7.1f}x realtime  {results[-1]['outputMBps']:7.1f} MB/s", file=sys.stderr, flush=True)
+
+    # Widening conversions are exact, so both paths must produce the same samples
+    for width, bits in ((2, 24), (2, 32)):
+        native, ffmpeg = _native_export(sources[width], bits), _ffmpeg_export(sources[width], bits)
+        size = len(sources[width].raw_data) * bits // (8 * width)
+        results.append({"check": f"{8 * width}-bit -> {bits}-bit identical to ffmpeg",
+                        "identical": native[-size:] == ffmpeg[-size:]})
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != '--benchmark':
+        print("Usage: pcm_writer.py --benchmark [seconds]", file=sys.stderr)
+        sys.exit(1)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    print(json.dumps({"success": True, "benchmark": benchmark(seconds)}))
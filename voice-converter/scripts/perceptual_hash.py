@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Perceptual Audio Hash Index
+Recognizes re-uploads of the same master across encodings and trims:
+- 32-bit sub-fingerprint per ~11.6 ms frame from the sign of band-energy
+  differences over time and frequency (Haitsma/Kalker style), computed
+  from the analyzer's STFT magnitude
+- Bands and time grid are fixed in Hz/seconds, so 44.1/48/96 kHz copies
+  of a track hash alike
+- Index on disk: append-only hashes.u32 + a sorted lookup table; lookup
+  seeds candidate alignments from exact sub-fingerprint hits, then
+  verifies them by Hamming distance (bit error rate)
+- Each indexed track carries its cached analysis result
+
+Usage:
+    python perceptual_hash.py add <index_dir> <audio>
+    python perceptual_hash.py lookup <index_dir> <audio>
+    python perceptual_hash.py info <index_dir>
+"""
+
+import os
+import sys
+import json
+import fcntl
+from contextlib import contextmanager
+import numpy as np
+from fft_backend import configure_fft
+
+INDEX_VERSION = 1
+HASHES_FILE = 'hashes.u32'
+SORTED_VALUES_FILE = 'sorted_values.u32'
+SORTED_POSITIONS_FILE = 'sorted_positions.u32'
+TRACKS_FILE = 'tracks.json'
+LOCK_FILE = '.lock'
+
+# Fingerprint frame grid (the analyzer's hop at 44.1 kHz)
+HOP_SECONDS = 512 / 44100
+# 33 log-spaced bands give 32 difference bits per frame
+BAND_MIN_HZ = 300.0
+BAND_MAX_HZ = 3000.0
+BAND_COUNT = 33
+
+# Matching
+MATCH_MAX_BIT_ERROR_RATE = 0.35  # unrelated audio sits around 0.5
+MIN_OVERLAP_SECONDS = 2.0
+MAX_QUERY_SEEDS = 2048
+MAX_HITS_PER_VALUE = 64          # very common values carry no information
+MAX_CANDIDATES = 8
+
+_BAND_EDGES = np.geomspace(BAND_MIN_HZ, BAND_MAX_HZ, BAND_COUNT + 1)
+_BIT_WEIGHTS = (1 << np.arange(BAND_COUNT - 1, dtype=np.uint64)).astype(np.uint64)
+
+
+def band_energies(magnitude, sr, n_fft):
+    """
+    Log energy per fingerprint band and STFT frame.
+
+    Band edges are interpolated on the cumulative power spectrum, so bands
+    narrower than an FFT bin still get a proportional share of its energy.
+    """
+    power = np.asarray(magnitude, dtype=np.float64) ** 2
+    cumulative = np.concatenate([np.zeros((1, power.shape[1])), np.cumsum(power, axis=0)], axis=0)
+    # Bin k covers [(k - 0.5), (k + 0.5)) * bin_hz; cumulative row j is the energy below (j - 0.5) * bin_hz
+    position = np.clip(_BAND_EDGES / (sr / n_fft) + 0.5, 0, power.shape[0])
+    lower = np.minimum(position.astype(np.int64), power.shape[0] - 1)
+    frac = (position - lower)[:, np.newaxis]
+    at_edges = cumulative[lower] + frac * (cumulative[lower + 1] - cumulative[lower])
+    return np.log10(np.diff(at_edges, axis=0) + 1e-12)
+
+
+def fingerprint(magnitude, sr, n_fft=2048, hop_length=512):
+    """
+    Sub-fingerprints (uint32, one per HOP_SECONDS) of an STFT magnitude.
+    """
+    energies = band_energies(magnitude, sr, n_fft)
+    frames = energies.shape[1]
+    if frames < 2:
+        return np.zeros(0, dtype=np.uint32)
+
+    # Resample the frame axis onto the fixed time grid
+    frame_seconds = hop_length / sr
+    grid = np.arange(0, (frames - 1) * frame_seconds, HOP_SECONDS) / frame_seconds
+    lower = np.minimum(grid.astype(np.int64), frames - 2)
+    frac = grid - lower
+    energies = energies[:, lower] * (1 - frac) + energies[:, lower + 1] * frac
+
+    band_diff = energies[:-1, :] - energies[1:, :]
+    bits = (band_diff[:, 1:] - band_diff[:, :-1]) > 0
+    return (bits.T.astype(np.uint64) @ _BIT_WEIGHTS).astype(np.uint32)
+
+
+def bit_error_rate(a, b):
+    """Fraction of differing bits between two equal-length sub-fingerprint arrays."""
+    if len(a) == 0:
+        return 1.0
+    differing = np.unpackbits(np.bitwise_xor(a, b).view(np.uint8)).sum()
+    return float(differing) / (32 * len(a))
+
+
+class HashIndex:
+    """
+    Perceptual hash index directory.
+
+    Usage:
+        index = HashIndex('hash_index/')
+        match = index.lookup(fp)          # None or dict with the cached result
+        index.add('track', fp, result)    # after a fresh analysis
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.tracks = []
+        self.hashes = np.zeros(0, dtype=np.uint32)
+        self.sorted_values = np.zeros(0, dtype=np.uint32)
+        self.sorted_positions = np.zeros(0, dtype=np.uint32)
+        if os.path.exists(self._path(TRACKS_FILE)):
+            with self._locked(fcntl.LOCK_SH):
+                self._load()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    @contextmanager
+    def _locked(self, mode):
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(self._path(LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        with open(self._path(TRACKS_FILE)) as f:
+            metadata = json.load(f)
+        if metadata.get("version") != INDEX_VERSION:
+            raise ValueError(f"Hash index {self.index_dir} was built with an incompatible version; rebuild it")
+        self.tracks = metadata["tracks"]
+        total = sum(track["length"] for track in self.tracks)
+        # Frames appended by a writer that has not finished are ignored
+        self.hashes = np.memmap(self._path(HASHES_FILE), dtype='<u4', mode='r', shape=(total,)) if total else self.hashes
+        if metadata.get("indexedFrames") == total and total:
+            self.sorted_values = np.memmap(self._path(SORTED_VALUES_FILE), dtype='<u4', mode='r', shape=(total,))
+            self.sorted_positions = np.memmap(self._path(SORTED_POSITIONS_FILE), dtype='<u4', mode='r', shape=(total,))
+        elif total:
+            self.sorted_values, self.sorted_positions = self._sort(self.hashes)
+
+    @staticmethod
+    def _sort(hashes):
+        order = np.argsort(hashes, kind='stable').astype(np.uint32)
+        return np.asarray(hashes)[order], order
+
+    def _track_starts(self):
+        return np.array([track["start"] for track in self.tracks], dtype=np.int64)
+
+    def lookup(self, query):
+        """
+        Best matching indexed track for a query fingerprint.
+
+        Returns:
+            None, or dict with id, bitErrorRate, offsetSeconds and the
+            cached result of that track
+        """
+        min_overlap = int(MIN_OVERLAP_SECONDS / HOP_SECONDS)
+        if not self.tracks or len(query) < min_overlap:
+            return None
+
+        # Seeds: query frames whose exact value occurs in the index
+        query_frames = np.linspace(0, len(query) - 1, min(len(query), MAX_QUERY_SEEDS)).astype(np.int64)
+        values = query[query_frames]
+        informative = (values != 0) & (values != 0xFFFFFFFF)
+        query_frames, values = query_frames[informative], values[informative]
+        left = np.searchsorted(self.sorted_values, values, side='left')
+        right = np.searchsorted(self.sorted_values, values, side='right')
+        hits = right - left
+        usable = (hits > 0) & (hits <= MAX_HITS_PER_VALUE)
+        if not np.any(usable):
+            return None
+        left, hits, query_frames = left[usable], hits[usable], query_frames[usable]
+
+        # Expand every hit range into (index position, query frame) pairs
+        seed_of_hit = np.repeat(np.arange(len(hits)), hits)
+        within = np.arange(hits.sum()) - np.repeat(np.cumsum(hits) - hits, hits)
+        positions = np.asarray(self.sorted_positions[left[seed_of_hit] + within], dtype=np.int64)
+        starts = self._track_starts()
+        track_rows = np.searchsorted(starts, positions, side='right') - 1
+        offsets = positions - starts[track_rows] - query_frames[seed_of_hit]
+
+        # Vote on (track, alignment) and verify the strongest candidates
+        keys = np.stack([track_rows, offsets], axis=1)
+        candidates, votes = np.unique(keys, axis=0, return_counts=True)
+        best = None
+        for row, offset in candidates[np.argsort(votes)[::-1][:MAX_CANDIDATES]]:
+            track = self.tracks[row]
+            ref_start = max(0, offset)
+            query_start = max(0, -offset)
+            overlap = min(track["length"] - ref_start, len(query) - query_start)
+            if overlap < min_overlap:
+                continue
+            ref = np.asarray(self.hashes[track["start"] + ref_start: track["start"] + ref_start + overlap])
+            ber = bit_error_rate(ref, query[query_start:query_start + overlap])
+            if ber <= MATCH_MAX_BIT_ERROR_RATE and (best is None or ber < best["bitErrorRate"]):
+                best = {
+                    "id": track["id"],
+                    "bitErrorRate": round(ber, 4),
+                    "offsetSeconds": round(float(offset) * HOP_SECONDS, 3),
+                    "result": track.get("result"),
+                }
+        return best
+
+    def add(self, track_id, fp, result=None, **info):
+        """Append a track's fingerprint (and cached result) to the index."""
+        fp = np.ascontiguousarray(fp, dtype='<u4')
+        with self._locked(fcntl.LOCK_EX):
+            # Re-read under the exclusive lock: another job may have added tracks
+            if os.path.exists(self._path(TRACKS_FILE)):
+                self._load()
+            start = sum(track["length"] for track in self.tracks)
+            with open(self._path(HASHES_FILE), 'r+b' if os.path.exists(self._path(HASHES_FILE)) else 'wb') as f:
+                f.seek(start * 4)
+                f.write(fp.tobytes())
+                f.truncate()
+
+            self.tracks.append({"id": track_id, "start": start, "length": len(fp), "result": result, **info})
+            total = start + len(fp)
+            self.hashes = np.fromfile(self._path(HASHES_FILE), dtype='<u4', count=total)
+            self.sorted_values, self.sorted_positions = self._sort(self.hashes)
+            self.sorted_values.astype('<u4').tofile(self._path(SORTED_VALUES_FILE))
+            self.sorted_positions.astype('<u4').tofile(self._path(SORTED_POSITIONS_FILE))
+
+            tmp = self._path(TRACKS_FILE + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump({"version": INDEX_VERSION, "hopSeconds": HOP_SECONDS,
+                           "indexedFrames": total, "tracks": self.tracks}, f)
+            os.replace(tmp, self._path(TRACKS_FILE))
+
+
+def fingerprint_file(input_path):
+    """Fingerprint of an audio file, via the analyzer's input path and STFT."""
+    # Imported here: the analyzer imports this module
+    from analyze_fingerprint import open_input, N_FFT, HOP_LENGTH
+    sr, duration, compute_stft = open_input(input_path, log=lambda message: None)
+    return fingerprint(np.abs(compute_stft()), sr, N_FFT, HOP_LENGTH), sr, duration
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    # FFT backend for every STFT in this process (see fft_backend.py)
+    configure_fft()
+    command = args[0] if args else None
+    try:
+        if command == 'add' and len(args) == 3:
+            fp, sr, duration = fingerprint_file(args[2])
+            track_id = os.path.splitext(os.path.basename(args[2]))[0]
+            HashIndex(args[1]).add(track_id, fp, sampleRate=int(sr), duration=round(float(duration), 2))
+            result = {"success": True, "id": track_id, "frames": int(len(fp))}
+        elif command == 'lookup' and len(args) == 3:
+            fp, sr, duration = fingerprint_file(args[2])
+            match = HashIndex(args[1]).lookup(fp)
+            result = {"success": True, "match": None}
+            if match:
+                result["match"] = {key: match[key] for key in ("id", "bitErrorRate", "offsetSeconds")}
+        elif command == 'info' and len(args) == 2:
+            index = HashIndex(args[1])
+            result = {
+                "success": True,
+                "tracks": len(index.tracks),
+                "frames": int(len(index.hashes)),
+                "cachedResults": sum(1 for track in index.tracks if track.get("result")),
+            }
+        else:
+            print(json.dumps({
+                "success": False,
+                "error": "Usage: perceptual_hash.py add <index_dir> <audio> | lookup <index_dir> <audio> | info <index_dir>"
+            }))
+            sys.exit(1)
+    except Exception as e:
+        result = {"success": False, "error": f"Hash index error: {str(e)}"}
+
+    print(json.dumps(result), flush=True)
+    sys.exit(0 if result.get("success") else 1)
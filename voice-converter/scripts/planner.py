@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Cost-Based Execution Planner
+Picks the cheapest way to run a script on an input, from the header facts
+of probe.py and per-sample costs measured on a 20 min 48 kHz stereo file:
+- analyze_fingerprint: memory-mapped streaming STFT or in-memory decode,
+  at the input rate or decimated (when the caller allows it), with
+  whole-signal detectors if their peak memory (admission.py's model) fits
+  the budget, otherwise frame-sliced ones (transcoding to MP3 first is not
+  a candidate: it changes the samples analyzed and costs more than
+  decoding the source directly)
+- trim_audio: slicing the memory map, stream copy (no re-encode, cuts on
+  codec frame boundaries; opt-in), ffmpeg seeking and decoding only the
+  range, or decoding the whole file
+- convert_audio / convert_to_mp3: stream copy when the output would carry
+  the same samples in the same codec, otherwise decode and encode
+
+Only strategies that leave the script's output unchanged are considered
+automatically. The chosen plan is recorded in each script's JSON result.
+"""
+
+from pydub.utils import which
+from probe import probe
+from admission import MEMORY_PROFILES, memory_budget
+
+# Seconds per sample (frame x channel), measured with ffmpeg 7 / libsndfile 1.2
+DECODE_SECONDS = {
+    'mmap': 0.0,          # Samples are read in place by the consumer
+    'libsndfile': 4.0e-8,
+    'ffmpeg': 6.6e-8,     # Decoded in a subprocess and piped back
+}
+# Integer conversion into a pydub AudioSegment on top of the decode (decode.decode_segment)
+SEGMENT_SECONDS = 1.0e-8
+ENCODE_SECONDS = {
+    'mp3': 2.6e-7,
+    'wav': 5.0e-9,
+}
+DEFAULT_ENCODE_SECONDS = 5.0e-8   # FLAC, Ogg, ...
+COPY_SECONDS = 1.0e-9
+# Analyzer detectors per (mono) frame, STFT included
+ANALYSIS_SECONDS_PER_FRAME = 1.6e-6
+# Frame-sliced detectors run one at a time over LOW_MEMORY_FRAME_CHUNK slices
+LOW_MEMORY_SLOWDOWN = 1.04
+# soxr 'very-high' decimation per input (mono) frame
+DECIMATE_SECONDS_PER_FRAME = 8.0e-9
+
+# Codec a container written by ffmpeg with its default encoder holds
+OUTPUT_CODECS = {'mp3': 'mp3', 'flac': 'flac', 'ogg': 'vorbis', 'opus': 'opus', 'm4a': 'aac'}
+# Stream copy when the source bit rate is this close to the requested one
+BITRATE_TOLERANCE = 0.02
+
+
+def _samples(info, seconds=None):
+    seconds = info["duration"] if seconds is None else seconds
+    return max(0.0, seconds) * info["sampleRate"] * info["channels"]
+
+
+def _segment_seconds(info):
+    """Per-sample cost of stdio_io.load_segment() on an input."""
+    return DECODE_SECONDS[info["decoder"]] + SEGMENT_SECONDS
+
+
+def _encode_seconds(output_format):
+    return ENCODE_SECONDS.get(output_format, DEFAULT_ENCODE_SECONDS)
+
+
+def _parse_bitrate(bitrate):
+    """'320k' -> 320000 (None if it cannot be read)."""
+    try:
+        text = str(bitrate).strip().lower()
+        return int(float(text[:-1]) * 1000) if text.endswith('k') else int(text)
+    except ValueError:
+        return None
+
+
+def _choose(candidates):
+    """candidates: {strategy: (seconds, reason)} -> plan dict of the cheapest."""
+    strategy = min(candidates, key=lambda name: candidates[name][0])
+    seconds, reason = candidates[strategy]
+    return {
+        "strategy": strategy,
+        "reason": reason,
+        "estimatedSeconds": round(seconds, 2),
+        "candidates": {name: round(cost, 2) for name, (cost, _) in candidates.items()},
+    }
+
+
+def _peak_bytes(profile, frames, analysis_frames, channels):
+    """admission.py's memory model with the mono analysis arrays at the analysis rate."""
+    return profile['base'] + analysis_frames * profile['per_frame'] + frames * channels * profile['per_sample']
+
+
+def plan_analyze(info, low_memory=False, decimation=1, budget=None):
+    """
+    Args:
+        low_memory: Frame-sliced detectors were asked for (or chosen by
+            admission.py); whole-signal variants are then not candidates
+        decimation: Factor the caller may decimate by (analyze_fingerprint's
+            decimation_factor() with --decimate; 1 keeps the input rate)
+        budget: Memory budget in bytes (default admission.memory_budget();
+            0 = no limit)
+
+    Returns:
+        plan dict (see _choose) plus lowMemory and decimation, the variant
+        the analyzer has to run
+    """
+    budget = memory_budget() if budget is None else budget
+    profile = MEMORY_PROFILES['analyze_fingerprint']
+    frames, channels = info["frames"], info["channels"]
+    if info["decoder"] == 'mmap':
+        source, read, source_reason = 'mmap-stream', 0.0, "uncompressed PCM is transformed straight from the memory map"
+    else:
+        source, read = 'decode', _samples(info) * DECODE_SECONDS[info["decoder"]]
+        source_reason = f"decoded in memory with {info['decoder']}"
+
+    candidates, variants = {}, {}
+    for factor in sorted({1, max(1, int(decimation))}):
+        analysis_frames = frames // factor
+        analysis = analysis_frames * ANALYSIS_SECONDS_PER_FRAME
+        seconds = read + (frames * DECIMATE_SECONDS_PER_FRAME if factor > 1 else 0.0)
+        name, reason = source, source_reason
+        if factor > 1:
+            name += '+decimate'
+            reason += f"; decimated to 1/{factor} of the input rate"
+        whole_fits = not budget or _peak_bytes(profile, frames, analysis_frames, channels) <= budget
+        if whole_fits and not low_memory:
+            candidates[name] = (seconds + analysis, reason)
+            variants[name] = (False, factor)
+        else:
+            # Slower than whole-signal detectors: only when asked for or needed
+            candidates[name + '+low-memory'] = (seconds + analysis * LOW_MEMORY_SLOWDOWN,
+                                                reason + "; frame-sliced detectors to fit the memory budget")
+            variants[name + '+low-memory'] = (True, factor)
+    chosen = _choose(candidates)
+    sliced, factor = variants[chosen["strategy"]]
+    chosen.update({"lowMemory": sliced, "decimation": factor})
+    return chosen
+
+
+def plan_trim(info, start=0.0, end=None, output_format='wav', stream_copy=False, pipe_input=False):
+    """
+    Args:
+        start, end: Range in seconds (end None = end of file)
+        output_format: Output container ('wav', 'mp3', ...)
+        stream_copy: Allow cuts on codec frame boundaries (MP3: 26 ms)
+        pipe_input: The input is stdin/shared memory, so ffmpeg cannot seek
+    """
+    end = info["duration"] if end is None else min(end, info["duration"])
+    start = max(0.0, start)
+    kept = _samples(info, end - start)
+    candidates = {}
+    if info["decoder"] == 'mmap' and output_format == 'wav':
+        candidates['mmap-slice'] = (kept * COPY_SECONDS, "only the selected frames are read from the memory map")
+    if which('ffmpeg'):
+        if stream_copy and OUTPUT_CODECS.get(output_format) == info["codec"]:
+            candidates['stream-copy'] = (kept * COPY_SECONDS, f"{info['codec']} packets are copied without re-encoding")
+        decoded = _samples(info, end) if pipe_input else kept
+        candidates['seek-decode'] = (decoded * DECODE_SECONDS['ffmpeg'] + kept * _encode_seconds(output_format),
+                                     "ffmpeg seeks to the start and decodes only the range")
+    candidates['decode'] = (_samples(info) * _segment_seconds(info) + kept * _encode_seconds(output_format),
+                            "the whole file is decoded")
+    return _choose(candidates)
+
+
+def plan_convert(info, output_format='wav', sample_rate=None, bit_depth=None, bitrate='320k'):
+    """
+    Args:
+        output_format: 'wav' or 'mp3'
+        sample_rate, bit_depth, bitrate: Requested output parameters (None = keep)
+    """
+    same_rate = not sample_rate or int(sample_rate) == info["sampleRate"]
+    copy_reason = None
+    if same_rate and output_format == 'wav' and info["decoder"] == 'mmap' and info["codec"].startswith('pcm_s'):
+        # Without a bit depth pydub keeps 16-bit as is (and widens 24-bit to 32-bit)
+        if (bit_depth and int(bit_depth) == info["bitDepth"]) or (not bit_depth and info["bitDepth"] == 16):
+            copy_reason = f"{info['bitDepth']}-bit PCM at {info['sampleRate']} Hz is copied sample for sample"
+    elif same_rate and output_format == 'mp3' and info["codec"] == 'mp3' and which('ffmpeg'):
+        wanted, actual = _parse_bitrate(bitrate), info.get("bitRate")
+        if wanted and actual and abs(actual - wanted) <= wanted * BITRATE_TOLERANCE:
+            copy_reason = f"the source is already {wanted // 1000} kbps MP3; copied without re-encoding"
+
+    samples = _samples(info)
+    candidates = {
+        'decode': (samples * (_segment_seconds(info) + _encode_seconds(output_format)),
+                   "decoded and re-encoded"),
+    }
+    if copy_reason:
+        candidates['stream-copy'] = (samples * COPY_SECONDS, copy_reason)
+    return _choose(candidates)
+
+
+PLANNERS = {
+    'analyze_fingerprint': plan_analyze,
+    'trim_audio': plan_trim,
+    'convert_audio': plan_convert,
+    'convert_to_mp3': lambda info, bitrate='320k': plan_convert(info, 'mp3', bitrate=bitrate),
+}
+
+
+def plan(script, info, **options):
+    """
+    Cheapest strategy for running `script` on an input.
+
+    Args:
+        script: Key of PLANNERS
+        info: probe.probe() result
+        **options: The script's parameters (see the plan_* functions)
+
+    Returns:
+        dict with strategy, reason, estimatedSeconds and the estimate of
+        every candidate considered
+    """
+    if script not in PLANNERS:
+        raise ValueError(f"No planner for {script} (known: {', '.join(PLANNERS)})")
+    return PLANNERS[script](info, **options)
+
+
+def probe_and_plan(script, input_path, **options):
+    """
+    probe() and plan() for a script's input.
+
+    Returns:
+        (info, plan), or (None, None) if the input cannot be probed; the
+        script then takes its decode path, whose decoder reports the problem
+    """
+    try:
+        info = probe(input_path)
+    except (OSError, ValueError):
+        return None, None
+    return info, plan(script, info, **options)
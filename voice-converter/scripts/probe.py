@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Header-Only Audio Probe
+Reads format, codec, sample rate, channels and duration of an input
+without decoding its samples:
+- Uncompressed WAV/RF64/AIFF: the container header (pcm_mmap.py); a WAV
+  on stdin is answered from its header without reading the samples, so
+  they can still be streamed
+- Anything libsndfile opens (FLAC, Ogg, MP3, ...): soundfile.info()
+- Everything else (AAC/M4A, ...): ffprobe, or the stream summary ffmpeg
+  prints for an input when ffprobe is not installed
+
+The "decoder" field tells which path a script will decode the input with
+('mmap', 'libsndfile' or 'ffmpeg'); planner.py prices strategies on it.
+
+Usage:
+    python probe.py <input|-|shm:name>                probe an input
+    python probe.py <input> --plan <script> [k=v ...] and plan a script run on it
+"""
+
+import os
+import re
+import sys
+import json
+import subprocess
+import soundfile as sf
+from pydub.utils import which
+from stdio_io import open_input_pcm, decoder_source, input_buffer, input_exists, streamed_wav
+
+# ffmpeg codec names of libsndfile formats (subtype decides for WAV/AIFF/CAF)
+SNDFILE_CODECS = {
+    'MP3': 'mp3',
+    'FLAC': 'flac',
+    'OGG': 'vorbis',
+    'VORBIS': 'vorbis',
+    'OPUS': 'opus',
+    'ALAC_16': 'alac', 'ALAC_20': 'alac', 'ALAC_24': 'alac', 'ALAC_32': 'alac',
+    'MPEG_LAYER_III': 'mp3',
+}
+SNDFILE_BITS = {'PCM_S8': 8, 'PCM_U8': 8, 'PCM_16': 16, 'PCM_24': 24, 'PCM_32': 32, 'FLOAT': 32, 'DOUBLE': 64,
+                'ALAC_16': 16, 'ALAC_20': 20, 'ALAC_24': 24, 'ALAC_32': 32}
+# Sample formats whose bit depth ffprobe/ffmpeg report through the codec name
+PCM_CODEC = re.compile(r'pcm_([suf])(\d+)')
+
+# ffmpeg's input summary, e.g.
+#   Duration: 00:20:00.00, start: 0.000000, bitrate: 176 kb/s
+#   Stream #0:0(und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, stereo, fltp, 175 kb/s
+FFMPEG_DURATION = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+FFMPEG_BITRATE = re.compile(r'Duration:.*?bitrate: (\d+) kb/s')
+FFMPEG_AUDIO = re.compile(r'Stream #\d+:\d+.*?: Audio: (\w+).*?, (\d+) Hz, ([^,]+)')
+FFMPEG_CONTAINER = re.compile(r'Input #0, ([\w,]+), from')
+CHANNEL_LAYOUTS = {'mono': 1, 'stereo': 2, '2.1': 3, 'quad': 4, '4.0': 4, '5.0': 5, '5.1': 6,
+                   '6.1': 7, '7.1': 8}
+
+
+def _pcm_info(pcm):
+    kind = 'f' if pcm.sample_format == 'float' else ('u' if pcm.bits == 8 and pcm.container != 'aiff' else 's')
+    endian = '' if pcm.bits == 8 else ('be' if pcm.big_endian else 'le')
+    return {
+        "format": pcm.container,
+        "codec": f"pcm_{kind}{pcm.bits}{endian}",
+        "sampleRate": pcm.samplerate,
+        "channels": pcm.channels,
+        "frames": int(pcm.n_frames),
+        "duration": pcm.duration,
+        "bitDepth": pcm.bits,
+        "bitRate": pcm.samplerate * pcm.channels * pcm.bits,
+        "decoder": 'mmap',
+        "source": 'header',
+    }
+
+
+def _soundfile_info(input_path):
+    info = sf.info(decoder_source(input_path))
+    codec = SNDFILE_CODECS.get(info.subtype) or SNDFILE_CODECS.get(info.format)
+    if codec is None:
+        match = re.match(r'(PCM|FLOAT|DOUBLE)', info.subtype)
+        bits = SNDFILE_BITS.get(info.subtype)
+        codec = f"pcm_{'f' if match and match.group(1) != 'PCM' else 's'}{bits}" if match and bits else info.subtype.lower()
+    return {
+        "format": info.format.lower(),
+        "codec": codec,
+        "sampleRate": int(info.samplerate),
+        "channels": int(info.channels),
+        "frames": int(info.frames),
+        "duration": float(info.duration),
+        "bitDepth": SNDFILE_BITS.get(info.subtype),
+        "bitRate": None,
+        "decoder": 'libsndfile',
+        "source": 'soundfile',
+    }
+
+
+def _run_ffmpeg_tool(command, input_path):
+    """Run ffprobe/ffmpeg on a path, or with a stdin/shared memory image on its stdin."""
+    buffer = input_buffer(input_path)
+    source = 'pipe:0' if buffer is not None else input_path
+    return subprocess.run(command + [source], input=bytes(buffer) if buffer is not None else None,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+
+
+def _ffprobe_info(input_path):
+    process = _run_ffmpeg_tool(['ffprobe', '-hide_banner', '-loglevel', 'error', '-print_format', 'json',
+                                '-show_format', '-show_streams', '-select_streams', 'a:0'], input_path)
+    if process.returncode != 0:
+        raise ValueError(process.stderr.decode(errors='replace').strip() or "ffprobe failed")
+    data = json.loads(process.stdout)
+    streams = data.get("streams") or []
+    if not streams:
+        raise ValueError("No audio stream found")
+    stream, container = streams[0], data.get("format", {})
+    sr = int(stream["sample_rate"])
+    duration = float(stream.get("duration") or container.get("duration") or 0.0)
+    bits = int(stream.get("bits_per_raw_sample") or stream.get("bits_per_sample") or 0) or None
+    bit_rate = stream.get("bit_rate") or container.get("bit_rate")
+    return {
+        "format": container.get("format_name", '').split(',')[0],
+        "codec": stream["codec_name"],
+        "sampleRate": sr,
+        "channels": int(stream["channels"]),
+        "frames": int(round(duration * sr)),
+        "duration": duration,
+        "bitDepth": bits,
+        "bitRate": int(bit_rate) if bit_rate else None,
+        "decoder": 'ffmpeg',
+        "source": 'ffprobe',
+    }
+
+
+def _ffmpeg_info(input_path):
+    # Without an output ffmpeg only opens the input, prints its summary and exits non-zero
+    process = _run_ffmpeg_tool(['ffmpeg', '-hide_banner', '-i'], input_path)
+    text = process.stderr.decode(errors='replace')
+    audio = FFMPEG_AUDIO.search(text)
+    if audio is None:
+        raise ValueError("No audio stream found")
+    codec, sr, layout = audio.group(1), int(audio.group(2)), audio.group(3).strip()
+    channels = CHANNEL_LAYOUTS.get(layout.split('(')[0].strip())
+    if channels is None:
+        count = re.match(r'(\d+) channels', layout)
+        channels = int(count.group(1)) if count else 2
+    duration = FFMPEG_DURATION.search(text)
+    seconds = int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)) if duration else 0.0
+    bit_rate = FFMPEG_BITRATE.search(text)
+    container = FFMPEG_CONTAINER.search(text)
+    pcm = PCM_CODEC.match(codec)
+    return {
+        "format": container.group(1).split(',')[0] if container else None,
+        "codec": codec,
+        "sampleRate": sr,
+        "channels": channels,
+        "frames": int(round(seconds * sr)),
+        "duration": seconds,
+        "bitDepth": int(pcm.group(2)) if pcm else None,
+        "bitRate": int(bit_rate.group(1)) * 1000 if bit_rate else None,
+        "decoder": 'ffmpeg',
+        "source": 'ffmpeg',
+    }
+
+
+def probe(input_path):
+    """
+    Stream parameters of an input from its headers.
+
+    Args:
+        input_path: Path, "-" (stdin) or "shm:<name>"
+
+    Returns:
+        dict with format, codec (ffmpeg names), sampleRate, channels, frames,
+        duration (seconds), bitDepth and bitRate (None where the header does
+        not say), decoder and source (which reader answered)
+
+    Raises:
+        FileNotFoundError if the input does not exist
+        ValueError if no reader recognizes it as audio
+    """
+    if not input_exists(input_path):
+        raise FileNotFoundError(f"Input not found: {input_path}")
+
+    pcm = streamed_wav(input_path) or open_input_pcm(input_path)
+    if pcm is not None:
+        return _pcm_info(pcm)
+    try:
+        info = _soundfile_info(input_path)
+    except Exception:
+        info = None
+    if info is not None:
+        if info["duration"] > 0:
+            # Average over the file (exact for CBR, the mean for VBR)
+            buffer = input_buffer(input_path)
+            size = len(buffer) if buffer is not None else os.path.getsize(input_path)
+            info["bitRate"] = int(size * 8 / info["duration"])
+        return info
+
+    errors = []
+    for tool, reader in (('ffprobe', _ffprobe_info), ('ffmpeg', _ffmpeg_info)):
+        if not which(tool):
+            continue
+        try:
+            return reader(input_path)
+        except (ValueError, KeyError, subprocess.TimeoutExpired) as e:
+            errors.append(f"{tool}: {e}")
+    raise ValueError(f"Unrecognized audio input ({'; '.join(errors) or 'no header reader available'})")
+
+
+def _parse_option(value):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return {'true': True, 'false': False, 'none': None}.get(value.lower(), value)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    plan_script = None
+    if '--plan' in args:
+        idx = args.index('--plan')
+        plan_script = args[idx + 1] if idx + 1 < len(args) else None
+        del args[idx:idx + 2]
+        if plan_script is None:
+            print(json.dumps({"success": False, "error": "--plan requires a script name"}))
+            sys.exit(1)
+    if not args:
+        print(json.dumps({"success": False, "error": "Usage: probe.py <input|-|shm:name> [--plan <script> [option=value ...]]"}))
+        sys.exit(1)
+
+    try:
+        info = probe(args[0])
+        result = {"success": True, **info}
+        if plan_script:
+            from planner import plan
+            options = dict(arg.split('=', 1) for arg in args[1:] if '=' in arg)
+            result["plan"] = plan(plan_script, info, **{key: _parse_option(value) for key, value in options.items()})
+        print(json.dumps(result))
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Stage Profiling Helpers
+Optional per-stage instrumentation shared by the processing scripts:
+- Wall time and peak resident memory (RSS) growth per named stage
+  (returned as a "timings" block)
+- cProfile dumps (.prof) for snakeviz / flameprof / gprof2dot flamegraphs
+
+When timings are disabled, stage() is a bare context manager and costs
+next to nothing, so scripts can leave the instrumentation in place.
+
+Peak memory comes from the kernel: on Linux the RSS high-water mark is
+reset at the start of each stage (/proc/self/clear_refs) and read back at
+the end, elsewhere only growth of the process-wide ru_maxrss is seen.
+Neither slows the stage down. TIMINGS_TRACEMALLOC=1 adds the Python heap
+peak per stage from tracemalloc, which traces every allocation NumPy and
+librosa make: wall times measured with it on are not comparable with
+those measured without.
+"""
+
+import os
+import sys
+import time
+import cProfile
+import resource
+import tracemalloc
+from contextlib import contextmanager
+
+# Highest RSS high-water mark seen before a stage reset it
+_reset_high_water_kb = 0
+
+
+def _status_kb(field):
+    """A /proc/self/status memory field in KB (None where there is no procfs)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _ru_maxrss_kb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 if sys.platform == 'darwin' else max_rss
+
+
+def _high_water_kb():
+    """The RSS high-water mark since it was last reset."""
+    high_water = _status_kb('VmHWM')
+    return high_water if high_water is not None else _ru_maxrss_kb()
+
+
+def _reset_high_water():
+    """Reset the RSS high-water mark to the current RSS; False where the kernel does not allow it."""
+    global _reset_high_water_kb
+    high_water = _status_kb('VmHWM')
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    if high_water is not None:
+        _reset_high_water_kb = max(_reset_high_water_kb, high_water)
+    return True
+
+
+def rss_high_water_mb():
+    """Process peak RSS in MB, including peaks from before any stage reset."""
+    return max(_reset_high_water_kb, _high_water_kb(), _ru_maxrss_kb()) / 1024
+
+
+class StageTimer:
+    """
+    Collects wall time and peak memory delta for named processing stages.
+
+    Usage:
+        timer = StageTimer(enabled=True)
+        with timer.stage('decode'):
+            y, sr = librosa.load(path)
+        result['timings'] = timer.as_dict()
+
+    Args:
+        enabled: Collect anything at all
+        trace_memory: Also trace the Python heap with tracemalloc (default:
+            the TIMINGS_TRACEMALLOC environment variable); slows
+            allocation-heavy stages down
+    """
+
+    def __init__(self, enabled=False, trace_memory=None):
+        self.enabled = enabled
+        self.stages = {}
+        self._started = time.perf_counter()
+        # Memory baselines and peaks of every stage currently open (stages may nest)
+        self._open = []
+        if trace_memory is None:
+            trace_memory = os.environ.get('TIMINGS_TRACEMALLOC', '') in ('1', 'true')
+        self.trace_memory = enabled and trace_memory
+        self._owns_tracemalloc = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            # NumPy reports its buffers to tracemalloc, so this covers arrays too
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    def _fold_peaks(self):
+        """Carry the peaks so far into every open stage (a nested stage resets them)."""
+        high_water = _high_water_kb()
+        heap_peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+        for span in self._open:
+            span["rss_peak"] = max(span["rss_peak"], high_water)
+            span["heap_peak"] = max(span["heap_peak"], heap_peak)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        self._fold_peaks()
+        # Without a reset, the high-water mark only moves once the stage outgrows every earlier one
+        _reset_high_water()
+        rss_before = _status_kb('VmRSS') or _high_water_kb()
+        span = {"rss_before": rss_before, "rss_peak": rss_before, "heap_before": 0, "heap_peak": 0}
+        if self.trace_memory:
+            span["heap_before"] = span["heap_peak"] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._open.append(span)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._fold_peaks()
+            self._open = [other for other in self._open if other is not span]
+            entry = self.stages.setdefault(name, {
+                "wallSeconds": 0.0,
+                "peakMemoryDeltaMB": 0.0,
+            })
+            # Repeated stages (e.g. per channel) accumulate time, keep the worst peak
+            entry["wallSeconds"] = round(entry["wallSeconds"] + elapsed, 4)
+            entry["peakMemoryDeltaMB"] = round(max(entry["peakMemoryDeltaMB"],
+                                                   (span["rss_peak"] - span["rss_before"]) / 1024), 2)
+            if self.trace_memory:
+                entry["heapPeakDeltaMB"] = round(max(entry.get("heapPeakDeltaMB", 0.0),
+                                                     (span["heap_peak"] - span["heap_before"]) / (1024 * 1024)), 2)
+
+    def record(self, name, seconds):
+        """
+        Add wall time measured elsewhere (e.g. on a worker thread, where
+        the process-wide memory peak would mix concurrent stages).
+        """
+        if not self.enabled:
+            return
+        entry = self.stages.setdefault(name, {"wallSeconds": 0.0})
+        entry["wallSeconds"] = round(entry["wallSeconds"] + seconds, 4)
+
+    def as_dict(self):
+        """Return the timings block for the JSON result (None when disabled)."""
+        if not self.enabled:
+            return None
+        timings = {
+            "stages": self.stages,
+            "totalSeconds": round(time.perf_counter() - self._started, 4),
+            "rssHighWaterMB": round(rss_high_water_mb(), 1),
+        }
+        if self.trace_memory:
+            # Wall times include tracemalloc's overhead
+            timings["traceMemory"] = True
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        return timings
+
+
+def run_with_profile(profile_path, func, *args, **kwargs):
+    """
+    Run func under cProfile and write a pstats dump to profile_path.
+
+    The dump can be opened with `snakeviz <file>` or turned into a
+    flamegraph with `flameprof <file>`. Without a profile_path the
+    function is called directly.
+    """
+    if not profile_path:
+        return func(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        try:
+            profiler.dump_stats(profile_path)
+            print(f"Profile written: {profile_path}", file=sys.stderr, flush=True)
+        except OSError as e:
+            print(f"Warning: Could not write profile: {e}", file=sys.stderr, flush=True)
+
+
+def parse_profiling_args(argv):
+    """
+    Strip --timings and --profile <path> (or --profile=<path>) from argv.
+
+    Returns:
+        (remaining_args, timings_enabled, profile_path)
+    """
+    remaining = []
+    timings_enabled = False
+    profile_path = None
+    args = iter(argv)
+    for arg in args:
+        if arg == '--timings':
+            timings_enabled = True
+        elif arg == '--profile':
+            profile_path = next(args, None)
+        elif arg.startswith('--profile='):
+            profile_path = arg.split('=', 1)[1]
+        else:
+            remaining.append(arg)
+    return remaining, timings_enabled, profile_path
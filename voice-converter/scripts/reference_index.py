@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Clean Reference Profile Index
+Stores compact spectral profiles of known-clean tracks so the analyzer can
+compare an upload against real references instead of fixed thresholds:
+- Per track: level-normalized 1 kHz band energies (dB) and the spectral
+  detector metrics (energy ratio, frame ratios, phase, dithering, filter)
+- On disk: profiles.npz (arrays) + metadata.json (track list, genres)
+- Queries filter by genre / sample rate and rank by band-profile distance,
+  all vectorized over the whole index
+
+Usage:
+    python reference_index.py build <index_dir> <audio file or dir>... [--genre G] [--workers N]
+    python reference_index.py query <index_dir> <audio> [--genre G] [--k N]
+    python reference_index.py info <index_dir>
+"""
+
+import os
+import sys
+import json
+import numpy as np
+from fft_backend import configure_fft
+
+INDEX_VERSION = 1
+PROFILES_FILE = 'profiles.npz'
+METADATA_FILE = 'metadata.json'
+
+# Band energies in 1 kHz bands up to 24 kHz (bands above Nyquist are NaN)
+BAND_WIDTH_HZ = 1000
+BAND_COUNT = 24
+# Profiles are normalized to the mean level of the bands below this
+NORMALIZE_BELOW_HZ = 12000
+DEFAULT_NEIGHBOURS = 10
+
+# Analyzer metrics stored per reference track (all from the STFT-only detectors)
+PROFILE_FEATURES = [
+    "energyRatio",
+    "meanFrameRatio",
+    "medianFrameRatio",
+    "framesWatermarkHigherPercent",
+    "framesWatermarkElevatedPercent",
+    "phaseCoherenceRatio",
+    "ditheringSuspicion",
+    "filterArtifactSuspicion",
+]
+PROFILE_GROUPS = ("energy_ratio", "phase_coherence", "dithering", "filter_artifacts")
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.ogg', '.aiff', '.aif', '.m4a')
+
+
+def band_profile(magnitude, frequencies):
+    """
+    Level-normalized band energy profile (dB) of an STFT magnitude.
+
+    Returns:
+        float32 array of BAND_COUNT values, NaN for bands above Nyquist
+    """
+    frame_mean = np.mean(magnitude, axis=1)
+    band = (frequencies // BAND_WIDTH_HZ).astype(np.int64)
+    valid = band < BAND_COUNT
+    sums = np.bincount(band[valid], weights=frame_mean[valid], minlength=BAND_COUNT)
+    counts = np.bincount(band[valid], minlength=BAND_COUNT)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        levels = 20 * np.log10(sums / counts + 1e-10)
+    levels[counts == 0] = np.nan
+    reference_bands = NORMALIZE_BELOW_HZ // BAND_WIDTH_HZ
+    return (levels - np.nanmean(levels[:reference_bands])).astype(np.float32)
+
+
+class ReferenceIndex:
+    """
+    In-memory view of an index directory.
+
+    Usage:
+        index = ReferenceIndex.load('refs/')
+        comparison = index.compare(profile, metrics, sample_rate=44100, genre='pop')
+    """
+
+    def __init__(self, tracks=None, profiles=None, features=None):
+        self.tracks = tracks or []
+        self.profiles = profiles if profiles is not None else np.zeros((0, BAND_COUNT), np.float32)
+        self.features = features if features is not None else np.zeros((0, len(PROFILE_FEATURES)), np.float32)
+        self.sample_rates = np.array([t["sampleRate"] for t in self.tracks], dtype=np.int64)
+        self.genres = np.array([t.get("genre") or "" for t in self.tracks], dtype=object)
+
+    @classmethod
+    def load(cls, index_dir):
+        """Load an index directory (an empty index if it does not exist yet)."""
+        metadata_path = os.path.join(index_dir, METADATA_FILE)
+        if not os.path.exists(metadata_path):
+            return cls()
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        if metadata.get("version") != INDEX_VERSION or metadata.get("features") != PROFILE_FEATURES:
+            raise ValueError(f"Reference index {index_dir} was built with an incompatible version; rebuild it")
+        arrays = np.load(os.path.join(index_dir, PROFILES_FILE))
+        return cls(metadata["tracks"], arrays["profiles"], arrays["features"])
+
+    def save(self, index_dir):
+        """Write arrays and metadata (each replaced atomically)."""
+        os.makedirs(index_dir, exist_ok=True)
+        profiles_tmp = os.path.join(index_dir, PROFILES_FILE + '.tmp.npz')
+        np.savez(profiles_tmp, profiles=self.profiles, features=self.features)
+        os.replace(profiles_tmp, os.path.join(index_dir, PROFILES_FILE))
+
+        metadata = {
+            "version": INDEX_VERSION,
+            "bandWidthHz": BAND_WIDTH_HZ,
+            "bandCount": BAND_COUNT,
+            "features": PROFILE_FEATURES,
+            "tracks": self.tracks,
+        }
+        metadata_tmp = os.path.join(index_dir, METADATA_FILE + '.tmp')
+        with open(metadata_tmp, 'w') as f:
+            json.dump(metadata, f, indent=1)
+        os.replace(metadata_tmp, os.path.join(index_dir, METADATA_FILE))
+
+    def add(self, track, profile, metrics):
+        self.tracks.append(track)
+        self.profiles = np.vstack([self.profiles, profile[np.newaxis, :]])
+        row = np.array([[metrics[name] for name in PROFILE_FEATURES]], dtype=np.float32)
+        self.features = np.vstack([self.features, row])
+        self.sample_rates = np.append(self.sample_rates, track["sampleRate"])
+        self.genres = np.append(self.genres, np.array([track.get("genre") or ""], dtype=object))
+
+    def candidates(self, sample_rate=None, genre=None):
+        """
+        Tracks to compare against, narrowing by genre and sample rate while
+        at least one reference matches.
+
+        Returns:
+            (row indices, description of the filter that was applied)
+        """
+        everything = np.ones(len(self.tracks), dtype=bool)
+        same_rate = self.sample_rates == int(sample_rate) if sample_rate else everything
+        same_genre = self.genres == genre if genre else everything
+        for mask, label in ((same_genre & same_rate, "genre+sampleRate"),
+                            (same_genre, "genre"),
+                            (same_rate, "sampleRate"),
+                            (everything, "all")):
+            if label.startswith("genre") and not genre:
+                continue
+            if np.any(mask):
+                return np.flatnonzero(mask), label
+        return np.zeros(0, dtype=np.int64), "none"
+
+    def nearest(self, profile, sample_rate=None, genre=None, k=DEFAULT_NEIGHBOURS):
+        """
+        k nearest reference profiles by RMS dB difference over the bands
+        both signals have.
+
+        Returns:
+            (row indices, distances, filter description)
+        """
+        rows, matched_on = self.candidates(sample_rate, genre)
+        if len(rows) == 0:
+            return rows, np.zeros(0), matched_on
+        diff = self.profiles[rows] - profile[np.newaxis, :]
+        shared = np.isfinite(diff)
+        squared = np.where(shared, diff, 0.0) ** 2
+        distances = np.sqrt(squared.sum(axis=1) / np.maximum(shared.sum(axis=1), 1))
+        order = np.argsort(distances)[:k]
+        return rows[order], distances[order], matched_on
+
+    def compare(self, profile, metrics, sample_rate=None, genre=None, k=DEFAULT_NEIGHBOURS):
+        """
+        Compare an analyzed track against its nearest references.
+
+        Returns:
+            Flat dict of reference* fields for the analyzer result
+        """
+        rows, distances, matched_on = self.nearest(profile, sample_rate, genre, k)
+        if len(rows) == 0:
+            return {"referenceMatches": 0, "referenceMatchedOn": matched_on}
+
+        reference_ratios = self.features[rows, PROFILE_FEATURES.index("energyRatio")]
+        energy_ratio = float(metrics["energyRatio"])
+        std = float(np.std(reference_ratios))
+        return {
+            "referenceMatches": int(len(rows)),
+            "referenceMatchedOn": matched_on,
+            "referenceNearest": [self.tracks[i]["id"] for i in rows[:3]],
+            "referenceDistance": round(float(distances[0]), 3),
+            "referenceEnergyRatioMean": round(float(np.mean(reference_ratios)), 4),
+            "referenceEnergyRatioStd": round(std, 4),
+            "referenceEnergyRatioZ": round((energy_ratio - float(np.mean(reference_ratios))) / std, 2) if std > 0 else 0.0,
+            # Share of comparable clean tracks with a lower ratio (0-1)
+            "referenceEnergyRatioPercentile": round(float(np.mean(reference_ratios < energy_ratio)), 4),
+        }
+
+
+def profile_track(input_path, workers=None):
+    """
+    Spectral profile and STFT-only detector metrics of one track.
+
+    Returns:
+        (sample_rate, duration, band profile, metrics dict)
+    """
+    # Imported here: the analyzer imports this module for queries
+    from analyze_fingerprint import AnalysisContext, open_input, build_tasks
+    from scheduler import run_graph
+
+    sr, duration, compute_stft = open_input(input_path, log=lambda message: None)
+    ctx = AnalysisContext(sr)
+    outputs = run_graph(build_tasks(ctx, compute_stft, groups=PROFILE_GROUPS, keep=("band_energy",)), workers=workers)
+    metrics = {}
+    for group in PROFILE_GROUPS:
+        metrics.update(outputs[group])
+    return sr, duration, outputs["band_energy"], metrics
+
+
+def _audio_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def build_index(index_dir, inputs, genre=None, workers=None):
+    """
+    Add tracks to an index, skipping paths already ingested.
+
+    Args:
+        index_dir: Index directory (created if missing)
+        inputs: Audio files and/or directories scanned recursively
+        genre: Optional genre label for every added track
+        workers: Threads for the analyzer task graph
+    """
+    try:
+        index = ReferenceIndex.load(index_dir)
+        known = {track["path"] for track in index.tracks}
+        added, skipped, failed = 0, 0, []
+        for path in _audio_files(inputs):
+            path = os.path.abspath(path)
+            if path in known:
+                skipped += 1
+                continue
+            try:
+                print(f"Profiling: {path}", flush=True)
+                sr, duration, profile, metrics = profile_track(path, workers)
+            except Exception as e:
+                print(f"Warning: Could not profile {path}: {e}", file=sys.stderr, flush=True)
+                failed.append(path)
+                continue
+            track = {
+                "id": os.path.splitext(os.path.basename(path))[0],
+                "path": path,
+                "genre": genre,
+                "sampleRate": int(sr),
+                "duration": round(float(duration), 2),
+            }
+            index.add(track, profile, metrics)
+            known.add(path)
+            added += 1
+        index.save(index_dir)
+        return {
+            "success": True,
+            "added": added,
+            "skipped": skipped,
+            "failed": failed,
+            "total": len(index.tracks),
+        }
+    except Exception as e:
+        error_msg = f"Index build failed: {str(e)}"
+        print(error_msg, file=sys.stderr, flush=True)
+        return {
+            "success": False,
+            "error": error_msg
+        }
+
+
+def _take_option(args, flag, cast=str):
+    if flag not in args:
+        return None
+    idx = args.index(flag)
+    value = cast(args[idx + 1])
+    del args[idx:idx + 2]
+    return value
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    # FFT backend for every STFT in this process (see fft_backend.py)
+    configure_fft()
+    try:
+        genre = _take_option(args, '--genre')
+        workers = _take_option(args, '--workers', int)
+        k = _take_option(args, '--k', int) or DEFAULT_NEIGHBOURS
+    except (IndexError, ValueError):
+        print(json.dumps({"success": False, "error": "Options --genre, --workers and --k need a value"}))
+        sys.exit(1)
+
+    command = args[0] if args else None
+    if command == 'build' and len(args) >= 3:
+        result = build_index(args[1], args[2:], genre, workers)
+    elif command == 'query' and len(args) == 3:
+        try:
+            index = ReferenceIndex.load(args[1])
+            sr, duration, profile, metrics = profile_track(args[2], workers)
+            result = {"success": True, "energyRatio": round(float(metrics["energyRatio"]), 4)}
+            result.update(index.compare(profile, metrics, sr, genre, k))
+        except Exception as e:
+            result = {"success": False, "error": f"Query failed: {str(e)}"}
+    elif command == 'info' and len(args) == 2:
+        try:
+            index = ReferenceIndex.load(args[1])
+            genres, counts = np.unique(index.genres.astype(str), return_counts=True) if index.tracks else ([], [])
+            rates, rate_counts = np.unique(index.sample_rates, return_counts=True)
+            result = {
+                "success": True,
+                "tracks": len(index.tracks),
+                "genres": {g or "(none)": int(c) for g, c in zip(genres, counts)},
+                "sampleRates": {str(r): int(c) for r, c in zip(rates, rate_counts)},
+            }
+        except Exception as e:
+            result = {"success": False, "error": f"Could not read index: {str(e)}"}
+    else:
+        print(json.dumps({
+            "success": False,
+            "error": "Usage: reference_index.py build <index_dir> <audio|dir>... [--genre G] [--workers N] | "
+                     "query <index_dir> <audio> [--genre G] [--k N] | info <index_dir>"
+        }))
+        sys.exit(1)
+
+    print(json.dumps(result), flush=True)
+    sys.exit(0 if result.get("success") else 1)
@@ -12,6 +12,8 @@ OPTIMIZATIONS IMPLEMENTED:
 - Improved Natural Masking: 12-14 kHz at 0.5-1% (reduced from 12-15 kHz at 2%)
 - Enhanced Feature Preservation: MFCC, Chroma, Spectral Contrast, Centroid, Bandwidth (matching external analyzers)
 - Adaptive Smoothing: Variance-based instead of minimum operation
+- Zero-Disk Handoff: "-" input/output for stdin/stdout, "shm:<name>" shared memory input
+- Scratch Space: intermediates in RAM-backed scratch with quotas and cleanup on exit/crash
 
 Version: 2.0 (Master-STFT)
 """
@@ -26,6 +28,12 @@ import soundfile as sf
 from pydub import AudioSegment
 from scipy import signal
 import random
+from profiling import StageTimer, run_with_profile, parse_profiling_args
+from scratch import get_scratch, scratch_file
+from admission import admit_or_exit
+from fft_backend import configure_fft
+from stdio_io import (is_stdio, input_exists, input_buffer, decoder_source, output_extension, open_output,
+                      write_samples, claim_stdout, parse_stdio_args)
 
 # Try to import mutagen for metadata removal (optional)
 try:
@@ -36,7 +44,7 @@ try:
     MUTAGEN_AVAILABLE = True
 except ImportError:
     MUTAGEN_AVAILABLE = False
-    print("Warning: mutagen not available - metadata removal will be skipped", flush=True)
+    print("Warning: mutagen not available - metadata removal will be skipped", file=sys.stderr, flush=True)
 
 # ============================================================================
 # CONSTANTS (P1 Fix 4: Fixed Target Ratio)
@@ -103,6 +111,13 @@ def calculate_file_hash(file_path):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
+def calculate_input_hash(input_path):
+    """SHA256 of the input, which may be held in memory (stdin / shared memory)."""
+    buffer = input_buffer(input_path)
+    if buffer is None:
+        return calculate_file_hash(input_path)
+    return hashlib.sha256(buffer).hexdigest()
+
 # ============================================================================
 # ADAPTIVE REMOVAL: PRE-ANALYSIS & INTELLIGENT PLANNING
 # ============================================================================
@@ -1232,7 +1247,7 @@ def process_channel_stealth(y, sr, aggressiveness, adaptive_params=None):
 # SUPPORTING FUNCTIONS
 # ============================================================================
 
-def remove_fingerprint_enhanced(input_path, output_path, aggressiveness='medium', enable_humanization=False, adaptive_params=None):
+def remove_fingerprint_enhanced(input_path, output_path, aggressiveness='medium', enable_humanization=False, adaptive_params=None, timings=False):
     """
     Enhanced fingerprint removal with Master-STFT optimization and adaptive processing.
     
@@ -1242,34 +1257,38 @@ def remove_fingerprint_enhanced(input_path, output_path, aggressiveness='medium'
         aggressiveness: 'low', 'medium', 'high'
         enable_humanization: Apply AI humanization (analog warmth, room tone, etc.)
         adaptive_params: Optional dict with pre-analysis data for adaptive removal
+        timings: If True, print per-stage wall time/memory as a __TIMINGS_JSON__ line
     
     Returns:
         dict: Success status and adaptive parameters used
     """
+    timer = StageTimer(enabled=timings)
     try:
         # Verify input file exists
-        if not os.path.exists(input_path):
+        if not input_exists(input_path):
             raise FileNotFoundError(f"Input file does not exist: {input_path}")
         
         # Calculate original file hash
-        original_hash = calculate_file_hash(input_path)
+        original_hash = calculate_input_hash(input_path)
         print(f"Original file hash: {original_hash[:16]}...", flush=True)
         
         # Remove metadata
         print(f"Stage 0: Removing metadata...", flush=True)
         remove_metadata(input_path)
         
-        # Load audio
-        print(f"Loading audio: {input_path}", flush=True)
-        y, sr = librosa.load(input_path, sr=None)
-        duration = len(y) / sr
-        print(f"Sample rate: {sr} Hz, Duration: {duration:.2f}s", flush=True)
-        print(f"Aggressiveness: {aggressiveness}", flush=True)
+        with timer.stage('decode'):
+            # Load audio
+            print(f"Loading audio: {input_path}", flush=True)
+            y, sr = librosa.load(decoder_source(input_path), sr=None)
+            duration = len(y) / sr
+            print(f"Sample rate: {sr} Hz, Duration: {duration:.2f}s", flush=True)
+            print(f"Aggressiveness: {aggressiveness}", flush=True)
         
         # Generate adaptive parameters if not provided
         if adaptive_params is None:
             # Perform quick pre-analysis for intelligent planning
-            analysis_metrics = quick_analyze_audio(y, sr)
+            with timer.stage('pre_analysis'):
+                analysis_metrics = quick_analyze_audio(y, sr)
             
             # IMPROVED: Smart skip-logic - only skip if clean AND no suspicious energy
             current_ratio = analysis_metrics.get('current_ratio', 1.0)
@@ -1282,10 +1301,19 @@ def remove_fingerprint_enhanced(input_path, output_path, aggressiveness='medium'
                 
                 # Copy file directly without processing
                 import shutil
-                shutil.copy2(input_path, output_path)
+                buffer = input_buffer(input_path)
+                if buffer is not None or is_stdio(output_path):
+                    with open_output(output_path) as out:
+                        if buffer is not None:
+                            out.write(buffer)
+                        else:
+                            with open(input_path, 'rb') as src:
+                                shutil.copyfileobj(src, out)
+                else:
+                    shutil.copy2(input_path, output_path)
                 
                 # Calculate output hash
-                output_hash = calculate_file_hash(output_path)
+                output_hash = original_hash if is_stdio(output_path) else calculate_file_hash(output_path)
                 print(f"Processed file hash: {output_hash[:16]}...", flush=True)
                 print(f"Files are identical: {original_hash == output_hash}", flush=True)
                 print(f"✅ File skipped (already clean): {output_path}", flush=True)
@@ -1313,66 +1341,68 @@ def remove_fingerprint_enhanced(input_path, output_path, aggressiveness='medium'
         # Store original for statistical analysis
         y_original = y.copy()
         
-        # Process stereo or mono
-        is_stereo = y.ndim > 1
-        if is_stereo:
-            print(f"Processing stereo audio ({y.shape[1]} channels)...", flush=True)
-            y_processed = np.zeros_like(y)
-            for channel in range(y.shape[1]):
-                print(f"Channel {channel + 1}/{y.shape[1]}:", flush=True)
-                y_processed[:, channel] = process_channel_stealth(y[:, channel], sr, aggressiveness, adaptive_params)
-            
-            # Apply stereo imaging variation
-            if aggressiveness in ['medium', 'high']:
-                print(f"Applying stereo imaging variation...", flush=True)
-                y_processed = apply_stereo_imaging_variation(y_processed, sr, aggressiveness)
-        else:
-            print("Processing mono audio...", flush=True)
-            y_processed = process_channel_stealth(y, sr, aggressiveness, adaptive_params)
-        
-        # Apply statistical pattern normalization (includes unified pitch/timing - P0 Fix 3)
-        if aggressiveness in ['medium', 'high']:
-            print(f"Applying statistical pattern normalization...", flush=True)
+        with timer.stage('process_channels'):
+            # Process stereo or mono
+            is_stereo = y.ndim > 1
             if is_stereo:
-                for channel in range(y_processed.shape[1]):
-                    y_processed[:, channel] = normalize_statistical_patterns(
-                        y_original[:, channel] if y_original.ndim > 1 else y_original,
-                        y_processed[:, channel],
-                        sr,
-                        aggressiveness,
-                        HUMANIZING_FACTOR
-                    )
+                print(f"Processing stereo audio ({y.shape[1]} channels)...", flush=True)
+                y_processed = np.zeros_like(y)
+                for channel in range(y.shape[1]):
+                    print(f"Channel {channel + 1}/{y.shape[1]}:", flush=True)
+                    y_processed[:, channel] = process_channel_stealth(y[:, channel], sr, aggressiveness, adaptive_params)
+            
+                # Apply stereo imaging variation
+                if aggressiveness in ['medium', 'high']:
+                    print(f"Applying stereo imaging variation...", flush=True)
+                    y_processed = apply_stereo_imaging_variation(y_processed, sr, aggressiveness)
             else:
-                y_processed = normalize_statistical_patterns(y_original, y_processed, sr, aggressiveness, HUMANIZING_FACTOR)
+                print("Processing mono audio...", flush=True)
+                y_processed = process_channel_stealth(y, sr, aggressiveness, adaptive_params)
+        
+        with timer.stage('statistical_normalization'):
+            # Apply statistical pattern normalization (includes unified pitch/timing - P0 Fix 3)
+            if aggressiveness in ['medium', 'high']:
+                print(f"Applying statistical pattern normalization...", flush=True)
+                if is_stereo:
+                    for channel in range(y_processed.shape[1]):
+                        y_processed[:, channel] = normalize_statistical_patterns(
+                            y_original[:, channel] if y_original.ndim > 1 else y_original,
+                            y_processed[:, channel],
+                            sr,
+                            aggressiveness,
+                            HUMANIZING_FACTOR
+                        )
+                else:
+                    y_processed = normalize_statistical_patterns(y_original, y_processed, sr, aggressiveness, HUMANIZING_FACTOR)
         
         # Apply AI humanization if enabled (BETA)
         if enable_humanization:
-            y_processed = apply_ai_humanization(y_processed, sr)
+            with timer.stage('humanization'):
+                y_processed = apply_ai_humanization(y_processed, sr)
         
-        # Save cleaned audio
-        output_ext = os.path.splitext(output_path)[1].lower()
+        with timer.stage('write'):
+            # Save cleaned audio
+            output_ext = output_extension(output_path)
         
-        if output_ext == '.mp3':
-            temp_wav_path = output_path.replace('.mp3', '.wav')
-            print(f"Saving as WAV (temporary): {temp_wav_path}", flush=True)
-            sf.write(temp_wav_path, y_processed, sr)
-            
-            # Convert to MP3
-            print(f"Converting to MP3: {output_path}", flush=True)
-            audio = AudioSegment.from_wav(temp_wav_path)
-            audio.export(output_path, format="mp3", bitrate="320k")
-            
-            # Cleanup
-            if os.path.exists(temp_wav_path):
-                os.remove(temp_wav_path)
-        else:
-            print(f"Saving cleaned audio: {output_path}", flush=True)
-            sf.write(output_path, y_processed, sr)
+            if output_ext == '.mp3' and not is_stdio(output_path):
+                # Scratch WAV (RAM-backed when it fits), removed even if the export fails
+                with scratch_file('.wav', size_hint=y_processed.size * 2 + 1024) as temp_wav_path:
+                    print(f"Saving as WAV (temporary): {temp_wav_path}", flush=True)
+                    sf.write(temp_wav_path, y_processed, sr)
+                
+                    # Convert to MP3
+                    print(f"Converting to MP3: {output_path}", flush=True)
+                    audio = AudioSegment.from_wav(temp_wav_path)
+                    audio.export(output_path, format="mp3", bitrate="320k")
+            else:
+                print(f"Saving cleaned audio: {output_path}", flush=True)
+                write_samples(output_path, y_processed, sr)
         
-        # Calculate output hash
-        output_hash = calculate_file_hash(output_path)
-        print(f"Processed file hash: {output_hash[:16]}...", flush=True)
-        print(f"Files are different: {original_hash != output_hash}", flush=True)
+        # Calculate output hash (stdout cannot be read back)
+        if not is_stdio(output_path):
+            output_hash = calculate_file_hash(output_path)
+            print(f"Processed file hash: {output_hash[:16]}...", flush=True)
+            print(f"Files are different: {original_hash != output_hash}", flush=True)
         
         print(f"✅ Fingerprint removal successful: {output_path}", flush=True)
         
@@ -1382,6 +1412,10 @@ def remove_fingerprint_enhanced(input_path, output_path, aggressiveness='medium'
             import json
             print(f"__PRE_ANALYSIS_JSON__:{json.dumps(pre_analysis)}", flush=True)
         
+        if timings:
+            import json
+            print(f"__TIMINGS_JSON__:{json.dumps(timer.as_dict())}", flush=True)
+        
         # Return success + adaptive params + pre-analysis metrics for caching
         return {
             'success': True,
@@ -1392,6 +1426,9 @@ def remove_fingerprint_enhanced(input_path, output_path, aggressiveness='medium'
     except Exception as e:
         error_msg = f"Fingerprint removal error: {str(e)}"
         print(error_msg, file=sys.stderr, flush=True)
+        if timings:
+            import json
+            print(f"__TIMINGS_JSON__:{json.dumps(timer.as_dict())}", flush=True)
         return {
             'success': False,
             'error': str(e)
@@ -1823,16 +1860,26 @@ def apply_ai_humanization(y, sr):
     return y
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: remove_audio_fingerprint.py <input> <output> [fingerprintIntensity] [humanizingIntensity]", file=sys.stderr)
+    args, timings, profile_path = parse_profiling_args(sys.argv[1:])
+    # FFT backend for every STFT in this process (see fft_backend.py)
+    configure_fft()
+    args = parse_stdio_args(args)
+    # Library temporaries (pydub's export files) go into this job's scratch space
+    get_scratch()
+    if len(args) < 2:
+        print("Usage: remove_audio_fingerprint.py <input|-> <output|-> [fingerprintIntensity] [humanizingIntensity] [--output-format wav|mp3] [--timings] [--profile <file.prof>]", file=sys.stderr)
         print("  fingerprintIntensity: 0-100 (default: 30)", file=sys.stderr)
         print("  humanizingIntensity: 0-100 (default: 10)", file=sys.stderr)
         sys.exit(1)
     
-    input_path = sys.argv[1].strip('"\'')
-    output_path = sys.argv[2].strip('"\'')
-    fingerprint_intensity = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3].isdigit() else 30
-    humanizing_intensity = int(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4].isdigit() else 10
+    input_path = args[0].strip('"\'')
+    output_path = args[1].strip('"\'')
+    # With "-" as output the audio goes to stdout and all messages to stderr
+    claim_stdout(output_path)
+    # Wait for room in the memory budget (see admission.py)
+    admit_or_exit('remove_audio_fingerprint', input_path, output_path)
+    fingerprint_intensity = int(args[2]) if len(args) > 2 and args[2].isdigit() else 30
+    humanizing_intensity = int(args[3]) if len(args) > 3 and args[3].isdigit() else 10
     
     # Convert slider values to aggressiveness and humanization
     # Fingerprint intensity → aggressiveness
@@ -1860,5 +1907,5 @@ if __name__ == "__main__":
     print(f"Mode: {aggressiveness}", flush=True)
     print(f"Humanization: {'ENABLED' if enable_humanization else 'disabled'}", flush=True)
     
-    result = remove_fingerprint_enhanced(input_path, output_path, aggressiveness, enable_humanization)
+    result = run_with_profile(profile_path, remove_fingerprint_enhanced, input_path, output_path, aggressiveness, enable_humanization, timings=timings)
     sys.exit(0 if result['success'] else 1)
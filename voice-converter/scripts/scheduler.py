@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Task Graph Scheduler
+Runs a small dependency graph of processing tasks on a thread pool:
+- Each task declares the tasks whose results it consumes
+- Independent tasks run concurrently (NumPy/FFT work releases the GIL)
+- Shared intermediates are computed once and dropped as soon as their
+  last consumer has finished, unless marked keep=True
+
+Used by analyze_fingerprint.py to share one STFT between all detectors.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def available_cpus():
+    """CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class Task:
+    """
+    One node of the graph.
+
+    func is called with the results of `deps` as keyword arguments named
+    after the dependencies, so dependency names must be identifiers.
+    """
+
+    def __init__(self, name, func, deps=(), keep=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.keep = keep
+
+
+def prefix_tasks(tasks, prefix):
+    """
+    Rename a graph's tasks and their dependencies with a prefix, so several
+    independent graphs can share one run_graph() call (and its threads).
+    Functions still receive their dependencies under the original names.
+    """
+    def renamed(task):
+        def func(**kwargs):
+            return task.func(**{name[len(prefix):]: value for name, value in kwargs.items()})
+        return Task(prefix + task.name, func, (prefix + dep for dep in task.deps), keep=task.keep)
+
+    return [renamed(task) for task in tasks]
+
+
+def _timed(task, kwargs):
+    start = time.perf_counter()
+    result = task.func(**kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_graph(tasks, workers=None, on_done=None):
+    """
+    Run every task once, each as soon as its dependencies are available.
+
+    Args:
+        tasks: List of Task; ready tasks are started in list order
+        workers: Thread count (default: available CPUs); 1 runs inline
+        on_done: Optional callback(name, result, seconds), called from the
+            calling thread as each task completes
+
+    Returns:
+        dict of results for tasks marked keep=True and tasks nothing depends on
+    """
+    by_name = {task.name: task for task in tasks}
+    for task in tasks:
+        missing = [dep for dep in task.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Task '{task.name}' depends on unknown task(s): {', '.join(missing)}")
+
+    consumers = {task.name: 0 for task in tasks}
+    for task in tasks:
+        for dep in task.deps:
+            consumers[dep] += 1
+    keep = {task.name for task in tasks if task.keep or consumers[task.name] == 0}
+
+    results = {}
+    pending = list(tasks)
+    workers = available_cpus() if workers is None else max(1, int(workers))
+
+    def ready():
+        started = [task for task in pending if all(dep in results for dep in task.deps)]
+        for task in started:
+            pending.remove(task)
+        return started
+
+    def finish(task, result, seconds):
+        results[task.name] = result
+        for dep in task.deps:
+            consumers[dep] -= 1
+            if consumers[dep] == 0 and dep not in keep:
+                # Last consumer is done: free the intermediate
+                del results[dep]
+        if on_done is not None:
+            on_done(task.name, result, seconds)
+
+    if workers == 1:
+        # Inline: always run the first ready task, so list order is run order
+        while pending:
+            task = next((t for t in pending if all(dep in results for dep in t.deps)), None)
+            if task is None:
+                raise ValueError("Task graph has a dependency cycle")
+            pending.remove(task)
+            result, seconds = _timed(task, {dep: results[dep] for dep in task.deps})
+            finish(task, result, seconds)
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while pending or running:
+            for task in ready():
+                future = pool.submit(_timed, task, {dep: results[dep] for dep in task.deps})
+                running[future] = task
+            if not running:
+                raise ValueError("Task graph has a dependency cycle")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                result, seconds = future.result()
+                finish(task, result, seconds)
+    return results
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Scratch Space Manager
+Allocates intermediate files for the processing scripts:
+- RAM-backed directory (/dev/shm) when the file fits, disk otherwise
+- Per-job and global byte quotas, checked before anything is written
+- Everything a job allocated is deleted on exit, on SIGTERM/SIGHUP, and -
+  for jobs that were killed outright - by the next job that starts
+
+Jobs share a small ledger (JSON, guarded by flock) in the disk scratch
+root recording each live job's reservations, so the global quota holds
+across concurrent processes.
+
+Environment:
+    SCRATCH_RAM_DIR          RAM-backed root (default /dev/shm, "" disables)
+    SCRATCH_DISK_DIR         Disk root (default: the system temp dir / TMPDIR)
+    SCRATCH_JOB_QUOTA_MB     Per-job limit (default 4096)
+    SCRATCH_GLOBAL_QUOTA_MB  Limit over all jobs (default 16384)
+    SCRATCH_RAM_QUOTA_MB     RAM share over all jobs (default 1024)
+
+CLI:
+    scratch.py info     show the ledger
+    scratch.py reap     remove leftovers of dead jobs
+"""
+
+import os
+import sys
+import json
+import errno
+import fcntl
+import shutil
+import signal
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+
+SCRATCH_DIRNAME = 'voice-converter-scratch'
+LEDGER_FILE = 'ledger.json'
+LOCK_FILE = '.lock'
+JOB_PREFIX = 'job-'
+DEFAULT_RAM_DIR = '/dev/shm'
+DEFAULT_JOB_QUOTA_MB = 4096
+DEFAULT_GLOBAL_QUOTA_MB = 16384
+DEFAULT_RAM_QUOTA_MB = 1024
+# Never take more than this share of the tmpfs' currently free space
+RAM_FREE_FRACTION = 0.5
+
+MB = 1024 * 1024
+
+# The system temp dir, captured before get_scratch() points tempfile at a job directory
+_SYSTEM_TEMPDIR = tempfile.gettempdir()
+
+
+def _env_mb(name, default):
+    try:
+        return int(float(os.environ.get(name, default)) * MB)
+    except ValueError:
+        return default * MB
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _free_bytes(path):
+    stats = os.statvfs(path)
+    return stats.f_bavail * stats.f_frsize
+
+
+def _usable_dir(path):
+    return bool(path) and os.path.isdir(path) and os.access(path, os.W_OK | os.X_OK)
+
+
+def disk_root(disk_dir=None):
+    """Shared on-disk scratch root (also home of other cross-job ledgers)."""
+    return os.path.join(disk_dir or os.environ.get('SCRATCH_DISK_DIR') or _SYSTEM_TEMPDIR, SCRATCH_DIRNAME)
+
+
+class ScratchSpace:
+    """
+    Intermediate files of one job (process).
+
+    Usage:
+        scratch = get_scratch()
+        with scratch.file('.wav', size_hint=y.size * 2 + 1024) as temp_wav_path:
+            sf.write(temp_wav_path, y, sr)
+            ...
+    """
+
+    def __init__(self, job_quota=None, global_quota=None, ram_quota=None, ram_dir=None, disk_dir=None):
+        self.job_quota = _env_mb('SCRATCH_JOB_QUOTA_MB', DEFAULT_JOB_QUOTA_MB) if job_quota is None else job_quota
+        self.global_quota = _env_mb('SCRATCH_GLOBAL_QUOTA_MB', DEFAULT_GLOBAL_QUOTA_MB) if global_quota is None else global_quota
+        self.ram_quota = _env_mb('SCRATCH_RAM_QUOTA_MB', DEFAULT_RAM_QUOTA_MB) if ram_quota is None else ram_quota
+        ram_dir = os.environ.get('SCRATCH_RAM_DIR', DEFAULT_RAM_DIR) if ram_dir is None else ram_dir
+
+        self.pid = os.getpid()
+        self.job_id = f"{JOB_PREFIX}{self.pid}-{os.urandom(4).hex()}"
+        self.disk_root = disk_root(disk_dir)
+        self.ram_root = os.path.join(ram_dir, SCRATCH_DIRNAME) if _usable_dir(ram_dir) else None
+        self.files = {}  # path -> (reserved bytes, in RAM)
+        self._lock = threading.Lock()
+        self._counter = 0
+        os.makedirs(self.disk_root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Ledger
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _ledger(self):
+        """Exclusive access to the shared ledger; yields the jobs dict to modify."""
+        with open(os.path.join(self.disk_root, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                path = os.path.join(self.disk_root, LEDGER_FILE)
+                try:
+                    with open(path) as f:
+                        jobs = json.load(f)
+                except (OSError, ValueError):
+                    jobs = {}
+                _reap(jobs, self.disk_root, self.ram_root, keep=self.job_id)
+                yield jobs
+                tmp = f"{path}.{self.pid}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump(jobs, f)
+                os.replace(tmp, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @property
+    def reserved(self):
+        return sum(size for size, _ in self.files.values())
+
+    @property
+    def ram_reserved(self):
+        return sum(size for size, in_ram in self.files.values() if in_ram)
+
+    def _job_dir(self, in_ram):
+        path = os.path.join(self.ram_root if in_ram else self.disk_root, self.job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    # ------------------------------------------------------------------
+    # Allocation
+    # ------------------------------------------------------------------
+
+    def reserve(self, suffix='', size_hint=0, prefer_ram=True):
+        """
+        Reserve space for one intermediate file and return its path.
+
+        Args:
+            suffix: File name suffix (e.g. '.wav')
+            size_hint: Expected size in bytes, counted against the quotas
+            prefer_ram: Use the RAM-backed directory if the file fits
+
+        Raises:
+            OSError (ENOSPC) if a quota or the free disk space would be exceeded
+        """
+        size_hint = max(0, int(size_hint))
+        with self._lock, self._ledger() as jobs:
+            if self.reserved + size_hint > self.job_quota:
+                raise OSError(errno.ENOSPC, f"Scratch quota exceeded for this job: {size_hint / MB:.1f} MB requested, "
+                                            f"{self.reserved / MB:.1f} of {self.job_quota / MB:.0f} MB in use")
+            others = [job for job_id, job in jobs.items() if job_id != self.job_id]
+            global_used = sum(job["bytes"] for job in others) + self.reserved
+            if global_used + size_hint > self.global_quota:
+                raise OSError(errno.ENOSPC, f"Global scratch quota exceeded: {size_hint / MB:.1f} MB requested, "
+                                            f"{global_used / MB:.1f} of {self.global_quota / MB:.0f} MB in use")
+
+            in_ram = False
+            if prefer_ram and self.ram_root is not None:
+                ram_used = sum(job.get("ramBytes", 0) for job in others) + self.ram_reserved
+                ram_parent = os.path.dirname(self.ram_root)
+                in_ram = (ram_used + size_hint <= self.ram_quota and
+                          size_hint <= _free_bytes(ram_parent) * RAM_FREE_FRACTION)
+            if not in_ram and size_hint > _free_bytes(self.disk_root):
+                raise OSError(errno.ENOSPC, f"Not enough disk space for a {size_hint / MB:.1f} MB intermediate "
+                                            f"in {self.disk_root}")
+
+            self._counter += 1
+            path = os.path.join(self._job_dir(in_ram), f"{self._counter:04d}{suffix}")
+            self.files[path] = (size_hint, in_ram)
+            jobs[self.job_id] = {"pid": self.pid, "bytes": self.reserved, "ramBytes": self.ram_reserved}
+        return path
+
+    def release(self, path):
+        """Delete an intermediate and return its reservation."""
+        with self._lock:
+            if path not in self.files:
+                return
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self.files[path]
+            with self._ledger() as jobs:
+                if self.files:
+                    jobs[self.job_id] = {"pid": self.pid, "bytes": self.reserved, "ramBytes": self.ram_reserved}
+                else:
+                    jobs.pop(self.job_id, None)
+
+    @contextmanager
+    def file(self, suffix='', size_hint=0, prefer_ram=True):
+        """Path of an intermediate file that is deleted when the block exits."""
+        path = self.reserve(suffix, size_hint, prefer_ram)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def library_tempdir(self):
+        """
+        A directory for temporaries created by libraries (e.g. pydub's
+        export files), on disk since their size is unknown; it is removed
+        with the rest of the job.
+        """
+        return self._job_dir(in_ram=False)
+
+    def cleanup(self, update_ledger=True):
+        """Delete everything this job allocated."""
+        if os.getpid() != self.pid:
+            # Forked child: the parent owns the files
+            return
+        for root in (self.disk_root, self.ram_root):
+            if root is not None:
+                shutil.rmtree(os.path.join(root, self.job_id), ignore_errors=True)
+        self.files.clear()
+        if update_ledger:
+            try:
+                with self._ledger() as jobs:
+                    jobs.pop(self.job_id, None)
+            except OSError:
+                pass
+
+
+def _reap(jobs, disk_root, ram_root, keep=None):
+    """Drop ledger entries and job directories of processes that no longer exist."""
+    for job_id in [job_id for job_id, job in jobs.items() if job_id != keep and not pid_alive(job["pid"])]:
+        del jobs[job_id]
+    for root in (disk_root, ram_root):
+        if root is None or not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            if not name.startswith(JOB_PREFIX) or name == keep or name in jobs:
+                continue
+            try:
+                pid = int(name[len(JOB_PREFIX):].split('-')[0])
+            except ValueError:
+                continue
+            if not pid_alive(pid):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+_scratch = None
+
+
+def _on_signal(signum, frame):
+    if _scratch is not None:
+        # No ledger update here: the lock may be held by the interrupted code.
+        # The stale entry is dropped by the next job since this pid is gone.
+        _scratch.cleanup(update_ledger=False)
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def get_scratch():
+    """
+    The process-wide ScratchSpace, created on first use and cleaned up at
+    exit and on SIGTERM/SIGHUP. Library temporaries (tempfile) are routed
+    into it too, so they cannot outlive the job either.
+    """
+    global _scratch
+    if _scratch is None:
+        _scratch = ScratchSpace()
+        atexit.register(_scratch.cleanup)
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGHUP):
+                if signal.getsignal(signum) == signal.SIG_DFL:
+                    signal.signal(signum, _on_signal)
+        tempfile.tempdir = _scratch.library_tempdir()
+    return _scratch
+
+
+def scratch_file(suffix='', size_hint=0, prefer_ram=True):
+    """Shortcut for get_scratch().file(...)."""
+    return get_scratch().file(suffix, size_hint, prefer_ram)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('info', 'reap'):
+        print(json.dumps({"success": False, "error": "Usage: scratch.py info | reap"}))
+        sys.exit(1)
+
+    space = ScratchSpace()
+    with space._ledger() as ledger:
+        # Reaping happens on every ledger access
+        jobs = dict(ledger)
+    print(json.dumps({
+        "success": True,
+        "diskRoot": space.disk_root,
+        "ramRoot": space.ram_root,
+        "jobs": jobs,
+        "reservedMB": round(sum(job["bytes"] for job in jobs.values()) / MB, 1),
+        "globalQuotaMB": round(space.global_quota / MB),
+    }))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Silence Detection
+Vectorized frame-RMS scan used by the trimmer's auto-trim mode:
+- Streams the input in blocks (memory-mapped PCM, libsndfile, or pydub as a last resort);
+  "-" / "shm:<name>" inputs are read from stdin / shared memory (see stdio_io.py)
+- Frame RMS per channel via reshape + mean, no per-sample Python loops
+- Leading/trailing silence boundaries and optional internal gaps
+
+A replacement for pydub.silence.detect_silence, which walks the audio in
+Python one slice at a time and is very slow on long files.
+"""
+
+import numpy as np
+import soundfile as sf
+from pcm_mmap import BLOCK_FRAMES
+from stdio_io import is_stdio, open_input_pcm, decoder_source, load_segment, stream_wav_blocks
+
+DEFAULT_THRESHOLD_DB = -50.0
+DEFAULT_MIN_SILENCE_MS = 500
+DEFAULT_FRAME_MS = 10
+DEFAULT_PADDING_MS = 50
+
+
+def iter_audio_blocks(input_path, block_frames=BLOCK_FRAMES, stream=False):
+    """
+    Yield float32 (n, channels) blocks of the input.
+
+    Args:
+        input_path: Path, "-" for stdin or "shm:<name>"
+        block_frames: Frames per block
+        stream: If True, a WAV on stdin is processed while it is still
+            arriving (single pass only - stdin cannot be read again)
+
+    Returns:
+        (samplerate, generator of blocks)
+    """
+    if stream and is_stdio(input_path):
+        streamed = stream_wav_blocks(block_frames)
+        if streamed is not None:
+            return streamed
+
+    pcm = open_input_pcm(input_path)
+    if pcm is not None:
+        return pcm.samplerate, (block for _, block in pcm.iter_blocks(block_frames))
+
+    try:
+        info = sf.info(decoder_source(input_path))
+        blocks = sf.blocks(decoder_source(input_path), blocksize=block_frames, dtype='float32', always_2d=True)
+        return info.samplerate, blocks
+    except RuntimeError:
+        pass
+
+    # Formats libsndfile cannot read (e.g. AAC/M4A): decode once with pydub
+    audio = load_segment(input_path)
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32).reshape(-1, audio.channels)
+    samples /= float(1 << (8 * audio.sample_width - 1))
+    return audio.frame_rate, (samples[i:i + block_frames] for i in range(0, len(samples), block_frames))
+
+
+def frame_levels_db(blocks, frame_length):
+    """
+    Loudest-channel RMS level (dBFS) per frame of frame_length samples.
+
+    Samples left over at a block boundary are carried into the next block,
+    so frames line up exactly as if the whole file were in memory.
+    """
+    levels = []
+    carry = None
+    total = 0
+    for block in blocks:
+        total += len(block)
+        if carry is not None and len(carry):
+            block = np.concatenate([carry, block])
+        usable = len(block) - len(block) % frame_length
+        if usable:
+            frames = block[:usable].reshape(-1, frame_length, block.shape[1])
+            mean_square = np.mean(np.square(frames, dtype=np.float64), axis=1).max(axis=1)
+            levels.append(mean_square)
+        carry = block[usable:]
+
+    if carry is not None and len(carry):
+        levels.append(np.mean(np.square(carry, dtype=np.float64), axis=0).max(keepdims=True))
+
+    mean_square = np.concatenate(levels) if levels else np.zeros(0)
+    return 10.0 * np.log10(mean_square + 1e-20), total
+
+
+def silent_runs(is_silent, min_frames):
+    """(start, end) frame index pairs of silent runs at least min_frames long."""
+    padded = np.concatenate([[False], is_silent, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    keep = (ends - starts) >= min_frames
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def detect_silence(input_path, threshold_db=DEFAULT_THRESHOLD_DB, min_silence_ms=DEFAULT_MIN_SILENCE_MS,
+                   frame_ms=DEFAULT_FRAME_MS, padding_ms=DEFAULT_PADDING_MS, find_gaps=False):
+    """
+    Find where sound starts and ends, and optionally internal silent gaps.
+
+    Args:
+        input_path: Path to input audio file
+        threshold_db: Frames below this level (dBFS) count as silence
+        min_silence_ms: Minimum length of an internal gap
+        frame_ms: Analysis frame length
+        padding_ms: Audio kept before the first / after the last sound
+        find_gaps: If True, also report internal silent gaps
+
+    Returns:
+        dict with duration, sound_start, sound_end (seconds) and gaps
+    """
+    sr, blocks = iter_audio_blocks(input_path)
+    frame_length = max(1, int(sr * frame_ms / 1000))
+    levels_db, total_samples = frame_levels_db(blocks, frame_length)
+    duration = total_samples / sr
+    frame_seconds = frame_length / sr
+    padding = padding_ms / 1000.0
+
+    is_silent = levels_db < threshold_db
+    loud = np.flatnonzero(~is_silent)
+    if len(loud) == 0:
+        return {
+            "duration": round(duration, 3),
+            "sound_start": None,
+            "sound_end": None,
+            "all_silent": True,
+            "gaps": [],
+        }
+
+    sound_start = max(0.0, loud[0] * frame_seconds - padding)
+    sound_end = min(duration, (loud[-1] + 1) * frame_seconds + padding)
+    result = {
+        "duration": round(duration, 3),
+        "sound_start": round(sound_start, 3),
+        "sound_end": round(sound_end, 3),
+        "all_silent": False,
+        "gaps": [],
+    }
+
+    if find_gaps:
+        min_frames = max(1, int(np.ceil(min_silence_ms / 1000.0 / frame_seconds)))
+        for start, end in silent_runs(is_silent[loud[0]:loud[-1] + 1], min_frames):
+            result["gaps"].append({
+                "start": round((loud[0] + start) * frame_seconds, 3),
+                "end": round((loud[0] + end) * frame_seconds, 3),
+            })
+    return result
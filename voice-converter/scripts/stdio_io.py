@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+Zero-Disk Audio Handoff
+Lets every processing script take its input and write its output without
+temporary files:
+- "-" as input reads the upload from stdin. A PCM/float WAV is recognized
+  from its header alone (stdin_wav), so probing, admission and the scripts'
+  streaming paths consume its samples block by block while they are still
+  arriving; anything else is read whole, once (stdin_bytes), and so is a
+  WAV whose script needs random access
+- "-" as output writes the result to stdout; progress lines and the JSON
+  result then go to stderr so stdout carries only the audio bytes
+- "shm:<name>" as input attaches to a multiprocessing.shared_memory block
+  holding a WAV image of already-decoded PCM (see publish_pcm), so a worker
+  can decode once and hand the samples to several scripts
+
+Shared memory CLI:
+    stdio_io.py publish <input|->    decode into shared memory, print the spec
+    stdio_io.py release <shm:name>   unlink a published block
+"""
+
+import io
+import os
+import sys
+import json
+import struct
+import subprocess
+from contextlib import contextmanager
+import numpy as np
+import soundfile as sf
+from pcm_mmap import PcmMap, BLOCK_FRAMES, open_pcm, open_pcm_buffer, wav_format, wav_header
+from metrics import timed_decode
+
+STDIO = '-'
+SHM_PREFIX = 'shm:'
+STDIN_NAME = '<stdin>'
+DEFAULT_STDOUT_FORMAT = 'wav'
+
+# Raw sample formats ffmpeg reads from a pipe, by pydub sample width
+PIPE_SAMPLE_FORMATS = {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}
+# stdin bytes passed on per read when it is piped through to ffmpeg
+READ_CHUNK = 1 << 20
+
+_stdin_data = None
+_stdin_prefix = b''
+# StdinWav once the header has been parsed, False if stdin is not a streamable WAV
+_stdin_wav = None
+_binary_stdout = None
+_stdout_format = DEFAULT_STDOUT_FORMAT
+_attached = {}
+
+
+def is_stdio(path):
+    return path == STDIO
+
+
+def is_shared_memory(spec):
+    return isinstance(spec, str) and spec.startswith(SHM_PREFIX)
+
+
+# ============================================================================
+# INPUT
+# ============================================================================
+
+def stdin_bytes():
+    """
+    The whole of stdin, read once and cached (stdin cannot be rewound).
+    Header bytes already parsed by stdin_wav() are included.
+
+    Raises:
+        RuntimeError if the samples have already been streamed
+    """
+    global _stdin_data
+    if _stdin_data is None:
+        if _stdin_wav and _stdin_wav.streamed:
+            raise RuntimeError("stdin has already been streamed and cannot be read again")
+        _stdin_data = _stdin_prefix + sys.stdin.buffer.read()
+    return _stdin_data
+
+
+def stdin_size():
+    """Size of the stdin input in bytes, without reading more of it (None if unknown)."""
+    if _stdin_data is not None:
+        return len(_stdin_data)
+    wav = stdin_wav()
+    if wav is not None and wav.n_frames is not None:
+        return len(_stdin_prefix) + wav.n_frames * wav.block_align
+    return None
+
+
+def attach_shared_memory(spec):
+    """Attach to a published shared memory block (cached per process)."""
+    from multiprocessing import shared_memory
+
+    name = spec[len(SHM_PREFIX):]
+    if name not in _attached:
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the block with the resource
+            # tracker, which would unlink the publisher's block when we exit
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        _attached[name] = shm
+    return _attached[name]
+
+
+def detach_shared_memory(spec):
+    """
+    Drop this process's mapping of a block attached by attach_shared_memory()
+    (long-lived workers attach one block per job). A block still referenced
+    by live arrays stays attached.
+    """
+    import gc
+
+    name = spec[len(SHM_PREFIX):]
+    shm = _attached.get(name)
+    if shm is None:
+        return
+    # Arrays over the block often sit in reference cycles (librosa, closures)
+    gc.collect()
+    try:
+        shm.close()
+    except BufferError:
+        return
+    del _attached[name]
+
+
+def input_buffer(spec):
+    """
+    In-memory image of a stdin or shared memory input (None for paths).
+    For stdin this reads all of it: check streamed_wav() first.
+    """
+    if is_stdio(spec):
+        return stdin_bytes()
+    if is_shared_memory(spec):
+        return attach_shared_memory(spec).buf
+    return None
+
+
+def open_input_pcm(spec):
+    """
+    open_pcm() for any input spec: paths are memory-mapped, stdin and
+    shared memory images are wrapped in place.
+
+    Returns:
+        PcmMap, or None if the input is not uncompressed PCM
+    """
+    buffer = input_buffer(spec)
+    if buffer is None:
+        return open_pcm(spec)
+    return open_pcm_buffer(buffer, STDIN_NAME if is_stdio(spec) else spec)
+
+
+def decoder_source(spec):
+    """
+    Something librosa, soundfile and pydub can read: the path itself, or a
+    fresh in-memory file for stdin / shared memory inputs.
+    """
+    buffer = input_buffer(spec)
+    if buffer is None:
+        return spec
+    return io.BytesIO(buffer)
+
+
+def load_segment(spec):
+    """
+    AudioSegment for any input spec. Integer PCM WAV is read by pydub
+    itself (no subprocess), or collected block by block while it arrives
+    on stdin (16/32-bit, the widths pydub keeps as is); anything else is
+    decoded by decode.py.
+    """
+    from pydub import AudioSegment
+    from decode import decode_segment
+
+    wav = streamed_wav(spec)
+    if wav is not None and wav.sample_format == 'int' and wav.bits in (16, 32):
+        with timed_decode():
+            # Collected as it arrives, into the buffer pydub would have read it into
+            data = bytearray(wav.n_frames * wav.block_align)
+            filled = 0
+            for chunk in wav.raw_blocks():
+                data[filled:filled + len(chunk)] = chunk
+                filled += len(chunk)
+            if filled < len(data):
+                raise ValueError(f"Input ended after {filled // wav.block_align} of {wav.n_frames} frames")
+            return AudioSegment(data=bytes(data), sample_width=wav.bits // 8, frame_rate=wav.samplerate,
+                                channels=wav.channels)
+    pcm = open_input_pcm(spec)
+    with timed_decode():
+        if pcm is None or pcm.container != 'wav' or pcm.sample_format == 'float':
+            return decode_segment(spec)
+        buffer = input_buffer(spec)
+        if buffer is None:
+            return AudioSegment.from_file(spec, format='wav')
+        return AudioSegment.from_file(io.BytesIO(buffer), format='wav')
+
+
+def input_exists(spec):
+    if is_stdio(spec):
+        return True
+    if is_shared_memory(spec):
+        try:
+            attach_shared_memory(spec)
+            return True
+        except FileNotFoundError:
+            return False
+    return os.path.exists(spec)
+
+
+def _read_exact(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+class StdinWav:
+    """
+    A PCM/float WAV arriving on stdin, known from its header; the samples
+    are read (once) by raw_blocks() or blocks() as they arrive.
+
+    Attributes:
+        container: 'wav' or 'rf64'
+        samplerate, channels, bits, sample_format, fmt_chunk, block_align
+        n_frames: Frame count from the header (None when a piped encoder
+            left the size open: the data then runs to the end of stdin)
+        big_endian: Always False (WAV)
+    """
+
+    big_endian = False
+
+    def __init__(self, container, fmt_chunk, data_size):
+        self.container = container
+        self.fmt_chunk = fmt_chunk
+        self.channels, self.samplerate, self.bits, self.sample_format = wav_format(fmt_chunk)
+        self.block_align = self.channels * self.bits // 8
+        self.n_frames = data_size // self.block_align if data_size else None
+        self.streamed = False
+
+    @property
+    def duration(self):
+        return self.n_frames / self.samplerate if self.n_frames is not None else None
+
+    def raw_blocks(self, block_frames=BLOCK_FRAMES):
+        """Yield the payload as bytes, whole frames only, block_frames at a time."""
+        if self.streamed:
+            raise RuntimeError("stdin has already been streamed and cannot be read again")
+        self.streamed = True
+        stream = sys.stdin.buffer
+        remaining = self.n_frames * self.block_align if self.n_frames is not None else None
+        carry = b''
+        while remaining is None or remaining > 0:
+            want = block_frames * self.block_align - len(carry)
+            if remaining is not None:
+                want = min(want, remaining)
+            data = _read_exact(stream, want)
+            if remaining is not None:
+                remaining -= len(data)
+            chunk = carry + data
+            usable = len(chunk) - len(chunk) % self.block_align
+            if usable:
+                yield chunk[:usable]
+            carry = chunk[usable:]
+            if len(data) < want:
+                break
+
+    def blocks(self, block_frames=BLOCK_FRAMES):
+        """Yield float32 (n, channels) blocks, converted as for files (pcm_mmap.PcmMap.to_float)."""
+        for chunk in self.raw_blocks(block_frames):
+            pcm = PcmMap(STDIN_NAME, self.container, self.samplerate, self.channels, self.bits,
+                         self.sample_format, False, 0, len(chunk) // self.block_align,
+                         fmt_chunk=self.fmt_chunk, buffer=chunk)
+            yield pcm.to_float()
+
+
+def _parse_stdin_wav():
+    global _stdin_prefix
+    stream = sys.stdin.buffer
+    consumed = [_read_exact(stream, 12)]
+    head = consumed[0]
+    try:
+        if len(head) < 12 or head[:4] not in (b'RIFF', b'RF64', b'BW64') or head[8:12] != b'WAVE':
+            return None
+        fmt = ds64_data_size = None
+        while True:
+            chunk_header = _read_exact(stream, 8)
+            consumed.append(chunk_header)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'data':
+                data_size = ds64_data_size if chunk_size == 0xFFFFFFFF else chunk_size
+                break
+            payload = _read_exact(stream, chunk_size + (chunk_size & 1))
+            consumed.append(payload)
+            if chunk_id == b'fmt ':
+                fmt = payload[:chunk_size]
+            elif chunk_id == b'ds64' and len(payload) >= 16:
+                ds64_data_size = struct.unpack('<Q', payload[8:16])[0]
+        if wav_format(fmt) is None:
+            return None
+        return StdinWav('wav' if head[:4] == b'RIFF' else 'rf64', fmt, data_size)
+    finally:
+        # Kept, so stdin_bytes() still returns the complete input
+        _stdin_prefix = b''.join(consumed)
+
+
+def stdin_wav():
+    """
+    Parse the header of a WAV on stdin (reading nothing past the start of
+    its samples) and cache it.
+
+    Returns:
+        StdinWav, or None if stdin is not a plain PCM/float WAV
+    """
+    global _stdin_wav
+    if _stdin_wav is None:
+        _stdin_wav = (_parse_stdin_wav() if _stdin_data is None else None) or False
+    return _stdin_wav or None
+
+
+def streamed_wav(spec):
+    """
+    The StdinWav of a "-" input whose samples can still be streamed: stdin
+    holds a PCM/float WAV of known length that has been neither streamed
+    nor read whole. None otherwise (use the input's buffer or path).
+    """
+    if not is_stdio(spec) or _stdin_data is not None:
+        return None
+    wav = stdin_wav()
+    if wav is None or wav.streamed or wav.n_frames is None:
+        return None
+    return wav
+
+
+def stream_wav_blocks(block_frames=BLOCK_FRAMES):
+    """
+    Decode a WAV arriving on stdin block by block, as soon as each block
+    has been received, instead of waiting for the whole upload (the length
+    may be left open: the blocks then run to the end of stdin).
+
+    Returns:
+        (samplerate, generator of float32 (n, channels) blocks), or None if
+        stdin is not a plain PCM/float WAV; the bytes inspected so far are
+        kept, so stdin_bytes() still returns the complete input
+    """
+    wav = stdin_wav() if _stdin_data is None else None
+    if wav is None or wav.streamed:
+        return None
+    return wav.samplerate, wav.blocks(block_frames)
+
+
+def write_wav_stream(wav, out, start_frame, stop_frame, block_frames=BLOCK_FRAMES):
+    """
+    pcm_mmap.write_wav_slice() for a StdinWav: frames [start_frame,
+    stop_frame) are copied to a new WAV as they arrive, and stdin is not
+    read past stop_frame.
+
+    Returns:
+        Frames written
+    """
+    start_frame = max(0, start_frame)
+    stop_frame = min(stop_frame, wav.n_frames)
+    n_frames = max(0, stop_frame - start_frame)
+    data_size = n_frames * wav.block_align
+    out.write(wav_header(wav.channels, wav.samplerate, wav.bits, data_size, fmt_chunk=wav.fmt_chunk))
+    position = 0
+    for chunk in wav.raw_blocks(block_frames):
+        frames = len(chunk) // wav.block_align
+        lo, hi = max(start_frame, position), min(stop_frame, position + frames)
+        if hi > lo:
+            out.write(chunk[(lo - position) * wav.block_align:(hi - position) * wav.block_align])
+        position += frames
+        if position >= stop_frame:
+            break
+    if position < stop_frame:
+        raise ValueError(f"Input ended after {position} of {wav.n_frames} frames")
+    if data_size & 1:
+        out.write(b'\x00')
+    return n_frames
+
+
+def _copy_stdin(pipe):
+    """Write all of stdin (including the bytes already parsed) to a pipe as it arrives."""
+    try:
+        if _stdin_data is not None:
+            pipe.write(_stdin_data)
+            return
+        if _stdin_wav and _stdin_wav.streamed:
+            raise RuntimeError("stdin has already been streamed and cannot be read again")
+        pipe.write(_stdin_prefix)
+        while True:
+            chunk = sys.stdin.buffer.read1(READ_CHUNK)
+            if not chunk:
+                break
+            pipe.write(chunk)
+    except BrokenPipeError:
+        # The reader stopped early (an error it reports itself, or it had all it needed)
+        pass
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+# ============================================================================
+# OUTPUT
+# ============================================================================
+
+def parse_stdio_args(argv):
+    """
+    Strip --output-format <ext> (the encoding used when the output is "-")
+    from argv.
+
+    Returns:
+        remaining args
+    """
+    global _stdout_format
+    remaining = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--output-format':
+            _stdout_format = (next(args, None) or DEFAULT_STDOUT_FORMAT).lower().lstrip('.')
+        elif arg.startswith('--output-format='):
+            _stdout_format = arg.split('=', 1)[1].lower().lstrip('.') or DEFAULT_STDOUT_FORMAT
+        else:
+            remaining.append(arg)
+    return remaining
+
+
+def claim_stdout(output_path):
+    """
+    When the output is "-", reserve the real stdout for the output bytes and
+    send everything print()ed (progress and the JSON result) to stderr.
+    """
+    global _binary_stdout
+    if is_stdio(output_path) and _binary_stdout is None:
+        sys.stdout.flush()
+        _binary_stdout = sys.stdout.buffer
+        sys.stdout = sys.stderr
+
+
+def output_extension(output_path):
+    """Lower-case extension with the dot ('.wav'); for "-" the --output-format."""
+    if is_stdio(output_path):
+        return '.' + _stdout_format
+    return os.path.splitext(output_path)[1].lower()
+
+
+@contextmanager
+def open_output(output_path):
+    """Binary file object for an output path, or stdout for "-" (left open)."""
+    if is_stdio(output_path):
+        claim_stdout(output_path)
+        yield _binary_stdout
+        _binary_stdout.flush()
+    else:
+        with open(output_path, 'wb') as f:
+            yield f
+
+
+def export_segment(audio, output_path, output_format, bitrate=None, parameters=None):
+    """
+    AudioSegment.export() that can also write to stdout.
+
+    pydub encodes through temporary files and seeks in its output, so for
+    "-" the raw samples are piped through ffmpeg straight to stdout instead.
+    """
+    if not is_stdio(output_path):
+        audio.export(output_path, format=output_format, bitrate=bitrate, parameters=parameters)
+        return
+    claim_stdout(output_path)
+    command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', PIPE_SAMPLE_FORMATS[audio.sample_width], '-ar', str(audio.frame_rate), '-ac', str(audio.channels),
+        '-i', 'pipe:0',
+    ]
+    if bitrate:
+        command += ['-b:a', bitrate]
+    command += list(parameters or []) + ['-f', output_format, 'pipe:1']
+    process = subprocess.run(command, input=audio.raw_data, stdout=_binary_stdout, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg encoding failed: {process.stderr.decode(errors='replace').strip()}")
+
+
+def run_ffmpeg(input_spec, output_path, output_format, input_options=(), output_options=()):
+    """
+    Run ffmpeg from any input spec straight to an output path or stdout,
+    without decoding into Python (stream copies, range transcodes).
+
+    stdin and shared memory images are fed through a pipe, so ffmpeg
+    reads them from the start instead of seeking; stdin is passed on as it
+    arrives rather than read whole first.
+    """
+    pipe_stdin = is_stdio(input_spec)
+    buffer = None if pipe_stdin else input_buffer(input_spec)
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *input_options,
+               '-i', 'pipe:0' if pipe_stdin or buffer is not None else input_spec,
+               *output_options, '-f', output_format]
+    if is_stdio(output_path):
+        claim_stdout(output_path)
+        command.append('pipe:1')
+        stdout = _binary_stdout
+        stdout.flush()
+    else:
+        command.append(output_path)
+        stdout = subprocess.DEVNULL
+    if pipe_stdin:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=stdout, stderr=subprocess.PIPE)
+        # ffmpeg logs at error level only, so its stderr cannot fill up while stdin is copied
+        _copy_stdin(process.stdin)
+        error = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    else:
+        completed = subprocess.run(command, input=bytes(buffer) if buffer is not None else None,
+                                   stdout=stdout, stderr=subprocess.PIPE)
+        error, returncode = completed.stderr, completed.returncode
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {error.decode(errors='replace').strip()}")
+
+
+def write_samples(output_path, y, sr, bitrate='320k'):
+    """
+    soundfile.write() that can also write to stdout.
+
+    libsndfile needs a seekable file to finalize headers, so for "-" the
+    file is encoded in memory first; MP3 (--output-format mp3) goes from an
+    in-memory 16-bit WAV through ffmpeg.
+    """
+    if not is_stdio(output_path):
+        sf.write(output_path, y, sr)
+        return
+    encoded = io.BytesIO()
+    if _stdout_format == 'mp3':
+        from pydub import AudioSegment
+        sf.write(encoded, y, sr, format='WAV', subtype='PCM_16')
+        encoded.seek(0)
+        export_segment(AudioSegment.from_wav(encoded), output_path, 'mp3', bitrate=bitrate)
+        return
+    sf.write(encoded, y, sr, format=_stdout_format.upper())
+    with open_output(output_path) as f:
+        f.write(encoded.getbuffer())
+
+
+# ============================================================================
+# SHARED MEMORY
+# ============================================================================
+
+def publish_pcm(samples, samplerate, name=None):
+    """
+    Copy decoded samples into a new shared memory block laid out as a
+    32-bit float WAV image, readable by any script as "shm:<name>".
+
+    Args:
+        samples: (n,) or (n, channels) array
+        samplerate: Sample rate in Hz
+        name: Optional block name (default: generated)
+
+    Returns:
+        (spec, SharedMemory) - the caller closes and unlinks the block
+    """
+    from multiprocessing import shared_memory
+
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    header = wav_header(samples.shape[1], int(samplerate), 32, samples.nbytes, float_format=True)
+    shm = shared_memory.SharedMemory(name=name, create=True, size=len(header) + samples.nbytes)
+    shm.buf[:len(header)] = header
+    view = np.ndarray(samples.shape, dtype=np.float32, buffer=shm.buf, offset=len(header))
+    view[:] = samples
+    del view
+    return SHM_PREFIX + shm.name, shm
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    command = args[0] if args else None
+    if command not in ('publish', 'release') or len(args) < 2:
+        print(json.dumps({"success": False, "error": "Usage: stdio_io.py publish <input|-> | release <shm:name>"}))
+        sys.exit(1)
+
+    try:
+        if command == 'publish':
+            from decode import decode
+            y, sr = decode(args[1])
+            spec, shm = publish_pcm(y, sr)
+            # Keep the block alive after this process exits; "release" unlinks it
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            shm.close()
+            result = {"success": True, "spec": spec, "sample_rate": int(sr), "channels": int(y.shape[1]),
+                      "duration": round(len(y) / sr, 3), "bytes": shm.size}
+        else:
+            shm = attach_shared_memory(args[1])
+            shm.close()
+            shm.unlink()
+            result = {"success": True, "spec": args[1]}
+    except (OSError, RuntimeError, ValueError) as e:
+        result = {"success": False, "error": str(e)}
+    print(json.dumps(result))
+    sys.exit(0 if result["success"] else 1)
@@ -0,0 +1,13 @@
+"""
+Shared setup for the processing script tests.
+
+The scripts import each other as siblings (they run as `python scripts/x.py`),
+so the scripts directory goes on sys.path. Metrics recording is turned off
+so test runs leave no store behind.
+"""
+
+import os
+import sys
+
+os.environ.setdefault('METRICS_DISABLED', '1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,16 @@
+"""
+A short run of equivalence_harness.py: every analyzer mode against the
+reference on two synthetic clips. The full corpus (with the multi-slice
+clip and 192 kHz master) runs as `npm run test:equivalence`.
+"""
+
+from equivalence_harness import default_modes, run_harness, write_synthetic_corpus
+
+
+def test_every_mode_matches_the_reference(tmp_path):
+    inputs = write_synthetic_corpus(str(tmp_path / 'synthetic'), names=('boundary_44k', 'hires_96k_stereo'))
+    report = run_harness(inputs, default_modes(str(tmp_path)), str(tmp_path))
+    failures = [(r["input"], r["mode"], r["statusFlip"], r["mismatches"])
+                for r in report["results"] if r["mismatches"] or r["statusFlip"]]
+    assert report["success"], failures
+    assert report["comparisons"] == len(inputs) * len(report["modes"])
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from loudness import LoudnessMeter, measure
+
+
+def _sine(sr, seconds=5.0, freq=997.0, amplitude=1.0):
+    t = np.arange(int(sr * seconds)) / sr
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+
+@pytest.mark.parametrize('sr', [44100, 48000])
+def test_full_scale_997_hz_sine_reads_minus_3_01_lufs(sr):
+    # ITU-R BS.1770-4: a 0 dBFS 997 Hz sine in one channel reads -3.01 LKFS
+    assert measure(_sine(sr), sr)["integratedLoudness"] == -3.01
+
+
+def test_second_silent_channel_does_not_change_loudness():
+    y = _sine(48000)
+    stereo = np.stack([y, np.zeros_like(y)], axis=1)
+    assert measure(stereo, 48000)["integratedLoudness"] == -3.01
+
+
+def test_minus_20_db_reads_20_lu_lower():
+    assert measure(_sine(48000, amplitude=0.1), 48000)["integratedLoudness"] == -23.01
+
+
+def test_block_size_does_not_change_the_result():
+    y = np.random.default_rng(0).standard_normal((48000 * 6, 2)) * 0.1
+    assert measure(y, 48000, block_frames=1000) == measure(y, 48000)
+
+
+def test_silence_and_unstarted_meter_have_no_loudness():
+    assert measure(np.zeros(48000), 48000)["integratedLoudness"] is None
+    assert LoudnessMeter().result()["integratedLoudness"] is None
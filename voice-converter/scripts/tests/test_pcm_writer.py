@@ -0,0 +1,55 @@
+import io
+import numpy as np
+import pytest
+import soundfile as sf
+from pydub import AudioSegment
+from pcm_writer import PcmWriter, write_pcm, write_segment
+
+
+def _segment(samples, sample_width, frame_rate=44100):
+    return AudioSegment(samples.astype(f'<i{sample_width}').tobytes(), frame_rate=frame_rate,
+                        sample_width=sample_width, channels=samples.shape[1])
+
+
+def _read_ints(data):
+    """Samples of a WAV as int32, left-aligned as libsndfile returns them."""
+    samples, _ = sf.read(io.BytesIO(data), dtype='int32', always_2d=True)
+    return samples
+
+
+def test_16_to_24_bit_is_an_exact_shift():
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-32768, 32768, size=(5000, 2))
+    samples[:4] = [[-32768, 32767], [0, -1], [1, -32767], [32767, -32768]]
+    out = io.BytesIO()
+    write_segment(out, _segment(samples, 2), 24, block_frames=1000)
+    np.testing.assert_array_equal(_read_ints(out.getvalue()), samples << 16)
+
+
+def test_24_bit_held_as_32_bits_is_written_back_unchanged():
+    rng = np.random.default_rng(1)
+    s24 = rng.integers(-(1 << 23), 1 << 23, size=(5000, 1))
+    # pydub widens 24-bit files by filling the new low byte with the sign
+    widened = (s24 << 8) | np.where(s24 < 0, 0xFF, 0)
+    out = io.BytesIO()
+    write_segment(out, _segment(widened, 4), 24)
+    np.testing.assert_array_equal(_read_ints(out.getvalue()), s24 << 8)
+
+
+@pytest.mark.parametrize('bits', [16, 24, 32])
+def test_undithered_float_round_trip_is_exact(bits):
+    rng = np.random.default_rng(2)
+    scale = 1 << (bits - 1)
+    ints = rng.integers(-scale, scale, size=(3000, 2))
+    out = io.BytesIO()
+    write_pcm(out, ints / scale, 48000, bits=bits, dither='none', block_frames=700)
+    np.testing.assert_array_equal(_read_ints(out.getvalue()) >> (32 - bits), ints)
+
+
+def test_unseekable_stream_needs_the_frame_count():
+    class Unseekable(io.BytesIO):
+        def seekable(self):
+            return False
+
+    with pytest.raises(ValueError):
+        PcmWriter(Unseekable(), 48000, 2)
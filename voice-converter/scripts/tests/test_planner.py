@@ -0,0 +1,68 @@
+import pytest
+from admission import MB
+from planner import plan
+
+
+def _info(decoder='mmap', codec='pcm_s16le', sample_rate=44100, channels=2, seconds=600.0, bit_depth=16):
+    return {
+        "decoder": decoder, "codec": codec, "sampleRate": sample_rate, "channels": channels,
+        "duration": seconds, "frames": int(sample_rate * seconds), "bitDepth": bit_depth,
+    }
+
+
+HIRES = _info(sample_rate=96000, seconds=1200.0, codec='pcm_s24le', bit_depth=24)
+
+
+def test_analyze_pcm_streams_from_the_memory_map():
+    chosen = plan('analyze_fingerprint', _info(), budget=0)
+    assert chosen["strategy"] == 'mmap-stream'
+    assert (chosen["lowMemory"], chosen["decimation"]) == (False, 1)
+
+
+def test_analyze_compressed_input_is_decoded():
+    assert plan('analyze_fingerprint', _info(decoder='ffmpeg', codec='mp3'), budget=0)["strategy"] == 'decode'
+
+
+def test_analyze_slices_only_when_the_whole_signal_does_not_fit():
+    fits = plan('analyze_fingerprint', _info(), budget=4096 * MB)
+    too_big = plan('analyze_fingerprint', _info(), budget=400 * MB)
+    assert fits["strategy"] == 'mmap-stream' and not fits["lowMemory"]
+    assert too_big["strategy"] == 'mmap-stream+low-memory' and too_big["lowMemory"]
+    assert list(too_big["candidates"]) == ['mmap-stream+low-memory']
+
+
+def test_analyze_asked_for_low_memory_never_plans_whole_signal():
+    chosen = plan('analyze_fingerprint', _info(), low_memory=True, budget=0)
+    assert chosen["lowMemory"] and chosen["strategy"].endswith('+low-memory')
+
+
+def test_analyze_decimates_only_when_allowed():
+    assert plan('analyze_fingerprint', HIRES, budget=0)["decimation"] == 1
+    chosen = plan('analyze_fingerprint', HIRES, decimation=2, budget=0)
+    assert chosen["strategy"] == 'mmap-stream+decimate' and chosen["decimation"] == 2
+    assert chosen["candidates"]['mmap-stream+decimate'] < chosen["candidates"]['mmap-stream']
+
+
+def test_analyze_decimated_whole_signal_beats_slicing_at_the_input_rate():
+    # Between the two peaks: only the decimated analysis fits whole
+    chosen = plan('analyze_fingerprint', HIRES, decimation=2, budget=10000 * MB)
+    assert chosen["strategy"] == 'mmap-stream+decimate'
+    assert 'mmap-stream+low-memory' in chosen["candidates"]
+
+
+def test_trim_of_pcm_to_wav_slices_the_memory_map():
+    assert plan('trim_audio', _info(), start=10.0, end=20.0)["strategy"] == 'mmap-slice'
+
+
+@pytest.mark.parametrize('bit_depth, expected', [(None, 'stream-copy'), (16, 'stream-copy'), (24, 'decode')])
+def test_convert_copies_pcm_only_when_the_samples_are_unchanged(bit_depth, expected):
+    assert plan('convert_audio', _info(), output_format='wav', bit_depth=bit_depth)["strategy"] == expected
+
+
+def test_convert_with_a_new_rate_decodes():
+    assert plan('convert_audio', _info(), output_format='wav', sample_rate=48000)["strategy"] == 'decode'
+
+
+def test_unknown_script_is_rejected():
+    with pytest.raises(ValueError):
+        plan('separate_stems', _info())
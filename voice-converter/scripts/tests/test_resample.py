@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from scipy import signal
+from resample import PolyphaseStream, SOXR_AVAILABLE, resample, resample_stream
+
+BACKENDS = ['scipy'] + (['soxr'] if SOXR_AVAILABLE else [])
+
+
+def _noise(n, channels=None, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal(n if channels is None else (n, channels))
+
+
+def _irregular_blocks(x, sizes=(1, 777, 4096, 13, 20000)):
+    blocks, start = [], 0
+    for size in sizes * 3:
+        blocks.append(x[start:start + size])
+        start += size
+    blocks.append(x[start:])
+    return blocks
+
+
+@pytest.mark.parametrize('block_samples', [441, 4096, 10000])
+def test_block_size_does_not_change_output(block_samples):
+    x = _noise(30000, channels=2)
+    whole = resample(x, 48000, 44100, backend='scipy', block_samples=1 << 16)
+    blocked = resample(x, 48000, 44100, backend='scipy', block_samples=block_samples)
+    assert blocked.shape == whole.shape
+    np.testing.assert_array_equal(blocked, whole)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_stream_of_irregular_blocks_matches_whole_signal(backend):
+    x = _noise(30000)
+    whole = resample(x, 96000, 44100, backend=backend)
+    streamed = np.concatenate(list(resample_stream(iter(_irregular_blocks(x)), 96000, 44100, backend=backend)))
+    np.testing.assert_array_equal(streamed[:, 0], whole)
+
+
+def test_polyphase_matches_one_upfirdn_over_the_whole_signal():
+    x = _noise(30000)
+    stream = PolyphaseStream(96000, 44100)
+    out = resample(x, 96000, 44100, backend='scipy')
+    reference = signal.upfirdn(stream.h, x, stream.up, stream.down)[stream.h_delay:stream.h_delay + len(out)]
+    assert len(out) == -(-len(x) * stream.up // stream.down)
+    np.testing.assert_array_equal(out, reference)
+
+
+def test_same_rate_is_returned_unchanged():
+    x = _noise(1000)
+    np.testing.assert_array_equal(resample(x, 44100, 44100), x)
+
+
+def test_unknown_quality_is_rejected():
+    with pytest.raises(ValueError):
+        resample(_noise(100), 48000, 44100, quality='best')
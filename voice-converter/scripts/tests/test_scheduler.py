@@ -0,0 +1,70 @@
+import gc
+import weakref
+import pytest
+from scheduler import Task, prefix_tasks, run_graph
+
+
+class Blob:
+    """A result that can be weakly referenced, to see when the graph drops it."""
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_intermediates_are_freed_after_their_last_consumer(workers):
+    refs = {}
+
+    def make():
+        blob = Blob()
+        refs['intermediate'] = weakref.ref(blob)
+        return blob
+
+    def after(a, b):
+        # Runs once both consumers of the intermediate are done
+        gc.collect()
+        return refs['intermediate']() is None
+
+    tasks = [
+        Task('intermediate', make),
+        Task('a', lambda intermediate: 1, deps=['intermediate']),
+        Task('b', lambda intermediate: 2, deps=['intermediate']),
+        Task('c', after, deps=['a', 'b']),
+    ]
+    results = run_graph(tasks, workers=workers)
+    assert results == {'c': True}
+
+
+def test_kept_and_leaf_results_are_returned():
+    tasks = [
+        Task('stft', lambda: 'S', keep=True),
+        Task('band', lambda stft: stft + 'b', deps=['stft']),
+        Task('mfcc', lambda stft: stft + 'm', deps=['stft']),
+    ]
+    assert run_graph(tasks, workers=1) == {'stft': 'S', 'band': 'Sb', 'mfcc': 'Sm'}
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_dependency_cycle_is_detected(workers):
+    tasks = [
+        Task('a', lambda c: c, deps=['c']),
+        Task('b', lambda a: a, deps=['a']),
+        Task('c', lambda b: b, deps=['b']),
+    ]
+    with pytest.raises(ValueError, match='cycle'):
+        run_graph(tasks, workers=workers)
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError, match='unknown'):
+        run_graph([Task('a', lambda missing: missing, deps=['missing'])], workers=1)
+
+
+def test_prefixed_graphs_share_one_run():
+    graph = [Task('x', lambda: 1), Task('y', lambda x: x + 1, deps=['x'])]
+    results = run_graph(prefix_tasks(graph, 'left_') + prefix_tasks(graph, 'right_'), workers=2)
+    assert results == {'left_y': 2, 'right_y': 2}
+
+
+def test_on_done_sees_every_task():
+    seen = []
+    run_graph([Task('x', lambda: 1), Task('y', lambda x: x, deps=['x'])], workers=1,
+              on_done=lambda name, result, seconds: seen.append((name, result)))
+    assert seen == [('x', 1), ('y', 1)]
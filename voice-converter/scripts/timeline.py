@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Time-Resolved Energy Timeline
+Where in a track the watermark band is elevated, from the per-frame band
+energies of the analysis STFT (analyze_fingerprint.band_curves):
+- Cumulative sums of the band energies, valid-frame counts, frame ratios
+  and threshold crossings are built once, in O(frames)
+- A sparse table of frame ratios answers range maxima
+- Any time range is then summarized in O(1): energy ratio, mean / max
+  frame ratio, elevated / higher frame percentages and status (the
+  analyzer's energy rules), and the fixed-window timeline is computed for
+  all windows at once
+- serialize() gives the timeline as flat, columnar fields for the result
+
+Usage:
+    python timeline.py <input> [--window seconds] [--range start:end ...]
+"""
+
+import sys
+import json
+import numpy as np
+
+DEFAULT_WINDOW_SECONDS = 2.0
+# Status codes of the serialized timeline; -1 = no reference-band energy (silence)
+STATUSES = ("clean", "suspicious", "watermarked", "possibly_cleaned")
+NO_STATUS = -1
+
+
+def _cumsum(values):
+    """Prefix sums with a leading zero: sum of values[i:j] = c[j] - c[i]."""
+    out = np.zeros(len(values) + 1)
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+class EnergyTimeline:
+    """
+    O(1) range queries over the per-frame band energies of one input.
+
+    Args:
+        curves: (2, frames) per-frame mean magnitude of the watermark and
+            reference bands (analyze_fingerprint.band_curves)
+        frame_seconds: Hop length in seconds
+        thresholds: {result field: frame ratio} percentages to report,
+            e.g. {"framesWatermarkElevatedPercent": 0.25}
+        classify: Optional metrics -> status function (energy_status)
+    """
+
+    def __init__(self, curves, frame_seconds, thresholds, classify=None):
+        watermark, reference = np.asarray(curves, dtype=np.float64)
+        self.frames = len(watermark)
+        self.frame_seconds = frame_seconds
+        self.classify = classify
+
+        # Frames without reference energy are skipped, as in the whole-file statistics
+        valid = reference > 0
+        ratios = np.divide(watermark, reference, out=np.zeros(self.frames), where=valid)
+        self._watermark = _cumsum(watermark)
+        self._reference = _cumsum(reference)
+        self._valid = _cumsum(valid)
+        self._ratio = _cumsum(ratios)
+        self._above = {field: _cumsum(ratios > threshold) for field, threshold in thresholds.items()}
+
+        # Sparse table: _max[k, i] = max(ratios[i:i + 2**k]); ratios are >= 0, so 0 pads
+        levels = max(1, int(self.frames).bit_length())
+        self._max = np.zeros((levels, self.frames), dtype=np.float32)
+        if self.frames:
+            self._max[0] = ratios
+        for k in range(1, levels):
+            span = 1 << (k - 1)
+            self._max[k, :self.frames - span] = np.maximum(self._max[k - 1, :self.frames - span],
+                                                           self._max[k - 1, span:])
+
+    @property
+    def duration(self):
+        return self.frames * self.frame_seconds
+
+    def _frame_range(self, start, end):
+        """Seconds -> indices [i, j) of the frames centered in [start, end), clipped to the track."""
+        i = np.clip(np.ceil(np.asarray(start, dtype=np.float64) / self.frame_seconds), 0, self.frames).astype(np.int64)
+        j = np.clip(np.ceil(np.asarray(end, dtype=np.float64) / self.frame_seconds), 0, self.frames).astype(np.int64)
+        return i, np.maximum(i, j)
+
+    def _summaries(self, i, j):
+        """Range metrics for arrays of frame ranges [i, j), vectorized."""
+        watermark = self._watermark[j] - self._watermark[i]
+        reference = self._reference[j] - self._reference[i]
+        valid = self._valid[j] - self._valid[i]
+        length = j - i
+        k = np.maximum(np.floor(np.log2(np.maximum(length, 1))).astype(np.int64), 0)
+        last = np.clip(j - (1 << k), 0, max(self.frames - 1, 0))
+        first = np.minimum(i, max(self.frames - 1, 0))
+        if self.frames:
+            range_max = np.maximum(self._max[k, first], self._max[k, last])
+        else:
+            range_max = np.zeros(len(i))
+
+        def share(counts):
+            return np.divide(counts * 100.0, valid, out=np.zeros(len(i)), where=valid > 0)
+
+        metrics = {
+            "energyRatio": np.divide(watermark, reference, out=np.zeros(len(i)), where=reference > 0),
+            "meanFrameRatio": np.divide(self._ratio[j] - self._ratio[i], valid, out=np.zeros(len(i)), where=valid > 0),
+            "maxFrameRatio": np.where(valid > 0, range_max, 0.0),
+        }
+        for field, counts in self._above.items():
+            metrics[field] = share(counts[j] - counts[i])
+        return metrics, valid
+
+    def query(self, start, end):
+        """
+        Energy metrics of the time range [start, end) in seconds, in O(1).
+
+        Returns:
+            dict with start, end (clipped to frame boundaries), frames, the
+            range metrics and status (None without classify, or for a range
+            without reference-band energy)
+        """
+        i, j = self._frame_range([start], [end])
+        metrics, valid = self._summaries(i, j)
+        summary = {key: float(values[0]) for key, values in metrics.items()}
+        status = self.classify(summary) if self.classify and valid[0] > 0 else None
+        return {
+            "start": round(float(i[0] * self.frame_seconds), 3),
+            "end": round(float(j[0] * self.frame_seconds), 3),
+            "frames": int(j[0] - i[0]),
+            **{key: round(value, 4) for key, value in summary.items()},
+            "status": status,
+        }
+
+    def windows(self, window_seconds=DEFAULT_WINDOW_SECONDS):
+        """
+        Metrics of consecutive windows covering the track (the last one may
+        be shorter), all computed at once.
+
+        Returns:
+            (metrics dict of arrays, valid frame counts per window)
+        """
+        if window_seconds <= 0:
+            raise ValueError("Window length must be positive")
+        last_center = max(self.frames - 1, 0) * self.frame_seconds
+        starts = np.arange(int(last_center // window_seconds) + 1) * float(window_seconds)
+        i, j = self._frame_range(starts, starts + window_seconds)
+        return self._summaries(i, j)
+
+    def serialize(self, window_seconds=DEFAULT_WINDOW_SECONDS):
+        """
+        The window timeline as flat columnar fields (arrays only, no nested
+        objects, so the analyze route can still pick the result out of
+        stdout): timelineWindowSeconds, timelineStatuses (legend),
+        timelineStatus (codes, -1 = silence), timelineRatio,
+        timelineElevatedPercent (when that threshold is tracked).
+        """
+        metrics, valid = self.windows(window_seconds)
+        codes = []
+        for w in range(len(valid)):
+            if valid[w] == 0 or self.classify is None:
+                codes.append(NO_STATUS)
+                continue
+            codes.append(STATUSES.index(self.classify({key: float(values[w]) for key, values in metrics.items()})))
+        fields = {
+            "timelineWindowSeconds": float(window_seconds),
+            "timelineStatuses": list(STATUSES),
+            "timelineStatus": codes,
+            "timelineRatio": np.round(metrics["energyRatio"], 4).tolist(),
+        }
+        if "framesWatermarkElevatedPercent" in metrics:
+            fields["timelineElevatedPercent"] = np.round(metrics["framesWatermarkElevatedPercent"], 1).tolist()
+        return fields
+
+
+def analyzer_timeline(curves, sr):
+    """EnergyTimeline with the analyzer's hop, thresholds and status rules."""
+    from analyze_fingerprint import HOP_LENGTH, ELEVATED_RATIO, HIGHER_RATIO, energy_status
+
+    thresholds = {"framesWatermarkElevatedPercent": ELEVATED_RATIO, "framesWatermarkHigherPercent": HIGHER_RATIO}
+    return EnergyTimeline(curves, HOP_LENGTH / sr, thresholds, classify=energy_status)
+
+
+def build_timeline(input_path):
+    """Decode an input, compute its band curves and return its EnergyTimeline."""
+    from analyze_fingerprint import AnalysisContext, open_input, build_tasks
+    from scheduler import run_graph
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    sr, _, compute_stft = open_input(input_path, log)
+    outputs = run_graph(build_tasks(AnalysisContext(sr), compute_stft, groups=(), keep=("band_curves",)))
+    return analyzer_timeline(outputs["band_curves"], sr)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    window = DEFAULT_WINDOW_SECONDS
+    ranges = []
+    try:
+        while '--window' in args:
+            idx = args.index('--window')
+            window = float(args[idx + 1])
+            del args[idx:idx + 2]
+        while '--range' in args:
+            idx = args.index('--range')
+            start, end = args[idx + 1].split(':')
+            ranges.append((float(start), float(end)))
+            del args[idx:idx + 2]
+    except (IndexError, ValueError):
+        print(json.dumps({"success": False, "error": "--window takes seconds, --range takes start:end"}))
+        sys.exit(1)
+    if not args:
+        print(json.dumps({"success": False, "error": "Usage: timeline.py <input|-|shm:name> [--window seconds] [--range start:end ...]"}))
+        sys.exit(1)
+
+    from fft_backend import configure_fft
+    # FFT backend for every STFT in this process (see fft_backend.py)
+    configure_fft()
+    try:
+        timeline = build_timeline(args[0])
+        result = {"success": True, "duration": round(timeline.duration, 2), **timeline.serialize(window)}
+        if ranges:
+            result["ranges"] = [timeline.query(start, end) for start, end in ranges]
+        print(json.dumps(result))
+    except Exception as e:
+        print(json.dumps({"success": False, "error": f"Timeline error: {e}"}))
+        sys.exit(1)
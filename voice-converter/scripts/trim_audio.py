@@ -2,98 +2,580 @@
 """
 Audio Trimming Script
 Trims audio files to specified start and end times.
+Batch mode (--regions) splits one input into many segments from a JSON list,
+CUE sheet or CSV of markers with a single decode.
+Auto mode (--auto) detects leading/trailing silence and trims it.
+Input and output may be "-" (stdin/stdout, see stdio_io.py); the output
+format for stdout is chosen with --output-format.
 """
 
 import sys
 import os
+import re
+import io
+import csv
 import json
-from pydub import AudioSegment
+from concurrent.futures import ThreadPoolExecutor
+from profiling import StageTimer, run_with_profile, parse_profiling_args
+from scratch import get_scratch
+from admission import admit_or_exit
+from pcm_mmap import write_wav_slice
+from stdio_io import (open_input_pcm, load_segment, output_extension, open_output, export_segment, run_ffmpeg,
+                      claim_stdout, parse_stdio_args, is_stdio, is_shared_memory, streamed_wav, write_wav_stream,
+                      StdinWav)
+from probe import probe
+from planner import probe_and_plan
+from silence import detect_silence, DEFAULT_THRESHOLD_DB, DEFAULT_MIN_SILENCE_MS, DEFAULT_PADDING_MS
 
-def trim_audio(input_path, output_path, start_seconds, end_seconds):
+# Audio decoded before the start of an ffmpeg range cut and then discarded
+SEEK_PREROLL_MS = 500
+
+def clamp_range(start_seconds, end_seconds, duration_seconds):
+    """Clamp a time range to the file and reject empty/inverted ranges."""
+    if start_seconds < 0:
+        start_seconds = 0
+    if end_seconds is None or end_seconds > duration_seconds:
+        end_seconds = duration_seconds
+    if start_seconds >= end_seconds:
+        raise ValueError(f"Start time ({start_seconds}s) must be less than end time ({end_seconds}s)")
+    return start_seconds, end_seconds
+
+def _frame_range(pcm, start_seconds, end_seconds):
+    """Seconds -> frame indices, at the same millisecond granularity as the pydub path."""
+    start_frame = int(start_seconds * 1000) * pcm.samplerate // 1000
+    end_frame = int(end_seconds * 1000) * pcm.samplerate // 1000
+    return start_frame, end_frame
+
+def trim_audio(input_path, output_path, start_seconds, end_seconds, timings=False, stream_copy=False):
     """
     Trim audio file to specified time range.
     
+    The strategy comes from planner.py: uncompressed input to WAV is sliced
+    from the memory map, other inputs are cut by ffmpeg seeking to the start
+    (or copied packet for packet with stream_copy), and pydub decodes the
+    whole file only when ffmpeg is missing.
+    
     Args:
         input_path: Path to input audio file
         output_path: Path to output trimmed audio file
         start_seconds: Start time in seconds (float)
         end_seconds: End time in seconds (float)
+        timings: If True, add per-stage wall time/memory to the result
+        stream_copy: Allow copying compressed packets without re-encoding
+            when the output codec matches (cuts land on codec frame
+            boundaries, e.g. within 26 ms for MP3)
     
     Returns:
         dict with success status and output path
     """
+    timer = StageTimer(enabled=timings)
     try:
-        print(f"Loading audio: {input_path}", flush=True)
-        audio = AudioSegment.from_file(input_path)
-        
-        duration_seconds = len(audio) / 1000.0
-        print(f"Original duration: {duration_seconds:.2f} seconds", flush=True)
-        
-        # Validate time range
-        if start_seconds < 0:
-            start_seconds = 0
-        if end_seconds > duration_seconds:
-            end_seconds = duration_seconds
-        if start_seconds >= end_seconds:
-            raise ValueError(f"Start time ({start_seconds}s) must be less than end time ({end_seconds}s)")
-        
-        # Convert seconds to milliseconds (pydub uses milliseconds)
-        start_ms = int(start_seconds * 1000)
-        end_ms = int(end_seconds * 1000)
-        
-        print(f"Trimming from {start_seconds:.2f}s to {end_seconds:.2f}s", flush=True)
+        output_ext = output_extension(output_path)
+        # Detect output format from extension
+        output_format = output_ext[1:] if output_ext else 'wav'  # Remove dot
         
-        # Trim audio
-        trimmed = audio[start_ms:end_ms]
+        with timer.stage('plan'):
+            info, execution_plan = probe_and_plan('trim_audio', input_path, start=start_seconds, end=end_seconds,
+                                                  output_format=output_format, stream_copy=stream_copy,
+                                                  pipe_input=is_stdio(input_path) or is_shared_memory(input_path))
+        strategy = execution_plan["strategy"] if execution_plan else 'decode'
         
-        trimmed_duration = len(trimmed) / 1000.0
-        print(f"Trimmed duration: {trimmed_duration:.2f} seconds", flush=True)
+        if strategy == 'mmap-slice':
+            # Uncompressed WAV/AIFF to WAV: copy the sample range straight from the mapping (or from stdin)
+            result = _trim_pcm(streamed_wav(input_path) or open_input_pcm(input_path), output_path,
+                               start_seconds, end_seconds, timer)
+        elif strategy in ('seek-decode', 'stream-copy'):
+            result = _trim_ffmpeg(input_path, output_path, output_format, info, start_seconds, end_seconds,
+                                  timer, copy=strategy == 'stream-copy')
+        else:
+            result = _trim_decode(input_path, output_path, output_format, start_seconds, end_seconds, timer)
         
-        # Detect output format from extension
-        output_ext = os.path.splitext(output_path)[1].lower()
-        output_format = output_ext[1:] if output_ext else 'wav'  # Remove dot
+        if execution_plan:
+            result["plan"] = strategy
+            result["plan_reason"] = execution_plan["reason"]
+        if timings:
+            result["timings"] = timer.as_dict()
+        return result
         
-        # Export trimmed audio
+    except Exception as e:
+        error_msg = f"Audio trimming failed: {str(e)}"
+        print(error_msg, file=sys.stderr, flush=True)
+        result = {
+            "success": False,
+            "error": error_msg
+        }
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
+        return result
+
+def _trim_decode(input_path, output_path, output_format, start_seconds, end_seconds, timer):
+    """Trim by decoding the whole file with pydub (the fallback without ffmpeg seeking)."""
+    with timer.stage('decode'):
+        print(f"Loading audio: {input_path}", flush=True)
+        audio = load_segment(input_path)
+    
+    duration_seconds = len(audio) / 1000.0
+    print(f"Original duration: {duration_seconds:.2f} seconds", flush=True)
+    
+    # Validate time range
+    start_seconds, end_seconds = clamp_range(start_seconds, end_seconds, duration_seconds)
+    
+    # Convert seconds to milliseconds (pydub uses milliseconds)
+    start_ms = int(start_seconds * 1000)
+    end_ms = int(end_seconds * 1000)
+    
+    print(f"Trimming from {start_seconds:.2f}s to {end_seconds:.2f}s", flush=True)
+    
+    # Trim audio
+    trimmed = audio[start_ms:end_ms]
+    
+    trimmed_duration = len(trimmed) / 1000.0
+    print(f"Trimmed duration: {trimmed_duration:.2f} seconds", flush=True)
+    
+    # Export trimmed audio
+    with timer.stage('export'):
         print(f"Exporting trimmed audio: {output_path} (format: {output_format})", flush=True)
         
         if output_format == 'mp3':
-            trimmed.export(output_path, format="mp3", bitrate="320k")
+            export_segment(trimmed, output_path, "mp3", bitrate="320k")
+        else:
+            export_segment(trimmed, output_path, output_format)
+    
+    print(f"Trim successful: {output_path}", flush=True)
+    
+    return {
+        "success": True,
+        "output_path": output_path,
+        "original_duration": round(duration_seconds, 2),
+        "trimmed_duration": round(trimmed_duration, 2),
+        "start_time": round(start_seconds, 2),
+        "end_time": round(end_seconds, 2)
+    }
+
+def _trim_ffmpeg(input_path, output_path, output_format, info, start_seconds, end_seconds, timer, copy=False):
+    """
+    Trim with ffmpeg without decoding in Python: the duration comes from the
+    probed header, and ffmpeg seeks to the start and decodes only the range
+    (or, with copy, passes the range's packets through unchanged).
+    """
+    duration_seconds = info["duration"]
+    print(f"{info['codec']} input ({info['sampleRate']} Hz, {info['channels']} ch)", flush=True)
+    print(f"Original duration: {duration_seconds:.2f} seconds", flush=True)
+    
+    # Validate time range
+    start_seconds, end_seconds = clamp_range(start_seconds, end_seconds, duration_seconds)
+    print(f"Trimming from {start_seconds:.2f}s to {end_seconds:.2f}s", flush=True)
+    
+    # Same millisecond granularity as the pydub path
+    start_ms = int(start_seconds * 1000)
+    end_ms = int(end_seconds * 1000)
+    if copy:
+        codec_options = ['-c:a', 'copy']
+    elif output_format == 'mp3':
+        codec_options = ['-c:a', 'libmp3lame', '-b:a', '320k']
+    elif output_format == 'wav':
+        # The sample width pydub would have decoded to
+        bits = info["bitDepth"] if info["bitDepth"] in (24, 32) else 16
+        codec_options = ['-c:a', f'pcm_s{bits}le']
+    else:
+        codec_options = []
+    
+    with timer.stage('export'):
+        print(f"Exporting trimmed audio: {output_path} (format: {output_format})", flush=True)
+        # Seek a little early and drop the preroll after decoding: the first
+        # frames after a seek decode without their overlap / bit reservoir
+        preroll_ms = 0 if copy else min(start_ms, SEEK_PREROLL_MS)
+        run_ffmpeg(input_path, output_path, output_format,
+                   input_options=['-ss', f'{(start_ms - preroll_ms) / 1000:.3f}'],
+                   output_options=['-ss', f'{preroll_ms / 1000:.3f}', '-t', f'{(end_ms - start_ms) / 1000:.3f}',
+                                   '-vn', *codec_options, '-map_metadata', '-1'])
+    
+    trimmed_duration = (end_ms - start_ms) / 1000.0
+    if copy and not is_stdio(output_path):
+        # Packet boundaries decide the actual length
+        trimmed_duration = probe(output_path)["duration"]
+    print(f"Trimmed duration: {trimmed_duration:.2f} seconds", flush=True)
+    print(f"Trim successful: {output_path}", flush=True)
+    
+    return {
+        "success": True,
+        "output_path": output_path,
+        "original_duration": round(duration_seconds, 2),
+        "trimmed_duration": round(trimmed_duration, 2),
+        "start_time": round(start_seconds, 2),
+        "end_time": round(end_seconds, 2)
+    }
+
+def _trim_pcm(pcm, output_path, start_seconds, end_seconds, timer):
+    """
+    Trim a memory-mapped PCM file (or a stdio_io.StdinWav) without decoding it.
+    Only the selected frames are read from disk and written to the output WAV;
+    stdin is copied as it arrives and not read past the end of the range.
+    """
+    duration_seconds = pcm.duration
+    streamed = isinstance(pcm, StdinWav)
+    print(f"{'Streamed' if streamed else 'Memory-mapped'} {pcm.container.upper()} input ({pcm.bits}-bit, {pcm.channels} ch)", flush=True)
+    print(f"Original duration: {duration_seconds:.2f} seconds", flush=True)
+    
+    # Validate time range
+    start_seconds, end_seconds = clamp_range(start_seconds, end_seconds, duration_seconds)
+    
+    print(f"Trimming from {start_seconds:.2f}s to {end_seconds:.2f}s", flush=True)
+    
+    start_frame, end_frame = _frame_range(pcm, start_seconds, end_seconds)
+    
+    with timer.stage('export'):
+        print(f"Exporting trimmed audio: {output_path} (format: wav)", flush=True)
+        with open_output(output_path) as out:
+            write = write_wav_stream if streamed else write_wav_slice
+            n_frames = write(pcm, out, start_frame, end_frame)
+    
+    trimmed_duration = n_frames / pcm.samplerate
+    print(f"Trimmed duration: {trimmed_duration:.2f} seconds", flush=True)
+    print(f"Trim successful: {output_path}", flush=True)
+    
+    return {
+        "success": True,
+        "output_path": output_path,
+        "original_duration": round(duration_seconds, 2),
+        "trimmed_duration": round(trimmed_duration, 2),
+        "start_time": round(start_seconds, 2),
+        "end_time": round(end_seconds, 2)
+    }
+
+def auto_trim(input_path, output_path, threshold_db=DEFAULT_THRESHOLD_DB, min_silence_ms=DEFAULT_MIN_SILENCE_MS,
+              padding_ms=DEFAULT_PADDING_MS, find_gaps=False, timings=False):
+    """
+    Trim leading and trailing silence automatically.
+    
+    Args:
+        input_path: Path to input audio file
+        output_path: Path to output trimmed audio file
+        threshold_db: Level (dBFS) below which audio counts as silence
+        min_silence_ms: Minimum length of reported internal gaps
+        padding_ms: Audio kept before the first / after the last sound
+        find_gaps: If True, also report internal silent gaps
+        timings: If True, add per-stage wall time/memory to the result
+    
+    Returns:
+        trim_audio() result plus the detected "silence" boundaries
+    """
+    timer = StageTimer(enabled=timings)
+    try:
+        with timer.stage('detect_silence'):
+            print(f"Scanning for silence below {threshold_db:.1f} dBFS: {input_path}", flush=True)
+            silence = detect_silence(input_path, threshold_db, min_silence_ms,
+                                     padding_ms=padding_ms, find_gaps=find_gaps)
+        if silence["all_silent"]:
+            raise ValueError(f"No audio above {threshold_db:.1f} dBFS found - nothing to keep")
+        print(f"Sound from {silence['sound_start']:.3f}s to {silence['sound_end']:.3f}s", flush=True)
+        if find_gaps:
+            print(f"Internal gaps: {len(silence['gaps'])}", flush=True)
+    except Exception as e:
+        error_msg = f"Audio trimming failed: {str(e)}"
+        print(error_msg, file=sys.stderr, flush=True)
+        result = {
+            "success": False,
+            "error": error_msg
+        }
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
+        return result
+    
+    result = trim_audio(input_path, output_path, silence["sound_start"], silence["sound_end"], timings)
+    result["silence"] = silence
+    if timings and result.get("timings"):
+        # Report silence detection and the trim itself as one timeline
+        auto_timings = timer.as_dict()
+        auto_timings["stages"].update(result["timings"]["stages"])
+        result["timings"] = auto_timings
+    return result
+
+# ============================================================================
+# MULTI-REGION SPLIT
+# ============================================================================
+def parse_timestamp(value):
+    """'83.5', '1:23.5' or '01:01:23.500' -> seconds."""
+    seconds = 0.0
+    for part in str(value).strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def _is_timestamp(value):
+    try:
+        parse_timestamp(value)
+        return True
+    except ValueError:
+        return False
+
+def parse_cue(text):
+    """
+    Parse a CUE sheet into regions.
+    Each TRACK starts at its INDEX 01 (mm:ss:ff, 75 frames per second)
+    and ends where the next track starts; the last track runs to the end.
+    """
+    tracks = []
+    current = None
+    for line in text.splitlines():
+        tokens = line.strip().split(None, 1)
+        if not tokens:
+            continue
+        keyword = tokens[0].upper()
+        if keyword == 'TRACK':
+            current = {"name": None, "start": None}
+            tracks.append(current)
+        elif keyword == 'TITLE' and current is not None and len(tokens) > 1:
+            current["name"] = tokens[1].strip().strip('"')
+        elif keyword == 'INDEX' and current is not None and len(tokens) > 1:
+            number, stamp = tokens[1].split()[:2]
+            if int(number) == 1:
+                minutes, seconds, frames = (int(x) for x in stamp.split(':'))
+                current["start"] = minutes * 60 + seconds + frames / 75.0
+    
+    tracks = [t for t in tracks if t["start"] is not None]
+    for track, following in zip(tracks, tracks[1:] + [None]):
+        track["end"] = following["start"] if following else None
+    return tracks
+
+def parse_marker_csv(text):
+    """
+    Parse a CSV of regions or markers.
+    Accepted layouts (header optional): start,end[,name] or start[,name]
+    where a marker-only row ends at the next marker. Times are seconds or
+    [hh:]mm:ss(.ms).
+    """
+    rows = [r for r in csv.reader(io.StringIO(text)) if r and any(c.strip() for c in r)]
+    if not rows:
+        return []
+    
+    start_col, end_col, name_col = 0, None, None
+    if not _is_timestamp(rows[0][0]):
+        header = [c.strip().lower() for c in rows.pop(0)]
+        start_col = header.index('start') if 'start' in header else 0
+        end_col = header.index('end') if 'end' in header else None
+        name_col = next((header.index(k) for k in ('name', 'title', 'label') if k in header), None)
+    elif len(rows[0]) > 1 and _is_timestamp(rows[0][1]):
+        end_col, name_col = 1, 2
+    else:
+        name_col = 1
+    
+    regions = []
+    for row in rows:
+        cell = lambda col: row[col].strip() if col is not None and col < len(row) and row[col].strip() else None
+        regions.append({
+            "start": parse_timestamp(cell(start_col)),
+            "end": parse_timestamp(cell(end_col)) if cell(end_col) else None,
+            "name": cell(name_col),
+        })
+    
+    # Markers: open-ended regions run to the next marker
+    if end_col is None:
+        regions.sort(key=lambda r: r["start"])
+        for region, following in zip(regions, regions[1:] + [None]):
+            region["end"] = following["start"] if following else None
+    return regions
+
+def load_regions(spec):
+    """
+    Read regions from an inline JSON list or a .json / .cue / .csv file.
+    
+    Returns:
+        list of dicts with start, end (None = until end of file) and optional name
+    """
+    if spec.lstrip().startswith('['):
+        return json.loads(spec)
+    with open(spec, encoding='utf-8-sig') as f:
+        text = f.read()
+    ext = os.path.splitext(spec)[1].lower()
+    if ext == '.cue':
+        return parse_cue(text)
+    if ext == '.csv':
+        return parse_marker_csv(text)
+    return json.loads(text)
+
+def _safe_name(name):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('._') or 'segment'
+
+def trim_audio_regions(input_path, regions, output_dir, output_format='wav', timings=False):
+    """
+    Split one input into several segments with a single decode.
+    
+    Uncompressed WAV/AIFF sources written as WAV are sliced straight from
+    the memory map (no decode at all); everything else is decoded once with
+    pydub and the segment encoders run in parallel threads.
+    
+    Args:
+        input_path: Path to input audio file
+        regions: List of dicts with start, end (seconds, None = end of file), name
+        output_dir: Directory for the segment files
+        output_format: 'wav', 'mp3', or any format ffmpeg can write
+        timings: If True, add per-stage wall time/memory to the result
+    
+    Returns:
+        dict with success status and one entry per segment
+    """
+    timer = StageTimer(enabled=timings)
+    try:
+        if not regions:
+            raise ValueError("No regions given")
+        os.makedirs(output_dir, exist_ok=True)
+        output_format = output_format.lower().lstrip('.')
+        
+        pcm = open_input_pcm(input_path) if output_format == 'wav' else None
+        if pcm is not None:
+            print(f"Memory-mapped {pcm.container.upper()} input ({pcm.bits}-bit, {pcm.channels} ch)", flush=True)
+            duration_seconds = pcm.duration
         else:
-            trimmed.export(output_path, format=output_format)
+            with timer.stage('decode'):
+                print(f"Loading audio: {input_path}", flush=True)
+                audio = load_segment(input_path)
+            duration_seconds = len(audio) / 1000.0
+        print(f"Original duration: {duration_seconds:.2f} seconds, {len(regions)} regions", flush=True)
         
-        print(f"Trim successful: {output_path}", flush=True)
+        def export_segment(index, region):
+            name = region.get("name") or f"segment_{index:02d}"
+            output_path = os.path.join(output_dir, f"{index:02d}_{_safe_name(name)}.{output_format}")
+            entry = {"index": index, "name": name, "output_path": output_path}
+            try:
+                end = region.get("end")
+                start_seconds, end_seconds = clamp_range(float(region["start"]), None if end is None else float(end), duration_seconds)
+                if pcm is not None:
+                    n_frames = write_wav_slice(pcm, output_path, *_frame_range(pcm, start_seconds, end_seconds))
+                    trimmed_duration = n_frames / pcm.samplerate
+                else:
+                    segment = audio[int(start_seconds * 1000):int(end_seconds * 1000)]
+                    if output_format == 'mp3':
+                        segment.export(output_path, format="mp3", bitrate="320k")
+                    else:
+                        segment.export(output_path, format=output_format)
+                    trimmed_duration = len(segment) / 1000.0
+                print(f"Segment {index}: {start_seconds:.2f}s - {end_seconds:.2f}s -> {output_path}", flush=True)
+                entry.update({
+                    "success": True,
+                    "start_time": round(start_seconds, 2),
+                    "end_time": round(end_seconds, 2),
+                    "trimmed_duration": round(trimmed_duration, 2),
+                })
+            except Exception as e:
+                print(f"Segment {index} failed: {e}", file=sys.stderr, flush=True)
+                entry.update({"success": False, "error": str(e)})
+            return entry
         
-        return {
-            "success": True,
-            "output_path": output_path,
+        with timer.stage('export'):
+            # Memory-mapped slices are plain I/O; only encoder-bound exports are parallelized
+            workers = 1 if pcm is not None else max(1, min(len(regions), os.cpu_count() or 1))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                segments = list(pool.map(export_segment, range(1, len(regions) + 1), regions))
+        
+        failed = [seg for seg in segments if not seg["success"]]
+        print(f"Split finished: {len(segments) - len(failed)}/{len(segments)} segments written", flush=True)
+        result = {
+            "success": not failed,
             "original_duration": round(duration_seconds, 2),
-            "trimmed_duration": round(trimmed_duration, 2),
-            "start_time": round(start_seconds, 2),
-            "end_time": round(end_seconds, 2)
+            "segments": segments,
         }
+        if failed:
+            result["error"] = f"{len(failed)} of {len(segments)} segments failed"
+        if timings:
+            result["timings"] = timer.as_dict()
+        return result
         
     except Exception as e:
-        error_msg = f"Audio trimming failed: {str(e)}"
+        error_msg = f"Audio splitting failed: {str(e)}"
         print(error_msg, file=sys.stderr, flush=True)
-        return {
+        result = {
             "success": False,
             "error": error_msg
         }
+        if timings:
+            # Stages that ran (including the one that failed)
+            result["timings"] = timer.as_dict()
+        return result
 
 if __name__ == "__main__":
-    if len(sys.argv) < 5:
+    args, timings, profile_path = parse_profiling_args(sys.argv[1:])
+    args = parse_stdio_args(args)
+    # Library temporaries (pydub's export files) go into this job's scratch space
+    get_scratch()
+    if len(args) > 1:
+        # With "-" as output the audio goes to stdout and the JSON result to stderr
+        claim_stdout(args[1].strip('"\''))
+    if args:
+        # Wait for room in the memory budget (see admission.py)
+        admit_or_exit('trim_audio', args[0].strip('"\''), args[1].strip('"\'') if len(args) > 1 else None)
+    
+    # Batch mode: trim_audio.py <input> <output_dir> --regions <json|file.json|file.cue|file.csv> [--format wav|mp3]
+    if '--regions' in args:
+        idx = args.index('--regions')
+        spec = args[idx + 1] if idx + 1 < len(args) else None
+        del args[idx:idx + 2]
+        output_format = 'wav'
+        if '--format' in args:
+            idx = args.index('--format')
+            output_format = args[idx + 1] if idx + 1 < len(args) else 'wav'
+            del args[idx:idx + 2]
+        if spec is None or len(args) < 2:
+            print(json.dumps({
+                "success": False,
+                "error": "Usage: trim_audio.py <input> <output_dir> --regions <json|file.json|file.cue|file.csv> [--format wav|mp3]"
+            }))
+            sys.exit(1)
+        try:
+            regions = load_regions(spec)
+        except (OSError, ValueError) as e:
+            print(json.dumps({"success": False, "error": f"Could not read regions: {e}"}))
+            sys.exit(1)
+        result = run_with_profile(profile_path, trim_audio_regions, args[0].strip('"\''), regions, args[1].strip('"\''), output_format, timings)
+        print(json.dumps(result), flush=True)
+        sys.exit(0 if result.get("success") else 1)
+    
+    # Auto-trim mode: trim_audio.py <input> <output> --auto [--threshold-db N] [--min-silence-ms N] [--padding-ms N] [--gaps]
+    if '--auto' in args:
+        args.remove('--auto')
+        find_gaps = '--gaps' in args
+        if find_gaps:
+            args.remove('--gaps')
+        options = {'--threshold-db': DEFAULT_THRESHOLD_DB, '--min-silence-ms': DEFAULT_MIN_SILENCE_MS, '--padding-ms': DEFAULT_PADDING_MS}
+        try:
+            for flag in options:
+                if flag in args:
+                    idx = args.index(flag)
+                    options[flag] = float(args[idx + 1])
+                    del args[idx:idx + 2]
+        except (IndexError, ValueError):
+            print(json.dumps({"success": False, "error": "Silence options must be numbers"}))
+            sys.exit(1)
+        if len(args) < 2:
+            print(json.dumps({
+                "success": False,
+                "error": "Usage: trim_audio.py <input> <output> --auto [--threshold-db N] [--min-silence-ms N] [--padding-ms N] [--gaps]"
+            }))
+            sys.exit(1)
+        result = run_with_profile(profile_path, auto_trim, args[0].strip('"\''), args[1].strip('"\''),
+                                  options['--threshold-db'], options['--min-silence-ms'], options['--padding-ms'], find_gaps, timings)
+        print(json.dumps(result), flush=True)
+        sys.exit(0 if result.get("success") else 1)
+    
+    # Stream copy: cut compressed input on packet boundaries without re-encoding
+    stream_copy = '--stream-copy' in args
+    if stream_copy:
+        args.remove('--stream-copy')
+    
+    if len(args) < 4:
         print(json.dumps({
             "success": False,
-            "error": "Usage: trim_audio.py <input> <output> <start_seconds> <end_seconds>"
+            "error": "Usage: trim_audio.py <input|-> <output|-> <start_seconds> <end_seconds> [--output-format wav|mp3] [--stream-copy] [--timings] [--profile <file.prof>]"
         }))
         sys.exit(1)
     
-    input_path = sys.argv[1].strip('"\'')
-    output_path = sys.argv[2].strip('"\'')
+    input_path = args[0].strip('"\'')
+    output_path = args[1].strip('"\'')
     
     try:
-        start_seconds = float(sys.argv[3])
-        end_seconds = float(sys.argv[4])
+        start_seconds = float(args[2])
+        end_seconds = float(args[3])
     except ValueError:
         print(json.dumps({
             "success": False,
@@ -101,7 +583,7 @@ if __name__ == "__main__":
         }))
         sys.exit(1)
     
-    result = trim_audio(input_path, output_path, start_seconds, end_seconds)
+    result = run_with_profile(profile_path, trim_audio, input_path, output_path, start_seconds, end_seconds, timings, stream_copy)
     print(json.dumps(result), flush=True)
     sys.exit(0 if result.get("success") else 1)
 